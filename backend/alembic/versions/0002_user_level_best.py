@@ -0,0 +1,35 @@
+"""user_level_best table
+
+Revision ID: 0002_user_level_best
+Revises: 0001_init
+Create Date: 2026-10-17
+
+大表请在升级后执行 `python scripts/backfill_user_level_best.py` 分批回填（可重复执行）。
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0002_user_level_best"
+down_revision = "0001_init"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+  op.create_table(
+    "user_level_best",
+    sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), primary_key=True),
+    sa.Column("level_id", sa.String, sa.ForeignKey("levels.id"), primary_key=True),
+    sa.Column("score_id", sa.Integer, sa.ForeignKey("scores.id"), nullable=False),
+    sa.Column("score", sa.Integer, nullable=False),
+    sa.Column("wave", sa.Integer, nullable=False),
+    sa.Column("time_ms", sa.Integer, nullable=False),
+    sa.Column("life_left", sa.Integer, nullable=False),
+    sa.Column("created_at", sa.DateTime),
+  )
+
+
+def downgrade():
+  op.drop_table("user_level_best")
@@ -0,0 +1,25 @@
+"""scores.replay_status
+
+Revision ID: 0003_score_replay_status
+Revises: 0002_user_level_best
+Create Date: 2026-10-17
+
+可空列，已有成绩保持为空（未上传操作日志）。
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0003_score_replay_status"
+down_revision = "0002_user_level_best"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+  op.add_column("scores", sa.Column("replay_status", sa.String, nullable=True))
+
+
+def downgrade():
+  op.drop_column("scores", "replay_status")
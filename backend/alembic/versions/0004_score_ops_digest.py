@@ -0,0 +1,25 @@
+"""scores.ops_digest
+
+Revision ID: 0004_score_ops_digest
+Revises: 0003_score_replay_status
+Create Date: 2026-10-17
+
+可空列：已有成绩没有记录摘要，不能再补传二进制日志。
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0004_score_ops_digest"
+down_revision = "0003_score_replay_status"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+  op.add_column("scores", sa.Column("ops_digest", sa.String, nullable=True))
+
+
+def downgrade():
+  op.drop_column("scores", "ops_digest")
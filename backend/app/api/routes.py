@@ -1,41 +1,75 @@
-from datetime import timedelta
+import asyncio
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+import hmac
+import re
 import time
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from fastapi.security import OAuth2PasswordBearer
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer, OAuth2PasswordBearer
 from jose import JWTError, jwt
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
 
 from ..core.config import get_settings
-from ..core.db import get_db
-from ..core.deps import get_leaderboard, get_nonce_store
-from ..models import Score, User, Level
+from ..core.db import get_db, get_engine
+from ..core.deps import (
+  get_leaderboard,
+  get_nonce_store,
+  get_password_hasher,
+  get_replay_store,
+  get_replay_verifier,
+  get_score_writer,
+)
+from ..models import Score, User, Level, UserLevelBest
 from ..schemas import (
   BestScoreResponse,
   LeaderboardEntry,
+  LeaderboardRankResponse,
   LeaderboardResponse,
   LevelResponse,
+  LevelWaves,
   LoginRequest,
+  RankedLeaderboardEntry,
   RegisterRequest,
+  ReplayStored,
   UserOut,
   ScoreOut,
   ScoreSubmit,
   Token,
+  WaveTable,
 )
-from ..services.levels import load_level
-from ..services.leaderboard import Leaderboard
-from ..utils.nonce import NonceStore
+from ..services.auth_cache import get_auth_cache
+from ..services.best_scores import best_upsert
+from ..services.export import EXPORT_FORMATS, ScoreExporter
+from ..services.ingest import ScoreQueueFull, ScoreWriter
+from ..services.passwords import PasswordHasher, PasswordHasherBusy
+from ..services.replay import PENDING, SKIPPED, ReplayVerifier, replay_digest
+from ..services.replay_format import ReplayReader, ReplaySummary
+from ..services.replay_store import ReplayExists, ReplayStore
+from ..services.simulation import ReplayInvalid
+from ..services.levels import get_level_registry, load_level
+from ..services.leaderboard import SCORE_LIMIT, Leaderboard, parse_cursor
+from ..services.response_cache import cached_response, get_response_cache, not_modified
+from ..services.waves import UINT32, get_wave_schedules
+from ..utils.nonce import NonceStore, NonceStoreFull
 from ..utils.security import (
   create_access_token,
-  get_password_hash,
-  verify_password,
   verify_score_signature,
 )
 
 settings = get_settings()
+# router：无数据库依赖的只读接口；sync_router：同步 Session 版认证/成绩接口（异步版见 routes_async）
 router = APIRouter()
+sync_router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.api_prefix}/auth/login")
+admin_scheme = HTTPBearer(auto_error=False)
 
 
 def get_user(db: Session, name: str) -> Optional[User]:
@@ -46,67 +80,147 @@ def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
   return db.get(User, user_id)
 
 
-def create_user(db: Session, name: str, password: str) -> User:
-  user = User(name=name, hash_pwd=get_password_hash(password))
+password_busy = HTTPException(
+  status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+  detail="Password service busy",
+  headers={"Retry-After": "1"},
+)
+
+
+def create_user(db: Session, name: str, password: str, hasher: PasswordHasher) -> User:
+  try:
+    hash_pwd = hasher.hash(password)
+  except PasswordHasherBusy:
+    raise password_busy
+  user = User(name=name, hash_pwd=hash_pwd)
   db.add(user)
   db.commit()
   db.refresh(user)
   return user
 
 
-def authenticate_user(db: Session, name: str, password: Optional[str]) -> User:
-  """用户存在则校验密码；guest 允许无密码用于体验。"""
+def guest_user() -> User:
+  # 游客不入库，用于试玩，不参与榜单
+  return User(id=0, name="guest", hash_pwd="", created_at=None)  # type: ignore[arg-type]
+
+
+def authenticate_user(db: Session, name: str, password: Optional[str], hasher: PasswordHasher) -> User:
+  """用户存在则校验密码（轮数变更时顺带升级哈希）；guest 允许无密码用于体验。"""
   if name == "guest":
-    # 游客不入库，用于试玩，不参与榜单
-    guest = User(id=0, name="guest", hash_pwd="", created_at=None)  # type: ignore[arg-type]
-    return guest
+    return guest_user()
 
   user = get_user(db, name)
   if not user:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
   if not password:
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Password required")
-  if not verify_password(password, user.hash_pwd):
+  try:
+    valid, new_hash = hasher.verify(password, user.hash_pwd)
+  except PasswordHasherBusy:
+    raise password_busy
+  if not valid:
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect password")
+  if new_hash:
+    user.hash_pwd = new_hash
+    db.commit()
   return user
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-  """解析 JWT，获取当前用户。"""
-  credentials_exception = HTTPException(
-    status_code=status.HTTP_401_UNAUTHORIZED,
-    detail="Could not validate credentials",
-    headers={"WWW-Authenticate": "Bearer"},
-  )
+credentials_exception = HTTPException(
+  status_code=status.HTTP_401_UNAUTHORIZED,
+  detail="Could not validate credentials",
+  headers={"WWW-Authenticate": "Bearer"},
+)
+
+
+def decode_token_claims(token: str) -> Dict[str, Any]:
+  try:
+    claims = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+  except JWTError:
+    raise credentials_exception
+  if claims.get("sub") is None:
+    raise credentials_exception
+  return claims
+
+
+def claims_subject(claims: Dict[str, Any]) -> Optional[int]:
+  """JWT 的 sub：用户 id；游客返回 None。"""
+  if claims["sub"] == "guest":
+    return None
   try:
-    payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-    sub = payload.get("sub")
-    if sub is None:
-      raise credentials_exception
-    if sub == "guest":
-      return User(id=0, name="guest", hash_pwd="", created_at=None)  # type: ignore[arg-type]
-    user_id = int(sub)
-  except (JWTError, ValueError):
+    return int(claims["sub"])
+  except ValueError:
     raise credentials_exception
-  user = get_user_by_id(db, user_id)
+
+
+def decode_token_subject(token: str) -> Optional[int]:
+  """解析 JWT 的 sub：用户 id；游客返回 None。"""
+  return claims_subject(decode_token_claims(token))
+
+
+def cached_user(token: str) -> Optional[User]:
+  """认证缓存命中：返回不挂 Session 的 User（只带 id/name），不解 JWT、不查库。"""
+  identity = get_auth_cache().get(token)
+  if identity is None:
+    return None
+  return User(id=identity.user_id, name=identity.name, hash_pwd="")
+
+
+def claims_user(claims: Dict[str, Any], user_id: int) -> Optional[User]:
+  """开启 auth_trust_token_claims 且 token 带 name 时直接由 claims 构造用户；已撤销的用户拒绝。"""
+  if get_auth_cache().is_revoked(user_id):
+    raise credentials_exception
+  if settings.auth_trust_token_claims and get_auth_cache().claims_trusted and "name" in claims:
+    return User(id=user_id, name=claims["name"], hash_pwd="")
+  return None
+
+
+def remember_user(token: str, claims: Dict[str, Any], user: User) -> None:
+  get_auth_cache().put(token, user.id, user.name, token_exp=claims.get("exp"))
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+  """解析 JWT，获取当前用户：先查认证缓存，未命中再解 JWT 并查库（或信任 claims）。"""
+  user = cached_user(token)
+  if user is not None:
+    return user
+  claims = decode_token_claims(token)
+  user_id = claims_subject(claims)
+  if user_id is None:
+    return guest_user()
+  user = claims_user(claims, user_id) or get_user_by_id(db, user_id)
   if user is None:
     raise credentials_exception
+  remember_user(token, claims, user)
   return user
 
 
-@router.post("/auth/login", response_model=Token, name="auth_login")
-def login(payload: LoginRequest, db: Session = Depends(get_db)) -> Token:
-  """登录，返回 JWT。游客不计入榜单。"""
-  name = payload.name or "guest"
-  user = authenticate_user(db, name, payload.password)
+def issue_token(user: User) -> Token:
   access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
   token_sub = "guest" if user.name == "guest" else str(user.id)
-  token = create_access_token({"sub": token_sub}, expires_delta=access_token_expires)
+  # name 随 token 下发，auth_trust_token_claims 开启时认证无需查库
+  token = create_access_token({"sub": token_sub, "name": user.name}, expires_delta=access_token_expires)
   return Token(access_token=token, expires_in=int(access_token_expires.total_seconds()))
 
 
-@router.post("/auth/register", response_model=UserOut, status_code=status.HTTP_201_CREATED, name="auth_register")
-def register(payload: RegisterRequest, db: Session = Depends(get_db)) -> UserOut:
+@sync_router.post("/auth/login", response_model=Token, name="auth_login")
+def login(
+  payload: LoginRequest,
+  db: Session = Depends(get_db),
+  hasher: PasswordHasher = Depends(get_password_hasher),
+) -> Token:
+  """登录，返回 JWT。游客不计入榜单。"""
+  name = payload.name or "guest"
+  user = authenticate_user(db, name, payload.password, hasher)
+  return issue_token(user)
+
+
+@sync_router.post("/auth/register", response_model=UserOut, status_code=status.HTTP_201_CREATED, name="auth_register")
+def register(
+  payload: RegisterRequest,
+  db: Session = Depends(get_db),
+  hasher: PasswordHasher = Depends(get_password_hasher),
+) -> UserOut:
   """注册新用户：名称唯一，需密码。"""
   if payload.name == "guest":
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Reserved username")
@@ -114,40 +228,170 @@ def register(payload: RegisterRequest, db: Session = Depends(get_db)) -> UserOut
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username already exists")
   if not payload.password:
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Password required")
-  user = create_user(db, payload.name, payload.password)
+  user = create_user(db, payload.name, payload.password, hasher)
   return UserOut.model_validate(user)
 
 
 @router.get("/levels/{level_id}", response_model=LevelResponse, name="get_level")
-def get_level(level_id: str) -> LevelResponse:
-  """获取关卡配置（附带版本/hash）。"""
-  level = load_level(level_id)
-  return LevelResponse(id=level["id"], version=level["version"], hash=level["hash"], config=level["config"])
+def get_level(level_id: str, request: Request) -> Response:
+  """获取关卡配置（附带版本/hash 与预算的距离场/流场/基础路径）。ETag 为关卡 hash；序列化与压缩结果按 hash 缓存。"""
+  record = get_level_registry().get(level_id)
+  etag = f'"{record.hash}"'
+  unchanged = not_modified(request, etag)
+  if unchanged is not None:
+    return unchanged
+  cached = get_response_cache().get_or_build(
+    ("level", level_id, record.hash),
+    etag,
+    lambda: (
+      LevelResponse(
+        id=record.id,
+        version=record.version,
+        hash=record.hash,
+        config=record.config,
+        paths=record.compiled.attachment(),
+      )
+      .model_dump_json()
+      .encode()
+    ),
+  )
+  return cached_response(request, cached)
+
+
+@router.get("/levels/{level_id}/waves", response_model=LevelWaves, name="get_level_waves")
+def get_level_waves(
+  level_id: str,
+  request: Request,
+  seed: int = Query(ge=0, le=UINT32),
+  start: int = Query(1, alias="from", ge=1),
+  count: int = Query(10, ge=1, le=100),
+) -> Response:
+  """按种子展开的波次表（第 from 波起 count 波，1 基）；展开结果按 (hash, seed) 缓存，响应体按页缓存。"""
+  if start + count - 1 > settings.wave_schedule_max_wave:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail=f"Waves beyond {settings.wave_schedule_max_wave} are not served",
+    )
+  record = get_level_registry().get(level_id)
+  etag = f'"{record.hash}-{seed}-{start}-{count}"'
+  unchanged = not_modified(request, etag)
+  if unchanged is not None:
+    return unchanged
+
+  def build() -> bytes:
+    schedule = get_wave_schedules().get(record.hash, record.config, seed)
+    return (
+      LevelWaves(
+        level=record.id,
+        hash=record.hash,
+        seed=seed,
+        enemy_types=list(schedule.enemy_types),
+        waves=[
+          WaveTable(
+            wave=wave.index + 1,
+            auto=wave.auto,
+            difficulty_bonus=wave.difficulty_bonus,
+            spawns=list(wave.spawns),
+            variance=wave.variance.tolist(),
+          )
+          for wave in schedule.waves(start - 1, count)
+        ],
+      )
+      .model_dump_json()
+      .encode()
+    )
+
+  cached = get_response_cache().get_or_build(("waves", level_id, record.hash, seed, start, count), etag, build)
+  return cached_response(request, cached)
+
+
+def leaderboard_body(level: str, scope: str, payloads: List[bytes], next_cursor: Optional[str]) -> bytes:
+  """按 LeaderboardResponse 的字段顺序拼接 JSON：条目为已存储的 LeaderboardEntry JSON，不再解析/校验。"""
+  return b"".join(
+    (
+      b'{"level":',
+      orjson.dumps(level),
+      b',"scope":',
+      orjson.dumps(scope),
+      b',"entries":[',
+      b",".join(payloads),
+      b'],"next_cursor":',
+      orjson.dumps(next_cursor),
+      b"}",
+    )
+  )
 
 
 @router.get("/leaderboard", response_model=LeaderboardResponse, name="read_leaderboard")
 def read_leaderboard(
+  request: Request,
   level: str = Query("endless"),
   scope: str = Query("all"),
   limit: int = Query(10, ge=1, le=100),
+  cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
   leaderboard: Leaderboard = Depends(get_leaderboard),
-) -> LeaderboardResponse:
-  """读取榜单，支持 scope/limit。"""
-  entries = leaderboard.top(level, scope=scope, limit=limit)
-  return LeaderboardResponse(level=level, scope=scope, entries=entries)
+) -> Response:
+  """
+  读取榜单，支持 scope/limit 与游标翻页。
+  ETag 为榜单版本（每次提交改变），If-None-Match 命中直接 304，不读 payload；同版本同参数的响应体只序列化/压缩一次。
+  响应体由存储的 payload 字节直接拼接（见 leaderboard_body），response_model 仅用于 OpenAPI。
+  """
+  try:
+    if cursor:
+      parse_cursor(cursor)
+  except ValueError:
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+  version = leaderboard.version(level, scope)
+  etag = f'"{version}"'
+  unchanged = not_modified(request, etag)
+  if unchanged is not None:
+    return unchanged
+
+  def build() -> bytes:
+    payloads, next_cursor = leaderboard.page_raw(level, scope=scope, limit=limit, cursor=cursor)
+    return leaderboard_body(level, scope, payloads, next_cursor)
+
+  # 版本与页内容是两次读取：构建期间有提交时本次响应不入缓存（内容不旧于 ETag，客户端下次带旧 ETag 只会拿到 200）
+  cached = get_response_cache().get_or_build(
+    ("leaderboard", level, scope, limit, cursor, version),
+    etag,
+    build,
+    valid=lambda: leaderboard.version(level, scope) == version,
+  )
+  return cached_response(request, cached)
 
 
-@router.post("/score", response_model=ScoreOut, name="submit_score")
-def submit_score(
-  payload: ScoreSubmit,
-  db: Session = Depends(get_db),
-  user: User = Depends(get_current_user),
+@router.get("/leaderboard/rank", response_model=LeaderboardRankResponse, name="read_leaderboard_rank")
+def read_leaderboard_rank(
+  level: str = Query("endless"),
+  scope: str = Query("all"),
+  around: int = Query(5, ge=0, le=50, description="上下各取的条数"),
+  token: str = Depends(oauth2_scheme),
   leaderboard: Leaderboard = Depends(get_leaderboard),
-  nonce_store: NonceStore = Depends(get_nonce_store),
-) -> ScoreOut:
-  """提交成绩：校验版本/hash，存库并更新榜单。"""
+) -> LeaderboardRankResponse:
+  """当前用户名次（ZREVRANK）及前后 around 名；只解析 JWT，不查库。"""
+  user_id = decode_token_subject(token)
+  if user_id is None:
+    return LeaderboardRankResponse(level=level, scope=scope, rank=None, total=0, entries=[])
+  rank, total, entries = leaderboard.around(level, user_id, scope=scope, radius=around)
+  if rank is None:
+    return LeaderboardRankResponse(level=level, scope=scope, rank=None, total=total, entries=[])
+  first = max(0, rank - around) + 1
+  return LeaderboardRankResponse(
+    level=level,
+    scope=scope,
+    rank=rank + 1,
+    total=total,
+    entries=[RankedLeaderboardEntry(**entry.model_dump(), rank=first + i) for i, entry in enumerate(entries)],
+  )
+
+
+def validate_submission(payload: ScoreSubmit, user: User, nonce_store: NonceStore) -> Dict[str, Any]:
+  """成绩提交的无数据库校验：游客、时间窗、nonce、签名、关卡版本/hash、操作日志摘要。返回关卡。"""
   if user.name == "guest":
     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Guest scores are not ranked")
+  if payload.score >= SCORE_LIMIT:
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Score out of range")
 
   # 时间戳窗口校验（默认 120s）
   now = int(time.time())
@@ -156,7 +400,15 @@ def submit_score(
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Timestamp out of window")
 
   # nonce 防重放
-  if not nonce_store.check_and_store(payload.nonce, ttl_seconds=window):
+  try:
+    fresh = nonce_store.check_and_store(payload.nonce, ttl_seconds=window)
+  except NonceStoreFull:
+    raise HTTPException(
+      status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+      detail="Nonce store is full",
+      headers={"Retry-After": "1"},
+    )
+  if not fresh:
     raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Duplicate nonce")
 
   # 签名校验
@@ -169,75 +421,424 @@ def submit_score(
   if payload.level_version != level["version"]:
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Level version mismatch")
 
-  db_level = db.get(Level, payload.level_id)
-  if not db_level:
-    db_level = Level(
-      id=payload.level_id,
-      config_json=level["config"],
-      version=level["version"],
-      hash=level["hash"],
-    )
-    db.add(db_level)
-  else:
-    db_level.config_json = level["config"]
-    db_level.version = level["version"]
-    db_level.hash = level["hash"]
+  # 操作日志须与签名覆盖的 ops_digest 一致，否则日志可被替换
+  if payload.replay is not None:
+    if payload.ops_digest != replay_digest(payload.replay.model_dump()):
+      raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Replay digest mismatch")
+  elif settings.replay_mode == "enforce":
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Replay required")
+  return level
 
-  score = Score(
+
+def leaderboard_entry(user: User, payload: ScoreSubmit, created_at: datetime) -> LeaderboardEntry:
+  return LeaderboardEntry(
     user_id=user.id,
-    level_id=payload.level_id,
+    name=user.name,
     score=payload.score,
     wave=payload.wave,
     time_ms=payload.time_ms,
     life_left=payload.life_left,
+    created_at=created_at,
   )
-  db.add(score)
-  db.commit()
-  db.refresh(score)
 
-  lb_entry = LeaderboardEntry(
+
+# 本进程已同步到 levels 表的关卡版本：level_id → hash
+synced_levels: Dict[str, str] = {}
+
+
+def level_row_values(level: Dict[str, Any]) -> Dict[str, Any]:
+  return {"config_json": level["config"], "version": level["version"], "hash": level["hash"]}
+
+
+def sync_level_row(db: Session, level: Dict[str, Any]) -> None:
+  """每个关卡版本只写一次 levels 表（本进程首次见到或 hash 变化时），避免每次提交都整行覆盖配置 JSON。"""
+  if synced_levels.get(level["id"]) == level["hash"]:
+    return
+  row = db.get(Level, level["id"])
+  if row is None:
+    db.add(Level(id=level["id"], **level_row_values(level)))
+  elif row.hash != level["hash"] or row.version != level["version"]:
+    for key, value in level_row_values(level).items():
+      setattr(row, key, value)
+  try:
+    db.commit()
+  except IntegrityError:
+    # 并发首次写入：其他请求/进程已插入同一关卡
+    db.rollback()
+  synced_levels[level["id"]] = level["hash"]
+
+
+def score_values(user: User, payload: ScoreSubmit) -> Dict[str, Any]:
+  return {
+    "user_id": user.id,
+    "level_id": payload.level_id,
+    "score": payload.score,
+    "wave": payload.wave,
+    "time_ms": payload.time_ms,
+    "life_left": payload.life_left,
+    "replay_status": PENDING if payload.replay is not None else None,
+    "ops_digest": payload.ops_digest,
+  }
+
+
+def score_insert(user: User, payload: ScoreSubmit):
+  """单条 INSERT ... RETURNING，取回 id/created_at，无需 ORM refresh。"""
+  return insert(Score).values(**score_values(user, payload)).returning(Score.id, Score.created_at)
+
+
+def enqueue_score(writer: ScoreWriter, user: User, payload: ScoreSubmit, created_at: datetime, nonce_store: NonceStore):
+  """组提交模式入队；队列满时释放 nonce 并 503 + Retry-After。"""
+  try:
+    return writer.submit({**score_values(user, payload), "created_at": created_at})
+  except ScoreQueueFull:
+    nonce_store.release(payload.nonce)
+    raise HTTPException(
+      status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+      detail="Score queue is full",
+      headers={"Retry-After": "1"},
+    )
+
+
+score_commit_failed = HTTPException(
+  status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+  detail="Score could not be persisted",
+  headers={"Retry-After": "1"},
+)
+
+
+async def wait_committed(future: "Future[int]", nonce_store: NonceStore, nonce: str) -> int:
+  """
+  等所在批次 commit 并返回 score_id；在事件循环上等待，不占线程池线程（同步等待时每条在途成绩占一个线程，
+  一批最多攒到线程池大小）。超时时成绩若仍在队列中则撤回（确定未落库）；已被写线程取走的继续等到 commit 结束，
+  不在落库与否未知时返回 503（shield 防止超时取消把它一并取消）。
+  确定未落库时释放 nonce 再 503，客户端可原样重试而不会产生重复成绩。
+  """
+  waiter = asyncio.wrap_future(future)
+  try:
+    return await asyncio.wait_for(asyncio.shield(waiter), settings.score_commit_timeout_seconds)
+  except asyncio.TimeoutError:
+    if not future.cancel():
+      try:
+        return await waiter
+      except Exception:
+        pass
+  except Exception:
+    pass
+  nonce_store.release(nonce)
+  raise score_commit_failed
+
+
+def best_values(user: User, payload: ScoreSubmit, score_id: int, created_at: datetime) -> Dict[str, Any]:
+  return {
+    "user_id": user.id,
+    "level_id": payload.level_id,
+    "score_id": score_id,
+    "score": payload.score,
+    "wave": payload.wave,
+    "time_ms": payload.time_ms,
+    "life_left": payload.life_left,
+    "created_at": created_at,
+  }
+
+
+def score_out(user: User, payload: ScoreSubmit, score_id: int, created_at: datetime) -> ScoreOut:
+  return ScoreOut(
+    id=score_id,
     user_id=user.id,
-    name=user.name,
+    level_id=payload.level_id,
     score=payload.score,
     wave=payload.wave,
     time_ms=payload.time_ms,
     life_left=payload.life_left,
-    created_at=score.created_at,
+    created_at=created_at,
+    replay_status=PENDING if payload.replay is not None else None,
+  )
+
+
+def schedule_replay(
+  verifier: Optional[ReplayVerifier], level: Dict[str, Any], payload: ScoreSubmit, score_id: int
+) -> None:
+  """成绩落库后排队重放校验（不等待结论）；未开启校验时保持 pending。"""
+  if verifier is None or payload.replay is None:
+    return
+  claim = {"score": payload.score, "wave": payload.wave, "life_left": payload.life_left, "time_ms": payload.time_ms}
+  # 关卡编译时已算好初始基础路径（校验后关卡又被热更新时让子进程自己寻路）
+  record = get_level_registry().get(payload.level_id)
+  base_path = record.compiled.base_path if record.hash == level["hash"] else None
+  verifier.submit(score_id, level["config"], payload.replay.model_dump(), claim, base_path)
+
+
+def best_score_response(best: Optional[UserLevelBest]) -> BestScoreResponse:
+  if not best:
+    return BestScoreResponse(best_score=None, wave=None, time_ms=None, life_left=None, created_at=None)
+  return BestScoreResponse(
+    best_score=best.score,
+    wave=best.wave,
+    time_ms=best.time_ms,
+    life_left=best.life_left,
+    created_at=best.created_at,
   )
-  leaderboard.submit(payload.level_id, lb_entry, scope="all")
 
-  return ScoreOut.model_validate(score)
 
+@sync_router.post("/score", response_model=ScoreOut, name="submit_score")
+async def submit_score(
+  payload: ScoreSubmit,
+  db: Session = Depends(get_db),
+  user: User = Depends(get_current_user),
+  leaderboard: Leaderboard = Depends(get_leaderboard),
+  nonce_store: NonceStore = Depends(get_nonce_store),
+  writer: Optional[ScoreWriter] = Depends(get_score_writer),
+  verifier: Optional[ReplayVerifier] = Depends(get_replay_verifier),
+) -> ScoreOut:
+  """提交成绩：校验版本/hash，存库并更新榜单；带操作日志时 commit 后排队重放校验。同步 Session 的操作放到线程池。"""
+  level = await run_in_threadpool(validate_submission, payload, user, nonce_store)
+  if writer is None:
+    return await run_in_threadpool(insert_score, db, user, payload, level, leaderboard, verifier)
+
+  # 组提交：响应等所在批次 commit 后返回；榜单只在确定落库后更新，失败时不留下条目
+  await run_in_threadpool(sync_level_row, db, level)
+  created_at = datetime.utcnow()
+  future = enqueue_score(writer, user, payload, created_at, nonce_store)
+  score_id = await wait_committed(future, nonce_store, payload.nonce)
+  await run_in_threadpool(leaderboard.submit_scopes, payload.level_id, leaderboard_entry(user, payload, created_at))
+  await run_in_threadpool(schedule_replay, verifier, level, payload, score_id)
+  return score_out(user, payload, score_id, created_at)
+
+
+def insert_score(
+  db: Session,
+  user: User,
+  payload: ScoreSubmit,
+  level: Dict[str, Any],
+  leaderboard: Leaderboard,
+  verifier: Optional[ReplayVerifier],
+) -> ScoreOut:
+  """逐条 commit 的提交路径（未开启组提交）。"""
+  sync_level_row(db, level)
+  score_id, created_at = db.execute(score_insert(user, payload)).one()
+  # 同一事务内维护 user_level_best，仅在更好时覆盖
+  db.execute(best_upsert(db.get_bind().dialect.name, best_values(user, payload, score_id, created_at)))
+  # commit 会让 user 过期，先构造返回值与榜单条目，避免再查一次 users
+  result = score_out(user, payload, score_id, created_at)
+  entry = leaderboard_entry(user, payload, created_at)
+  db.commit()
 
-@router.get("/score/best", response_model=BestScoreResponse, name="best_score")
+  leaderboard.submit_scopes(payload.level_id, entry)
+  schedule_replay(verifier, level, payload, score_id)
+
+  return result
+
+
+@sync_router.get("/score/best", response_model=BestScoreResponse, name="best_score")
 def best_score(
   level: str = Query("endless"),
   db: Session = Depends(get_db),
   user: User = Depends(get_current_user),
 ) -> BestScoreResponse:
-  """返回当前用户该关卡的最高分（即便不在榜单内）。"""
+  """返回当前用户该关卡的最高分（即便不在榜单内）：user_level_best 主键查询。"""
   if user.name == "guest":
-    return BestScoreResponse(
-      best_score=None,
-      wave=None,
-      time_ms=None,
-      life_left=None,
-      created_at=None,
+    return best_score_response(None)
+
+  return best_score_response(db.get(UserLevelBest, (user.id, level)))
+
+
+REPLAY_MEDIA_TYPE = "application/octet-stream"
+replay_exists = HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Replay already uploaded")
+replay_too_large = HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail="Replay too large")
+
+
+def check_replay_upload(score: Optional[Score], user: User, store: ReplayStore) -> Score:
+  """只有成绩本人可以上传（他人的成绩按不存在处理），成绩须带已签名的 ops_digest；日志落盘后不可替换。"""
+  if score is None or score.user_id != user.id:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Score not found")
+  if not score.ops_digest:
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Score has no ops_digest")
+  if store.exists(score.id):
+    raise replay_exists
+  return score
+
+
+async def receive_replay(request: Request, store: ReplayStore, score: Score) -> Tuple[ReplaySummary, int]:
+  """边收边校验边写临时文件（只缓冲当前一块），摘要与 ops_digest 一致才落位；返回 (概要, 字节数)。"""
+  if int(request.headers.get("content-length") or 0) > settings.replay_max_bytes:
+    raise replay_too_large
+  upload = await run_in_threadpool(store.begin, score.id)
+  try:
+    async for piece in request.stream():
+      if upload.size + len(piece) > settings.replay_max_bytes:
+        raise replay_too_large
+      if piece:
+        await run_in_threadpool(upload.feed, piece)
+    summary = await run_in_threadpool(upload.finish)
+    if summary.digest != score.ops_digest:
+      raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Replay digest mismatch")
+    await run_in_threadpool(upload.commit)
+  except ReplayInvalid as exc:
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Bad replay: {exc}")
+  except ReplayExists:
+    raise replay_exists
+  finally:
+    upload.discard()
+  return summary, upload.size
+
+
+def schedule_stored_replay(verifier: Optional[ReplayVerifier], store: ReplayStore, score: Score) -> Optional[str]:
+  """
+  落盘后排队重放校验（子进程按路径读文件）；返回写入的 replay_status。
+  按关卡当前版本重放：提交时已校验过 version/hash，期间关卡更新会使结论为 mismatch。
+  """
+  if verifier is None:
+    return PENDING
+  record = get_level_registry().get(score.level_id)
+  claim = {"score": score.score, "wave": score.wave, "life_left": score.life_left, "time_ms": score.time_ms}
+  future = verifier.submit(score.id, record.config, str(store.path(score.id)), claim, record.compiled.base_path)
+  if future is None:
+    return SKIPPED
+  # workers=0 时已在本线程得出结论
+  if future.done() and future.exception() is None:
+    return future.result()
+  return PENDING
+
+
+def replay_stored(score_id: int, summary: ReplaySummary, size: int, replay_status: Optional[str]) -> ReplayStored:
+  return ReplayStored(
+    score_id=score_id,
+    size=size,
+    ops=summary.ops,
+    chunks=summary.chunks,
+    ticks=summary.ticks,
+    first_wave=summary.first_wave,
+    last_wave=summary.last_wave,
+    replay_status=replay_status,
+  )
+
+
+def replay_pending(score: Score):
+  return update(Score).where(Score.id == score.id).values(replay_status=PENDING)
+
+
+def mark_replay_pending(db: Session, score: Score) -> None:
+  # 先脱离 session：commit 后仍要读它的字段排队校验，不触发过期重载
+  db.expunge(score)
+  db.execute(replay_pending(score))
+  db.commit()
+
+
+@sync_router.put(
+  "/score/{score_id}/replay",
+  response_model=ReplayStored,
+  status_code=status.HTTP_201_CREATED,
+  name="upload_replay",
+)
+async def upload_replay(
+  score_id: int,
+  request: Request,
+  db: Session = Depends(get_db),
+  user: User = Depends(get_current_user),
+  store: ReplayStore = Depends(get_replay_store),
+  verifier: Optional[ReplayVerifier] = Depends(get_replay_verifier),
+) -> ReplayStored:
+  """
+  流式上传成绩的二进制操作日志（格式见 BACKEND_API.md「Replay」）：请求体不整体缓冲，边收边校验落盘；
+  摘要须等于提交成绩时签名的 ops_digest。落盘后 replay_status 置为 pending 并排队重放校验。
+  """
+  score = check_replay_upload(await run_in_threadpool(db.get, Score, score_id), user, store)
+  summary, size = await receive_replay(request, store, score)
+  await run_in_threadpool(mark_replay_pending, db, score)
+  replay_status = await run_in_threadpool(schedule_stored_replay, verifier, store, score)
+  return replay_stored(score.id, summary, size, replay_status)
+
+
+def wave_range(header: Optional[str]) -> Optional[Tuple[Optional[int], Optional[int]]]:
+  """解析 Range: waves=a-b / waves=a- / waves=-n（最后 n 波）；其他单位或写法返回 None（按 RFC 9110 忽略 Range）。"""
+  match = re.fullmatch(r"waves=(\d*)-(\d*)", (header or "").strip())
+  if match is None or not (match[1] or match[2]):
+    return None
+  first, last = (int(v) if v else None for v in match.groups())
+  if first is not None and last is not None and last < first:
+    return None
+  return first, last
+
+
+@router.get("/score/{score_id}/replay", name="download_replay")
+def download_replay(score_id: int, request: Request, store: ReplayStore = Depends(get_replay_store)) -> Response:
+  """
+  下载成绩的二进制操作日志。Range: waves=a-b 只返回这些波次的块（206，仍是可独立解码的完整日志，块原样拷贝不解压）；
+  bytes 范围与条件请求由 FileResponse 处理。
+  """
+  path = store.path(score_id)
+  if not path.is_file():
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Replay not found")
+  waves = wave_range(request.headers.get("range"))
+  if waves is None:
+    return FileResponse(path, media_type=REPLAY_MEDIA_TYPE, filename=f"{score_id}.tdr")
+
+  f = open(path, "rb")
+  try:
+    reader = ReplayReader(f)
+    total = reader.last_wave or 0
+    first, last = waves
+    if first is None:
+      first, last = total - last + 1, total
+    chunks = reader.select(first, total if last is None else last)
+  except BaseException:
+    # 文件损坏/截断等：未交给响应体生成器的句柄在此关闭
+    f.close()
+    raise
+  if not chunks:
+    f.close()
+    return Response(
+      status_code=status.HTTP_416_RANGE_NOT_SATISFIABLE,
+      headers={"Content-Range": f"waves */{total}"},
     )
 
-  best = (
-    db.query(Score)
-    .filter(Score.user_id == user.id, Score.level_id == level)
-    .order_by(Score.score.desc(), Score.time_ms.asc())
-    .first()
+  def body():
+    try:
+      yield from reader.slice(chunks)
+    finally:
+      f.close()
+
+  return StreamingResponse(
+    body(),
+    status_code=status.HTTP_206_PARTIAL_CONTENT,
+    media_type=REPLAY_MEDIA_TYPE,
+    headers={
+      "Content-Range": f"waves {chunks[0].wave}-{chunks[-1].wave}/{total}",
+      "Content-Length": str(reader.slice_size(chunks)),
+    },
   )
-  if not best:
-    return BestScoreResponse(best_score=None, wave=None, time_ms=None, life_left=None, created_at=None)
 
-  return BestScoreResponse(
-    best_score=best.score,
-    wave=best.wave,
-    time_ms=best.time_ms,
-    life_left=best.life_left,
-    created_at=best.created_at,
+
+def require_admin(credentials: Optional[HTTPAuthorizationCredentials] = Depends(admin_scheme)) -> None:
+  """管理接口：Bearer 须等于 TD_ADMIN_TOKEN；未配置令牌时接口视为不存在。"""
+  if not settings.admin_token:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+  if credentials is None or not hmac.compare_digest(credentials.credentials.encode(), settings.admin_token.encode()):
+    raise HTTPException(
+      status_code=status.HTTP_401_UNAUTHORIZED,
+      detail="Invalid admin token",
+      headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+@router.get("/admin/scores/export", name="export_scores", dependencies=[Depends(require_admin)])
+def export_scores(
+  format: str = Query("ndjson", pattern=f"^({'|'.join(EXPORT_FORMATS)})$"),
+  level: Optional[str] = Query(None),
+  since: Optional[datetime] = Query(None),
+  until: Optional[datetime] = Query(None),
+  after_id: Optional[int] = Query(None, ge=0),
+  limit: Optional[int] = Query(None, ge=1),
+  engine: Engine = Depends(get_engine),
+) -> StreamingResponse:
+  """
+  流式导出 scores ⋈ users（NDJSON 每行一个对象 / CSV 带表头），按 id 升序；since 含、until 不含。
+  服务端游标逐批读取、逐块写出，不缓冲整个结果集；中断后以已收到的最后一行 id 作为 after_id 续传。
+  自带连接而非请求级 Session，同步与异步部署均挂载；生成器在线程池中迭代，不阻塞事件循环。
+  """
+  exporter = ScoreExporter(engine, format, batch_size=settings.export_batch_size)
+  return StreamingResponse(
+    exporter.chunks(level, since, until, after_id, limit),
+    media_type=exporter.media_type,
+    headers={"Content-Disposition": f'attachment; filename="scores.{format}"', "Cache-Control": "no-store"},
   )
@@ -0,0 +1,232 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import get_settings
+from ..core.db import get_async_db
+from ..core.deps import (
+  get_leaderboard,
+  get_nonce_store,
+  get_password_hasher,
+  get_replay_store,
+  get_replay_verifier,
+  get_score_writer,
+)
+from ..models import Level, Score, User, UserLevelBest
+from ..schemas import (
+  BestScoreResponse,
+  LoginRequest,
+  RegisterRequest,
+  ReplayStored,
+  ScoreOut,
+  ScoreSubmit,
+  Token,
+  UserOut,
+)
+from ..services.best_scores import best_upsert
+from ..services.ingest import ScoreWriter
+from ..services.leaderboard import Leaderboard
+from ..services.passwords import PasswordHasher, PasswordHasherBusy
+from ..services.replay import ReplayVerifier
+from ..services.replay_store import ReplayStore
+from ..utils.nonce import NonceStore
+from .routes import (
+  best_score_response,
+  best_values,
+  cached_user,
+  check_replay_upload,
+  claims_subject,
+  claims_user,
+  credentials_exception,
+  decode_token_claims,
+  enqueue_score,
+  guest_user,
+  issue_token,
+  leaderboard_entry,
+  level_row_values,
+  oauth2_scheme,
+  password_busy,
+  receive_replay,
+  remember_user,
+  replay_pending,
+  replay_stored,
+  schedule_replay,
+  schedule_stored_replay,
+  score_insert,
+  score_out,
+  synced_levels,
+  validate_submission,
+  wait_committed,
+)
+
+# 异步栈（TD_ASYNC_DB=true）：与 routes.sync_router 路径/名称一致，数据库走 AsyncSession。
+# 密码哈希走独立进程池，同步 Redis 调用放到线程池，避免阻塞事件循环。
+settings = get_settings()
+router = APIRouter()
+
+
+async def get_user(db: AsyncSession, name: str) -> Optional[User]:
+  result = await db.execute(select(User).where(User.name == name))
+  return result.scalars().first()
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> User:
+  """解析 JWT，获取当前用户（异步版）：先查认证缓存，未命中再解 JWT 并查库（或信任 claims）。"""
+  user = cached_user(token)
+  if user is not None:
+    return user
+  claims = decode_token_claims(token)
+  user_id = claims_subject(claims)
+  if user_id is None:
+    return guest_user()
+  user = claims_user(claims, user_id) or await db.get(User, user_id)
+  if user is None:
+    raise credentials_exception
+  remember_user(token, claims, user)
+  return user
+
+
+async def sync_level_row(db: AsyncSession, level: Dict[str, Any]) -> None:
+  """异步版 routes.sync_level_row，共用同一份已同步版本表。"""
+  if synced_levels.get(level["id"]) == level["hash"]:
+    return
+  row = await db.get(Level, level["id"])
+  if row is None:
+    db.add(Level(id=level["id"], **level_row_values(level)))
+  elif row.hash != level["hash"] or row.version != level["version"]:
+    for key, value in level_row_values(level).items():
+      setattr(row, key, value)
+  try:
+    await db.commit()
+  except IntegrityError:
+    await db.rollback()
+  synced_levels[level["id"]] = level["hash"]
+
+
+@router.post("/auth/login", response_model=Token, name="auth_login")
+async def login(
+  payload: LoginRequest,
+  db: AsyncSession = Depends(get_async_db),
+  hasher: PasswordHasher = Depends(get_password_hasher),
+) -> Token:
+  """登录，返回 JWT。游客不计入榜单。"""
+  name = payload.name or "guest"
+  if name == "guest":
+    return issue_token(guest_user())
+
+  user = await get_user(db, name)
+  if not user:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+  if not payload.password:
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Password required")
+  try:
+    valid, new_hash = await hasher.verify_async(payload.password, user.hash_pwd)
+  except PasswordHasherBusy:
+    raise password_busy
+  if not valid:
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect password")
+  if new_hash:
+    user.hash_pwd = new_hash
+    await db.commit()
+  return issue_token(user)
+
+
+@router.post("/auth/register", response_model=UserOut, status_code=status.HTTP_201_CREATED, name="auth_register")
+async def register(
+  payload: RegisterRequest,
+  db: AsyncSession = Depends(get_async_db),
+  hasher: PasswordHasher = Depends(get_password_hasher),
+) -> UserOut:
+  """注册新用户：名称唯一，需密码。"""
+  if payload.name == "guest":
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Reserved username")
+  if await get_user(db, payload.name):
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username already exists")
+  if not payload.password:
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Password required")
+  try:
+    hash_pwd = await hasher.hash_async(payload.password)
+  except PasswordHasherBusy:
+    raise password_busy
+  user = User(name=payload.name, hash_pwd=hash_pwd)
+  db.add(user)
+  await db.commit()
+  await db.refresh(user)
+  return UserOut.model_validate(user)
+
+
+@router.post("/score", response_model=ScoreOut, name="submit_score")
+async def submit_score(
+  payload: ScoreSubmit,
+  db: AsyncSession = Depends(get_async_db),
+  user: User = Depends(get_current_user),
+  leaderboard: Leaderboard = Depends(get_leaderboard),
+  nonce_store: NonceStore = Depends(get_nonce_store),
+  writer: Optional[ScoreWriter] = Depends(get_score_writer),
+  verifier: Optional[ReplayVerifier] = Depends(get_replay_verifier),
+) -> ScoreOut:
+  """提交成绩：校验版本/hash，存库并更新榜单；带操作日志时 commit 后排队重放校验（异步版）。"""
+  level = await run_in_threadpool(validate_submission, payload, user, nonce_store)
+  await sync_level_row(db, level)
+
+  if writer is not None:
+    created_at = datetime.utcnow()
+    future = enqueue_score(writer, user, payload, created_at, nonce_store)
+    score_id = await wait_committed(future, nonce_store, payload.nonce)
+    await run_in_threadpool(leaderboard.submit_scopes, payload.level_id, leaderboard_entry(user, payload, created_at))
+    # 入队本身很快，但队列满时会同步写 skipped 状态，放到线程池
+    await run_in_threadpool(schedule_replay, verifier, level, payload, score_id)
+    return score_out(user, payload, score_id, created_at)
+
+  score_id, created_at = (await db.execute(score_insert(user, payload))).one()
+  await db.execute(best_upsert(db.get_bind().dialect.name, best_values(user, payload, score_id, created_at)))
+  result = score_out(user, payload, score_id, created_at)
+  entry = leaderboard_entry(user, payload, created_at)
+  await db.commit()
+
+  await run_in_threadpool(leaderboard.submit_scopes, payload.level_id, entry)
+  await run_in_threadpool(schedule_replay, verifier, level, payload, score_id)
+
+  return result
+
+
+@router.get("/score/best", response_model=BestScoreResponse, name="best_score")
+async def best_score(
+  level: str = Query("endless"),
+  db: AsyncSession = Depends(get_async_db),
+  user: User = Depends(get_current_user),
+) -> BestScoreResponse:
+  """返回当前用户该关卡的最高分（异步版）。"""
+  if user.name == "guest":
+    return best_score_response(None)
+
+  return best_score_response(await db.get(UserLevelBest, (user.id, level)))
+
+
+@router.put(
+  "/score/{score_id}/replay",
+  response_model=ReplayStored,
+  status_code=status.HTTP_201_CREATED,
+  name="upload_replay",
+)
+async def upload_replay(
+  score_id: int,
+  request: Request,
+  db: AsyncSession = Depends(get_async_db),
+  user: User = Depends(get_current_user),
+  store: ReplayStore = Depends(get_replay_store),
+  verifier: Optional[ReplayVerifier] = Depends(get_replay_verifier),
+) -> ReplayStored:
+  """流式上传二进制操作日志（异步版）：边收边校验落盘，摘要须等于签名的 ops_digest，之后排队重放校验。"""
+  score = check_replay_upload(await db.get(Score, score_id), user, store)
+  summary, size = await receive_replay(request, store, score)
+  db.expunge(score)
+  await db.execute(replay_pending(score))
+  await db.commit()
+  replay_status = await run_in_threadpool(schedule_stored_replay, verifier, store, score)
+  return replay_stored(score.id, summary, size, replay_status)
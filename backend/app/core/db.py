@@ -1,14 +1,50 @@
+from functools import lru_cache
+from typing import Any, AsyncGenerator, Dict
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from .config import get_settings
+from .metrics import instrument_engine
 
 settings = get_settings()
 
+# 同步 URL 驱动 → 对应异步驱动
+ASYNC_DRIVERS = {
+  "postgresql": "postgresql+asyncpg",
+  "postgresql+psycopg2": "postgresql+asyncpg",
+  "sqlite": "sqlite+aiosqlite",
+  "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def engine_kwargs(url: str) -> Dict[str, Any]:
+  """连接池参数；内存 SQLite 使用单连接池，不接受 pool_size/max_overflow。"""
+  parsed = make_url(url)
+  if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+    return {}
+  return {
+    "pool_size": settings.db_pool_size,
+    "max_overflow": settings.db_max_overflow,
+    "pool_timeout": settings.db_pool_timeout,
+    "pool_pre_ping": settings.db_pool_pre_ping,
+  }
+
+
+def async_database_url(url: str) -> str:
+  """由同步 URL 推导异步 URL（psycopg2 → asyncpg，pysqlite → aiosqlite）。"""
+  parsed = make_url(url)
+  driver = ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+  return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
 # SQLAlchemy 基础设施：Engine/Session/Base
-engine = create_engine(settings.database_url, future=True)
+engine = create_engine(settings.database_url, future=True, **engine_kwargs(settings.database_url))
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
 Base = declarative_base()
+if settings.metrics_enabled:
+  instrument_engine(engine)
 
 
 def get_db():
@@ -18,3 +54,26 @@ def get_db():
     yield db
   finally:
     db.close()
+
+
+def get_engine():
+  """FastAPI 依赖：同步 Engine，供自行管理连接的流式导出等接口（异步栈下同样可用）。"""
+  return engine
+
+
+@lru_cache(maxsize=1)
+def get_async_sessionmaker():
+  """异步栈按需创建（需安装 asyncpg / aiosqlite），同步部署不受影响。"""
+  from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+  url = settings.async_database_url or async_database_url(settings.database_url)
+  async_engine = create_async_engine(url, **engine_kwargs(url))
+  if settings.metrics_enabled:
+    instrument_engine(async_engine.sync_engine)
+  return async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db() -> AsyncGenerator[Any, None]:
+  """FastAPI 依赖：异步版 get_db，提供一次性 AsyncSession。"""
+  async with get_async_sessionmaker()() as db:
+    yield db
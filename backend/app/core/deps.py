@@ -1,37 +1,76 @@
-from collections.abc import Generator
 from typing import Optional
 
 import redis
+from starlette.requests import HTTPConnection
 
+from ..services.broadcast import LeaderboardBroadcaster
+from ..services.ingest import ScoreWriter
+from ..services.passwords import PasswordHasher
 from ..services.leaderboard import Leaderboard
-from .config import get_settings
+from ..services.replay import ReplayVerifier
+from ..services.replay_store import ReplayStore
+from .config import Settings
+from .metrics import InstrumentedRedis
 from ..utils.nonce import NonceStore
 
 
-def get_redis() -> Generator[redis.Redis, None, None]:
-  """Redis 连接依赖。"""
-  client = redis.from_url(get_settings().redis_url, decode_responses=True)
-  try:
-    yield client
-  finally:
-    client.close()
+def create_redis_pool(settings: Settings) -> redis.ConnectionPool:
+  """应用级 Redis 连接池：Leaderboard/NonceStore 共用，生命周期随 lifespan。"""
+  return redis.ConnectionPool.from_url(
+    settings.redis_url,
+    decode_responses=True,
+    max_connections=settings.redis_max_connections,
+    socket_timeout=settings.redis_socket_timeout,
+    socket_connect_timeout=settings.redis_socket_connect_timeout,
+    health_check_interval=settings.redis_health_check_interval,
+  )
 
 
-def get_leaderboard() -> Leaderboard:
-  """
-  榜单依赖：内部尝试连接 Redis，失败则回退内存实现，避免类型注入错误。
-  """
+def connect_redis(pool: redis.ConnectionPool, instrumented: bool = False) -> Optional[redis.Redis]:
+  """启动时探活；Redis 不可用返回 None，由各服务回退内存实现。instrumented 时按命令记录指标。"""
+  client = (InstrumentedRedis if instrumented else redis.Redis)(connection_pool=pool)
   try:
-    redis_client = redis.from_url(get_settings().redis_url, decode_responses=True)
-  except Exception:
-    redis_client = None
-  return Leaderboard(redis_client)
+    client.ping()
+  except redis.RedisError:
+    return None
+  return client
 
 
-def get_nonce_store() -> NonceStore:
-  """一次性 nonce 依赖：优先用 Redis，失败回退内存。"""
-  try:
-    redis_client = redis.from_url(get_settings().redis_url, decode_responses=True)
-  except Exception:
-    redis_client = None
-  return NonceStore(redis_client)
+def get_redis(conn: HTTPConnection) -> Optional[redis.Redis]:
+  """Redis 连接依赖：返回共享连接池上的客户端，不可用时为 None。"""
+  return conn.app.state.redis
+
+
+def get_leaderboard(conn: HTTPConnection) -> Leaderboard:
+  """榜单依赖：应用级单例，Redis 不可用时为内存回退实现。"""
+  return conn.app.state.leaderboard
+
+
+def get_nonce_store(conn: HTTPConnection) -> NonceStore:
+  """一次性 nonce 依赖：应用级单例，优先用 Redis，失败回退内存。"""
+  return conn.app.state.nonce_store
+
+
+def get_broadcaster(conn: HTTPConnection) -> LeaderboardBroadcaster:
+  """榜单推送依赖：每进程一个 Redis 订阅者。"""
+  return conn.app.state.broadcaster
+
+
+def get_score_writer(conn: HTTPConnection) -> Optional[ScoreWriter]:
+  """成绩组提交依赖：未开启 score_write_behind 时为 None，路由逐条 commit。"""
+  return conn.app.state.score_writer
+
+
+def get_password_hasher(conn: HTTPConnection) -> PasswordHasher:
+  """密码哈希依赖：每进程一个独立进程池。"""
+  return conn.app.state.password_hasher
+
+
+def get_replay_verifier(conn: HTTPConnection) -> Optional[ReplayVerifier]:
+  """重放校验依赖：TD_REPLAY_MODE=off 时为 None，带日志的成绩保持 pending。"""
+  return conn.app.state.replay_verifier
+
+
+def get_replay_store(conn: HTTPConnection) -> ReplayStore:
+  """二进制操作日志的落盘目录（TD_REPLAY_DIR）。"""
+  return conn.app.state.replay_store
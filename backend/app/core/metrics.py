@@ -0,0 +1,312 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import redis
+from redis.client import Pipeline
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 与 prometheus_client 默认分桶一致（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+# 数据库/Redis 单条命令通常在毫秒以内，分桶下移
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+  return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+  parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+  if extra:
+    parts.append(extra)
+  return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+  if value == float("inf"):
+    return "+Inf"
+  return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+  kind = "untyped"
+
+  def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+    self.name = name
+    self.documentation = documentation
+    self.labelnames = tuple(labelnames)
+    self._lock = threading.Lock()
+
+  def header(self) -> List[str]:
+    return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+  def samples(self) -> List[str]:
+    raise NotImplementedError
+
+
+class Counter(_Metric):
+  kind = "counter"
+
+  def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+    super().__init__(name, documentation, labelnames)
+    self._values: Dict[Labels, float] = {}
+
+  def inc(self, *labels: str, amount: float = 1) -> None:
+    with self._lock:
+      self._values[labels] = self._values.get(labels, 0) + amount
+
+  def value(self, *labels: str) -> float:
+    return self._values.get(labels, 0)
+
+  def samples(self) -> List[str]:
+    with self._lock:
+      items = sorted(self._values.items())
+    return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+  kind = "gauge"
+
+  def set(self, *labels: str, value: float) -> None:
+    with self._lock:
+      self._values[labels] = value
+
+  def dec(self, *labels: str, amount: float = 1) -> None:
+    self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+  """累积分桶直方图；observe 只做一次二分 + 计数，锁内无分配（标签组合首次出现除外）。"""
+
+  kind = "histogram"
+
+  def __init__(
+    self,
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS,
+  ):
+    super().__init__(name, documentation, labelnames)
+    self.buckets = tuple(sorted(buckets))
+    # labels → [各桶计数..., +Inf 计数, sum]
+    self._values: Dict[Labels, List[float]] = {}
+
+  def observe(self, labels: Labels, value: float) -> None:
+    index = bisect_left(self.buckets, value)
+    with self._lock:
+      row = self._values.get(labels)
+      if row is None:
+        row = self._values[labels] = [0] * (len(self.buckets) + 2)
+      row[index] += 1
+      row[-1] += value
+
+  def count(self, *labels: str) -> int:
+    row = self._values.get(labels)
+    return int(sum(row[:-1])) if row else 0
+
+  def samples(self) -> List[str]:
+    with self._lock:
+      items = sorted((k, list(v)) for k, v in self._values.items())
+    lines = []
+    for labels, row in items:
+      cumulative = 0
+      for bound, count in zip(self.buckets + (float("inf"),), row[:-1]):
+        cumulative += count
+        le = f'le="{_format_value(bound)}"'
+        lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+      suffix = _format_labels(self.labelnames, labels)
+      lines.append(f"{self.name}_sum{suffix} {_format_value(row[-1])}")
+      lines.append(f"{self.name}_count{suffix} {cumulative}")
+    return lines
+
+
+class Collected(_Metric):
+  """抓取时才取值的指标（队列长度、内存回退条目数等），避免在热路径上维护计数。"""
+
+  def __init__(self, name: str, documentation: str, kind: str, labelnames: Sequence[str] = ()):
+    super().__init__(name, documentation, labelnames)
+    self.kind = kind
+    self._collect: Optional[Callable[[], Iterable[Tuple[Labels, float]]]] = None
+
+  def bind(self, collect: Optional[Callable[[], Iterable[Tuple[Labels, float]]]]) -> None:
+    """绑定数据源；重复 lifespan（测试）时替换旧绑定，None 解绑。"""
+    self._collect = collect
+
+  def samples(self) -> List[str]:
+    collect = self._collect
+    if collect is None:
+      return []
+    return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in collect()]
+
+
+class Registry:
+  def __init__(self):
+    self._metrics: Dict[str, _Metric] = {}
+
+  def register(self, metric: _Metric) -> _Metric:
+    if metric.name in self._metrics:
+      raise ValueError(f"duplicate metric {metric.name}")
+    self._metrics[metric.name] = metric
+    return metric
+
+  def render(self) -> str:
+    lines: List[str] = []
+    for metric in self._metrics.values():
+      samples = metric.samples()
+      if samples:
+        lines.extend(metric.header())
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_request_duration = REGISTRY.register(
+  Histogram(
+    "td_http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status")
+  )
+)
+db_query_duration = REGISTRY.register(
+  Histogram(
+    "td_db_query_duration_seconds", "SQL statement execution time by statement type.", ("statement",), FAST_BUCKETS
+  )
+)
+redis_command_duration = REGISTRY.register(
+  Histogram(
+    "td_redis_command_duration_seconds",
+    "Redis round-trip time by command (pipelines as PIPELINE).",
+    ("command",),
+    FAST_BUCKETS,
+  )
+)
+redis_commands = REGISTRY.register(
+  Counter("td_redis_commands_total", "Redis commands sent, including those batched in pipelines.", ("command",))
+)
+fallback_activations = REGISTRY.register(
+  Counter(
+    "td_redis_fallback_activations_total",
+    "Times a service started on its in-memory fallback because Redis was unavailable.",
+    ("component",),
+  )
+)
+fallback_active = REGISTRY.register(
+  Gauge("td_redis_fallback_active", "1 while the component serves from its in-memory fallback.", ("component",))
+)
+ws_connections = REGISTRY.register(Gauge("td_ws_connections", "Open leaderboard WebSocket connections."))
+nonce_fallback_entries = REGISTRY.register(
+  Collected("td_nonce_fallback_entries", "Live entries in the in-memory nonce store.", "gauge")
+)
+password_hasher_tasks = REGISTRY.register(
+  Collected("td_password_hash_tasks", "Password hashing pool occupancy.", "gauge", ("state",))
+)
+password_hasher_rejected = REGISTRY.register(
+  Collected("td_password_hash_rejected_total", "Password hash requests rejected with 503.", "counter")
+)
+auth_cache_lookups = REGISTRY.register(
+  Collected("td_auth_cache_lookups_total", "Authenticated identity cache lookups.", "counter", ("result",))
+)
+replay_verifications = REGISTRY.register(
+  Counter("td_replay_verifications_total", "Score replay verification results.", ("status",))
+)
+replay_tasks = REGISTRY.register(
+  Collected("td_replay_tasks", "Replay verification pool occupancy.", "gauge", ("state",))
+)
+wave_schedule_lookups = REGISTRY.register(
+  Collected("td_wave_schedule_lookups_total", "Expanded wave schedule cache lookups.", "counter", ("result",))
+)
+
+
+class MetricsMiddleware:
+  """
+  纯 ASGI 中间件：按路由模板（/api/levels/{level_id}）记录 HTTP 延迟，未匹配的路径统一记为 unmatched，
+  避免任意 URL 撑爆标签基数。不包一层 BaseHTTPMiddleware，开销只有两次 perf_counter 与一次 observe。
+  """
+
+  def __init__(self, app):
+    self.app = app
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+    status, route = "500", None
+
+    async def send_wrapper(message):
+      nonlocal status, route
+      if message["type"] == "http.response.start":
+        # 子路由返回后会还原 scope 中的路由上下文，需在响应开始时读取
+        status, route = str(message["status"]), route_template(scope)
+      await send(message)
+
+    start = time.perf_counter()
+    try:
+      await self.app(scope, receive, send_wrapper)
+    finally:
+      http_request_duration.observe(
+        (scope["method"], route or route_template(scope), status), time.perf_counter() - start
+      )
+
+
+def route_template(scope) -> str:
+  """匹配到的路由模板（含 include_router 前缀）；新版 FastAPI 的子路由 route.path 不带前缀，完整路径在 effective_route_context。"""
+  route = scope.get("fastapi", {}).get("effective_route_context") or scope.get("route")
+  return getattr(route, "path", None) or "unmatched"
+
+
+def _statement_type(statement: str) -> str:
+  head = statement.lstrip()[:16].split(None, 1)
+  return head[0].upper() if head else "UNKNOWN"
+
+
+def instrument_engine(engine: Engine) -> None:
+  """挂 SQLAlchemy cursor 事件统计每条语句耗时；异步引擎传 async_engine.sync_engine。"""
+
+  @event.listens_for(engine, "before_cursor_execute")
+  def _before(conn, _cursor, _statement, _parameters, _context, _executemany):
+    conn.info.setdefault("td_query_start", []).append(time.perf_counter())
+
+  @event.listens_for(engine, "after_cursor_execute")
+  def _after(conn, _cursor, statement, _parameters, _context, _executemany):
+    started = conn.info["td_query_start"].pop()
+    db_query_duration.observe((_statement_type(statement),), time.perf_counter() - started)
+
+  @event.listens_for(engine, "handle_error")
+  def _error(context):
+    # 执行失败不会触发 after_cursor_execute，弹出对应的开始时间
+    stack = context.connection.info.get("td_query_start") if context.connection is not None else None
+    if stack:
+      stack.pop()
+
+
+class InstrumentedPipeline(Pipeline):
+  def execute(self, raise_on_error: bool = True):
+    for args, _options in self.command_stack:
+      redis_commands.inc(str(args[0]).upper())
+    start = time.perf_counter()
+    try:
+      return super().execute(raise_on_error)
+    finally:
+      redis_command_duration.observe(("PIPELINE",), time.perf_counter() - start)
+
+
+class InstrumentedRedis(redis.Redis):
+  """按命令统计次数与往返耗时；注册脚本经 EVALSHA 调用，也落在这里。"""
+
+  def execute_command(self, *args, **options):
+    command = str(args[0]).upper()
+    redis_commands.inc(command)
+    start = time.perf_counter()
+    try:
+      return super().execute_command(*args, **options)
+    finally:
+      redis_command_duration.observe((command,), time.perf_counter() - start)
+
+  def pipeline(self, transaction=True, shard_hint=None) -> InstrumentedPipeline:
+    return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
@@ -1,15 +1,145 @@
 import asyncio
+import logging
+import os
+import threading
+from contextlib import asynccontextmanager
 
-from fastapi import Depends, FastAPI, WebSocket
+from fastapi import Depends, FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 
-from .api.routes import router as api_router
+from .api.routes import router as api_router, sync_router
 from .core.config import get_settings
-from .core.deps import get_leaderboard
+from .core.db import SessionLocal, engine
+from .core import metrics
+from .core.deps import connect_redis, create_redis_pool, get_broadcaster
+from .services.auth_cache import get_auth_cache
+from .services.broadcast import LeaderboardBroadcaster
+from .services.ingest import ScoreWriter
 from .services.leaderboard import Leaderboard
+from .services.passwords import PasswordHasher
+from .services.replay import ReplayVerifier
+from .services.replay_store import ReplayStore
+from .services.levels import get_level_registry
+from .services.rebuild import warm_up
+from .services.waves import get_wave_schedules
+from .utils.nonce import NonceStore
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
-app = FastAPI(title=settings.app_name, version="0.1.0")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+  """
+  启动：预加载全部关卡并计算 hash；建立共享 Redis 连接池、密码哈希与重放校验进程池及服务单例；
+  可选在后台从数据库预热缺失的榜单。
+  关闭：停止后台任务与进程池（等在途重放校验写回结论），断开连接池中的全部连接。
+  """
+  get_level_registry().load_all()
+  pool = create_redis_pool(settings)
+  redis_client = connect_redis(pool, instrumented=settings.metrics_enabled)
+  app.state.redis_pool = pool
+  app.state.redis = redis_client
+  app.state.leaderboard = Leaderboard(redis_client)
+  app.state.nonce_store = NonceStore(redis_client, max_entries=settings.nonce_fallback_max_entries)
+  auth_cache = get_auth_cache()
+  auth_cache.start(redis_client)
+  # 没有 Redis 时撤销只在本进程生效：多进程部署（WEB_CONCURRENCY > 1）不信任 token claims
+  auth_cache.claims_trusted = redis_client is not None or int(os.environ.get("WEB_CONCURRENCY", "1")) <= 1
+  if settings.auth_trust_token_claims and not auth_cache.claims_trusted:
+    logger.warning("TD_AUTH_TRUST_TOKEN_CLAIMS ignored: Redis unavailable with multiple workers")
+  app.state.broadcaster = LeaderboardBroadcaster(
+    app.state.leaderboard,
+    redis_url=settings.redis_url if redis_client else None,
+    queue_size=settings.ws_send_queue_size,
+  )
+  await app.state.broadcaster.start()
+  app.state.password_hasher = PasswordHasher(
+    settings.password_hash_rounds,
+    workers=settings.password_hash_workers,
+    max_pending=settings.password_hash_max_pending,
+  )
+  app.state.replay_store = ReplayStore(settings.replay_dir, max_ops=settings.replay_max_ops)
+  app.state.replay_verifier = None
+  if settings.replay_mode != "off":
+    app.state.replay_verifier = ReplayVerifier(
+      SessionLocal,
+      workers=settings.replay_workers,
+      max_pending=settings.replay_max_pending,
+      max_ticks=settings.replay_max_ticks,
+      # 只有 enforce 模式按结论撤下成绩
+      leaderboard=app.state.leaderboard if settings.replay_mode == "enforce" else None,
+    )
+  app.state.score_writer = None
+  if settings.score_write_behind:
+    app.state.score_writer = ScoreWriter(
+      SessionLocal,
+      max_batch=settings.score_batch_max_size,
+      max_latency=settings.score_batch_max_latency_ms / 1000,
+      max_queue=settings.score_queue_size,
+    ).start()
+  bind_metrics(app)
+  warmup_stop = threading.Event()
+  warmup = None
+  if redis_client and settings.leaderboard_warmup_on_startup:
+    warmup = asyncio.ensure_future(asyncio.to_thread(warm_up, engine, redis_client, warmup_stop))
+  try:
+    yield
+  finally:
+    if warmup is not None:
+      # 重建在批次间检查停止标志，等当前批写完再断开连接池
+      warmup_stop.set()
+      await warmup
+    if app.state.score_writer is not None:
+      # 先把已接收的成绩全部落库
+      await asyncio.to_thread(app.state.score_writer.stop)
+    await app.state.broadcaster.stop()
+    await asyncio.to_thread(app.state.password_hasher.shutdown)
+    await asyncio.to_thread(auth_cache.stop)
+    if app.state.replay_verifier is not None:
+      await asyncio.to_thread(app.state.replay_verifier.shutdown)
+    pool.disconnect()
+
+
+def bind_metrics(app: FastAPI) -> None:
+  """把本次 lifespan 创建的单例接到抓取时取值的指标上；回退状态在启动时记一次。"""
+  for component, client in (
+    ("leaderboard", app.state.leaderboard.client),
+    ("nonce_store", app.state.nonce_store.client),
+  ):
+    if client is None:
+      metrics.fallback_activations.inc(component)
+    metrics.fallback_active.set(component, value=0 if client else 1)
+  nonce_store, hasher = app.state.nonce_store, app.state.password_hasher
+  metrics.nonce_fallback_entries.bind(lambda: [((), len(nonce_store.fallback))])
+
+  def hasher_tasks():
+    stats = hasher.stats()
+    return [(("in_flight",), stats["in_flight"]), (("queued",), stats["queued"])]
+
+  def auth_cache_lookups():
+    cache = get_auth_cache()
+    return [(("hit",), cache.hits), (("miss",), cache.misses)]
+
+  def wave_schedule_lookups():
+    cache = get_wave_schedules()
+    return [(("hit",), cache.hits), (("miss",), cache.misses)]
+
+  metrics.password_hasher_tasks.bind(hasher_tasks)
+  metrics.password_hasher_rejected.bind(lambda: [((), hasher.stats()["rejected"])])
+  metrics.auth_cache_lookups.bind(auth_cache_lookups)
+  metrics.wave_schedule_lookups.bind(wave_schedule_lookups)
+  verifier = app.state.replay_verifier
+
+  def replay_tasks():
+    stats = verifier.stats()
+    return [(("in_flight",), stats["in_flight"]), (("queued",), stats["queued"])]
+
+  metrics.replay_tasks.bind(replay_tasks if verifier is not None else None)
+
+
+app = FastAPI(title=settings.app_name, version="0.1.0", lifespan=lifespan)
 
 # 全局 CORS：前后端联调方便
 app.add_middleware(
@@ -19,8 +149,25 @@ app.add_middleware(
   allow_methods=["*"],
   allow_headers=["*"],
 )
+if settings.metrics_enabled:
+  # 放在最外层：计入 CORS 在内的整段处理时间
+  app.add_middleware(metrics.MetricsMiddleware)
 
 app.include_router(api_router, prefix=settings.api_prefix)
+if settings.async_db:
+  from .api.routes_async import router as async_router
+
+  app.include_router(async_router, prefix=settings.api_prefix)
+else:
+  app.include_router(sync_router, prefix=settings.api_prefix)
+
+
+if settings.metrics_enabled:
+
+  @app.get("/metrics", include_in_schema=False)
+  def read_metrics() -> Response:
+    """Prometheus 文本格式抓取端点。"""
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
 
 @app.websocket("/ws/leaderboard")
@@ -28,14 +175,32 @@ async def leaderboard_socket(
   websocket: WebSocket,
   level: str = "endless",
   scope: str = "all",
-  leaderboard: Leaderboard = Depends(get_leaderboard),
+  broadcaster: LeaderboardBroadcaster = Depends(get_broadcaster),
 ):
-  """每隔 2s 推送当前榜单快照；后续可换成事件驱动。"""
+  """榜单变化时推送快照：连接建立先推一次，之后由事件驱动。"""
   await websocket.accept()
-  try:
+  subscriber = await broadcaster.subscribe(level, scope)
+  metrics.ws_connections.inc()
+
+  async def send_loop():
     while True:
-      entries = leaderboard.top(level, scope=scope, limit=settings.leaderboard_size)
-      await websocket.send_json({"entries": [entry.model_dump() for entry in entries]})
-      await asyncio.sleep(2)
-  except Exception:
-    await websocket.close()
+      await websocket.send_text(await subscriber.queue.get())
+
+  async def receive_loop():
+    # 客户端无需上行消息，仅用于感知断开
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+      pass
+
+  tasks = [asyncio.create_task(send_loop()), asyncio.create_task(receive_loop())]
+  try:
+    await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+  finally:
+    for task in tasks:
+      task.cancel()
+    broadcaster.unsubscribe(subscriber)
+    metrics.ws_connections.dec()
+    try:
+      await websocket.close()
+    except (RuntimeError, WebSocketDisconnect):
+      # 客户端已断开或连接已关闭，无需再发 close 帧
+      pass
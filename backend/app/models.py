@@ -46,6 +46,25 @@ class Score(Base):
   time_ms = Column(Integer, nullable=False)
   life_left = Column(Integer, nullable=False)
   created_at = Column(DateTime, server_default=func.now(), default=datetime.utcnow)
+  # 重放校验状态：未上传操作日志为空，否则 pending → verified/mismatch/invalid/skipped
+  replay_status = Column(String, nullable=True)
+  # 签名覆盖的操作日志摘要：之后上传的二进制日志须与之一致
+  ops_digest = Column(String, nullable=True)
 
   user = relationship("User", back_populates="scores")
   level = relationship("Level", back_populates="scores")
+
+
+class UserLevelBest(Base):
+  """每用户每关卡最好成绩：随成绩写入原子 upsert，/score/best 走主键查询。"""
+
+  __tablename__ = "user_level_best"
+
+  user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+  level_id = Column(String, ForeignKey("levels.id"), primary_key=True)
+  score_id = Column(Integer, ForeignKey("scores.id"), nullable=False)
+  score = Column(Integer, nullable=False)
+  wave = Column(Integer, nullable=False)
+  time_ms = Column(Integer, nullable=False)
+  life_left = Column(Integer, nullable=False)
+  created_at = Column(DateTime)
@@ -34,19 +34,70 @@ class UserOut(BaseModel):
     from_attributes = True
 
 
+class LevelPaths(BaseModel):
+  """
+  关卡编译产物（按 hash 缓存）：到 exit 的 BFS 距离场与流场，数组为小端行优先（y * width + x）字节的 base64；
+  flow 为 directions 下标（255 表示 exit 或不可达），distance 不可达为 distance_dtype 最大值；
+  base_path 为与前端 A* 一致的初始路径，扁平 [x0, y0, x1, y1, ...]。
+  """
+
+  width: int
+  height: int
+  directions: List[List[int]]
+  distance_dtype: str
+  distance: str
+  flow: str
+  base_path: List[int]
+
+
 class LevelResponse(BaseModel):
-  """关卡返回：携带版本与 hash。"""
+  """关卡返回：携带版本与 hash，以及预算的寻路数据。"""
 
   id: str
   version: str
   hash: str
   config: Any
+  paths: Optional[LevelPaths] = None
+
+
+class WaveTable(BaseModel):
+  """
+  一波的刷怪表：spawns 为按刷出先后排列的 enemy_types 下标，variance 为对应敌人的属性浮动；
+  difficulty_bonus 为自动波相对动态难度的附加值（固定波为 0）。
+  """
+
+  wave: int
+  auto: bool
+  difficulty_bonus: float
+  spawns: List[int]
+  variance: List[float]
+
+
+class LevelWaves(BaseModel):
+  """GET /levels/{id}/waves：某关卡版本 + 种子从第 from 波起的波次表（见 BACKEND_API.md「Waves」）。"""
+
+  level: str
+  hash: str
+  seed: int
+  enemy_types: List[str]
+  waves: List[WaveTable]
+
+
+class ReplayLog(BaseModel):
+  """
+  操作日志（见 BACKEND_API.md「Replay」）：随机种子、总帧数与按帧排序的操作，
+  如 [tick, "build", x, y, "LMG"]、[tick, "upgrade", x, y]、[tick, "sell", x, y]、[tick, "skip"]。
+  """
+
+  seed: int = Field(ge=0, le=0xFFFFFFFF)
+  ticks: int = Field(gt=0)
+  ops: List[List[Any]] = Field(default_factory=list, max_length=20_000)
 
 
 class ScoreSubmit(BaseModel):
   """成绩上传参数，含版本/hash 校验字段。"""
 
-  score: int
+  score: int = Field(ge=0)
   wave: int
   time_ms: int
   life_left: int
@@ -57,6 +108,21 @@ class ScoreSubmit(BaseModel):
   nonce: str
   signature: Optional[str] = None
   ops_digest: Optional[str] = None
+  # 可选操作日志：其摘要须等于已签名的 ops_digest，提交后异步重放校验
+  replay: Optional[ReplayLog] = None
+
+
+class ReplayStored(BaseModel):
+  """PUT /score/{id}/replay 的返回：落盘的二进制日志概要（波次范围即可按 Range: waves= 下载的范围）。"""
+
+  score_id: int
+  size: int
+  ops: int
+  chunks: int
+  ticks: int
+  first_wave: Optional[int] = None
+  last_wave: Optional[int] = None
+  replay_status: Optional[str] = None
 
 
 class ScoreOut(BaseModel):
@@ -70,6 +136,7 @@ class ScoreOut(BaseModel):
   time_ms: int
   life_left: int
   created_at: datetime
+  replay_status: Optional[str] = None
 
   class Config:
     from_attributes = True
@@ -91,6 +158,23 @@ class LeaderboardResponse(BaseModel):
   level: str
   scope: str = "all"
   entries: List[LeaderboardEntry]
+  next_cursor: Optional[str] = None
+
+
+class RankedLeaderboardEntry(LeaderboardEntry):
+  """带名次（1 基）的榜单条目。"""
+
+  rank: int
+
+
+class LeaderboardRankResponse(BaseModel):
+  """当前用户名次及前后窗口；未上榜时 rank 为空。"""
+
+  level: str
+  scope: str = "all"
+  rank: Optional[int]
+  total: int
+  entries: List[RankedLeaderboardEntry]
 
 
 class BestScoreResponse(BaseModel):
@@ -0,0 +1,248 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Dict, NamedTuple, Optional, Set
+
+import redis
+from sqlalchemy import event
+
+from ..core.config import get_settings
+from ..models import User
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# 跨进程共享：撤销记录（user_id → 截止时间戳）与失效/撤销事件频道
+REVOKED_KEY = "auth:revoked"
+EVENTS_CHANNEL = "auth:events"
+
+
+class Identity(NamedTuple):
+  user_id: int
+  name: str
+  expires_at: float
+
+
+class AuthCache:
+  """
+  已认证身份缓存：token → (user_id, name)，有界 LRU + TTL（不超过 token 自身的 exp）。
+  命中时 get_current_user 既不解 JWT 也不查库；用户更新/删除（ORM flush）时按 user_id 失效，
+  删除的用户另记入 revoked，信任 claims 模式下也会被拒绝。
+  start(client) 后失效/撤销经 Redis 共享：撤销写入 auth:revoked（ZSET，按截止时间清理），两者都发布到 auth:events，
+  每进程一个订阅线程应用到本地；（重新）订阅时清空本地缓存并重载撤销表，覆盖断线期间错过的事件。
+  """
+
+  def __init__(self, max_entries: int, ttl: float, clock: Callable[[], float] = time.time):
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self.clock = clock
+    self._entries: "OrderedDict[str, Identity]" = OrderedDict()
+    self._tokens_by_user: Dict[int, Set[str]] = {}
+    # user_id → 撤销记录过期时间（token 最长有效期之后不再需要）
+    self._revoked: Dict[int, float] = {}
+    self._lock = threading.Lock()
+    self.client: Optional[redis.Redis] = None
+    # Redis 不可用且多进程部署时置 False：撤销无法送达其他进程，不能信任 claims
+    self.claims_trusted = True
+    self._stop = threading.Event()
+    self._listener: Optional[threading.Thread] = None
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.invalidations = 0
+
+  def stats(self) -> Dict[str, float]:
+    with self._lock:
+      lookups = self.hits + self.misses
+      return {
+        "entries": len(self._entries),
+        "hits": self.hits,
+        "misses": self.misses,
+        "hit_rate": self.hits / lookups if lookups else 0.0,
+        "evictions": self.evictions,
+        "invalidations": self.invalidations,
+        "revoked": len(self._revoked),
+      }
+
+  def get(self, token: str) -> Optional[Identity]:
+    with self._lock:
+      identity = self._entries.get(token)
+      if identity is None:
+        self.misses += 1
+        return None
+      if identity.expires_at <= self.clock():
+        self._remove(token, identity.user_id)
+        self.misses += 1
+        return None
+      self._entries.move_to_end(token)
+      self.hits += 1
+      return identity
+
+  def put(self, token: str, user_id: int, name: str, token_exp: Optional[float] = None) -> None:
+    if self.ttl <= 0 or self.max_entries <= 0:
+      return
+    expires_at = self.clock() + self.ttl
+    if token_exp is not None:
+      expires_at = min(expires_at, token_exp)
+    with self._lock:
+      if user_id in self._revoked:
+        return
+      old = self._entries.pop(token, None)
+      if old is not None:
+        self._tokens_by_user.get(old.user_id, set()).discard(token)
+      self._entries[token] = Identity(user_id, name, expires_at)
+      self._tokens_by_user.setdefault(user_id, set()).add(token)
+      while len(self._entries) > self.max_entries:
+        oldest, evicted = next(iter(self._entries.items()))
+        self._remove(oldest, evicted.user_id)
+        self.evictions += 1
+
+  def invalidate_user(self, user_id: int) -> None:
+    """用户资料变化：丢弃该用户全部缓存 token，下次请求重新查库；通知其他进程。"""
+    self._invalidate(user_id)
+    self._publish(f"invalidate:{user_id}")
+
+  def revoke_user(self, user_id: int) -> None:
+    """用户被删除/封禁：失效缓存，并在 token 最长有效期内拒绝其 claims；记入共享撤销表并通知其他进程。"""
+    now = self.clock()
+    until = now + settings.access_token_expire_minutes * 60
+    self._invalidate(user_id)
+    self._revoke(user_id, until)
+    if self.client is None:
+      return
+    try:
+      pipe = self.client.pipeline()
+      pipe.zadd(REVOKED_KEY, {str(user_id): until})
+      pipe.zremrangebyscore(REVOKED_KEY, "-inf", now)
+      pipe.publish(EVENTS_CHANNEL, f"revoke:{user_id}:{until}")
+      pipe.execute()
+    except redis.RedisError:
+      logger.warning("failed to share revocation of user %s", user_id, exc_info=True)
+
+  def is_revoked(self, user_id: int) -> bool:
+    with self._lock:
+      until = self._revoked.get(user_id)
+      return until is not None and until > self.clock()
+
+  def clear(self) -> None:
+    with self._lock:
+      self._entries.clear()
+      self._tokens_by_user.clear()
+      self._revoked.clear()
+
+  def start(self, client: Optional[redis.Redis]) -> None:
+    """接入共享 Redis 并启动订阅线程；client 为 None 时只在本进程内失效。"""
+    self.client = client
+    if client is None:
+      return
+    self._stop.clear()
+    # 首次订阅在调用方完成：返回时撤销表已载入
+    try:
+      pubsub = self._subscribe()
+    except redis.RedisError:
+      logger.warning("auth cache pub/sub subscribe failed; retrying in background", exc_info=True)
+      pubsub = None
+    self._listener = threading.Thread(target=self._listen, args=(pubsub,), name="auth-cache-events", daemon=True)
+    self._listener.start()
+
+  def stop(self) -> None:
+    self._stop.set()
+    if self._listener is not None:
+      self._listener.join()
+      self._listener = None
+    self.client = None
+
+  def handle_event(self, message: str) -> None:
+    """应用其他进程发布的事件：invalidate:<user_id> 或 revoke:<user_id>:<截止时间>。"""
+    kind, _, rest = message.partition(":")
+    if kind == "invalidate":
+      self._invalidate(int(rest))
+    elif kind == "revoke":
+      user_id, _, until = rest.partition(":")
+      self._invalidate(int(user_id))
+      self._revoke(int(user_id), float(until))
+
+  def resync(self) -> None:
+    """丢弃本地缓存的身份并从 auth:revoked 重载未过期的撤销记录。"""
+    revoked = self.client.zrangebyscore(REVOKED_KEY, self.clock(), "+inf", withscores=True)
+    with self._lock:
+      self._entries.clear()
+      self._tokens_by_user.clear()
+      for user_id, until in revoked:
+        self._revoked[int(user_id)] = max(until, self._revoked.get(int(user_id), 0.0))
+
+  def _subscribe(self) -> "redis.client.PubSub":
+    """订阅 auth:events 后再 resync：之后的事件都不会错过。"""
+    pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+    try:
+      pubsub.subscribe(EVENTS_CHANNEL)
+      self.resync()
+    except BaseException:
+      pubsub.close()
+      raise
+    return pubsub
+
+  def _listen(self, pubsub: "Optional[redis.client.PubSub]") -> None:
+    """应用 auth:events 上的事件；断线后退避重连，每次重新订阅后 resync。"""
+    while not self._stop.is_set():
+      try:
+        if pubsub is None:
+          pubsub = self._subscribe()
+        while not self._stop.is_set():
+          message = pubsub.get_message(timeout=0.5)
+          if message is not None and message["type"] == "message":
+            self.handle_event(message["data"])
+      except (redis.RedisError, ValueError):
+        logger.warning("auth cache pub/sub listener disconnected; retrying", exc_info=True)
+        self._stop.wait(1)
+      finally:
+        if pubsub is not None:
+          pubsub.close()
+          pubsub = None
+
+  def _invalidate(self, user_id: int) -> None:
+    with self._lock:
+      for token in self._tokens_by_user.pop(user_id, set()):
+        self._entries.pop(token, None)
+        self.invalidations += 1
+
+  def _revoke(self, user_id: int, until: float) -> None:
+    now = self.clock()
+    with self._lock:
+      self._revoked[user_id] = max(until, self._revoked.get(user_id, 0.0))
+      for revoked_id in [uid for uid, expires in self._revoked.items() if expires <= now]:
+        del self._revoked[revoked_id]
+
+  def _publish(self, message: str) -> None:
+    if self.client is None:
+      return
+    try:
+      self.client.publish(EVENTS_CHANNEL, message)
+    except redis.RedisError:
+      logger.warning("failed to publish auth cache event %s", message, exc_info=True)
+
+  def _remove(self, token: str, user_id: int) -> None:
+    self._entries.pop(token, None)
+    tokens = self._tokens_by_user.get(user_id)
+    if tokens is not None:
+      tokens.discard(token)
+      if not tokens:
+        del self._tokens_by_user[user_id]
+
+
+@lru_cache(maxsize=1)
+def get_auth_cache() -> AuthCache:
+  """进程级单例：ORM 事件需要在请求上下文之外访问。"""
+  return AuthCache(settings.auth_cache_size, settings.auth_cache_ttl_seconds)
+
+
+@event.listens_for(User, "after_update")
+def _user_updated(_mapper, _connection, target: User) -> None:
+  get_auth_cache().invalidate_user(target.id)
+
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(_mapper, _connection, target: User) -> None:
+  get_auth_cache().revoke_user(target.id)
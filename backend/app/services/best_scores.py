@@ -0,0 +1,88 @@
+from typing import Any, Dict, List, Union
+
+from sqlalchemy import and_, delete, func, or_, select, true
+from sqlalchemy.dialects import postgresql, sqlite
+
+from sqlalchemy.orm import Session
+
+from ..core.config import get_settings
+from ..models import Score, UserLevelBest
+
+# on_conflict_do_update 仅 Postgres/SQLite 方言提供
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+BEST_COLUMNS = ("score_id", "score", "wave", "time_ms", "life_left", "created_at")
+# 重放结论为 mismatch/invalid（取值见 services.replay）；TD_REPLAY_MODE=enforce 时不计入最好成绩与榜单
+REJECTED_STATUSES = ("mismatch", "invalid")
+
+
+def ranked_scores():
+  """计入最好成绩与榜单的成绩：enforce 模式排除被重放拒绝的；其余模式下结论只作记录，全部计入。"""
+  if get_settings().replay_mode != "enforce":
+    return true()
+  return or_(Score.replay_status.is_(None), Score.replay_status.notin_(REJECTED_STATUSES))
+
+
+def _upsert(dialect_name: str, source):
+  """插入或在“更好”时覆盖：分数更高，或同分耗时更短（与榜单排序一致）。"""
+  insert = _INSERTS.get(dialect_name)
+  if insert is None:
+    raise NotImplementedError(f"user_level_best upsert is not supported on {dialect_name}")
+  stmt = source(insert(UserLevelBest))
+  table = UserLevelBest.__table__
+  better = or_(
+    stmt.excluded.score > table.c.score,
+    and_(stmt.excluded.score == table.c.score, stmt.excluded.time_ms < table.c.time_ms),
+  )
+  return stmt.on_conflict_do_update(
+    index_elements=[table.c.user_id, table.c.level_id],
+    set_={name: stmt.excluded[name] for name in BEST_COLUMNS},
+    where=better,
+  )
+
+
+def best_upsert(dialect_name: str, values: Union[Dict[str, Any], List[Dict[str, Any]]]):
+  """submit_score 中与成绩 INSERT 同事务执行；传列表时为多行 upsert（同批内 (user, level) 须唯一）。"""
+  return _upsert(dialect_name, lambda insert: insert.values(values))
+
+
+def ranked_best(*conditions):
+  """scores 上按 (user_id, level_id) 取最好一条（rn == 1）的子查询，conditions 为附加过滤。"""
+  return (
+    select(
+      Score.user_id,
+      Score.level_id,
+      Score.id.label("score_id"),
+      Score.score,
+      Score.wave,
+      Score.time_ms,
+      Score.life_left,
+      Score.created_at,
+      func.row_number()
+      .over(
+        partition_by=(Score.user_id, Score.level_id),
+        order_by=(Score.score.desc(), Score.time_ms.asc(), Score.id.asc()),
+      )
+      .label("rn"),
+    )
+    .where(*conditions)
+    .subquery()
+  )
+
+
+def backfill_upsert(dialect_name: str, user_from: int, user_to: int):
+  """由 scores 回填 [user_from, user_to) 区间用户的最好成绩（enforce 模式下不含被重放拒绝的成绩）；可重复执行。"""
+  return _best_from_scores(dialect_name, Score.user_id >= user_from, Score.user_id < user_to)
+
+
+def recompute_best(db: Session, user_id: int, level_id: str) -> None:
+  """重算单个 (user, level) 的最好成绩（如某条成绩被重放拒绝后）：删除后由其余有效成绩回填，由调用方 commit。"""
+  db.execute(delete(UserLevelBest).where(UserLevelBest.user_id == user_id, UserLevelBest.level_id == level_id))
+  db.execute(_best_from_scores(db.get_bind().dialect.name, Score.user_id == user_id, Score.level_id == level_id))
+
+
+def _best_from_scores(dialect_name: str, *conditions):
+  ranked = ranked_best(ranked_scores(), *conditions)
+  # SQLite 要求 INSERT ... SELECT ... ON CONFLICT 的 SELECT 带 WHERE，rn == 1 恰好满足
+  columns = ("user_id", "level_id") + BEST_COLUMNS
+  best = select(*(ranked.c[name] for name in columns)).where(ranked.c.rn == 1)
+  return _upsert(dialect_name, lambda insert: insert.from_select(columns, best))
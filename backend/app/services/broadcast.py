@@ -0,0 +1,165 @@
+import asyncio
+import json
+import logging
+from typing import Dict, Optional, Set, Tuple
+
+import redis.asyncio as aioredis
+
+from ..core.config import get_settings
+from .leaderboard import EVENTS_PATTERN, Leaderboard, parse_events_channel, period_bucket
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+BoardKey = Tuple[str, str]
+
+
+class Subscriber:
+  """单个 WebSocket 的发送队列；队列有界，满时丢弃最旧快照（快照是全量状态，只需最新）。"""
+
+  def __init__(self, key: BoardKey, maxsize: int):
+    self.key = key
+    self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=maxsize)
+    self.dropped = 0
+
+  def offer(self, message: str) -> None:
+    if self.queue.full():
+      self.queue.get_nowait()
+      self.dropped += 1
+    self.queue.put_nowait(message)
+
+
+class LeaderboardBroadcaster:
+  """
+  榜单推送：每进程一个订阅者监听 `leaderboard:*:events`，
+  每次 (level, scope) 变化只重算并序列化一次快照，再把同一份文本分发给所有连接。
+  快照记下所属的日/周桶，桶切换后新连接不会拿到上一周期的榜单。Redis 不可用时由 Leaderboard.on_change 直接通知。
+  """
+
+  def __init__(self, leaderboard: Leaderboard, redis_url: Optional[str] = None, queue_size: int = 4):
+    self.leaderboard = leaderboard
+    self.redis_url = redis_url
+    self.queue_size = queue_size
+    self._subscribers: Dict[BoardKey, Set[Subscriber]] = {}
+    # (level, scope) → (桶标签，all 为 None；快照文本)
+    self._snapshots: Dict[BoardKey, Tuple[Optional[str], str]] = {}
+    self._refreshing: Dict[BoardKey, bool] = {}
+    self._loop: Optional[asyncio.AbstractEventLoop] = None
+    self._listener: Optional[asyncio.Task] = None
+    self._tasks: Set[asyncio.Task] = set()
+
+  async def start(self) -> None:
+    self._loop = asyncio.get_running_loop()
+    if self.redis_url:
+      self._listener = asyncio.create_task(self._listen())
+    else:
+      self.leaderboard.on_change = self.notify
+
+  async def stop(self) -> None:
+    if self._listener:
+      self._listener.cancel()
+      try:
+        await self._listener
+      except asyncio.CancelledError:
+        pass
+      self._listener = None
+    if self.leaderboard.on_change == self.notify:
+      self.leaderboard.on_change = None
+
+  async def subscribe(self, level_id: str, scope: str) -> Subscriber:
+    key = (level_id, scope)
+    subscriber = Subscriber(key, self.queue_size)
+    self._subscribers.setdefault(key, set()).add(subscriber)
+    cached = self._snapshots.get(key)
+    if cached is not None and cached[0] == self._bucket(scope):
+      snapshot = cached[1]
+    else:
+      snapshot = await self._snapshot(key)
+    subscriber.offer(snapshot)
+    return subscriber
+
+  def unsubscribe(self, subscriber: Subscriber) -> None:
+    subscribers = self._subscribers.get(subscriber.key)
+    if subscribers is None:
+      return
+    subscribers.discard(subscriber)
+    if not subscribers:
+      del self._subscribers[subscriber.key]
+      self._snapshots.pop(subscriber.key, None)
+
+  def notify(self, level_id: str, scope: str) -> None:
+    """可从任意线程调用（同步路由跑在线程池）。"""
+    if self._loop is None or self._loop.is_closed():
+      return
+    self._loop.call_soon_threadsafe(self._schedule, (level_id, scope))
+
+  def _schedule(self, key: BoardKey) -> None:
+    if key not in self._subscribers:
+      return
+    if key in self._refreshing:
+      # 刷新进行中：标记脏，完成后再刷一次，合并突发事件
+      self._refreshing[key] = True
+      return
+    self._refreshing[key] = False
+    task = asyncio.ensure_future(self._refresh(key))
+    self._tasks.add(task)
+    task.add_done_callback(self._tasks.discard)
+
+  async def _refresh(self, key: BoardKey) -> None:
+    try:
+      while True:
+        snapshot = await self._snapshot(key)
+        for subscriber in list(self._subscribers.get(key, ())):
+          subscriber.offer(snapshot)
+        if not self._refreshing.get(key):
+          break
+        self._refreshing[key] = False
+    except Exception:
+      logger.exception("leaderboard snapshot refresh failed for %s", key)
+    finally:
+      self._refreshing.pop(key, None)
+
+  def _bucket(self, scope: str) -> Optional[str]:
+    bucket = period_bucket(scope, self.leaderboard.clock())
+    return bucket[0] if bucket else None
+
+  async def _snapshot(self, key: BoardKey) -> str:
+    level_id, scope = key
+    # 先取桶标签再读榜：读取期间跨过周期边界时标签偏旧，下一个订阅者会重读
+    bucket = self._bucket(scope)
+    if self.leaderboard.client:
+      entries = await asyncio.to_thread(self.leaderboard.top, level_id, scope, settings.leaderboard_size)
+    else:
+      entries = self.leaderboard.top(level_id, scope=scope, limit=settings.leaderboard_size)
+    snapshot = json.dumps({"entries": [entry.model_dump(mode="json") for entry in entries]})
+    if key in self._subscribers:
+      self._snapshots[key] = (bucket, snapshot)
+    return snapshot
+
+  async def _listen(self) -> None:
+    """单连接 PSUBSCRIBE；断线后退避重连。"""
+    reconnecting = False
+    while True:
+      client = aioredis.from_url(self.redis_url, decode_responses=True)
+      pubsub = client.pubsub()
+      try:
+        await pubsub.psubscribe(EVENTS_PATTERN)
+        if reconnecting:
+          # 重连后补刷一次，覆盖断线期间错过的事件
+          for key in list(self._subscribers):
+            self._schedule(key)
+        async for message in pubsub.listen():
+          if message.get("type") != "pmessage":
+            continue
+          key = parse_events_channel(message["channel"])
+          if key is not None:
+            self._schedule(key)
+      except asyncio.CancelledError:
+        raise
+      except Exception:
+        logger.warning("leaderboard pub/sub listener disconnected; retrying", exc_info=True)
+        reconnecting = True
+        await asyncio.sleep(1)
+      finally:
+        await pubsub.aclose()
+        await client.aclose()
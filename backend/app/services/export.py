@@ -0,0 +1,244 @@
+import csv
+import io
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+
+from ..models import Score, User
+
+# 导出列顺序；id 在首列且单调递增，是续传游标（任一完整行的 id 即 after_id）
+EXPORT_COLUMNS = (
+  "id",
+  "user_id",
+  "name",
+  "level_id",
+  "score",
+  "wave",
+  "time_ms",
+  "life_left",
+  "created_at",
+  "replay_status",
+)
+EXPORT_FORMATS = ("ndjson", "csv")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+@dataclass
+class ExportStats:
+  """一次导出的进度：已写行数/字节数与最后一行 id（续传游标）。"""
+
+  rows: int = 0
+  bytes: int = 0
+  last_id: Optional[int] = None
+  elapsed: float = 0.0
+
+  @property
+  def rows_per_second(self) -> float:
+    return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+  """带时区的时间转为 naive UTC（与 scores.created_at 一致），naive 原样返回。"""
+  if value is None or value.tzinfo is None:
+    return value
+  return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def export_query(
+  level_id: Optional[str] = None,
+  since: Optional[datetime] = None,
+  until: Optional[datetime] = None,
+  after_id: Optional[int] = None,
+  limit: Optional[int] = None,
+):
+  """scores ⋈ users，按 scores.id 升序（主键顺序，无需额外排序）；since 含、until 不含。"""
+  query = select(*(User.name if name == "name" else getattr(Score, name) for name in EXPORT_COLUMNS)).join(
+    User, User.id == Score.user_id
+  )
+  if level_id is not None:
+    query = query.where(Score.level_id == level_id)
+  if since is not None:
+    query = query.where(Score.created_at >= naive_utc(since))
+  if until is not None:
+    query = query.where(Score.created_at < naive_utc(until))
+  if after_id is not None:
+    query = query.where(Score.id > after_id)
+  query = query.order_by(Score.id)
+  if limit is not None:
+    query = query.limit(limit)
+  return query
+
+
+def ndjson_chunk(rows: Sequence[Any]) -> bytes:
+  # 逐行追加到 bytearray：orjson 每次 dumps 的结果按页超额分配，先收集成列表再 join 会让一批占用放大数十倍
+  buffer = bytearray()
+  for row in rows:
+    buffer += orjson.dumps(dict(zip(EXPORT_COLUMNS, row)), option=orjson.OPT_APPEND_NEWLINE)
+  return bytes(buffer)
+
+
+def csv_header() -> bytes:
+  return (",".join(EXPORT_COLUMNS) + "\r\n").encode()
+
+
+def csv_chunk(rows: Sequence[Any]) -> bytes:
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  # created_at 与 NDJSON 一致输出 ISO 8601
+  writer.writerows(row[:8] + (row[8].isoformat() if row[8] else None, row[9]) for row in rows)
+  return buffer.getvalue().encode()
+
+
+class ScoreExporter:
+  """
+  把 scores ⋈ users 流式导出为 NDJSON 或 CSV：服务端游标（stream_results + yield_per）逐批读取，
+  每批编码为一个字节块交给调用方（StreamingResponse / 文件），内存占用与批大小相关而非总行数。
+  整个导出在一个连接、一个只读事务里完成；中断后以最后一行的 id 作为 after_id 重新请求即可续传。
+  """
+
+  def __init__(
+    self,
+    engine: Engine,
+    fmt: str = "ndjson",
+    batch_size: int = 5000,
+    progress: Optional[Callable[[ExportStats], None]] = None,
+  ):
+    if fmt not in EXPORT_FORMATS:
+      raise ValueError(f"unknown export format: {fmt}")
+    self.engine = engine
+    self.fmt = fmt
+    self.batch_size = batch_size
+    self.progress = progress
+    self.stats = ExportStats()
+
+  @property
+  def media_type(self) -> str:
+    return MEDIA_TYPES[self.fmt]
+
+  def chunks(
+    self,
+    level_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    header: bool = True,
+  ) -> Iterator[bytes]:
+    """按批产出字节块；CSV 且 header 时先产出表头（续传追加到已有文件时传 header=False）。"""
+    stats = self.stats
+    encode = ndjson_chunk if self.fmt == "ndjson" else csv_chunk
+    start = time.perf_counter()
+    if self.fmt == "csv" and header:
+      chunk = csv_header()
+      stats.bytes += len(chunk)
+      yield chunk
+    with self.engine.connect() as conn:
+      result = conn.execution_options(stream_results=True, yield_per=self.batch_size).execute(
+        export_query(level_id, since, until, after_id, limit)
+      )
+      for rows in result.partitions():
+        chunk = encode(rows)
+        stats.rows += len(rows)
+        stats.bytes += len(chunk)
+        stats.last_id = rows[-1].id
+        stats.elapsed = time.perf_counter() - start
+        if self.progress:
+          self.progress(stats)
+        yield chunk
+    stats.elapsed = time.perf_counter() - start
+
+
+def _csv_records(data: bytes, begin: int) -> Iterator[Tuple[int, List[str]]]:
+  """从 begin（须为行首）起逐条解析 CSV，产出 (记录结束偏移, 字段)；末尾不以换行结束或引号未闭合的残行不产出。"""
+  offset = begin
+
+  def lines() -> Iterator[str]:
+    nonlocal offset
+    for line in data[begin:].splitlines(keepends=True):
+      offset += len(line)
+      yield line.decode()
+
+  try:
+    for row in csv.reader(lines(), strict=True):
+      if data[offset - 1 : offset] == b"\n":
+        yield offset, row
+  except (csv.Error, UnicodeDecodeError):
+    return
+
+
+def _last_csv_record(data: bytes, at_start: bool) -> Optional[Tuple[int, Optional[int]]]:
+  """
+  在 data 中找最后一条完整数据行，返回 (行尾偏移, id)；无法在这段数据内确定时返回 None（调用方扩大窗口）。
+  不从文件开头读时，引号内的换行让"行首"有歧义：依次尝试每个换行之后的位置，
+  从该处解析出的完整记录都是合法数据行（列数一致、id 为数字且递增）且引号成对才采用。
+  """
+  starts = [0] if at_start else (i + 1 for i in range(len(data) - 1) if data[i] == 0x0A)
+  for begin in starts:
+    last: Optional[Tuple[int, Optional[int]]] = None
+    for end, row in _csv_records(data, begin):
+      if last is None and at_start and row == list(EXPORT_COLUMNS):
+        last = (end, None)
+      elif (
+        len(row) == len(EXPORT_COLUMNS)
+        and row[0].isdigit()
+        and (last is None or last[1] is None or int(row[0]) > last[1])
+      ):
+        last = (end, int(row[0]))
+      else:
+        break
+    else:
+      # 写出的引号都成对出现在引号字段里：起点落在引号字段中间时，这段数据里的引号数为奇数
+      if last is not None and data.count(b'"', begin, last[0]) % 2 == 0:
+        return last
+      if at_start:
+        return 0, None
+  if at_start:
+    raise ValueError("not a CSV score export")
+  return None
+
+
+def _last_ndjson_record(data: bytes, at_start: bool) -> Optional[Tuple[int, Optional[int]]]:
+  """同 _last_csv_record；NDJSON 的字符串内不会出现换行，一行即一条记录。"""
+  end = data.rfind(b"\n") + 1
+  if end == 0:
+    return (0, None) if at_start else None
+  begin = data.rfind(b"\n", 0, end - 1) + 1
+  if begin == 0 and not at_start:
+    return None
+  return end, int(orjson.loads(data[begin:end])["id"])
+
+
+def resume_point(path: Path, fmt: str, tail: int = 64 * 1024) -> Optional[int]:
+  """
+  续传已有的导出文件：截掉末尾写了一半的行，返回最后一条完整数据行的 id（作为 after_id）；
+  文件为空或只有 CSV 表头时返回 None。从文件末尾读 tail 字节，找不到完整的一行就加倍往前读。
+  """
+  last_record = _last_ndjson_record if fmt == "ndjson" else _last_csv_record
+  with open(path, "r+b") as f:
+    size = f.seek(0, os.SEEK_END)
+    while True:
+      start = max(0, size - tail)
+      f.seek(start)
+      found = last_record(f.read(), start == 0)
+      if found is not None:
+        break
+      tail *= 2
+    end, last_id = found
+    f.truncate(start + end)
+  return last_id
+
+
+def exported_rows(path: Path, fmt: str) -> int:
+  """已有导出文件（无残行）中的数据行数，供续传时扣减 limit；逐块读取，不整体载入。"""
+  if fmt == "ndjson":
+    with open(path, "rb") as f:
+      return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+  with open(path, newline="", encoding="utf-8") as f:
+    return max(0, sum(1 for _ in csv.reader(f)) - 1)
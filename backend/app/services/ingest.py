@@ -0,0 +1,149 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from ..models import Score
+from .best_scores import best_upsert
+
+logger = logging.getLogger(__name__)
+
+
+class ScoreQueueFull(Exception):
+  """写入队列已满：调用方应返回 503 + Retry-After。"""
+
+
+# 队列元素：Score 行的列值 + 提交后回填 score_id 的 Future
+Pending = Tuple[Dict[str, Any], "Future[int]"]
+
+
+class ScoreWriter:
+  """
+  成绩组提交（write-behind）：请求把校验通过的成绩放入有界队列，后台线程攒批
+  （最多 max_batch 条或等待 max_latency 秒）后用一条多行 INSERT ... RETURNING 加一次 commit 落库。
+  持久性：每条成绩的 Future 在所在批次 commit 后才完成，请求等到它再响应；commit 失败则整批报错。
+  写线程取批时对每个 Future 调用 set_running_or_notify_cancel：此前被 cancel() 撤回的成绩不会落库，
+  取走之后则无法撤回——请求据此区分“确定未落库”与“正在提交”。
+  """
+
+  def __init__(
+    self,
+    session_factory: Callable[[], Session],
+    max_batch: int = 500,
+    max_latency: float = 0.02,
+    max_queue: int = 10_000,
+  ):
+    self.session_factory = session_factory
+    self.max_batch = max_batch
+    self.max_latency = max_latency
+    self._queue: "queue.Queue[Optional[Pending]]" = queue.Queue(maxsize=max_queue)
+    self._thread: Optional[threading.Thread] = None
+    self.batches = 0
+    self.rows = 0
+
+  def start(self) -> "ScoreWriter":
+    self._thread = threading.Thread(target=self._run, name="score-writer", daemon=True)
+    self._thread.start()
+    return self
+
+  def stop(self) -> None:
+    """放入哨兵，等队列里已接收的成绩全部落库后退出。"""
+    if self._thread is None:
+      return
+    self._queue.put(None)
+    self._thread.join()
+    self._thread = None
+
+  def submit(self, values: Dict[str, Any]) -> "Future[int]":
+    """入队一条成绩；返回在 commit 后给出 score_id 的 Future。队列满时抛 ScoreQueueFull。"""
+    future: "Future[int]" = Future()
+    try:
+      self._queue.put_nowait((values, future))
+    except queue.Full:
+      raise ScoreQueueFull()
+    return future
+
+  def _run(self) -> None:
+    while True:
+      first = self._queue.get()
+      if first is None:
+        return
+      batch: List[Pending] = [first]
+      deadline = time.monotonic() + self.max_latency
+      stopping = False
+      while len(batch) < self.max_batch:
+        timeout = deadline - time.monotonic()
+        try:
+          item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+        except queue.Empty:
+          break
+        if item is None:
+          stopping = True
+          break
+        batch.append(item)
+      self._flush(batch)
+      if stopping:
+        # 哨兵之后不会再有新成绩，但之前入队的可能还没取完
+        self._drain()
+        return
+
+  def _drain(self) -> None:
+    batch: List[Pending] = []
+    while True:
+      try:
+        item = self._queue.get_nowait()
+      except queue.Empty:
+        break
+      if item is not None:
+        batch.append(item)
+      if len(batch) >= self.max_batch:
+        self._flush(batch)
+        batch = []
+    if batch:
+      self._flush(batch)
+
+  def _flush(self, batch: List[Pending]) -> None:
+    # 跳过已撤回（请求等待超时）的成绩；其余标记为运行中，之后不可再撤回
+    batch = [(values, future) for values, future in batch if future.set_running_or_notify_cancel()]
+    if not batch:
+      return
+    rows = [values for values, _ in batch]
+    try:
+      with self.session_factory() as db:
+        # insertmanyvalues：多行 INSERT ... RETURNING，按参数顺序返回 id
+        ids = db.execute(insert(Score).returning(Score.id, sort_by_parameter_order=True), rows).scalars().all()
+        bests = best_rows(rows, ids)
+        db.execute(best_upsert(db.get_bind().dialect.name, bests))
+        db.commit()
+    except Exception as exc:
+      logger.exception("score batch commit failed (%d rows)", len(batch))
+      for _, future in batch:
+        future.set_exception(exc)
+      return
+    self.batches += 1
+    self.rows += len(batch)
+    for (_, future), score_id in zip(batch, ids):
+      future.set_result(score_id)
+
+
+BEST_COLUMNS = ("user_id", "level_id", "score", "wave", "time_ms", "life_left", "created_at")
+
+
+def best_rows(rows: List[Dict[str, Any]], ids: List[int]) -> List[Dict[str, Any]]:
+  """
+  同批内同一 (user, level) 只保留最好的一条：
+  Postgres 的 ON CONFLICT DO UPDATE 不允许一条语句两次更新同一行。
+  """
+  best: Dict[Tuple[int, str], Dict[str, Any]] = {}
+  for values, score_id in zip(rows, ids):
+    key = (values["user_id"], values["level_id"])
+    current = best.get(key)
+    if current is None or (values["score"], -values["time_ms"]) > (current["score"], -current["time_ms"]):
+      # scores 的其余列（如 replay_status）不属于 user_level_best
+      best[key] = {**{column: values[column] for column in BEST_COLUMNS}, "score_id": score_id}
+  return list(best.values())
@@ -1,68 +1,389 @@
 import json
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
+import orjson
 import redis
 
 from ..core.config import get_settings
 from ..schemas import LeaderboardEntry
+from .memory_board import MemoryBoard
 
 settings = get_settings()
 
+KEY_PREFIX = "leaderboard:"
+EVENTS_SUFFIX = ":events"
+EVENTS_PATTERN = f"{KEY_PREFIX}*{EVENTS_SUFFIX}"
+
+# 滚动榜单：按 UTC 日/ISO 周分桶，键为 leaderboard:{level}:{scope}:{bucket}，过了周期自动过期
+SCOPES = ("all", "daily", "weekly")
+DAY_SECONDS = 86400
+PERIOD_SECONDS = {"daily": DAY_SECONDS, "weekly": 7 * DAY_SECONDS}
+# 周期结束后再保留一段时间，跨零点的读请求/推送仍能读到刚结束的桶
+BUCKET_GRACE_SECONDS = 3600
+
+
+def period_bucket(scope: str, now: float) -> Optional[Tuple[str, int]]:
+  """返回 (桶标签, 过期时间戳)；非周期 scope 返回 None。"""
+  period = PERIOD_SECONDS.get(scope)
+  if period is None:
+    return None
+  days = int(now // DAY_SECONDS)
+  if scope == "weekly":
+    # 1970-01-01 是周四，ISO 周从周一开始
+    days -= (days + 3) % 7
+  start = days * DAY_SECONDS
+  return time.strftime("%Y%m%d", time.gmtime(start)), start + period + BUCKET_GRACE_SECONDS
+
+
+# ZSET 分值 = 分数 << TIME_BITS | (TIME_CAP - 耗时)：同分耗时短者在前，与内存版排序一致。
+# 双精度可精确表示 2^53，分数上限约 6700 万，耗时超过 TIME_CAP（约 37 小时）按上限计。
+TIME_BITS = 27
+TIME_CAP = (1 << TIME_BITS) - 1
+# 可上榜的分数上限（不含）：再大的分值在 ZSET 的 double 中会舍入，破坏同分按耗时排序与游标往返
+SCORE_LIMIT = 1 << (53 - TIME_BITS)
+
+
+def rank_score(score: int, time_ms: int) -> int:
+  return (score << TIME_BITS) | (TIME_CAP - min(max(time_ms, 0), TIME_CAP))
+
+
+def split_rank_score(value: int) -> Tuple[int, int]:
+  """rank_score 的逆：(score, time_ms)。"""
+  return value >> TIME_BITS, TIME_CAP - (value & TIME_CAP)
+
+
+# 原子提交：保留最好成绩、写 payload、ZSET 与 payload 哈希同步截断、递增榜单版本、进入前 N 时发布事件，一次往返完成。
+# KEYS[1]=ZSET, KEYS[2]=payload 哈希, KEYS[3]=版本计数
+# ARGV: member, 分值, payload, 榜单容量, 事件频道, 事件内容, 过期时间戳（0 为不过期）, 推送名次阈值, 当前毫秒时间
+# 版本计数首次创建时以毫秒时间为起点：键被清空/过期后重建也不会复用旧版本号
+SUBMIT_SCRIPT = """
+local member = ARGV[1]
+local score = tonumber(ARGV[2])
+local prev = redis.call('ZSCORE', KEYS[1], member)
+if prev and score <= tonumber(prev) then
+  return 0
+end
+-- 直接传原始字符串：Lua 数字转字符串只保留 14 位有效数字
+redis.call('ZADD', KEYS[1], ARGV[2], member)
+redis.call('HSET', KEYS[2], member, ARGV[3])
+redis.call('SET', KEYS[3], ARGV[9], 'NX')
+redis.call('INCR', KEYS[3])
+local overflow = redis.call('ZCARD', KEYS[1]) - tonumber(ARGV[4])
+if overflow > 0 then
+  local evicted = redis.call('ZRANGE', KEYS[1], 0, overflow - 1)
+  redis.call('ZREMRANGEBYRANK', KEYS[1], 0, overflow - 1)
+  for i = 1, #evicted, 1000 do
+    redis.call('HDEL', KEYS[2], unpack(evicted, i, math.min(i + 999, #evicted)))
+  end
+end
+local expire_at = tonumber(ARGV[7])
+if expire_at > 0 then
+  redis.call('EXPIREAT', KEYS[1], expire_at)
+  redis.call('EXPIREAT', KEYS[2], expire_at)
+  redis.call('EXPIREAT', KEYS[3], expire_at)
+end
+local rank = redis.call('ZREVRANK', KEYS[1], member)
+if rank and rank < tonumber(ARGV[8]) then
+  redis.call('PUBLISH', ARGV[5], ARGV[6])
+  return 1
+end
+return 0
+"""
+
+# 撤下成绩：成员当前分值仍等于被撤成绩时，换成替补成绩（分值为空则移除），递增版本并发布事件；
+# 已被之后更好的成绩覆盖（或从未上榜）时不动。KEYS 同 SUBMIT_SCRIPT
+# ARGV: member, 被撤分值, 替补分值（'' 为移除）, 替补 payload, 事件频道, 事件内容, 当前毫秒时间
+WITHDRAW_SCRIPT = """
+local current = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not current or tonumber(current) ~= tonumber(ARGV[2]) then
+  return 0
+end
+if ARGV[3] == '' then
+  redis.call('ZREM', KEYS[1], ARGV[1])
+  redis.call('HDEL', KEYS[2], ARGV[1])
+else
+  redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+  redis.call('HSET', KEYS[2], ARGV[1], ARGV[4])
+end
+redis.call('SET', KEYS[3], ARGV[7], 'NX')
+redis.call('INCR', KEYS[3])
+redis.call('PUBLISH', ARGV[5], ARGV[6])
+return 1
+"""
+
+# 游标翻页：定位起点 + ZREVRANGE + HMGET 一次往返。KEYS 同上；ARGV: 条数, 游标分值（'' 为首页）, 游标 member
+# 游标成员分值未变时从其后开始；已变化/被淘汰则从“严格优于游标分值”的人数处开始
+PAGE_SCRIPT = """
+local start = 0
+if ARGV[2] ~= '' then
+  local rank = redis.call('ZREVRANK', KEYS[1], ARGV[3])
+  local current = redis.call('ZSCORE', KEYS[1], ARGV[3])
+  if rank and tonumber(current) == tonumber(ARGV[2]) then
+    start = rank + 1
+  else
+    start = redis.call('ZCOUNT', KEYS[1], '(' .. ARGV[2], '+inf')
+  end
+end
+local members = redis.call('ZREVRANGE', KEYS[1], start, start + tonumber(ARGV[1]) - 1)
+if #members == 0 then
+  return {}
+end
+return redis.call('HMGET', KEYS[2], unpack(members))
+"""
+
+# 名次 + 总数 + 前后窗口一次往返。ARGV: member, 半径；未上榜返回 {-1, 总数}
+AROUND_SCRIPT = """
+local total = redis.call('ZCARD', KEYS[1])
+local rank = redis.call('ZREVRANK', KEYS[1], ARGV[1])
+if not rank then
+  return {-1, total}
+end
+local radius = tonumber(ARGV[2])
+local members = redis.call('ZREVRANGE', KEYS[1], math.max(0, rank - radius), rank + radius)
+return {rank, total, redis.call('HMGET', KEYS[2], unpack(members))}
+"""
+
 
 class Leaderboard:
   """
   榜单服务：Redis ZSET 封装，Redis 不可用时使用内存回退。
   """
 
-  def __init__(self, client: Optional[redis.Redis] = None):
+  def __init__(self, client: Optional[redis.Redis] = None, clock: Callable[[], float] = time.time):
     self.client = client
-    self.fallback: Dict[str, List[LeaderboardEntry]] = {}
+    self.clock = clock
+    self.fallback: Dict[str, MemoryBoard] = {}
+    # 内存周期榜单的过期时间：key → 时间戳
+    self._fallback_expiry: Dict[str, int] = {}
+    self._fallback_lock = threading.Lock()
+    # 内存模式没有 pub/sub，变化时直接回调 (level_id, scope)
+    self.on_change: Optional[Callable[[str, str], None]] = None
+    # register_script：EVALSHA，脚本缓存丢失时自动 SCRIPT LOAD 重试
+    self._submit_script = client.register_script(SUBMIT_SCRIPT) if client else None
+    self._page_script = client.register_script(PAGE_SCRIPT) if client else None
+    self._around_script = client.register_script(AROUND_SCRIPT) if client else None
+    self._withdraw_script = client.register_script(WITHDRAW_SCRIPT) if client else None
 
-  def _key(self, level_id: str, scope: str = "all") -> str:
-    return f"leaderboard:{level_id}:{scope}"
+  def _key(self, level_id: str, scope: str = "all", now: Optional[float] = None) -> str:
+    bucket = period_bucket(scope, self.clock() if now is None else now)
+    if bucket is None:
+      return f"{KEY_PREFIX}{level_id}:{scope}"
+    return f"{KEY_PREFIX}{level_id}:{scope}:{bucket[0]}"
 
-  def submit(self, level_id: str, entry: LeaderboardEntry, scope: str = "all") -> None:
-    key = self._key(level_id, scope)
-    member = str(entry.user_id)
+  def _channel(self, level_id: str, scope: str) -> str:
+    # 频道不带桶标签，订阅方只关心 (level, scope)
+    return f"{KEY_PREFIX}{level_id}:{scope}{EVENTS_SUFFIX}"
+
+  def submit(self, level_id: str, entry: LeaderboardEntry, scope: str = "all") -> bool:
+    """提交成绩；仅保留用户最好成绩。返回前 leaderboard_size 名是否发生变化。"""
+    return self.submit_scopes(level_id, entry, (scope,))[0]
+
+  def submit_scopes(self, level_id: str, entry: LeaderboardEntry, scopes: Sequence[str] = SCOPES) -> List[bool]:
+    """一次写入多个 scope（总榜 + 日榜 + 周榜）；Redis 下合并为一个 pipeline 往返。"""
+    now = self.clock()
     if self.client:
-      payload = entry.model_dump(mode="json")
-      payload_key = f"{key}:payloads"
-      # 仅保留用户最高分
-      prev_score = self.client.zscore(key, member)
-      if prev_score is None or entry.score > prev_score:
-        self.client.zadd(key, {member: entry.score})
-        self.client.hset(payload_key, member, json.dumps(payload))
-      self.client.zremrangebyrank(key, 0, -(settings.leaderboard_size + 1))
-      self.client.publish(f"{key}:events", json.dumps({"type": "update"}))
-      return
-
-    # 内存模式：排序并截断
-    self.fallback.setdefault(key, [])
-    bucket = self.fallback[key]
-    # 按 user_id 去重，记录最高分；同分取时间短者
-    existing_idx = next((i for i, e in enumerate(bucket) if e.user_id == entry.user_id), None)
-    if existing_idx is None:
-      bucket.append(entry)
+      payload = json.dumps(entry.model_dump(mode="json"))
+      event = json.dumps({"type": "update"})
+      pipe = self.client.pipeline(transaction=False)
+      for scope in scopes:
+        key = self._key(level_id, scope, now)
+        bucket = period_bucket(scope, now)
+        self._submit_script(
+          keys=[key, f"{key}:payloads", f"{key}:version"],
+          args=[
+            str(entry.user_id),
+            rank_score(entry.score, entry.time_ms),
+            payload,
+            settings.leaderboard_capacity,
+            self._channel(level_id, scope),
+            event,
+            bucket[1] if bucket else 0,
+            settings.leaderboard_size,
+            int(now * 1000),
+          ],
+          client=pipe,
+        )
+      return [bool(changed) for changed in pipe.execute()]
+
+    # 内存模式：索引 + 有序结构，同用户只保留最好成绩（同分耗时短者优先）
+    result = []
+    for scope in scopes:
+      rank = self._board(self._key(level_id, scope, now), period_bucket(scope, now), now).submit(entry)
+      changed = rank is not None and rank < settings.leaderboard_size
+      if changed and self.on_change:
+        self.on_change(level_id, scope)
+      result.append(changed)
+    return result
+
+  def withdraw(
+    self,
+    level_id: str,
+    user_id: int,
+    score: int,
+    time_ms: int,
+    replacements: Dict[str, Optional[LeaderboardEntry]],
+  ) -> List[bool]:
+    """
+    撤下一条成绩（如重放判定作弊）：各 scope 上该用户若仍是这条 (score, time_ms)，换成 replacements[scope]
+    （该周期内下一条有效的最好成绩，None 则移除）；已是其他成绩时不动。返回各 scope 是否变化。
+    """
+    now = self.clock()
+    scopes = list(replacements)
+    if self.client:
+      event = json.dumps({"type": "update"})
+      pipe = self.client.pipeline(transaction=False)
+      for scope in scopes:
+        key = self._key(level_id, scope, now)
+        entry = replacements[scope]
+        self._withdraw_script(
+          keys=[key, f"{key}:payloads", f"{key}:version"],
+          args=[
+            str(user_id),
+            rank_score(score, time_ms),
+            rank_score(entry.score, entry.time_ms) if entry else "",
+            json.dumps(entry.model_dump(mode="json")) if entry else "",
+            self._channel(level_id, scope),
+            event,
+            int(now * 1000),
+          ],
+          client=pipe,
+        )
+      return [bool(changed) for changed in pipe.execute()]
+
+    result = []
+    for scope in scopes:
+      board = self.fallback.get(self._key(level_id, scope, now))
+      changed = board is not None and board.withdraw(user_id, (-score, time_ms, user_id), replacements[scope])
+      if changed and self.on_change:
+        self.on_change(level_id, scope)
+      result.append(changed)
+    return result
+
+  def _board(self, key: str, bucket: Optional[Tuple[str, int]] = None, now: float = 0) -> MemoryBoard:
+    board = self.fallback.get(key)
+    if board is None:
+      with self._fallback_lock:
+        board = self.fallback.get(key)
+        if board is None:
+          # 新桶出现时顺带清理已过期的旧桶
+          for expired in [k for k, expire_at in self._fallback_expiry.items() if expire_at <= now]:
+            self.fallback.pop(expired, None)
+            del self._fallback_expiry[expired]
+          board = self.fallback[key] = MemoryBoard(settings.leaderboard_memory_capacity)
+          if bucket is not None:
+            self._fallback_expiry[key] = bucket[1]
+    return board
+
+  def version(self, level_id: str, scope: str = "all") -> str:
+    """
+    榜单当前版本（每次内容变化都会改变），用作 ETag；只读一个计数，不读 payload。
+    带上周期桶标签：日/周榜换桶后版本不与旧桶混淆。
+    """
+    now = self.clock()
+    bucket = period_bucket(scope, now)
+    key = self._key(level_id, scope, now)
+    if self.client:
+      value = self.client.get(f"{key}:version")
+      version = int(value) if value else 0
     else:
-      existing = bucket[existing_idx]
-      if entry.score > existing.score or (entry.score == existing.score and entry.time_ms < existing.time_ms):
-        bucket[existing_idx] = entry
-    bucket.sort(key=lambda e: (-e.score, e.time_ms))
-    if len(bucket) > settings.leaderboard_size:
-      bucket[:] = bucket[: settings.leaderboard_size]
+      board = self.fallback.get(key)
+      version = board.version if board is not None else 0
+    return f"{bucket[0] if bucket else scope}.{version}"
 
   def top(self, level_id: str, scope: str = "all", limit: int = 10) -> List[LeaderboardEntry]:
+    return self.page(level_id, scope=scope, limit=limit)[0]
+
+  def page(
+    self, level_id: str, scope: str = "all", limit: int = 10, cursor: Optional[str] = None
+  ) -> Tuple[List[LeaderboardEntry], Optional[str]]:
+    """游标翻页：cursor 为上一页末条的 `分值:user_id`，返回 (条目, 下一页游标)；O(log n + limit)。"""
     key = self._key(level_id, scope)
+    after = parse_cursor(cursor) if cursor else None
     if self.client:
-      payload_key = f"{key}:payloads"
-      user_ids = self.client.zrevrange(key, 0, limit - 1, withscores=False)
-      if not user_ids:
-        return []
-      # redis-py hmget expects args unpacked, not a single list
-      payloads = self.client.hmget(payload_key, *user_ids)
-      result: List[LeaderboardEntry] = []
-      for raw in payloads:
-        if raw:
-          result.append(LeaderboardEntry(**json.loads(raw)))
-      return result
-    return self.fallback.get(key, [])[:limit]
+      entries = _decode(self._page_payloads(key, limit, after))
+    else:
+      entries = self._memory_page(key, limit, after)
+    last = entries[-1] if len(entries) == limit else None
+    return entries, _next_cursor(last.score, last.time_ms, last.user_id) if last else None
+
+  def page_raw(
+    self, level_id: str, scope: str = "all", limit: int = 10, cursor: Optional[str] = None
+  ) -> Tuple[List[bytes], Optional[str]]:
+    """
+    page 的原始字节版：Redis 中存的 payload 即 LeaderboardEntry 的 JSON，原样返回供响应体直接拼接，
+    不逐条 json.loads / 构造模型；只解析末条以生成游标。
+    """
+    key = self._key(level_id, scope)
+    after = parse_cursor(cursor) if cursor else None
+    if self.client:
+      payloads = [
+        raw.encode() if isinstance(raw, str) else raw for raw in self._page_payloads(key, limit, after) if raw
+      ]
+      if len(payloads) < limit:
+        return payloads, None
+      last = orjson.loads(payloads[-1])
+      return payloads, _next_cursor(last["score"], last["time_ms"], last["user_id"])
+    entries = self._memory_page(key, limit, after)
+    last = entries[-1] if len(entries) == limit else None
+    return (
+      [entry.model_dump_json().encode() for entry in entries],
+      _next_cursor(last.score, last.time_ms, last.user_id) if last else None,
+    )
+
+  def _page_payloads(self, key: str, limit: int, after: Optional[Tuple[int, int]]) -> List[Any]:
+    value, user_id = after if after is not None else ("", "")
+    return self._page_script(keys=[key, f"{key}:payloads"], args=[limit, value, user_id])
+
+  def _memory_page(self, key: str, limit: int, after: Optional[Tuple[int, int]]) -> List[LeaderboardEntry]:
+    board = self.fallback.get(key)
+    if board is None:
+      return []
+    if after is None:
+      return board.top(limit)
+    value, user_id = after
+    score, time_ms = split_rank_score(value)
+    return board.after((-score, time_ms, user_id), limit)[1]
+
+  def around(
+    self, level_id: str, user_id: int, scope: str = "all", radius: int = 5
+  ) -> Tuple[Optional[int], int, List[LeaderboardEntry]]:
+    """用户名次（0 基，ZREVRANK）、榜单总人数及上下各 radius 名；单次往返，O(log n + 窗口)。"""
+    key = self._key(level_id, scope)
+    if self.client:
+      result = self._around_script(keys=[key, f"{key}:payloads"], args=[user_id, radius])
+      if result[0] < 0:
+        return None, result[1], []
+      return result[0], result[1], _decode(result[2])
+    board = self.fallback.get(key)
+    if board is None:
+      return None, 0, []
+    rank, entries = board.around(user_id, radius)
+    return rank, len(board), entries
+
+
+def _decode(payloads: List[Optional[str]]) -> List[LeaderboardEntry]:
+  return [LeaderboardEntry(**json.loads(raw)) for raw in payloads if raw]
+
+
+def _next_cursor(score: int, time_ms: int, user_id: int) -> str:
+  return f"{rank_score(score, time_ms)}:{user_id}"
+
+
+def parse_cursor(cursor: str) -> Tuple[int, int]:
+  """`分值:user_id` → (分值, user_id)；格式错误抛 ValueError。"""
+  value, sep, user_id = cursor.partition(":")
+  if not sep:
+    raise ValueError(f"invalid leaderboard cursor: {cursor!r}")
+  return int(value), int(user_id)
+
+
+def parse_events_channel(channel: str) -> Optional[Tuple[str, str]]:
+  """`leaderboard:{level}:{scope}:events` → (level, scope)。"""
+  if not (channel.startswith(KEY_PREFIX) and channel.endswith(EVENTS_SUFFIX)):
+    return None
+  level_id, sep, scope = channel[len(KEY_PREFIX) : -len(EVENTS_SUFFIX)].rpartition(":")
+  if not sep:
+    return None
+  return level_id, scope
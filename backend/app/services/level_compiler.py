@@ -0,0 +1,150 @@
+"""
+关卡编译：加载关卡时校验网格并预算寻路数据，按关卡 hash 缓存。
+- 可解性：entry/exit/blocked/noBuild/预置塔都在网格内，entry/exit 未被占用，且 entry 可达 exit；
+- 距离场：从 exit 反向 BFS，每格到 exit 的最短步数（4 邻接；不可达为 dtype 最大值）；
+- 流场：每格沿最短路前进一步的方向（DIRECTIONS 下标，同距离时取靠前的方向；exit/不可达为 255）；
+- 基础路径：与前端 aStar.ts 同序的 A*（find_path）结果，服务端模拟开局直接复用。
+"""
+
+import base64
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Tuple
+
+import numpy as np
+
+from .simulation import DIRECTIONS, Cell, find_path
+
+NO_FLOW = 255
+
+
+class LevelInvalid(ValueError):
+  """关卡网格不合法或 entry 到 exit 无路可走。"""
+
+
+@dataclass(frozen=True)
+class CompiledLevel:
+  width: int
+  height: int
+  # (height, width)，行优先；不可达格为 dtype 最大值
+  distance: np.ndarray
+  # (height, width) uint8：DIRECTIONS 下标，NO_FLOW 表示 exit 或不可达
+  flow: np.ndarray
+  base_path: Tuple[Cell, ...]
+
+  def path_from(self, start: Cell) -> List[Cell]:
+    """沿流场从 start 走到 exit（最短路之一，不保证与 A* 同一条）；不可达返回空列表。"""
+    flow = self.flow
+    if self.distance[start[1], start[0]] == np.iinfo(self.distance.dtype).max:
+      return []
+    path = [start]
+    x, y = start
+    while flow[y, x] != NO_FLOW:
+      dx, dy = DIRECTIONS[flow[y, x]]
+      x, y = x + dx, y + dy
+      path.append((x, y))
+    return path
+
+  def attachment(self) -> Dict[str, Any]:
+    """随 GET /levels/{id} 下发的紧凑表示：数组为小端行优先字节的 base64，路径为扁平 [x0, y0, x1, y1, ...]。"""
+    return {
+      "width": self.width,
+      "height": self.height,
+      "directions": [list(d) for d in DIRECTIONS],
+      "distance_dtype": self.distance.dtype.name,
+      "distance": base64.b64encode(self.distance.astype(self.distance.dtype.newbyteorder("<")).tobytes()).decode(),
+      "flow": base64.b64encode(self.flow.tobytes()).decode(),
+      "base_path": [v for cell in self.base_path for v in cell],
+    }
+
+
+def _cells(values: Iterable[Dict[str, Any]], what: str, width: int, height: int) -> FrozenSet[Cell]:
+  cells = set()
+  for value in values:
+    try:
+      cell = (int(value["x"]), int(value["y"]))
+    except (KeyError, TypeError, ValueError):
+      raise LevelInvalid(f"{what}: bad cell {value!r}") from None
+    if not (0 <= cell[0] < width and 0 <= cell[1] < height):
+      raise LevelInvalid(f"{what}: cell {cell} outside {width}x{height} grid")
+    cells.add(cell)
+  return frozenset(cells)
+
+
+def bfs_distance(width: int, height: int, blocked: FrozenSet[Cell], goal: Cell) -> np.ndarray:
+  """从 goal 反向 BFS 的步数场（int32，不可达为 -1）；按扁平下标逐层扩展，O(格数)。"""
+  size = width * height
+  open_cells = bytearray(b"\x01") * size
+  for x, y in blocked:
+    open_cells[y * width + x] = 0
+  dist = [-1] * size
+  start = goal[1] * width + goal[0]
+  dist[start] = 0
+  queue = [start]
+  last_column = width - 1
+  for index in queue:
+    step = dist[index] + 1
+    x = index % width
+    for neighbor, inside in (
+      (index + 1, x < last_column),
+      (index - 1, x > 0),
+      (index + width, index + width < size),
+      (index - width, index >= width),
+    ):
+      if inside and open_cells[neighbor] and dist[neighbor] < 0:
+        dist[neighbor] = step
+        queue.append(neighbor)
+  return np.array(dist, dtype=np.int32).reshape(height, width)
+
+
+def flow_field(dist: np.ndarray) -> np.ndarray:
+  """每格取距离恰好减一的邻格方向；倒序覆盖，使 DIRECTIONS 中靠前的方向优先（与 A* 的扩展顺序一致）。"""
+  height, width = dist.shape
+  padded = np.full((height + 2, width + 2), -1, dtype=np.int32)
+  padded[1:-1, 1:-1] = dist
+  flow = np.full(dist.shape, NO_FLOW, dtype=np.uint8)
+  target = dist - 1
+  reachable = dist > 0
+  for index in reversed(range(len(DIRECTIONS))):
+    dx, dy = DIRECTIONS[index]
+    neighbor = padded[1 + dy : 1 + dy + height, 1 + dx : 1 + dx + width]
+    flow[reachable & (neighbor == target)] = index
+  return flow
+
+
+def compile_level(config: Dict[str, Any]) -> CompiledLevel:
+  """校验关卡网格并预算距离场/流场/基础路径；不合法时抛 LevelInvalid。"""
+  grid = config.get("grid")
+  if not isinstance(grid, dict):
+    raise LevelInvalid("missing grid")
+  width, height = grid.get("width"), grid.get("height")
+  if not isinstance(width, int) or not isinstance(height, int) or width <= 0 or height <= 0:
+    raise LevelInvalid(f"grid size must be positive integers, got {width!r}x{height!r}")
+  (entry,) = _cells([grid.get("entry")], "entry", width, height)
+  (exit_,) = _cells([grid.get("exit")], "exit", width, height)
+  if entry == exit_:
+    raise LevelInvalid("entry and exit must differ")
+  blocked = _cells(grid.get("blocked", ()), "blocked", width, height)
+  _cells(grid.get("noBuild", ()), "noBuild", width, height)
+  presets = _cells((p.get("cell") for p in grid.get("presetTowers", ())), "presetTowers", width, height)
+  # 预置塔与障碍一样阻挡寻路
+  blocked = blocked | presets
+  for name, cell in (("entry", entry), ("exit", exit_)):
+    if cell in blocked:
+      raise LevelInvalid(f"{name} {cell} is blocked")
+
+  dist = bfs_distance(width, height, blocked, exit_)
+  if dist[entry[1], entry[0]] < 0:
+    raise LevelInvalid(f"no path from entry {entry} to exit {exit_}")
+  base_path = find_path(width, height, entry, exit_, blocked)
+  if base_path is None:
+    raise LevelInvalid(f"no path from entry {entry} to exit {exit_}")
+
+  dtype = np.uint16 if dist.max() < np.iinfo(np.uint16).max else np.uint32
+  distance = np.where(dist < 0, np.iinfo(dtype).max, dist).astype(dtype)
+  return CompiledLevel(
+    width=width,
+    height=height,
+    distance=distance,
+    flow=flow_field(dist),
+    base_path=tuple(base_path),
+  )
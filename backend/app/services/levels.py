@@ -1,19 +1,42 @@
+import hashlib
 import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict
 
 from ..core.config import get_settings
+from ..utils.frozen import deep_freeze
 from ..utils.hash import hash_level_config
+from .level_compiler import CompiledLevel, compile_level
 
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class LevelRecord:
+  """已解析、已计算 hash、已编译寻路数据的关卡快照；config/compiled 在进程内共享，config 深度只读（修改抛 TypeError）。"""
+
+  id: str
+  version: str
+  hash: str
+  config: Dict[str, Any]
+  compiled: CompiledLevel
+  mtime_ns: int
+  size: int
+  digest: bytes
+
+  def as_dict(self) -> Dict[str, Any]:
+    return {"id": self.id, "version": self.version, "hash": self.hash, "config": self.config}
 
-def load_level(level_id: str) -> Dict[str, Any]:
-  """读取关卡 JSON，计算并回填 hash。"""
-  settings = get_settings()
-  level_path = Path(settings.level_dir) / f"{level_id}.json"
-  if not level_path.exists():
-    raise FileNotFoundError(f"Level {level_id} not found")
 
-  raw = json.loads(level_path.read_text(encoding="utf-8"))
+def parse_level(level_id: str, data: bytes) -> Dict[str, Any]:
+  """解析关卡 JSON，计算并回填 hash；config 为深度只读的 FrozenDict。"""
+  raw = json.loads(data.decode("utf-8"))
   metadata = raw.get("metadata", {})
   computed_hash = hash_level_config({**raw, "metadata": {**metadata, "hash": ""}})
   raw["metadata"] = {**metadata, "hash": computed_hash}
@@ -22,5 +45,109 @@ def load_level(level_id: str) -> Dict[str, Any]:
     "id": level_id,
     "version": raw["metadata"]["version"],
     "hash": computed_hash,
-    "config": raw,
+    "config": deep_freeze(raw),
   }
+
+
+class LevelRegistry:
+  """
+  进程内关卡注册表：启动时加载全部关卡并预算 hash、编译寻路数据（格式错误或网格不可解的关卡记日志后跳过）；
+  之后按间隔 stat 文件，仅在 mtime/大小变化且内容确实改变时重新解析。
+  编译结果按关卡 hash 缓存：文件只改了格式（hash 不变）或改回旧内容时不重算。
+  """
+
+  def __init__(self, level_dir: Path, check_interval: float = 1.0, compiled_cache_size: int = 32):
+    self.level_dir = Path(level_dir)
+    self.check_interval = check_interval
+    self.compiled_cache_size = compiled_cache_size
+    self._records: Dict[str, LevelRecord] = {}
+    self._checked_at: Dict[str, float] = {}
+    self._compiled: "OrderedDict[str, CompiledLevel]" = OrderedDict()
+    self._lock = threading.Lock()
+
+  def _path(self, level_id: str) -> Path:
+    return self.level_dir / f"{level_id}.json"
+
+  def load_all(self) -> None:
+    """扫描 level_dir 下全部 *.json，一次性加载；单个关卡无法加载时跳过，不影响其他关卡与启动。"""
+    for path in sorted(self.level_dir.glob("*.json")):
+      try:
+        self._refresh(path.stem)
+      except (ValueError, KeyError, TypeError):
+        # LevelInvalid / JSON 或编码错误 / 缺字段；之后请求该关卡时按原样报错
+        logger.exception("skipping level %s", path.name)
+
+  def get(self, level_id: str) -> LevelRecord:
+    record = self._records.get(level_id)
+    if record is not None and time.monotonic() - self._checked_at.get(level_id, 0.0) < self.check_interval:
+      return record
+    return self._refresh(level_id)
+
+  def _compile(self, level_hash: str, config: Dict[str, Any]) -> CompiledLevel:
+    with self._lock:
+      compiled = self._compiled.get(level_hash)
+      if compiled is not None:
+        self._compiled.move_to_end(level_hash)
+        return compiled
+    # 编译（BFS/流场/A*）不持锁，不阻塞其他关卡的 get()；并发编译同一 hash 时保留先落下的结果
+    compiled = compile_level(config)
+    with self._lock:
+      compiled = self._compiled.setdefault(level_hash, compiled)
+      self._compiled.move_to_end(level_hash)
+      if len(self._compiled) > self.compiled_cache_size:
+        self._compiled.popitem(last=False)
+    return compiled
+
+  def _refresh(self, level_id: str) -> LevelRecord:
+    """stat/读取/解析/编译都在锁外进行，只在换入记录时持锁；并发刷新同一关卡时保留先落下的记录。"""
+    path = self._path(level_id)
+    record = self._records.get(level_id)
+    try:
+      stat = path.stat()
+    except FileNotFoundError:
+      with self._lock:
+        self._records.pop(level_id, None)
+        self._checked_at.pop(level_id, None)
+      raise FileNotFoundError(f"Level {level_id} not found") from None
+
+    if record is not None and (record.mtime_ns, record.size) == (stat.st_mtime_ns, stat.st_size):
+      self._checked_at[level_id] = time.monotonic()
+      return record
+
+    data = path.read_bytes()
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    if record is not None and record.digest == digest:
+      # 仅 touch，内容未变：沿用已算好的 hash
+      fresh = replace(record, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+    else:
+      level = parse_level(level_id, data)
+      fresh = LevelRecord(
+        id=level["id"],
+        version=level["version"],
+        hash=level["hash"],
+        config=level["config"],
+        compiled=self._compile(level["hash"], level["config"]),
+        mtime_ns=stat.st_mtime_ns,
+        size=stat.st_size,
+        digest=digest,
+      )
+    with self._lock:
+      current = self._records.get(level_id)
+      if current is not None and current is not record:
+        # 其他线程在此期间已换入记录
+        fresh = current
+      else:
+        self._records[level_id] = fresh
+      self._checked_at[level_id] = time.monotonic()
+    return fresh
+
+
+@lru_cache(maxsize=1)
+def get_level_registry() -> LevelRegistry:
+  settings = get_settings()
+  return LevelRegistry(settings.level_dir, check_interval=settings.level_reload_interval_seconds)
+
+
+def load_level(level_id: str) -> Dict[str, Any]:
+  """读取关卡（走注册表缓存），返回 id/version/hash/config。"""
+  return get_level_registry().get(level_id).as_dict()
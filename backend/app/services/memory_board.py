@@ -0,0 +1,230 @@
+import itertools
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ..schemas import LeaderboardEntry
+
+# 排序键：分数降序、耗时升序，user_id 兜底保证唯一
+SortKey = Tuple[int, int, int]
+
+
+# 榜单版本号取自进程级递增计数：清空/重建的榜单不会复用旧版本（ETag 不会误判未变）
+_versions = itertools.count(1)
+
+
+def sort_key(entry: LeaderboardEntry) -> SortKey:
+  return (-entry.score, entry.time_ms, entry.user_id)
+
+
+class SortedKeys:
+  """
+  分块有序列表（思路同 sortedcontainers.SortedList）：
+  先对各块最大值二分定位块，再在块内 insort；块超过 2*load 时对半分裂，
+  单次插入/删除的搬移量与块大小相关而非总量。
+  名次靠块长度上的树状数组（Fenwick）：块内增删 O(log 块数) 更新，块分裂/删除时标记失效、下次查询 O(块数) 重建。
+  """
+
+  def __init__(self, load: int = 1000):
+    self._load = load
+    self._lists: List[List[SortKey]] = []
+    self._maxes: List[SortKey] = []
+    self._len = 0
+    # 1 基树状数组，None 表示块结构已变、待重建
+    self._tree: Optional[List[int]] = None
+
+  def __len__(self) -> int:
+    return self._len
+
+  def add(self, key: SortKey) -> None:
+    if not self._maxes:
+      self._lists.append([key])
+      self._maxes.append(key)
+      self._len = 1
+      self._tree = None
+      return
+    pos = bisect_left(self._maxes, key)
+    if pos == len(self._maxes):
+      pos -= 1
+      self._lists[pos].append(key)
+      self._maxes[pos] = key
+    else:
+      insort(self._lists[pos], key)
+    self._len += 1
+    self._update(pos, 1)
+    chunk = self._lists[pos]
+    if len(chunk) > 2 * self._load:
+      half = chunk[self._load :]
+      del chunk[self._load :]
+      self._lists.insert(pos + 1, half)
+      self._maxes[pos] = chunk[-1]
+      self._maxes.insert(pos + 1, half[-1])
+      self._tree = None
+
+  def remove(self, key: SortKey) -> None:
+    pos = bisect_left(self._maxes, key)
+    if pos == len(self._maxes):
+      raise KeyError(key)
+    chunk = self._lists[pos]
+    idx = bisect_left(chunk, key)
+    if idx == len(chunk) or chunk[idx] != key:
+      raise KeyError(key)
+    del chunk[idx]
+    self._len -= 1
+    if chunk:
+      self._maxes[pos] = chunk[-1]
+      self._update(pos, -1)
+    else:
+      del self._lists[pos]
+      del self._maxes[pos]
+      self._tree = None
+
+  def _index(self) -> List[int]:
+    if self._tree is None:
+      tree = [0] * (len(self._lists) + 1)
+      for i, chunk in enumerate(self._lists, 1):
+        tree[i] += len(chunk)
+        parent = i + (i & -i)
+        if parent < len(tree):
+          tree[parent] += tree[i]
+      self._tree = tree
+    return self._tree
+
+  def _update(self, pos: int, delta: int) -> None:
+    tree = self._tree
+    if tree is None:
+      return
+    i = pos + 1
+    while i < len(tree):
+      tree[i] += delta
+      i += i & -i
+
+  def _prefix(self, pos: int) -> int:
+    """前 pos 块的总长度。"""
+    tree = self._index()
+    total = 0
+    while pos:
+      total += tree[pos]
+      pos -= pos & -pos
+    return total
+
+  def _locate(self, index: int) -> Tuple[int, int]:
+    """全局 0 基位置 → (块号, 块内偏移)；index 须小于总长度。"""
+    tree = self._index()
+    pos, step = 0, 1 << (len(tree) - 1).bit_length()
+    while step:
+      nxt = pos + step
+      if nxt < len(tree) and tree[nxt] <= index:
+        pos = nxt
+        index -= tree[nxt]
+      step >>= 1
+    return pos, index
+
+  def index(self, key: SortKey) -> int:
+    """key 的 0 基名次（key 必须存在）。"""
+    pos = bisect_left(self._maxes, key)
+    return self._prefix(pos) + bisect_left(self._lists[pos], key)
+
+  def count_le(self, key: SortKey) -> int:
+    """不大于 key 的键数量（key 可不存在），用于游标翻页定位。"""
+    pos = bisect_right(self._maxes, key)
+    if pos == len(self._maxes):
+      return self._len
+    return self._prefix(pos) + bisect_right(self._lists[pos], key)
+
+  def last(self) -> SortKey:
+    return self._lists[-1][-1]
+
+  def islice(self, start: int = 0, stop: Optional[int] = None) -> Iterator[SortKey]:
+    stop = self._len if stop is None else min(stop, self._len)
+    if start >= stop:
+      return
+    remaining = stop - start
+    pos, start = self._locate(start)
+    for chunk in itertools.islice(self._lists, pos, None):
+      for key in chunk[start : start + remaining]:
+        yield key
+        remaining -= 1
+      if remaining <= 0:
+        return
+      start = 0
+
+
+class MemoryBoard:
+  """
+  单个榜单的内存实现：user_id → 条目索引 + 有序键，
+  插入/更新/名次查询 O(log n)，超过 capacity 时淘汰末位。每个榜单一把锁。
+  """
+
+  def __init__(self, capacity: int):
+    self.capacity = capacity
+    self._entries: Dict[int, LeaderboardEntry] = {}
+    self._keys = SortedKeys()
+    self._lock = threading.Lock()
+    # 每次内容变化递增，用作 GET /leaderboard 的 ETag
+    self.version = next(_versions)
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+  def submit(self, entry: LeaderboardEntry) -> Optional[int]:
+    """写入用户成绩（仅保留最好成绩）；返回写入后的名次，未改变或被淘汰返回 None。"""
+    key = sort_key(entry)
+    with self._lock:
+      existing = self._entries.get(entry.user_id)
+      if existing is not None:
+        old_key = sort_key(existing)
+        if key >= old_key:
+          return None
+        self._keys.remove(old_key)
+      elif len(self._entries) >= self.capacity:
+        worst = self._keys.last()
+        if key >= worst:
+          return None
+        self._keys.remove(worst)
+        del self._entries[worst[2]]
+      self._keys.add(key)
+      self._entries[entry.user_id] = entry
+      self.version = next(_versions)
+      return self._keys.index(key)
+
+  def withdraw(self, user_id: int, expected: SortKey, replacement: Optional[LeaderboardEntry]) -> bool:
+    """用户当前条目仍是 expected 时换成 replacement（None 则移除）；否则不动。返回是否变化。"""
+    with self._lock:
+      existing = self._entries.get(user_id)
+      if existing is None or sort_key(existing) != expected:
+        return False
+      self._keys.remove(expected)
+      del self._entries[user_id]
+      if replacement is not None:
+        self._keys.add(sort_key(replacement))
+        self._entries[user_id] = replacement
+      self.version = next(_versions)
+      return True
+
+  def top(self, limit: int, offset: int = 0) -> List[LeaderboardEntry]:
+    with self._lock:
+      return [self._entries[key[2]] for key in self._keys.islice(offset, offset + limit)]
+
+  def after(self, key: SortKey, limit: int) -> Tuple[int, List[LeaderboardEntry]]:
+    """排在 key 之后的 limit 条（key 可已不在榜上）；返回 (起始名次, 条目)。"""
+    with self._lock:
+      start = self._keys.count_le(key)
+      return start, [self._entries[k[2]] for k in self._keys.islice(start, start + limit)]
+
+  def around(self, user_id: int, radius: int) -> Tuple[Optional[int], List[LeaderboardEntry]]:
+    """用户名次及其上下各 radius 条；不在榜上返回 (None, [])。"""
+    with self._lock:
+      entry = self._entries.get(user_id)
+      if entry is None:
+        return None, []
+      rank = self._keys.index(sort_key(entry))
+      start = max(0, rank - radius)
+      return rank, [self._entries[k[2]] for k in self._keys.islice(start, rank + radius + 1)]
+
+  def rank(self, user_id: int) -> Optional[int]:
+    with self._lock:
+      entry = self._entries.get(user_id)
+      if entry is None:
+        return None
+      return self._keys.index(sort_key(entry))
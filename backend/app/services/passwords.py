@@ -0,0 +1,94 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from ..utils.security import get_password_hash, verify_and_update_password
+
+
+class PasswordHasherBusy(Exception):
+  """在途密码任务已达上限：调用方应返回 503 + Retry-After。"""
+
+
+class PasswordHasher:
+  """
+  密码哈希/校验的独立进程池：pbkdf2 在子进程里算，不占请求线程的 GIL。
+  在途任务数（执行中 + 排队）以 max_pending 为上限，超出立即抛 PasswordHasherBusy；
+  workers=0 时在调用线程内执行（测试/单核部署），上限与统计照常生效。
+  """
+
+  def __init__(self, rounds: int, workers: int = 2, max_pending: int = 32):
+    self.rounds = rounds
+    self.workers = workers
+    self.max_pending = max_pending
+    self._executor: Optional[ProcessPoolExecutor] = None
+    if workers > 0:
+      # spawn：应用进程里已有 Redis/写入线程，fork 可能复制到持有中的锁
+      self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    self._lock = threading.Lock()
+    self.in_flight = 0
+    self.peak_in_flight = 0
+    self.completed = 0
+    self.rejected = 0
+
+  def shutdown(self) -> None:
+    if self._executor is not None:
+      self._executor.shutdown(wait=True, cancel_futures=True)
+      self._executor = None
+
+  def stats(self) -> Dict[str, int]:
+    """队列深度等指标：queued 为在途中超出 worker 数、尚未开始执行的部分。"""
+    with self._lock:
+      return {
+        "workers": self.workers,
+        "max_pending": self.max_pending,
+        "in_flight": self.in_flight,
+        "queued": max(0, self.in_flight - max(self.workers, 1)),
+        "peak_in_flight": self.peak_in_flight,
+        "completed": self.completed,
+        "rejected": self.rejected,
+      }
+
+  def _acquire(self) -> None:
+    with self._lock:
+      if self.in_flight >= self.max_pending:
+        self.rejected += 1
+        raise PasswordHasherBusy()
+      self.in_flight += 1
+      self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+  def _release(self, _: Any = None) -> None:
+    with self._lock:
+      self.in_flight -= 1
+      self.completed += 1
+
+  def _submit(self, fn: Callable[..., Any], *args: Any) -> "Future[Any]":
+    self._acquire()
+    if self._executor is None:
+      future: "Future[Any]" = Future()
+      try:
+        future.set_result(fn(*args))
+      except Exception as exc:
+        future.set_exception(exc)
+    else:
+      try:
+        future = self._executor.submit(fn, *args)
+      except Exception:
+        self._release()
+        raise
+    future.add_done_callback(self._release)
+    return future
+
+  def hash(self, password: str) -> str:
+    return self._submit(get_password_hash, password, self.rounds).result()
+
+  def verify(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """返回 (是否匹配, 需升级时的新哈希)。"""
+    return self._submit(verify_and_update_password, password, hashed, self.rounds).result()
+
+  async def hash_async(self, password: str) -> str:
+    return await asyncio.wrap_future(self._submit(get_password_hash, password, self.rounds))
+
+  async def verify_async(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    return await asyncio.wrap_future(self._submit(verify_and_update_password, password, hashed, self.rounds))
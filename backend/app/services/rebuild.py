@@ -0,0 +1,327 @@
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import redis
+from sqlalchemy import and_, or_, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from ..core.config import get_settings
+from ..models import Score, User, UserLevelBest
+from ..schemas import LeaderboardEntry
+from .best_scores import ranked_best, ranked_scores, recompute_best
+from .leaderboard import (
+  BUCKET_GRACE_SECONDS,
+  KEY_PREFIX,
+  PERIOD_SECONDS,
+  SCOPES,
+  Leaderboard,
+  period_bucket,
+  rank_score,
+)
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# 重建写入：与 SUBMIT_SCRIPT 相同的“只保留更好成绩”语义，预热与线上 POST /score 并发时不会用库里的旧行覆盖新成绩。
+# KEYS[1]=ZSET, KEYS[2]=payload 哈希；ARGV: 过期时间戳（0 为不过期），之后每三个为 member, 分值, payload
+# 返回实际写入的条数
+REBUILD_SCRIPT = """
+local written = 0
+for i = 2, #ARGV, 3 do
+  local prev = redis.call('ZSCORE', KEYS[1], ARGV[i])
+  if not prev or tonumber(ARGV[i + 1]) > tonumber(prev) then
+    -- 直接传原始字符串：Lua 数字转字符串只保留 14 位有效数字
+    redis.call('ZADD', KEYS[1], ARGV[i + 1], ARGV[i])
+    redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 2])
+    written = written + 1
+  end
+end
+local expire_at = tonumber(ARGV[1])
+if expire_at > 0 then
+  redis.call('EXPIREAT', KEYS[1], expire_at)
+  redis.call('EXPIREAT', KEYS[2], expire_at)
+end
+return written
+"""
+
+# 流式查询列顺序：(user_id, level_id) 在前，即 user_level_best 主键顺序，也是断点续跑的键
+ROW_COLUMNS = ("user_id", "level_id", "name", "score", "wave", "time_ms", "life_left", "created_at")
+
+
+@dataclass
+class RebuildStats:
+  """单个 scope 的重建统计；dry-run 时 missing/changed/unchanged 为与 Redis 的差异。"""
+
+  scope: str
+  rows: int = 0
+  keys: int = 0
+  missing: int = 0
+  changed: int = 0
+  unchanged: int = 0
+  elapsed: float = 0.0
+  samples: List[str] = field(default_factory=list)
+
+  @property
+  def rows_per_second(self) -> float:
+    return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def period_start(scope: str, now: float) -> Optional[datetime]:
+  """当前周期桶的起点（naive UTC，与 scores.created_at 一致）；总榜返回 None。"""
+  bucket = period_bucket(scope, now)
+  if bucket is None:
+    return None
+  start = bucket[1] - PERIOD_SECONDS[scope] - BUCKET_GRACE_SECONDS
+  return datetime.fromtimestamp(start, tz=timezone.utc).replace(tzinfo=None)
+
+
+def best_rows_query(scope: str, now: float, after: Optional[Tuple[int, str]] = None):
+  """
+  每 (user, level) 最好成绩，按主键 (user_id, level_id) 顺序流出（无需额外排序）：
+  总榜直接读 user_level_best；日/周榜在 scores 上按当前桶起点过滤后取 rn == 1。
+  """
+  since = period_start(scope, now)
+  if since is None:
+    source = UserLevelBest.__table__.c
+    query = select(*(source[name] if name != "name" else User.name for name in ROW_COLUMNS)).join(
+      User, User.id == source.user_id
+    )
+  else:
+    source = ranked_best(ranked_scores(), Score.created_at >= since).c
+    query = (
+      select(*(source[name] if name != "name" else User.name for name in ROW_COLUMNS))
+      .join(User, User.id == source.user_id)
+      .where(source.rn == 1)
+    )
+  if after is not None:
+    user_id, level_id = after
+    query = query.where(or_(source.user_id > user_id, and_(source.user_id == user_id, source.level_id > level_id)))
+  return query.order_by(source.user_id, source.level_id)
+
+
+def withdraw_score(db: Session, leaderboard: Leaderboard, score_id: int) -> None:
+  """
+  撤下被重放拒绝（replay_status 已写为 mismatch/invalid）的成绩：重算该 (user, level) 的 user_level_best，
+  各榜单上若仍是这条成绩，换成该周期内下一条有效的最好成绩（没有则移除）。
+  """
+  score = db.get(Score, score_id)
+  if score is None:
+    return
+  recompute_best(db, score.user_id, score.level_id)
+  db.commit()
+
+  now = leaderboard.clock()
+  replacements: Dict[str, Optional[LeaderboardEntry]] = {}
+  for scope in SCOPES:
+    since = period_start(scope, now)
+    if since is not None and score.created_at < since:
+      # 不在当前周期桶里，该 scope 的现行榜单上不会有它
+      continue
+    conditions = [ranked_scores(), Score.user_id == score.user_id, Score.level_id == score.level_id]
+    if since is not None:
+      conditions.append(Score.created_at >= since)
+    ranked = ranked_best(*conditions)
+    row = db.execute(
+      select(*(ranked.c[name] if name != "name" else User.name for name in ROW_COLUMNS))
+      .join(User, User.id == ranked.c.user_id)
+      .where(ranked.c.rn == 1)
+    ).first()
+    replacements[scope] = (
+      LeaderboardEntry(**{name: getattr(row, name) for name in LeaderboardEntry.model_fields}) if row else None
+    )
+  leaderboard.withdraw(score.level_id, score.user_id, score.score, score.time_ms, replacements)
+
+
+def load_checkpoint(path: Optional[Path]) -> Dict[str, Any]:
+  if path is None or not path.exists():
+    return {}
+  return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_checkpoint(path: Optional[Path], state: Dict[str, Any]) -> None:
+  """先写临时文件再 rename，中途被杀也不会留下半个 JSON。"""
+  if path is None:
+    return
+  tmp = path.with_name(path.name + ".tmp")
+  tmp.write_text(json.dumps(state), encoding="utf-8")
+  os.replace(tmp, path)
+
+
+class LeaderboardRebuilder:
+  """
+  从数据库流式重建 Redis 榜单：服务端游标（stream_results + yield_per）逐批读取，
+  每批按榜单键合并为一个 pipeline（每键一次 REBUILD_SCRIPT，只写比现有更好的成绩），内存占用与批大小相关而非总行数。
+  支持断点续跑（checkpoint 记录每个 scope 最后写入的 (user_id, level_id) 与已写过的键）与 dry-run 差异比对。
+  """
+
+  def __init__(
+    self,
+    engine: Engine,
+    client: redis.Redis,
+    batch_size: int = 5000,
+    checkpoint: Optional[Path] = None,
+    dry_run: bool = False,
+    progress: Optional[Callable[[RebuildStats], None]] = None,
+    stop: Optional[threading.Event] = None,
+    clock: Callable[[], float] = time.time,
+  ):
+    self.engine = engine
+    self.client = client
+    self.batch_size = batch_size
+    self.checkpoint = checkpoint
+    self.dry_run = dry_run
+    self.progress = progress
+    self.stop = stop
+    self.leaderboard = Leaderboard(client, clock=clock)
+    self.clock = clock
+    self._rebuild_script = client.register_script(REBUILD_SCRIPT)
+
+  def run(self, scopes: Sequence[str] = SCOPES) -> Dict[str, RebuildStats]:
+    now = self.clock()
+    state = load_checkpoint(self.checkpoint)
+    results: Dict[str, RebuildStats] = {}
+    for scope in scopes:
+      scope_state = state.get(scope, {})
+      if scope_state.get("done"):
+        logger.info("leaderboard rebuild: scope %s already done, skipping", scope)
+        continue
+      after = tuple(scope_state["after"]) if "after" in scope_state else None
+      results[scope] = self._run_scope(scope, now, after, state)
+      if self.stop is not None and self.stop.is_set():
+        break
+    return results
+
+  def _run_scope(self, scope: str, now: float, after: Optional[tuple], state: Dict[str, Any]) -> RebuildStats:
+    stats = RebuildStats(scope=scope)
+    bucket = period_bucket(scope, now)
+    expire_at = bucket[1] if bucket else 0
+    # 写过的 level → key（含被中断的上一轮，从 checkpoint 恢复），全部写完后统一截断并通知
+    touched: Dict[str, str] = dict(state.get(scope, {}).get("touched", {}))
+    start = time.perf_counter()
+    with self.engine.connect() as conn:
+      result = conn.execution_options(stream_results=True, yield_per=self.batch_size).execute(
+        best_rows_query(scope, now, after)
+      )
+      for rows in result.partitions():
+        groups: Dict[str, List[Any]] = {}
+        for row in rows:
+          groups.setdefault(row.level_id, []).append(row)
+        for level_id in groups:
+          touched.setdefault(level_id, self.leaderboard._key(level_id, scope, now))
+        if self.dry_run:
+          self._diff(touched, groups, stats)
+        else:
+          self._write(touched, groups, expire_at)
+        stats.rows += len(rows)
+        stats.keys = len(touched)
+        last = rows[-1]
+        state[scope] = {"after": [last.user_id, last.level_id], "touched": touched}
+        if not self.dry_run:
+          save_checkpoint(self.checkpoint, state)
+        stats.elapsed = time.perf_counter() - start
+        if self.progress:
+          self.progress(stats)
+        if self.stop is not None and self.stop.is_set():
+          return stats
+    if not self.dry_run:
+      for level_id, key in touched.items():
+        self._finish_key(key, level_id, scope, expire_at)
+      state[scope] = {"done": True}
+      save_checkpoint(self.checkpoint, state)
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+  def _write(self, keys: Dict[str, str], groups: Dict[str, List[Any]], expire_at: int) -> None:
+    """一批一个 pipeline：每个关卡一次 REBUILD_SCRIPT（逐条与现有分值比较，只写更好的）。"""
+    pipe = self.client.pipeline(transaction=False)
+    for level_id, rows in groups.items():
+      key = keys[level_id]
+      args: List[Any] = [expire_at]
+      for row in rows:
+        args += (str(row.user_id), str(rank_score(row.score, row.time_ms)), _payload(row))
+      self._rebuild_script(keys=[key, f"{key}:payloads"], args=args, client=pipe)
+    pipe.execute()
+
+  def _diff(self, keys: Dict[str, str], groups: Dict[str, List[Any]], stats: RebuildStats) -> None:
+    pipe = self.client.pipeline(transaction=False)
+    for level_id, rows in groups.items():
+      pipe.zmscore(keys[level_id], [str(row.user_id) for row in rows])
+    for (level_id, rows), current in zip(groups.items(), pipe.execute()):
+      for row, value in zip(rows, current):
+        expected = rank_score(row.score, row.time_ms)
+        if value is None:
+          stats.missing += 1
+          label = "missing"
+        elif int(value) != expected:
+          stats.changed += 1
+          label = f"redis={int(value)}"
+        else:
+          stats.unchanged += 1
+          continue
+        if len(stats.samples) < 20:
+          stats.samples.append(f"{keys[level_id]} user={row.user_id} db={expected} {label}")
+
+  def _finish_key(self, key: str, level_id: str, scope: str, expire_at: int) -> None:
+    """键写完后按容量截断（ZSET 与 payload 同步）、递增榜单版本（使 ETag 失效），并通知推送端刷新。"""
+    overflow = self.client.zcard(key) - settings.leaderboard_capacity
+    if overflow > 0:
+      evicted = self.client.zrange(key, 0, overflow - 1)
+      pipe = self.client.pipeline(transaction=False)
+      pipe.zremrangebyrank(key, 0, overflow - 1)
+      for i in range(0, len(evicted), 1000):
+        pipe.hdel(f"{key}:payloads", *evicted[i : i + 1000])
+      pipe.execute()
+    pipe = self.client.pipeline(transaction=False)
+    pipe.set(f"{key}:version", int(self.clock() * 1000), nx=True)
+    pipe.incr(f"{key}:version")
+    if expire_at:
+      pipe.expireat(f"{key}:version", expire_at)
+    pipe.publish(self.leaderboard._channel(level_id, scope), json.dumps({"type": "update"}))
+    pipe.execute()
+
+
+def _payload(row: Any) -> str:
+  # 与 LeaderboardEntry.model_dump(mode="json") 同构，省去逐行构造模型
+  return json.dumps(
+    {
+      "user_id": row.user_id,
+      "name": row.name,
+      "score": row.score,
+      "wave": row.wave,
+      "time_ms": row.time_ms,
+      "life_left": row.life_left,
+      "created_at": row.created_at.isoformat() if row.created_at else None,
+    }
+  )
+
+
+def leaderboards_missing(client: redis.Redis) -> bool:
+  """Redis 中没有任何榜单键（被 flush / 重启且未持久化）。"""
+  return next(client.scan_iter(match=f"{KEY_PREFIX}*", count=1000), None) is None
+
+
+def warm_up(engine: Engine, client: redis.Redis, stop: Optional[threading.Event] = None) -> None:
+  """启动钩子：榜单键缺失时在后台线程重建；失败只记日志，不影响服务启动。"""
+  try:
+    if not leaderboards_missing(client):
+      return
+    logger.info("leaderboard keys missing; rebuilding from database")
+    results = LeaderboardRebuilder(engine, client, stop=stop).run()
+    for stats in results.values():
+      logger.info(
+        "leaderboard warm-up %s: %d rows, %d keys, %.0f rows/s",
+        stats.scope,
+        stats.rows,
+        stats.keys,
+        stats.rows_per_second,
+      )
+  except Exception:
+    logger.exception("leaderboard warm-up failed")
@@ -0,0 +1,190 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from ..core import metrics
+from ..models import Score
+from ..utils.hash import fnv1a_hash, stable_dumps
+from .best_scores import REJECTED_STATUSES
+from .leaderboard import Leaderboard
+from .rebuild import withdraw_score
+from .replay_format import read_replay
+from .simulation import Cell, ReplayInvalid, simulate
+
+logger = logging.getLogger(__name__)
+
+# scores.replay_status：pending 已入队；verified/mismatch/invalid 为重放结论；skipped 因队列满未校验
+PENDING = "pending"
+VERIFIED = "verified"
+MISMATCH = "mismatch"
+INVALID = "invalid"
+SKIPPED = "skipped"
+
+
+def replay_digest(replay: Dict[str, Any]) -> str:
+  """操作日志摘要：稳定序列化后 FNV-1a，与签名中的 ops_digest 对比。"""
+  return fnv1a_hash(stable_dumps(replay))
+
+
+def verify_replay(
+  config: Dict[str, Any],
+  replay: Dict[str, Any],
+  claim: Dict[str, int],
+  max_ticks: int,
+  base_path: Optional[Sequence[Cell]] = None,
+  op_waves: Optional[List[int]] = None,
+) -> str:
+  """
+  子进程内执行：重放操作日志并与声明的成绩比对。
+  游戏须恰好在最后一帧结束（声明的局面就是重放的终局），score/wave/life_left 完全一致，
+  time_ms 不少于帧数对应的时长。
+  """
+  try:
+    outcome = simulate(config, replay, max_ticks, base_path, op_waves)
+  except ReplayInvalid:
+    return INVALID
+  if not outcome.game_over or outcome.ticks != replay["ticks"]:
+    return MISMATCH
+  if (outcome.score, outcome.wave, outcome.life_left) != (claim["score"], claim["wave"], claim["life_left"]):
+    return MISMATCH
+  if claim["time_ms"] < outcome.ticks * 1000 // 60:
+    return MISMATCH
+  return VERIFIED
+
+
+def verify_stored_replay(
+  config: Dict[str, Any],
+  path: str,
+  claim: Dict[str, int],
+  max_ticks: int,
+  base_path: Optional[Sequence[Cell]] = None,
+) -> str:
+  """子进程内执行：解码落盘的二进制日志后同 verify_replay；各块标注的波次也须与重放一致（按波次下载依赖它）。"""
+  try:
+    replay, waves = read_replay(path)
+  except (OSError, ReplayInvalid):
+    return INVALID
+  op_waves: List[int] = []
+  status = verify_replay(config, replay, claim, max_ticks, base_path, op_waves)
+  if status == VERIFIED and op_waves != waves:
+    return MISMATCH
+  return status
+
+
+class ReplayVerifier:
+  """
+  成绩重放校验的独立进程池：提交成绩 commit 后入队，不阻塞响应；结论由完成回调写回 scores.replay_status。
+  传入 leaderboard（TD_REPLAY_MODE=enforce）时，结论为 mismatch/invalid 的成绩重算该用户的最好成绩并从各榜单撤下
+  （见 rebuild.withdraw_score）；否则结论只写回，不影响榜单。
+  在途任务（执行 + 排队）超过 max_pending 时不再入队，该成绩记为 skipped；
+  workers=0 时在调用线程内执行（测试/单核部署）。
+  """
+
+  def __init__(
+    self,
+    session_factory: Callable[[], Session],
+    workers: int = 1,
+    max_pending: int = 256,
+    max_ticks: int = 60 * 60 * 60,
+    leaderboard: Optional[Leaderboard] = None,
+  ):
+    self.session_factory = session_factory
+    self.leaderboard = leaderboard
+    self.workers = workers
+    self.max_pending = max_pending
+    self.max_ticks = max_ticks
+    self._executor: Optional[ProcessPoolExecutor] = None
+    if workers > 0:
+      # spawn：与密码哈希进程池同理，避免 fork 复制持有中的锁
+      self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    self._lock = threading.Lock()
+    self.in_flight = 0
+    self.completed = 0
+    self.skipped = 0
+
+  def shutdown(self) -> None:
+    """等在途校验完成再退出：结论已在 pending 状态落库，中途取消会留下永远 pending 的行。"""
+    if self._executor is not None:
+      self._executor.shutdown(wait=True)
+      self._executor = None
+
+  def stats(self) -> Dict[str, int]:
+    with self._lock:
+      return {
+        "workers": self.workers,
+        "max_pending": self.max_pending,
+        "in_flight": self.in_flight,
+        "queued": max(0, self.in_flight - max(self.workers, 1)),
+        "completed": self.completed,
+        "skipped": self.skipped,
+      }
+
+  def submit(
+    self,
+    score_id: int,
+    config: Dict[str, Any],
+    replay: Union[Dict[str, Any], str],
+    claim: Dict[str, int],
+    base_path: Optional[Sequence[Cell]] = None,
+  ) -> Optional["Future[str]"]:
+    """
+    为已落库（replay_status=pending）的成绩排队校验；队列满时直接记为 skipped 并返回 None。
+    replay 为 JSON 日志，或已落盘二进制日志的路径（子进程自己读文件，不经进程间传递）。
+    base_path 为关卡编译预算的基础路径，子进程开局不再寻路。
+    """
+    verify = verify_replay if isinstance(replay, dict) else verify_stored_replay
+    with self._lock:
+      full = self.in_flight >= self.max_pending
+      if full:
+        self.skipped += 1
+      else:
+        self.in_flight += 1
+    if full:
+      self._record(score_id, SKIPPED)
+      return None
+    if self._executor is None:
+      future: "Future[str]" = Future()
+      try:
+        future.set_result(verify(config, replay, claim, self.max_ticks, base_path))
+      except Exception as exc:
+        future.set_exception(exc)
+    else:
+      try:
+        future = self._executor.submit(verify, config, replay, claim, self.max_ticks, base_path)
+      except Exception:
+        with self._lock:
+          self.in_flight -= 1
+        raise
+    future.add_done_callback(lambda done: self._finish(score_id, done))
+    return future
+
+  def _finish(self, score_id: int, future: "Future[str]") -> None:
+    with self._lock:
+      self.in_flight -= 1
+      self.completed += 1
+    if future.cancelled():
+      return
+    exc = future.exception()
+    if exc is not None:
+      # 模拟器自身异常（非日志问题）：保持 pending，便于排查后重跑
+      logger.error("replay verification failed for score %s", score_id, exc_info=exc)
+      return
+    self._record(score_id, future.result())
+
+  def _record(self, score_id: int, status: str) -> None:
+    metrics.replay_verifications.inc(status)
+    db = self.session_factory()
+    try:
+      db.execute(update(Score).where(Score.id == score_id).values(replay_status=status))
+      db.commit()
+      if status in REJECTED_STATUSES and self.leaderboard is not None:
+        withdraw_score(db, self.leaderboard, score_id)
+    except Exception:
+      logger.exception("failed to record replay status for score %s", score_id)
+    finally:
+      db.close()
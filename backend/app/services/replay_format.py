@@ -0,0 +1,365 @@
+"""
+二进制操作日志（.tdr，版本 1）：与 JSON 日志（BACKEND_API.md「Replay」）逐条对应，解码后重新序列化即得相同的 ops_digest。
+
+布局（小端）：
+  HEADER  magic "TDRP" | version u8 | 塔类型数 u8 | 保留 u16 | seed u32，随后每个塔类型为 u8 长度 + ASCII 名称
+  块 × N  "C" | wave u16 | base_tick u32 | records u32 | size u32，随后 size 字节 zlib 压缩的 records 条定长记录
+  索引    "X" | 每块 wave u16 | base_tick u32 | records u32 | offset u64（该块 "C" 的文件偏移）
+  FOOTER  ticks u32 | 块数 u32 | 索引偏移 u64 | magic "TDRE"
+记录 8 字节：delta u16（相对块内上一条，首条为 0，即 tick == base_tick）| op u8 | kind u8（build 的塔类型下标，其余为 0）
+| x u16 | y u16（skip 为 0）。
+
+每块只含同一波（操作执行时的 Outcome.wave）的操作，单独解压即可解码；同一波超过 CHUNK_RECORDS 条、或相邻两条间隔
+超过 u16 时另起一块。索引在尾部：写入方可以边录边写，读取方按波次只取需要的块。
+"""
+
+import io
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..utils.hash import Fnv1a, stable_dumps
+from .simulation import ReplayInvalid
+
+MAGIC = b"TDRP"
+END_MAGIC = b"TDRE"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHI")
+CHUNK = struct.Struct("<cHIII")
+INDEX = struct.Struct("<HIIQ")
+FOOTER = struct.Struct("<IIQ4s")
+RECORD = np.dtype([("delta", "<u2"), ("op", "u1"), ("kind", "u1"), ("x", "<u2"), ("y", "<u2")])
+# op 编码为下标 + 1；0 保留
+OPS = ("build", "upgrade", "sell", "skip")
+BUILD, SKIP = 1, 4
+U16 = 0xFFFF
+U32 = 0xFFFFFFFF
+CHUNK_RECORDS = 4096
+MAX_CHUNK_RECORDS = U16
+# 单块压缩数据上限：不可压缩时 zlib 略大于原始记录
+MAX_CHUNK_BYTES = MAX_CHUNK_RECORDS * RECORD.itemsize + 1024
+
+
+class ReplayFormatError(ReplayInvalid):
+  """二进制日志结构错误，或 JSON 日志含无法编码的操作。"""
+
+
+class ChunkRef(NamedTuple):
+  wave: int
+  base_tick: int
+  records: int
+  # 块头 "C" 的文件偏移；size 为压缩数据字节数
+  offset: int
+  size: int
+
+  @property
+  def end(self) -> int:
+    return self.offset + CHUNK.size + self.size
+
+
+@dataclass(frozen=True)
+class ReplaySummary:
+  """上传流校验通过后的概要；digest 为对应 JSON 日志的 ops_digest。"""
+
+  digest: str
+  seed: int
+  ticks: int
+  ops: int
+  chunks: int
+  first_wave: Optional[int]
+  last_wave: Optional[int]
+
+
+def _header(seed: int, kinds: Sequence[str]) -> bytes:
+  if len(kinds) > 255:
+    raise ReplayFormatError("at most 255 tower types")
+  names = [kind.encode("ascii") for kind in kinds]
+  if not all(0 < len(name) <= 255 for name in names):
+    raise ReplayFormatError("tower type names must be 1..255 ASCII bytes")
+  return HEADER.pack(MAGIC, VERSION, len(names), 0, seed) + b"".join(bytes((len(n),)) + n for n in names)
+
+
+def _tail(chunks: Sequence[ChunkRef], ticks: int, index_offset: int) -> bytes:
+  return b"".join(
+    (
+      b"X",
+      *(INDEX.pack(c.wave, c.base_tick, c.records, c.offset) for c in chunks),
+      FOOTER.pack(ticks, len(chunks), index_offset, END_MAGIC),
+    )
+  )
+
+
+def _is_uint(value: Any, limit: int) -> bool:
+  return type(value) is int and 0 <= value <= limit
+
+
+class ReplayWriter:
+  """边录边写：按操作执行顺序 add(wave, op)，close(ticks) 写出最后一块与尾部索引。"""
+
+  def __init__(self, out: BinaryIO, seed: int, kinds: Sequence[str], level: int = 6):
+    self.out = out
+    self.level = level
+    self.kinds = tuple(kinds)
+    self._kind_index = {kind: i for i, kind in enumerate(self.kinds)}
+    self.offset = 0
+    self._write(_header(seed, self.kinds))
+    self._chunks: List[ChunkRef] = []
+    self._rows: List[Tuple[int, int, int, int, int]] = []
+    self._wave = 0
+    self._base = 0
+    self._last = -1
+
+  def _write(self, data: bytes) -> None:
+    self.out.write(data)
+    self.offset += len(data)
+
+  def _record(self, op: Sequence[Any]) -> Tuple[int, int, int, int, int]:
+    """只接受能原样解码回来的操作，否则解码后的 JSON 与原日志摘要不同。"""
+    if isinstance(op, (list, tuple)) and len(op) >= 2 and _is_uint(op[0], U32) and op[1] in OPS:
+      code = OPS.index(op[1]) + 1
+      if code == SKIP and len(op) == 2:
+        return op[0], code, 0, 0, 0
+      if len(op) == (5 if code == BUILD else 4) and _is_uint(op[2], U16) and _is_uint(op[3], U16):
+        if code != BUILD:
+          return op[0], code, 0, op[2], op[3]
+        if op[4] in self._kind_index:
+          return op[0], code, self._kind_index[op[4]], op[2], op[3]
+    raise ReplayFormatError(f"op cannot be encoded: {op!r}")
+
+  def add(self, wave: int, op: Sequence[Any]) -> None:
+    tick, code, kind, x, y = self._record(op)
+    if not _is_uint(wave, U16):
+      raise ReplayFormatError(f"bad wave {wave!r}")
+    if tick < self._last or (self._rows and wave < self._wave):
+      raise ReplayFormatError("ops must be ordered by tick and wave")
+    if self._rows and (wave != self._wave or len(self._rows) >= CHUNK_RECORDS or tick - self._last > U16):
+      self._flush()
+    if not self._rows:
+      self._wave, self._base, self._last = wave, tick, tick
+    self._rows.append((tick - self._last, code, kind, x, y))
+    self._last = tick
+
+  def _flush(self) -> None:
+    payload = zlib.compress(np.array(self._rows, dtype=RECORD).tobytes(), self.level)
+    chunk = ChunkRef(self._wave, self._base, len(self._rows), self.offset, len(payload))
+    self._write(CHUNK.pack(b"C", chunk.wave, chunk.base_tick, chunk.records, chunk.size))
+    self._write(payload)
+    self._chunks.append(chunk)
+    self._rows = []
+
+  def close(self, ticks: int) -> None:
+    if self._rows:
+      self._flush()
+    if not _is_uint(ticks, U32) or ticks <= self._last:
+      raise ReplayFormatError("ticks must be past the last op")
+    self._write(_tail(self._chunks, ticks, self.offset))
+
+
+def encode_replay(replay: Dict[str, Any], waves: Sequence[int], kinds: Optional[Sequence[str]] = None) -> bytes:
+  """JSON 日志 → 二进制；waves 为每条操作执行时的波次（simulate(..., op_waves=) 的结果），kinds 默认取日志中出现的塔类型。"""
+  ops = replay["ops"]
+  if len(waves) != len(ops):
+    raise ReplayFormatError("need one wave per op")
+  if kinds is None:
+    kinds = sorted({op[4] for op in ops if len(op) == 5 and op[1] == "build" and isinstance(op[4], str)})
+  out = io.BytesIO()
+  writer = ReplayWriter(out, replay["seed"], kinds)
+  for wave, op in zip(waves, ops):
+    writer.add(wave, op)
+  writer.close(replay["ticks"])
+  return out.getvalue()
+
+
+def decode_chunk(kinds: Sequence[str], base_tick: int, records: int, payload: bytes) -> List[List[Any]]:
+  """解压并解码一块；解压输出超过 records 条记录即报错，不会被压缩炸弹撑大。"""
+  size = records * RECORD.itemsize
+  inflate = zlib.decompressobj()
+  try:
+    raw = inflate.decompress(payload, size + 1)
+  except zlib.error as exc:
+    raise ReplayFormatError(f"corrupt chunk: {exc}") from None
+  if len(raw) != size or not inflate.eof or inflate.unused_data:
+    raise ReplayFormatError("chunk size does not match its record count")
+  rows = np.frombuffer(raw, dtype=RECORD)
+  codes, kind = rows["op"], rows["kind"]
+  build, skip = codes == BUILD, codes == SKIP
+  if (
+    not len(rows)
+    or rows["delta"][0]
+    or ((codes < 1) | (codes > len(OPS))).any()
+    or (kind[build] >= len(kinds)).any()
+    or kind[~build].any()
+    or rows["x"][skip].any()
+    or rows["y"][skip].any()
+  ):
+    raise ReplayFormatError("bad record in chunk")
+  ticks = (base_tick + np.cumsum(rows["delta"], dtype=np.int64)).tolist()
+  ops: List[List[Any]] = []
+  for tick, code, k, x, y in zip(ticks, codes.tolist(), kind.tolist(), rows["x"].tolist(), rows["y"].tolist()):
+    if code == BUILD:
+      ops.append([tick, "build", x, y, kinds[k]])
+    elif code == SKIP:
+      ops.append([tick, "skip"])
+    else:
+      ops.append([tick, OPS[code - 1], x, y])
+  return ops
+
+
+class ReplayParser:
+  """
+  增量校验上传流：feed() 接收任意切分的字节，按块解压校验并累计 JSON 等价摘要，内存只保留当前一块；
+  finish() 确认尾部索引与实际的块一致并返回概要。结构错误抛 ReplayFormatError。
+  """
+
+  def __init__(self, max_ops: int):
+    self.max_ops = max_ops
+    self._buffer = bytearray()
+    self._steps = self._parse()
+    self._need: Optional[int] = next(self._steps)
+    self._summary: Optional[ReplaySummary] = None
+
+  def feed(self, data: bytes) -> None:
+    self._buffer += data
+    while self._need is not None and len(self._buffer) >= self._need:
+      piece = bytes(self._buffer[: self._need])
+      del self._buffer[: self._need]
+      try:
+        self._need = self._steps.send(piece)
+      except StopIteration as done:
+        self._need, self._summary = None, done.value
+    if self._need is None and self._buffer:
+      raise ReplayFormatError("trailing bytes after footer")
+
+  def finish(self) -> ReplaySummary:
+    if self._summary is None:
+      raise ReplayFormatError("truncated replay")
+    return self._summary
+
+  def _parse(self):
+    """生成器：yield 需要的字节数，send 回恰好这么多字节。"""
+    magic, version, kind_count, _, seed = HEADER.unpack((yield HEADER.size))
+    if magic != MAGIC:
+      raise ReplayFormatError("not a replay file")
+    if version != VERSION:
+      raise ReplayFormatError(f"unsupported replay version {version}")
+    offset = HEADER.size
+    kinds = []
+    for _ in range(kind_count):
+      length = (yield 1)[0]
+      if not length:
+        raise ReplayFormatError("empty tower type name")
+      name = yield length
+      if not name.isascii():
+        raise ReplayFormatError("tower type names must be ASCII")
+      kinds.append(name.decode("ascii"))
+      offset += 1 + length
+
+    digest = Fnv1a()
+    digest.update(b'{"ops":[')
+    chunks: List[ChunkRef] = []
+    total, last_tick = 0, -1
+    while True:
+      tag = yield 1
+      if tag == b"X":
+        break
+      if tag != b"C":
+        raise ReplayFormatError("expected a chunk or the index")
+      _, wave, base_tick, records, size = CHUNK.unpack(tag + (yield CHUNK.size - 1))
+      total += records
+      if not 0 < records <= MAX_CHUNK_RECORDS or size > MAX_CHUNK_BYTES or total > self.max_ops:
+        raise ReplayFormatError("chunk too large")
+      if base_tick < last_tick or (chunks and wave < chunks[-1].wave):
+        raise ReplayFormatError("chunks must be ordered by tick and wave")
+      ops = decode_chunk(kinds, base_tick, records, (yield size))
+      digest.update((("," if chunks else "") + stable_dumps(ops)[1:-1]).encode("ascii"))
+      chunks.append(ChunkRef(wave, base_tick, records, offset, size))
+      offset += CHUNK.size + size
+      last_tick = ops[-1][0]
+
+    tail = yield len(chunks) * INDEX.size + FOOTER.size
+    if tail != _tail(chunks, FOOTER.unpack_from(tail, len(chunks) * INDEX.size)[0], offset)[1:]:
+      raise ReplayFormatError("index or footer does not match the chunks")
+    ticks = FOOTER.unpack_from(tail, len(chunks) * INDEX.size)[0]
+    if ticks <= last_tick or ticks == 0:
+      raise ReplayFormatError("ticks must be past the last op")
+    digest.update(f'],"seed":{seed},"ticks":{ticks}}}'.encode("ascii"))
+    return ReplaySummary(
+      digest=digest.hexdigest(),
+      seed=seed,
+      ticks=ticks,
+      ops=total,
+      chunks=len(chunks),
+      first_wave=chunks[0].wave if chunks else None,
+      last_wave=chunks[-1].wave if chunks else None,
+    )
+
+
+class ReplayReader:
+  """已落盘日志的随机读取：读头部与尾部索引，按块解码或按波次切出仍可独立解码的子日志。"""
+
+  def __init__(self, f: BinaryIO):
+    self.f = f
+    f.seek(0)
+    magic, version, kind_count, _, self.seed = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+      raise ReplayFormatError("not a version 1 replay file")
+    kinds = []
+    for _ in range(kind_count):
+      kinds.append(f.read(f.read(1)[0]).decode("ascii"))
+    self.kinds: Tuple[str, ...] = tuple(kinds)
+    self.header_size = f.tell()
+    f.seek(-FOOTER.size, io.SEEK_END)
+    self.ticks, count, index_offset, end = FOOTER.unpack(f.read(FOOTER.size))
+    if end != END_MAGIC:
+      raise ReplayFormatError("missing footer")
+    f.seek(index_offset)
+    index = f.read(1 + count * INDEX.size)
+    entries = [INDEX.unpack_from(index, 1 + i * INDEX.size) for i in range(count)]
+    ends = [offset for *_, offset in entries[1:]] + [index_offset]
+    self.chunks: List[ChunkRef] = [
+      ChunkRef(wave, base, records, offset, stop - offset - CHUNK.size)
+      for (wave, base, records, offset), stop in zip(entries, ends)
+    ]
+
+  @property
+  def last_wave(self) -> Optional[int]:
+    return self.chunks[-1].wave if self.chunks else None
+
+  def ops(self, chunk: ChunkRef) -> List[List[Any]]:
+    self.f.seek(chunk.offset + CHUNK.size)
+    return decode_chunk(self.kinds, chunk.base_tick, chunk.records, self.f.read(chunk.size))
+
+  def read(self) -> Tuple[Dict[str, Any], List[int]]:
+    """整份解码：(JSON 日志, 每条操作的波次)。"""
+    ops: List[List[Any]] = []
+    waves: List[int] = []
+    for chunk in self.chunks:
+      ops.extend(self.ops(chunk))
+      waves.extend([chunk.wave] * chunk.records)
+    return {"seed": self.seed, "ticks": self.ticks, "ops": ops}, waves
+
+  def select(self, first: int, last: int) -> List[ChunkRef]:
+    return [chunk for chunk in self.chunks if first <= chunk.wave <= last]
+
+  def slice_size(self, chunks: Sequence[ChunkRef]) -> int:
+    return self.header_size + sum(CHUNK.size + c.size for c in chunks) + 1 + len(chunks) * INDEX.size + FOOTER.size
+
+  def slice(self, chunks: Sequence[ChunkRef]) -> Iterator[bytes]:
+    """只含给定块的日志：块原样拷贝（不解压），按新位置重写索引；seed/ticks 不变。"""
+    self.f.seek(0)
+    yield self.f.read(self.header_size)
+    offset, moved = self.header_size, []
+    for chunk in chunks:
+      self.f.seek(chunk.offset)
+      yield self.f.read(chunk.end - chunk.offset)
+      moved.append(chunk._replace(offset=offset))
+      offset += CHUNK.size + chunk.size
+    yield _tail(moved, self.ticks, offset)
+
+
+def read_replay(path: str) -> Tuple[Dict[str, Any], List[int]]:
+  with open(path, "rb") as f:
+    return ReplayReader(f).read()
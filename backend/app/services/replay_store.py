@@ -0,0 +1,71 @@
+import os
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+from .replay_format import ReplayParser, ReplaySummary
+
+
+class ReplayExists(Exception):
+  """该成绩已有落盘的日志（日志落盘后不再修改）。"""
+
+
+class ReplayUpload:
+  """一次上传：字节边校验边写入同目录的临时文件，commit() 时原子落位，失败调用 discard()。"""
+
+  def __init__(self, path: Path, max_ops: int):
+    self.path = path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".part")
+    self.tmp = Path(tmp)
+    self._file: Optional[BinaryIO] = os.fdopen(fd, "wb")
+    self.parser = ReplayParser(max_ops)
+    self.size = 0
+
+  def feed(self, data: bytes) -> None:
+    self.parser.feed(data)
+    self._file.write(data)
+    self.size += len(data)
+
+  def finish(self) -> ReplaySummary:
+    summary = self.parser.finish()
+    self._file.flush()
+    os.fsync(self._file.fileno())
+    self._file.close()
+    self._file = None
+    return summary
+
+  def commit(self) -> None:
+    """硬链接到正式路径：已存在时不覆盖（并发重复上传只有一个成功）。"""
+    try:
+      os.link(self.tmp, self.path)
+    except FileExistsError:
+      raise ReplayExists(self.path.name) from None
+    finally:
+      self.discard()
+
+  def discard(self) -> None:
+    if self._file is not None:
+      self._file.close()
+      self._file = None
+    self.tmp.unlink(missing_ok=True)
+
+
+class ReplayStore:
+  """
+  成绩的二进制操作日志（格式见 replay_format）按成绩 id 存在文件系统：{root}/{id % 256:02x}/{id}.tdr。
+  不进数据库：上传可以边收边写、下载可以按块 seek，scores 表也不随日志膨胀。
+  """
+
+  def __init__(self, root: Path, max_ops: int):
+    self.root = Path(root)
+    self.max_ops = max_ops
+
+  def path(self, score_id: int) -> Path:
+    return self.root / f"{score_id % 256:02x}" / f"{score_id}.tdr"
+
+  def exists(self, score_id: int) -> bool:
+    return self.path(score_id).is_file()
+
+  def begin(self, score_id: int) -> ReplayUpload:
+    return ReplayUpload(self.path(score_id), self.max_ops)
@@ -0,0 +1,148 @@
+import gzip
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Hashable, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from ..core.config import get_settings
+
+try:
+  import brotli
+except ImportError:  # 可选依赖：pip install -e '.[compression]'
+  brotli = None
+
+# 太小的响应压缩收益抵不过头部与 CPU 开销
+COMPRESS_MIN_BYTES = 256
+# 每次都需带 If-None-Match 回源校验；内容未变时只回 304
+CACHE_CONTROL = "no-cache"
+# 预压缩的内容编码；各编码的表示是不同的字节序列，需各自的强校验器
+CODINGS = ("br", "gzip")
+
+
+def coded_etag(etag: str, coding: Optional[str]) -> str:
+  """某一内容编码的强 ETag："v" → "v-gzip"；identity（coding 为 None）原样返回。"""
+  return etag if coding is None else f'{etag[:-1]}-{coding}"'
+
+
+@dataclass(frozen=True)
+class CachedBody:
+  """某一版本的序列化结果及其预压缩变体（按版本只算一次）；etag 为 identity 表示的校验器。"""
+
+  etag: str
+  body: bytes
+  gzip: Optional[bytes] = None
+  br: Optional[bytes] = None
+
+
+def precompress(etag: str, body: bytes) -> CachedBody:
+  if len(body) < COMPRESS_MIN_BYTES:
+    return CachedBody(etag, body)
+  return CachedBody(
+    etag,
+    body,
+    gzip=gzip.compress(body, compresslevel=6, mtime=0),
+    br=brotli.compress(body, quality=5) if brotli is not None else None,
+  )
+
+
+class ResponseCache:
+  """按 (资源, 参数, 版本) 缓存 CachedBody 的有界 LRU；版本变化后旧条目自然被淘汰。"""
+
+  def __init__(self, max_entries: int):
+    self.max_entries = max_entries
+    self._entries: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  def get_or_build(
+    self, key: Hashable, etag: str, build: Callable[[], bytes], valid: Optional[Callable[[], bool]] = None
+  ) -> CachedBody:
+    """
+    未命中时构建并缓存。valid：构建后复核版本（版本与内容不是原子读取时），返回 False 则本次结果不入缓存，
+    避免把新内容存在旧版本的键下。
+    """
+    with self._lock:
+      cached = self._entries.get(key)
+      if cached is not None:
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return cached
+      self.misses += 1
+    # 序列化/压缩在锁外进行；并发未命中时重复构建一次无妨
+    cached = precompress(etag, build())
+    if valid is not None and not valid():
+      return cached
+    with self._lock:
+      self._entries[key] = cached
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+    return cached
+
+  def clear(self) -> None:
+    with self._lock:
+      self._entries.clear()
+
+
+@lru_cache(maxsize=1)
+def get_response_cache() -> ResponseCache:
+  return ResponseCache(get_settings().response_cache_size)
+
+
+def matching_etag(if_none_match: Optional[str], etag: str) -> Optional[str]:
+  """
+  If-None-Match 比较（弱比较，忽略 W/ 前缀）：返回命中的当前版本校验器（identity 或某一编码的变体），未命中为 None；
+  支持逗号分隔的多个值与 `*`（视为 identity）。
+  """
+  if not if_none_match:
+    return None
+  variants = {coded_etag(etag, coding) for coding in (None, *CODINGS)}
+  for candidate in if_none_match.split(","):
+    value = candidate.strip()
+    if value == "*":
+      return etag
+    value = value.removeprefix("W/")
+    if value in variants:
+      return value
+  return None
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+  return matching_etag(if_none_match, etag) is not None
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+  """客户端已持有当前版本（任一编码）时返回 304，ETag 为其所持表示的校验器；否则 None。"""
+  matched = matching_etag(request.headers.get("if-none-match"), etag)
+  if matched is not None:
+    return Response(
+      status_code=304, headers={"ETag": matched, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    )
+  return None
+
+
+def _accepts(accept_encoding: str, coding: str) -> bool:
+  for part in accept_encoding.split(","):
+    name, _, params = part.strip().partition(";")
+    if name.strip().lower() == coding:
+      return params.replace(" ", "").lower() not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+  return False
+
+
+def cached_response(request: Request, cached: CachedBody, media_type: str = "application/json") -> Response:
+  """按 Accept-Encoding 选择预压缩变体（br 优先于 gzip），附带该表示自己的 ETag。"""
+  headers = {"Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+  accept_encoding = request.headers.get("accept-encoding", "")
+  body, coding = cached.body, None
+  if cached.br is not None and _accepts(accept_encoding, "br"):
+    body, coding = cached.br, "br"
+  elif cached.gzip is not None and _accepts(accept_encoding, "gzip"):
+    body, coding = cached.gzip, "gzip"
+  if coding is not None:
+    headers["Content-Encoding"] = coding
+  headers["ETag"] = coded_etag(cached.etag, coding)
+  return Response(content=body, media_type=media_type, headers=headers)
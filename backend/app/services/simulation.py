@@ -0,0 +1,691 @@
+"""
+无头塔防模拟：按关卡 JSON 与前端规则（core/game.ts、entities/*.ts、logic/waveGenerator.ts、pathfinding/aStar.ts）
+逐帧复现一局，用于服务端重放校验。
+
+与前端的约定（见 BACKEND_API.md「Replay」）：
+- 固定步长 1/60 秒；操作在第 tick 帧更新之前生效。
+- 波次内容（类型、刷怪顺序、属性浮动）来自 waves.WaveSchedule：每波独立的 mulberry32 种子
+  （客户端提交日志时需以它替换 Math.random），与玩家操作无关。
+- 敌人/塔状态按列存放在 NumPy 数组（struct-of-arrays）：移动、索敌、溅射与减速对全部敌人一次向量化计算，
+  只有塔与塔之间（先后击杀会影响后者的目标）按顺序执行。
+"""
+
+import heapq
+import math
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .waves import WaveSchedule, js_round
+
+DT = 1 / 60
+SPAWN_INTERVAL = 0.6
+# 4 邻接顺序与 aStar.ts 的 dirs 一致（影响同代价路径的选择）
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+Cell = Tuple[int, int]
+
+
+class ReplayInvalid(ValueError):
+  """操作日志格式错误或超出上限：无法重放。"""
+
+
+@dataclass(frozen=True)
+class TowerSpec:
+  type: str
+  damage: float
+  fire_rate: float
+  range: float
+  costs: Tuple[int, ...]
+  splash: float = 0.0
+  pierce: int = 0
+  slow: Optional[Tuple[float, float]] = None
+
+
+@dataclass(frozen=True)
+class EnemySpec:
+  type: str
+  hp: float
+  armor: float
+  speed: float
+  damage: int
+  reward: float
+
+
+@dataclass(frozen=True)
+class LevelRules:
+  """关卡 JSON 中影响结果的字段；from_config 只做结构解析，不校验可解性。"""
+
+  width: int
+  height: int
+  cell_size: float
+  entry: Cell
+  exit: Cell
+  blocked: FrozenSet[Cell]
+  no_build: FrozenSet[Cell]
+  presets: Tuple[Tuple[str, Cell, int], ...]
+  initial_gold: int
+  initial_life: int
+  towers: Dict[str, TowerSpec]
+  enemies: Dict[str, EnemySpec]
+  fixed_waves: Tuple[Tuple[Tuple[str, int], ...], ...]
+  max_per_wave: int
+  type_weights: Tuple[Tuple[str, float], ...]
+  difficulty_growth: float
+  difficulty: Dict[str, float]
+  economy: Dict[str, float]
+
+  @classmethod
+  def from_config(cls, config: Dict[str, Any]) -> "LevelRules":
+    grid = config["grid"]
+
+    def cell(c: Dict[str, Any]) -> Tuple[int, int]:
+      return int(c["x"]), int(c["y"])
+
+    towers = {
+      name: TowerSpec(
+        type=name,
+        damage=spec["baseDamage"],
+        fire_rate=spec["fireRate"],
+        range=spec["range"],
+        costs=tuple(spec["costByLevel"]),
+        splash=spec.get("splashRadius") or 0.0,
+        pierce=spec.get("pierce") or 0,
+        slow=(spec["slow"]["multiplier"], spec["slow"]["duration"]) if spec.get("slow") else None,
+      )
+      for name, spec in config["towers"].items()
+    }
+    enemies = {
+      name: EnemySpec(name, spec["baseHp"], spec["baseArmor"], spec["baseSpeed"], spec["baseDamage"], spec["reward"])
+      for name, spec in config["enemies"].items()
+    }
+    waves = config["waves"]
+    generator = waves["generator"]
+    return cls(
+      width=grid["width"],
+      height=grid["height"],
+      cell_size=grid["cellSize"],
+      entry=cell(grid["entry"]),
+      exit=cell(grid["exit"]),
+      blocked=frozenset(cell(c) for c in grid.get("blocked", ())),
+      no_build=frozenset(cell(c) for c in grid.get("noBuild", ())),
+      presets=tuple((p["type"], cell(p["cell"]), p["level"]) for p in grid.get("presetTowers", ())),
+      initial_gold=js_round(grid["initialGold"]),
+      initial_life=grid["initialLife"],
+      towers=towers,
+      enemies=enemies,
+      fixed_waves=tuple(tuple((e["type"], e["count"]) for e in wave["enemies"]) for wave in waves["fixed"]),
+      max_per_wave=generator["maxPerWave"],
+      type_weights=tuple(generator["typeWeights"].items()),
+      difficulty_growth=generator["difficultyGrowth"],
+      difficulty=dict(config["difficulty"]),
+      economy=dict(config["economy"]),
+    )
+
+
+def find_path(width: int, height: int, start: Cell, goal: Cell, blocked: FrozenSet[Cell]) -> Optional[List[Cell]]:
+  """
+  aStar.ts 的等价实现：前端每轮对 open 稳定排序后取首个，等价于按 (f, 入队序号) 出堆；
+  同代价路径的取舍因此与前端完全一致。
+  """
+  gx, gy = goal
+  seq = 0
+  # 节点：(g, cell, parent 节点)
+  start_node = (0, start, None)
+  heap = [(abs(start[0] - gx) + abs(start[1] - gy), seq, start_node)]
+  best_g = {start: 0}
+  while heap:
+    _, _, node = heapq.heappop(heap)
+    g, (x, y), _ = node
+    if x == gx and y == gy:
+      path = []
+      while node is not None:
+        path.append(node[1])
+        node = node[2]
+      path.reverse()
+      return path
+    for dx, dy in DIRECTIONS:
+      nx, ny = x + dx, y + dy
+      nxt = (nx, ny)
+      if nxt in blocked or nx < 0 or ny < 0 or nx >= width or ny >= height:
+        continue
+      existing = best_g.get(nxt)
+      if existing is None or g + 1 < existing:
+        best_g[nxt] = g + 1
+        seq += 1
+        heapq.heappush(heap, (g + 1 + abs(nx - gx) + abs(ny - gy), seq, (g + 1, nxt, node)))
+  return None
+
+
+@dataclass
+class Outcome:
+  score: int
+  wave: int
+  life_left: int
+  gold: int
+  ticks: int
+  game_over: bool
+
+
+@dataclass
+class _Towers:
+  """塔的列存储（顺序即前端 towers 数组顺序）。"""
+
+  specs: List[TowerSpec] = field(default_factory=list)
+  cells: List[Cell] = field(default_factory=list)
+  level: List[int] = field(default_factory=list)
+  # 墙不攻击：冷却恒为 inf，永远不会进入待射击集合
+  cooldown: np.ndarray = field(default_factory=lambda: np.zeros(0))
+  origin: np.ndarray = field(default_factory=lambda: np.zeros((0, 2)))
+  range_px: np.ndarray = field(default_factory=lambda: np.zeros(0))
+
+
+class Simulation:
+  """一局游戏的状态机；step() 推进一帧，apply() 执行一条玩家操作。"""
+
+  def __init__(self, rules: LevelRules, seed: int, base_path: Optional[Sequence[Cell]] = None):
+    """base_path：关卡编译时预算的初始基础路径（与 find_path 结果一致），省去开局寻路。"""
+    self.rules = rules
+    self.schedule = WaveSchedule(
+      rules.fixed_waves, rules.max_per_wave, rules.type_weights, rules.difficulty_growth, seed
+    )
+    self.gold = rules.initial_gold
+    self.life = rules.initial_life
+    self.score = 0
+    self.wave_index = 0
+    self.tick = 0
+    self.game_over = False
+    self.difficulty_value = rules.difficulty["base"]
+    self.wave_result: Optional[int] = None
+    self.wave_lives_lost = 0
+    # 本波尚未刷出的敌人类型与属性浮动，逆序存放，pop() 即下一只
+    self.spawn_queue: List[str] = []
+    self._variance: List[float] = []
+    self.spawn_timer = 0.0
+    self._slowed = False
+    self.occupied = {cell for _, cell, _ in rules.presets}
+    self.towers = _Towers()
+    for tower_type, cell, level in rules.presets:
+      spec = rules.towers.get(tower_type)
+      if spec is not None:
+        self._add_tower(spec, cell, level)
+    self._empty_enemies()
+    base = list(base_path) if base_path is not None else self._find_path(rules.entry, self._blocked())
+    if base is None:
+      raise ReplayInvalid("no path from entry to exit")
+    self.base_path = base
+    self._reset_paths()
+    self._prepare_wave()
+
+  # ---- 状态存储 ----
+
+  def _empty_enemies(self) -> None:
+    self.hp = np.zeros(0)
+    self.armor = np.zeros(0)
+    self.speed = np.zeros(0)
+    self.damage = np.zeros(0, dtype=np.int64)
+    self.reward = np.zeros(0)
+    self.progress = np.zeros(0)
+    self.path_index = np.zeros(0, dtype=np.int64)
+    self.path_start = np.zeros(0, dtype=np.int64)
+    self.path_len = np.zeros(0, dtype=np.int64)
+    self.slow_timer = np.zeros(0)
+    self.slow_mult = np.zeros(0)
+    self.alive = np.zeros(0, dtype=bool)
+
+  _ENEMY_COLUMNS = (
+    "hp",
+    "armor",
+    "speed",
+    "damage",
+    "reward",
+    "progress",
+    "path_index",
+    "path_start",
+    "path_len",
+    "slow_timer",
+    "slow_mult",
+    "alive",
+  )
+
+  def _reset_paths(self) -> None:
+    """路径缓冲：所有敌人路径的世界坐标首尾相接；波次之间（无敌人时）清空重建。"""
+    self._path_chunks: List[Tuple[np.ndarray, np.ndarray]] = []
+    self._path_rows = 0
+    self.base_ref = self._add_path(self.base_path)
+
+  def _add_path(self, cells: Sequence[Cell]) -> Tuple[int, int]:
+    """追加一条路径：世界坐标与到下一点的段长（末点记 -1，快速路径据此判定到达终点）。"""
+    cs = self.rules.cell_size
+    xy = (np.asarray(cells, dtype=np.float64) + 0.5) * cs
+    seg = np.full(len(xy), -1.0)
+    seg[:-1] = np.hypot(xy[1:, 0] - xy[:-1, 0], xy[1:, 1] - xy[:-1, 1])
+    start = self._path_rows
+    self._path_chunks.append((xy, seg))
+    self._path_rows += len(xy)
+    if len(self._path_chunks) > 1:
+      self._path_xy = np.concatenate([c[0] for c in self._path_chunks])
+      self._path_seg = np.concatenate([c[1] for c in self._path_chunks])
+    else:
+      self._path_xy, self._path_seg = xy, seg
+    return start, len(xy)
+
+  def _find_path(self, start: Cell, blocked: FrozenSet[Cell]) -> Optional[List[Cell]]:
+    return find_path(self.rules.width, self.rules.height, start, self.rules.exit, blocked)
+
+  def _blocked(self, extra: Optional[Cell] = None) -> FrozenSet[Cell]:
+    blocked = self.rules.blocked | self.occupied
+    return blocked | {extra} if extra is not None else blocked
+
+  def _add_tower(self, spec: TowerSpec, cell: Cell, level: int) -> None:
+    self.towers.specs.append(spec)
+    self.towers.cells.append(cell)
+    self.towers.level.append(level)
+    towers = self.towers
+    towers.cooldown = np.append(towers.cooldown, np.inf if spec.type == "WALL" else 0.0)
+    cs = self.rules.cell_size
+    towers.origin = np.vstack([towers.origin, [((cell[0] + 0.5) * cs, (cell[1] + 0.5) * cs)]])
+    towers.range_px = np.append(towers.range_px, spec.range * cs)
+
+  # ---- 波次 ----
+
+  def _next_difficulty(self) -> float:
+    tuning = self.rules.difficulty
+    if self.wave_result is None:
+      return tuning["base"]
+    lost = self.wave_result
+    loss = tuning["lossPenalty"] * lost if lost > 0 else 0
+    gain = tuning["gainBonus"] if lost == 0 else 0
+    return max(tuning["minMultiplier"], min(tuning["maxMultiplier"], self.difficulty_value + gain - loss))
+
+  def _prepare_wave(self) -> None:
+    wave = self.schedule.wave(self.wave_index)
+    self.difficulty_value = self._next_difficulty() + wave.difficulty_bonus
+    self.spawn_queue = self.schedule.names(wave)[::-1]
+    self._variance = wave.variance.tolist()[::-1]
+    self.spawn_timer = 0.0
+    self.wave_result = None
+    self.wave_lives_lost = 0
+
+  def _finish_wave(self) -> None:
+    economy = self.rules.economy
+    self.wave_result = self.wave_lives_lost
+    self.gold += js_round(economy["waveRewardBase"] + self.wave_index * economy["waveRewardGrowth"])
+    self.wave_index += 1
+    self.wave_lives_lost = 0
+
+  def _spawn(self) -> None:
+    enemy_type = self.spawn_queue.pop()
+    variance = self._variance.pop()
+    spec = self.rules.enemies.get(enemy_type)
+    if spec is None:
+      return
+    d = self.difficulty_value
+    start, length = self.base_ref
+    row = {
+      "hp": spec.hp * d * variance,
+      "armor": spec.armor * d,
+      "speed": spec.speed * d,
+      "damage": spec.damage,
+      "reward": spec.reward * variance,
+      "progress": 0.0,
+      "path_index": 0,
+      "path_start": start,
+      "path_len": length,
+      "slow_timer": 0.0,
+      "slow_mult": 1.0,
+      "alive": True,
+    }
+    for name in self._ENEMY_COLUMNS:
+      column = getattr(self, name)
+      setattr(self, name, np.append(column, np.asarray(row[name], dtype=column.dtype)))
+
+  # ---- 每帧 ----
+
+  def positions(self) -> Tuple[np.ndarray, np.ndarray]:
+    xy = self._path_xy
+    last = self.path_len - 1
+    i0 = self.path_start + self.path_index
+    i1 = self.path_start + np.minimum(self.path_index + 1, last)
+    cx, cy = xy[i0, 0], xy[i0, 1]
+    dx, dy = xy[i1, 0] - cx, xy[i1, 1] - cy
+    dist = np.hypot(dx, dy)
+    dist[dist == 0] = 1
+    t = self.progress / dist
+    return cx + dx * t, cy + dy * t
+
+  def _move(self, dt: float) -> None:
+    if self._slowed:
+      timed = self.slow_timer > 0
+      if timed.any():
+        self.slow_timer[timed] = np.maximum(0, self.slow_timer[timed] - dt)
+        self.slow_mult[timed & (self.slow_timer == 0)] = 1
+      else:
+        self._slowed = False
+    remaining = dt * (self.speed * self.slow_mult * self.rules.cell_size)
+    seg_all = self._path_seg
+    # 快速路径：本帧没有敌人跨过格子中心（绝大多数帧），一次加法即可
+    seg = seg_all[self.path_start + self.path_index]
+    if (remaining <= seg - self.progress).all():
+      progress = self.progress + remaining
+      if (progress < seg).all():
+        self.progress = progress
+        return
+
+    last = self.path_len - 1
+    active = (remaining > 0) & (self.path_index < last)
+    while active.any():
+      idx = np.flatnonzero(active)
+      seg = seg_all[self.path_start[idx] + self.path_index[idx]]
+      zero = seg == 0
+      if zero.any():
+        self.path_index[idx[zero]] += 1
+        idx, seg = idx[~zero], seg[~zero]
+      step = np.minimum(remaining[idx], seg - self.progress[idx])
+      progress = self.progress[idx] + step
+      crossed = progress >= seg
+      progress[crossed] = 0
+      self.progress[idx] = progress
+      self.path_index[idx[crossed]] += 1
+      remaining[idx] -= step
+      active = (remaining > 0) & (self.path_index < last)
+
+    escaped = self.path_index >= last
+    if escaped.any():
+      self.alive[escaped] = False
+      lost = int(self.damage[escaped].sum())
+      self.wave_lives_lost += lost
+      self.life = max(0, self.life - lost)
+
+  def _fire(self, dt: float) -> None:
+    towers = self.towers
+    cooldown = towers.cooldown
+    cooldown -= dt
+    np.maximum(cooldown, 0, out=cooldown)
+    if not len(self.hp) or cooldown.min() > 0:
+      return
+    ready = np.flatnonzero(cooldown <= 0)
+    px, py = self.positions()
+    to_exit = self.path_index + self.progress
+    cs = self.rules.cell_size
+    alive = self.alive
+    # 待射击塔 × 敌人的距离一次算完；位置在塔阶段不变，只有存活状态随先射击的塔变化
+    origin = towers.origin[ready]
+    in_range = np.hypot(px - origin[:, :1], py - origin[:, 1:]) <= towers.range_px[ready, None]
+    for row, t in enumerate(ready):
+      spec = towers.specs[t]
+      candidates = np.flatnonzero(alive & in_range[row])
+      if not len(candidates):
+        continue
+      level = towers.level[t]
+      count = min(level, 3) if spec.type == "LASER" else 1
+      damage = self._damage_per_shot(spec, level)
+      splash = spec.splash * cs
+      if count == 1 and splash <= 0:
+        # 单体无溅射（最常见）：降序稳定排序的首位即首个最大值，逐标量结算
+        pick = int(candidates[np.argmax(to_exit[candidates])])
+        hp = float(self.hp[pick])
+        dealt = min(max(0.0, damage - float(self.armor[pick])), hp)
+        self.hp[pick] = hp - dealt
+        killed = hp - dealt <= 0
+        if killed:
+          alive[pick] = False
+        if dealt > 0:
+          self.score += math.floor(math.sqrt(dealt))
+        if spec.type == "FREEZE" and spec.slow is not None:
+          self._apply_slow(np.array([pick]), *spec.slow)
+        towers.cooldown[t] = 0 if spec.type == "LASER" and killed else 1 / spec.fire_rate
+        continue
+      # 前端按 progressToExit 降序稳定排序
+      order = np.argsort(-to_exit[candidates], kind="stable")
+      selected = candidates[order[:count]]
+      impacted = np.zeros(len(alive), dtype=bool)
+      killed = 0
+      for pick in selected:
+        if splash > 0:
+          affected = np.flatnonzero(alive & (np.hypot(px - px[pick], py - py[pick]) <= splash))
+        else:
+          affected = np.array([pick])
+        affected = affected[~impacted[affected]]
+        if not len(affected):
+          continue
+        impacted[affected] = True
+        dealt = np.minimum(np.maximum(0, damage - self.armor[affected]), self.hp[affected])
+        self.hp[affected] -= dealt
+        dead = affected[self.hp[affected] <= 0]
+        alive[dead] = False
+        killed += len(dead)
+        hit = dealt[dealt > 0]
+        if len(hit):
+          self.score += int(np.floor(np.sqrt(hit)).sum())
+        if spec.type == "FREEZE" and spec.slow is not None:
+          self._apply_slow(affected, *spec.slow)
+      towers.cooldown[t] = 0 if spec.type == "LASER" and killed > 0 else 1 / spec.fire_rate
+
+  @staticmethod
+  def _damage_per_shot(spec: TowerSpec, level: int) -> float:
+    if spec.type == "LASER":
+      return spec.damage if level <= 3 else spec.damage * (1 + max(0, level - 3) * 0.35)
+    return spec.damage * (1 + (level - 1) * 0.35)
+
+  def _apply_slow(self, idx: np.ndarray, multiplier: float, duration: float) -> None:
+    clamped = min(1, max(0.1, multiplier))
+    mult, timer = self.slow_mult[idx], self.slow_timer[idx]
+    replace = (clamped < mult) | (timer <= 0)
+    extend = ~replace & (clamped == mult) & (duration > timer)
+    self.slow_mult[idx[replace]] = clamped
+    self._slowed = True
+    self.slow_timer[idx[replace | extend]] = duration
+
+  def _reap(self) -> None:
+    dead = ~self.alive
+    if not dead.any():
+      return
+    rewards = np.floor(self.reward[dead] * self.rules.economy["killRewardMultiplier"] + 0.5)
+    self.gold += int(rewards[rewards > 0].sum())
+    keep = self.alive
+    for name in self._ENEMY_COLUMNS:
+      setattr(self, name, getattr(self, name)[keep])
+
+  def step(self) -> None:
+    """game.ts 的 update(dt)：刷怪 → 敌人移动/逃脱 → 塔攻击 → 结算击杀 → 波次推进。"""
+    if self.game_over:
+      return
+    if self.spawn_queue:
+      self.spawn_timer -= DT
+      if self.spawn_timer <= 0:
+        self._spawn()
+        self.spawn_timer = SPAWN_INTERVAL
+    if len(self.hp):
+      self._move(DT)
+    if self.life <= 0:
+      self.game_over = True
+    self._fire(DT)
+    self._reap()
+    if not len(self.hp) and not self.spawn_queue and not self.game_over:
+      self._finish_wave()
+      self._prepare_wave()
+      self._reset_paths()
+    self.tick += 1
+
+  # ---- 玩家操作 ----
+
+  def apply(self, op: Sequence[Any]) -> bool:
+    """执行一条操作；与前端一样，不满足条件（金币不足、会堵路等）时静默忽略，返回 False。"""
+    kind = op[1] if len(op) > 1 else None
+    if kind == "skip":
+      return self._skip()
+    if kind not in ("build", "upgrade", "sell") or len(op) < 4:
+      raise ReplayInvalid(f"unknown op {op!r}")
+    try:
+      cell = (int(op[2]), int(op[3]))
+    except (TypeError, ValueError):
+      raise ReplayInvalid(f"bad cell in op {op!r}")
+    if kind == "build":
+      if len(op) < 5:
+        raise ReplayInvalid(f"build op needs a tower type: {op!r}")
+      return self._build(cell, op[4])
+    tower = next((i for i, c in enumerate(self.towers.cells) if c == cell), None)
+    if tower is None:
+      return False
+    return self._upgrade(tower) if kind == "upgrade" else self._sell(tower)
+
+  def _enemy_cells(self) -> List[Cell]:
+    if not len(self.hp):
+      return []
+    px, py = self.positions()
+    cs = self.rules.cell_size
+    return list(zip(np.floor(px / cs).astype(int).tolist(), np.floor(py / cs).astype(int).tolist()))
+
+  def _buildable(self, cell: Cell) -> bool:
+    r = self.rules
+    x, y = cell
+    return (
+      0 <= x < r.width
+      and 0 <= y < r.height
+      and cell not in r.blocked
+      and cell not in r.no_build
+      and cell not in self.occupied
+      and cell != r.entry
+      and cell != r.exit
+    )
+
+  def _build(self, cell: Cell, tower_type: Any) -> bool:
+    enemy_cells = self._enemy_cells()
+    if cell in enemy_cells or not self._buildable(cell):
+      return False
+    blocked = self._blocked(cell)
+    if self._find_path(self.rules.entry, blocked) is None:
+      return False
+    spec = self.rules.towers.get(tower_type)
+    if spec is None or self.gold < spec.costs[0]:
+      return False
+    paths = {}
+    for start in enemy_cells:
+      if start not in paths:
+        paths[start] = self._find_path(start, blocked)
+      if paths[start] is None:
+        return False
+    self.gold -= spec.costs[0]
+    self.occupied.add(cell)
+    self._add_tower(spec, cell, 1)
+    self._reroute(enemy_cells, paths)
+    return True
+
+  def _upgrade(self, tower: int) -> bool:
+    spec, level = self.towers.specs[tower], self.towers.level[tower]
+    if level >= len(spec.costs) or self.gold < spec.costs[level]:
+      return False
+    self.gold -= spec.costs[level]
+    self.towers.level[tower] = level + 1
+    return True
+
+  def _sell(self, tower: int) -> bool:
+    towers = self.towers
+    spec, level, cell = towers.specs[tower], towers.level[tower], towers.cells[tower]
+    spent = sum(spec.costs[:level])
+    self.gold += js_round(spent * self.rules.economy["sellRefundRate"])
+    self.occupied.discard(cell)
+    del towers.specs[tower], towers.cells[tower], towers.level[tower]
+    towers.cooldown = np.delete(towers.cooldown, tower)
+    towers.origin = np.delete(towers.origin, tower, axis=0)
+    towers.range_px = np.delete(towers.range_px, tower)
+    self._reroute(self._enemy_cells(), {})
+    return True
+
+  def _reroute(self, enemy_cells: List[Cell], paths: Dict[Cell, Optional[List[Cell]]]) -> None:
+    """占用变化后：重算基础路径，存活敌人从所在格子重新寻路（从路径起点、进度清零）。"""
+    blocked = self._blocked()
+    base = self._find_path(self.rules.entry, blocked)
+    if base is not None:
+      self.base_path = base
+      self.base_ref = self._add_path(base)
+    refs: Dict[Cell, Tuple[int, int]] = {}
+    for i, start in enumerate(enemy_cells):
+      if start not in paths:
+        paths[start] = self._find_path(start, blocked)
+      if paths[start] is None:
+        continue
+      if start not in refs:
+        refs[start] = self._add_path(paths[start])
+      self.path_start[i], self.path_len[i] = refs[start]
+      self.path_index[i] = 0
+      self.progress[i] = 0
+
+  def _skip(self) -> bool:
+    """N 键：场上无敌人时直接结算本波并开始下一波（未刷出的敌人作废）。"""
+    if len(self.hp) or self.game_over:
+      return False
+    self._finish_wave()
+    self._prepare_wave()
+    self._reset_paths()
+    return True
+
+  # ---- 整局 ----
+
+  def outcome(self) -> Outcome:
+    return Outcome(
+      score=int(self.score),
+      wave=self.wave_index + 1,
+      life_left=int(self.life),
+      gold=int(self.gold),
+      ticks=self.tick,
+      game_over=self.game_over,
+    )
+
+
+def simulate(
+  config: Dict[str, Any],
+  replay: Dict[str, Any],
+  max_ticks: int,
+  base_path: Optional[Sequence[Cell]] = None,
+  op_waves: Optional[List[int]] = None,
+) -> Outcome:
+  """
+  按操作日志重放：第 tick 帧之前执行该帧的操作；游戏结束或达到 replay["ticks"] 时停止。
+  op_waves 非空时依次追加每条已执行操作所在的波次（Outcome.wave 口径），即二进制日志的分块依据。
+  """
+  try:
+    seed, ticks, ops = int(replay["seed"]), int(replay["ticks"]), replay["ops"]
+  except (KeyError, TypeError, ValueError):
+    raise ReplayInvalid("replay needs seed, ticks and ops")
+  if not 0 < ticks <= max_ticks:
+    raise ReplayInvalid(f"ticks must be within 1..{max_ticks}")
+  sim = Simulation(LevelRules.from_config(config), seed, base_path)
+  previous = 0
+  pending = iter(ops)
+  op = next(pending, None)
+  while sim.tick < ticks and not sim.game_over:
+    while op is not None:
+      if not isinstance(op, (list, tuple)) or not op or not isinstance(op[0], int):
+        raise ReplayInvalid(f"bad op {op!r}")
+      if op[0] < previous:
+        raise ReplayInvalid("ops must be ordered by tick")
+      if op[0] > sim.tick:
+        break
+      previous = op[0]
+      if op_waves is not None:
+        op_waves.append(sim.wave_index + 1)
+      sim.apply(op)
+      op = next(pending, None)
+    sim.step()
+  return sim.outcome()
+
+
+def play(
+  config: Dict[str, Any],
+  seed: int,
+  policy: Callable[[Simulation], Iterable[Sequence[Any]]],
+  max_ticks: int,
+) -> Tuple[Dict[str, Any], Outcome]:
+  """录制一局：每帧先询问 policy 要执行的操作，记录成功的操作，返回 (replay, 结果)。供测试与基准生成日志。"""
+  sim = Simulation(LevelRules.from_config(config), seed)
+  ops: List[List[Any]] = []
+  while sim.tick < max_ticks and not sim.game_over:
+    for action in policy(sim):
+      op = [sim.tick, *action]
+      if sim.apply(op):
+        ops.append(op)
+    sim.step()
+  return {"seed": seed, "ticks": sim.tick, "ops": ops}, sim.outcome()
@@ -0,0 +1,209 @@
+"""
+确定性波次表：按关卡 waves.fixed / waves.generator 与种子展开每一波的刷怪顺序与属性浮动，服务端模拟与
+GET /levels/{id}/waves 共用。
+
+每波使用独立的 mulberry32(wave_seed(seed, index))，依次抽取：自动波的敌人类型（固定波不抽）→ 打乱刷怪顺序 →
+每只敌人的属性浮动 variance ∈ [0.8, 1.2)。各波互不依赖，跳波、建塔等玩家操作不会改变后续波次的内容；
+难度倍率随上一波的损失动态变化，不在表内，表中只给出自动波的附加难度 difficulty_bonus。
+
+第 i 波只由 wave_seed(seed, i) 决定，WaveSchedule 直接展开被请求的波次（组成 → 打乱 → 浮动），不展开之前的波次，
+已展开的波次按下标稀疏记住；WaveScheduleCache 按 (关卡 hash, seed) 保存有界 LRU。
+"""
+
+import itertools
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from ..core.config import get_settings
+
+UINT32 = 0xFFFFFFFF
+# 前端 enemies 计数表的键顺序，决定自动波打包顺序
+ENEMY_ORDER = ("NORMAL", "FAST", "TANK", "SHIELD", "BRUISER", "BOSS")
+# 黄金分割常数：相邻波次的种子充分打散
+WAVE_SEED_STEP = 0x9E3779B9
+
+WaveSpec = Tuple[Tuple[str, int], ...]
+
+
+def js_round(value: float) -> int:
+  """JavaScript Math.round：.5 向正无穷取整（Python round 为银行家舍入）。"""
+  return math.floor(value + 0.5)
+
+
+class Mulberry32:
+  """32 位种子随机数；random() 与常见 JS 实现（Math.imul 版）逐位一致。"""
+
+  def __init__(self, seed: int):
+    self.state = seed & UINT32
+
+  def random(self) -> float:
+    self.state = a = (self.state + 0x6D2B79F5) & UINT32
+    t = ((a ^ (a >> 15)) * (a | 1)) & UINT32
+    t = ((t + (((t ^ (t >> 7)) * (t | 61)) & UINT32)) & UINT32) ^ t
+    return (t ^ (t >> 14)) / 4294967296
+
+  def block(self, n: int) -> np.ndarray:
+    """接下来 n 次 random() 的结果（float64 数组），状态随之前进 n 步；状态只是等差计数，可整体向量化。"""
+    a = (self.state + 0x6D2B79F5 * np.arange(1, n + 1, dtype=np.uint64)) & UINT32
+    self.state = (self.state + 0x6D2B79F5 * n) & UINT32
+    t = ((a ^ (a >> 15)) * (a | 1)) & UINT32
+    t = ((t + (((t ^ (t >> 7)) * (t | 61)) & UINT32)) & UINT32) ^ t
+    return (t ^ (t >> 14)) / 4294967296
+
+
+def wave_seed(seed: int, index: int) -> int:
+  """第 index 波（0 基）的种子，JS：(seed ^ Math.imul(index + 1, 0x9E3779B9)) >>> 0。"""
+  return (seed ^ ((index + 1) * WAVE_SEED_STEP)) & UINT32
+
+
+@dataclass(frozen=True, eq=False)
+class Wave:
+  """展开后的一波：spawns 为按刷出先后排列的敌人类型下标（指向 WaveSchedule.enemy_types），variance 与之一一对应。"""
+
+  index: int
+  auto: bool
+  difficulty_bonus: float
+  spawns: bytes
+  variance: np.ndarray
+
+
+class WaveSchedule:
+  """某关卡 + 种子的波次表；wave(i) 只展开第 i 波本身，结果按下标常驻（线程安全）。"""
+
+  def __init__(
+    self,
+    fixed: Sequence[WaveSpec],
+    max_per_wave: int,
+    type_weights: Sequence[Tuple[str, float]],
+    difficulty_growth: float,
+    seed: int,
+  ):
+    self.fixed = tuple(fixed)
+    self.max_per_wave = max_per_wave
+    self.type_weights = tuple(type_weights)
+    self.difficulty_growth = difficulty_growth
+    self.seed = seed & UINT32
+    # 类型表：前端计数表顺序在前，其余按首次出现；下标存进 Wave.spawns
+    names = [*ENEMY_ORDER, *(t for wave in self.fixed for t, _ in wave), *(t for t, _ in self.type_weights)]
+    self.enemy_types: Tuple[str, ...] = tuple(dict.fromkeys(names))
+    self._type_index = {name: i for i, name in enumerate(self.enemy_types)}
+    self._waves: Dict[int, Wave] = {}
+    self._lock = threading.Lock()
+
+  @classmethod
+  def from_config(cls, config: Dict[str, Any], seed: int) -> "WaveSchedule":
+    waves = config["waves"]
+    generator = waves["generator"]
+    return cls(
+      fixed=[tuple((e["type"], e["count"]) for e in wave["enemies"]) for wave in waves["fixed"]],
+      max_per_wave=generator["maxPerWave"],
+      type_weights=list(generator["typeWeights"].items()),
+      difficulty_growth=generator["difficultyGrowth"],
+      seed=seed,
+    )
+
+  @property
+  def expanded(self) -> int:
+    return len(self._waves)
+
+  def wave(self, index: int) -> Wave:
+    wave = self._waves.get(index)
+    if wave is None:
+      # 展开不持锁：同一波并发展开的结果相同，保留先落下的一份
+      built = self._build(index)
+      with self._lock:
+        wave = self._waves.setdefault(index, built)
+    return wave
+
+  def waves(self, start: int, count: int) -> List[Wave]:
+    """第 start 波起（0 基）的 count 波。"""
+    return [self.wave(index) for index in range(start, start + count)]
+
+  def names(self, wave: Wave) -> List[str]:
+    return [self.enemy_types[i] for i in wave.spawns]
+
+  # ---- 展开第 index 波：组成 → 打乱 → 浮动，各阶段依次消费该波自己的随机数流 ----
+
+  def _build(self, index: int) -> Wave:
+    rng = Mulberry32(wave_seed(self.seed, index))
+    fixed = self.fixed
+    if index < len(fixed):
+      auto, bonus, spec = False, 0.0, fixed[index]
+    else:
+      auto_index = index - len(fixed)
+      auto, bonus, spec = True, auto_index * self.difficulty_growth, self._auto_wave(auto_index, rng)
+    spawns = self._shuffle(spec, rng)
+    return Wave(index, auto, bonus, bytes(spawns), self._variance(len(spawns), rng))
+
+  def _auto_wave(self, index: int, rng: Mulberry32) -> WaveSpec:
+    """waveGenerator.ts 的 generateAutoWave：数量随波次增长，重型敌人权重逐波增加。"""
+    count = min(self.max_per_wave, js_round(math.pow(index + 1.2, 1.1) * 6))
+    weights = dict(self.type_weights)
+    weights["BOSS"] = weights.get("BOSS", 0) + (0.2 * index if index >= 8 else 0)
+    weights["BRUISER"] = weights.get("BRUISER", 0) + index * 0.08
+    weights["TANK"] = weights.get("TANK", 0) + index * 0.06
+    weights["SHIELD"] = weights.get("SHIELD", 0) + index * 0.04
+    # 前端逐项累加直到 r <= acc；累加和按同样顺序预先算好，二分取第一个 >= r 的项，浮点结果逐位一致
+    types = list(weights)
+    bounds = np.array(list(itertools.accumulate(weights.values())), dtype=np.float64)
+    picked = np.minimum(np.searchsorted(bounds, rng.block(count) * bounds[-1]), len(types) - 1)
+    counts = dict.fromkeys(ENEMY_ORDER, 0)
+    for enemy_type, c in zip(types, np.bincount(picked, minlength=len(types)).tolist()):
+      counts[enemy_type] = counts.get(enemy_type, 0) + c
+    return tuple((enemy_type, c) for enemy_type, c in counts.items() if c > 0)
+
+  def _shuffle(self, spec: WaveSpec, rng: Mulberry32) -> List[int]:
+    """game.ts 的 shuffleSpawn（Fisher-Yates），再按 pop() 的出队顺序反转为刷出顺序。"""
+    type_index = self._type_index
+    queue = [type_index[enemy_type] for enemy_type, count in spec for _ in range(count)]
+    n = len(queue)
+    # 第 k 次交换 i = n-1-k，j = floor(r * (i + 1))：下标一次算好，交换仍按顺序进行
+    picks = (rng.block(max(n - 1, 0)) * np.arange(n, 1, -1)).astype(np.int64).tolist()
+    for i, j in zip(range(n - 1, 0, -1), picks):
+      queue[i], queue[j] = queue[j], queue[i]
+    queue.reverse()
+    return queue
+
+  def _variance(self, n: int, rng: Mulberry32) -> np.ndarray:
+    """每只敌人刷出时的 jitter(0.8, 1.2)。"""
+    return rng.block(n) * (1.2 - 0.8) + 0.8
+
+
+class WaveScheduleCache:
+  """(关卡 hash, seed) → WaveSchedule 的有界 LRU；同一关卡版本与种子的波次只展开一次。"""
+
+  def __init__(self, max_entries: int):
+    self.max_entries = max_entries
+    self._entries: "OrderedDict[Tuple[str, int], WaveSchedule]" = OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, level_hash: str, config: Dict[str, Any], seed: int) -> WaveSchedule:
+    key = (level_hash, seed)
+    with self._lock:
+      schedule = self._entries.get(key)
+      if schedule is not None:
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return schedule
+      self.misses += 1
+      schedule = self._entries[key] = WaveSchedule.from_config(config, seed)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+      return schedule
+
+  def clear(self) -> None:
+    with self._lock:
+      self._entries.clear()
+
+
+@lru_cache(maxsize=1)
+def get_wave_schedules() -> WaveScheduleCache:
+  return WaveScheduleCache(get_settings().wave_schedule_cache_size)
@@ -0,0 +1,37 @@
+from typing import Any, NoReturn
+
+
+def _readonly(self, *args, **kwargs) -> NoReturn:
+  raise TypeError(f"{type(self).__name__} is read-only")
+
+
+class FrozenDict(dict):
+  """只读 dict：仍是 dict 子类，json/orjson/pydantic 序列化与比较照常，修改时抛 TypeError。"""
+
+  __slots__ = ()
+  __setitem__ = __delitem__ = __ior__ = _readonly
+  clear = pop = popitem = setdefault = update = _readonly
+
+  def __reduce__(self):
+    # pickle/deepcopy 默认逐项 __setitem__，改为按构造参数重建
+    return type(self), (dict(self),)
+
+
+class FrozenList(list):
+  """只读 list，同 FrozenDict。"""
+
+  __slots__ = ()
+  __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+  append = clear = extend = insert = pop = remove = reverse = sort = _readonly
+
+  def __reduce__(self):
+    return type(self), (list(self),)
+
+
+def deep_freeze(value: Any) -> Any:
+  """递归把 dict/list 换成只读的 FrozenDict/FrozenList；其他值原样返回。"""
+  if isinstance(value, dict):
+    return FrozenDict((key, deep_freeze(item)) for key, item in value.items())
+  if isinstance(value, list):
+    return FrozenList(deep_freeze(item) for item in value)
+  return value
@@ -3,6 +3,7 @@ from typing import Any
 
 FNV_OFFSET = 0x811C9DC5
 FNV_PRIME = 0x01000193
+FNV_MASK = 0xFFFFFFFF
 
 
 def stable_dumps(value: Any) -> str:
@@ -10,16 +11,56 @@ def stable_dumps(value: Any) -> str:
   return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=True)
 
 
+def _fnv1a_bytes(data: bytes, hash_val: int = FNV_OFFSET) -> int:
+  """
+  字节级 FNV-1a：每 8 字节展开一次，只在块末取模。
+  乘法/异或的低 32 位只依赖操作数低 32 位，块内不截断结果不变。
+  """
+  p = FNV_PRIME
+  view = memoryview(data)
+  tail = len(view) % 8
+  it = iter(view[: len(view) - tail])
+  for b0, b1, b2, b3, b4, b5, b6, b7 in zip(it, it, it, it, it, it, it, it):
+    hash_val = (
+      (((((((((((((((hash_val ^ b0) * p) ^ b1) * p) ^ b2) * p) ^ b3) * p) ^ b4) * p) ^ b5) * p) ^ b6) * p) ^ b7) * p
+    ) & FNV_MASK
+  for b in view[len(view) - tail :]:
+    hash_val = ((hash_val ^ b) * p) & FNV_MASK
+  return hash_val
+
+
+def fnv1a_hash_bytes(data: bytes) -> str:
+  """对已编码的 ASCII 字节计算 FNV-1a（与前端 charCodeAt 逐位一致）。"""
+  return f"fnv1a-{_fnv1a_bytes(data):08x}"
+
+
+class Fnv1a:
+  """增量 FNV-1a（ASCII 字节）：分段 update 的结果与整段 fnv1a_hash_bytes 相同。"""
+
+  def __init__(self):
+    self.value = FNV_OFFSET
+
+  def update(self, data: bytes) -> None:
+    self.value = _fnv1a_bytes(data, self.value)
+
+  def hexdigest(self) -> str:
+    return f"fnv1a-{self.value:08x}"
+
+
 def fnv1a_hash(data: str) -> str:
   """FNV-1a 简易一致性哈希（非安全用途）。"""
+  if data.isascii():
+    return fnv1a_hash_bytes(data.encode("ascii"))
+  # 非 ASCII：逐字符回退，保持既有输出
   hash_val = FNV_OFFSET
   for ch in data:
     hash_val ^= ord(ch)
-    hash_val = (hash_val * FNV_PRIME) % (1 << 32)
+    hash_val = (hash_val * FNV_PRIME) & FNV_MASK
   return f"fnv1a-{hash_val:08x}"
 
 
 def hash_level_config(config: Any) -> str:
   """计算关卡配置 hash。"""
   payload = stable_dumps(config)
-  return fnv1a_hash(payload)
+  # ensure_ascii=True 保证纯 ASCII，直接走字节快路径
+  return fnv1a_hash_bytes(payload.encode("ascii"))
@@ -1,29 +1,83 @@
+import threading
 import time
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional
 
 import redis
 
 
+class NonceStoreFull(Exception):
+  """内存回退已达上限且无可清理条目：拒绝新 nonce（fail closed），而不是放行可能的重放。"""
+
+
 class NonceStore:
   """
   一次性 nonce 校验器：优先使用 Redis，失败则回退内存，避免重放。
+  内存模式按到期秒分桶（时间轮），每次调用顺带清理一小批过期项，均摊 O(1)。
   """
 
-  def __init__(self, client: Optional[redis.Redis] = None):
+  def __init__(
+    self,
+    client: Optional[redis.Redis] = None,
+    max_entries: int = 1_000_000,
+    evict_batch: int = 64,
+    clock: Callable[[], float] = time.time,
+  ):
     self.client = client
     self.fallback: Dict[str, float] = {}
+    self.max_entries = max_entries
+    self.evict_batch = evict_batch
+    self._clock = clock
+    # 到期秒 → 该秒内到期的 nonce；_cursor 之前的桶均已清理
+    self._wheel: Dict[int, List[str]] = {}
+    self._cursor = int(clock())
+    self._lock = threading.Lock()
 
   def check_and_store(self, nonce: str, ttl_seconds: int) -> bool:
-    now = time.time()
+    now = self._clock()
     if self.client:
       # setnx + expire，成功返回 True
       return bool(self.client.set(name=f"nonce:{nonce}", value="1", nx=True, ex=ttl_seconds))
 
-    # 内存模式：清理过期，检查是否存在
-    expired = [k for k, exp in self.fallback.items() if exp <= now]
-    for k in expired:
-      del self.fallback[k]
-    if nonce in self.fallback:
-      return False
-    self.fallback[nonce] = now + ttl_seconds
-    return True
+    with self._lock:
+      self._evict(now, self.evict_batch)
+      expires_at = self.fallback.get(nonce)
+      if expires_at is not None and expires_at > now:
+        return False
+      if expires_at is None and len(self.fallback) >= self.max_entries:
+        self._evict(now, None)
+        if len(self.fallback) >= self.max_entries:
+          raise NonceStoreFull(f"nonce store holds {len(self.fallback)} live entries")
+      expires_at = now + ttl_seconds
+      self.fallback[nonce] = expires_at
+      self._wheel.setdefault(int(expires_at), []).append(nonce)
+      return True
+
+  def release(self, nonce: str) -> None:
+    """撤销登记：请求确定未落库（如组提交被撤回/失败）时调用，客户端可原样重试。"""
+    if self.client:
+      self.client.delete(f"nonce:{nonce}")
+      return
+    with self._lock:
+      # 时间轮里的旧条目到期时发现已不在 fallback 中，直接跳过
+      self.fallback.pop(nonce, None)
+
+  def _evict(self, now: float, budget: Optional[int]) -> None:
+    """清理已整秒过期的桶；budget 为 None 时清到底。"""
+    limit = int(now)
+    if not self._wheel:
+      self._cursor = max(self._cursor, limit)
+      return
+    while self._cursor < limit and (budget is None or budget > 0):
+      bucket = self._wheel.get(self._cursor)
+      if not bucket:
+        self._wheel.pop(self._cursor, None)
+        self._cursor += 1
+        continue
+      while bucket and (budget is None or budget > 0):
+        nonce = bucket.pop()
+        expires_at = self.fallback.get(nonce)
+        # 过期后被重新登记的 nonce 到期时间已更新，不能删
+        if expires_at is not None and expires_at <= now:
+          del self.fallback[nonce]
+        if budget is not None:
+          budget -= 1
@@ -1,7 +1,8 @@
 import hmac
 import hashlib
 from datetime import datetime, timedelta
-from typing import Any, Dict, Optional
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
 
 from jose import jwt
 from passlib.context import CryptContext
@@ -9,19 +10,39 @@ from passlib.context import CryptContext
 from ..core.config import get_settings
 from ..schemas import ScoreSubmit
 
-# 使用 pbkdf2_sha256 避免 bcrypt 兼容性问题
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 settings = get_settings()
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+@lru_cache(maxsize=4)
+def password_context(rounds: int) -> CryptContext:
+  """
+  使用 pbkdf2_sha256 避免 bcrypt 兼容性问题。
+  min/max 轮数都钉在 rounds：轮数调整后旧哈希 needs_update，登录时透明升级。
+  """
+  return CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=rounds,
+    pbkdf2_sha256__min_rounds=rounds,
+    pbkdf2_sha256__max_rounds=rounds,
+  )
+
+
+def verify_password(plain_password: str, hashed_password: str, rounds: Optional[int] = None) -> bool:
   """校验密码。"""
-  return pwd_context.verify(plain_password, hashed_password)
+  return password_context(rounds or settings.password_hash_rounds).verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(
+  plain_password: str, hashed_password: str, rounds: Optional[int] = None
+) -> Tuple[bool, Optional[str]]:
+  """校验密码；轮数与配置不一致时同时返回按新轮数重算的哈希。"""
+  return password_context(rounds or settings.password_hash_rounds).verify_and_update(plain_password, hashed_password)
 
 
-def get_password_hash(password: str) -> str:
+def get_password_hash(password: str, rounds: Optional[int] = None) -> str:
   """生成密码哈希。"""
-  return pwd_context.hash(password)
+  return password_context(rounds or settings.password_hash_rounds).hash(password)
 
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
@@ -0,0 +1,43 @@
+"""基准公用：未指定 --redis-url 时在本地起一个 fakeredis TCP 替身。"""
+
+import socket
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+def _free_port() -> int:
+  with socket.socket() as sock:
+    sock.bind(("127.0.0.1", 0))
+    return sock.getsockname()[1]
+
+
+@contextmanager
+def redis_url(url: Optional[str]) -> Iterator[str]:
+  """给定 URL 直接使用；否则启动 fakeredis.TcpFakeServer（需 `pip install fakeredis[lua]`）。"""
+  if url:
+    yield url
+    return
+  from fakeredis import TcpFakeServer
+
+  class _Server(TcpFakeServer):
+    # socketserver 默认 backlog 仅 5，并发建连会被丢 SYN
+    request_queue_size = 1024
+
+  port = _free_port()
+  server = _Server(("127.0.0.1", port), server_type="redis")
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+  try:
+    yield f"redis://127.0.0.1:{port}/0"
+  finally:
+    server.shutdown()
+    server.server_close()
+
+
+def percentile(samples, pct: float) -> float:
+  ordered = sorted(samples)
+  if not ordered:
+    return 0.0
+  idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+  return ordered[idx]
@@ -0,0 +1,102 @@
+"""
+/score/best 查询基准：旧版在 scores 上 `ORDER BY score DESC, time_ms ASC LIMIT 1` vs user_level_best 主键查询。
+目标用户有 --scores 条历史成绩（默认 10 万），另有若干其他用户作为背景数据；顺带统计回填耗时。
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.bench_best_score [--database-url postgresql+psycopg2://...] [--scores 100000]
+未指定 --database-url 时使用临时 SQLite 文件。
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, delete, func, select
+from sqlalchemy.orm import Session
+
+from app.core.db import Base
+from app.models import Level, Score, User, UserLevelBest
+from app.services.best_scores import backfill_upsert
+
+TARGET_USER = 1
+
+
+def prepare(engine, scores: int, other_users: int) -> None:
+  Base.metadata.create_all(bind=engine)
+  rng = random.Random(7)
+  with engine.begin() as conn:
+    conn.execute(delete(UserLevelBest.__table__))
+    conn.execute(delete(Score.__table__))
+    conn.execute(delete(User.__table__))
+    conn.execute(delete(Level.__table__))
+    conn.execute(Level.__table__.insert(), {"id": "endless", "config_json": {}, "version": "1", "hash": "h"})
+    conn.execute(
+      User.__table__.insert(), [{"id": i, "name": f"u{i}", "hash_pwd": ""} for i in range(1, other_users + 2)]
+    )
+    rows = [(TARGET_USER, rng.randrange(100_000), rng.randrange(30_000, 600_000)) for _ in range(scores)]
+    rows += [(rng.randrange(2, other_users + 2), rng.randrange(100_000), 60_000) for _ in range(scores)]
+    for start in range(0, len(rows), 10_000):
+      conn.execute(
+        Score.__table__.insert(),
+        [
+          {"user_id": u, "level_id": "endless", "score": s, "wave": 1, "time_ms": t, "life_left": 0}
+          for u, s, t in rows[start : start + 10_000]
+        ],
+      )
+  start = time.perf_counter()
+  with engine.begin() as conn:
+    conn.execute(backfill_upsert(engine.dialect.name, 1, other_users + 2))
+  print(f"backfill {len(rows)} scores: {time.perf_counter() - start:.2f}s")
+
+
+def legacy_best(session: Session, user_id: int):
+  return (
+    session.query(Score)
+    .filter(Score.user_id == user_id, Score.level_id == "endless")
+    .order_by(Score.score.desc(), Score.time_ms.asc())
+    .first()
+  )
+
+
+def table_best(session: Session, user_id: int):
+  return session.get(UserLevelBest, (user_id, "endless"))
+
+
+def bench(label: str, engine, fn, user_id: int, iterations: int):
+  start = time.perf_counter()
+  for _ in range(iterations):
+    # 每次新 Session，避免命中 identity map
+    with Session(engine) as session:
+      best = fn(session, user_id)
+      result = (best.score, best.time_ms)
+  per_call_us = (time.perf_counter() - start) / iterations * 1e6
+  print(f"{label:<28} {per_call_us:10.1f} us/request")
+  return per_call_us, result
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--database-url")
+  parser.add_argument("--scores", type=int, default=100_000)
+  parser.add_argument("--other-users", type=int, default=1000)
+  parser.add_argument("--iterations", type=int, default=200)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    engine = create_engine(args.database_url or f"sqlite:///{Path(tmp) / 'bench.db'}")
+    prepare(engine, args.scores, args.other_users)
+    user_id = TARGET_USER
+    with engine.connect() as conn:
+      count = conn.execute(select(func.count()).where(Score.user_id == user_id)).scalar_one()
+    print(f"user {user_id} has {count} scores")
+    before, expected = bench("scores ORDER BY LIMIT 1", engine, legacy_best, user_id, args.iterations)
+    after, actual = bench("user_level_best PK lookup", engine, table_best, user_id, args.iterations)
+    assert actual == expected, (actual, expected)
+    print(f"speedup: {before / after:.0f}x")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+  main()
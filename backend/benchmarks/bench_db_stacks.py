@@ -0,0 +1,185 @@
+"""
+同步 vs 异步数据库栈负载对比：N 个并发客户端循环 POST /score + GET /score/best，统计 req/s 与延迟分位。
+进程内 ASGI 调用（httpx.ASGITransport），不含网络开销；同步栈受线程池大小限制，异步栈受连接池限制。
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.bench_db_stacks [--database-url postgresql+psycopg2://...] [--clients 500] [--seconds 10]
+未指定 --database-url 时使用临时 SQLite 文件（WAL）作为替身，并发写入会串行化，结果仅供相对比较。
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api.routes import router as api_router, sync_router
+from app.api.routes_async import router as async_router
+from app.core.config import get_settings
+from app.core.db import Base, async_database_url, engine_kwargs, get_async_db, get_db
+from app.main import lifespan
+from app.models import Level, User
+from app.schemas import ScoreSubmit
+from app.services.levels import load_level
+from app.utils.security import compute_score_signature, create_access_token, get_password_hash
+
+from ._redis import percentile
+
+settings = get_settings()
+
+
+def pool_kwargs(url: str, clients: int) -> dict:
+  """连接池按客户端数放大，避免测到的是连接等待（见 config.db_pool_size 注释）。"""
+  kwargs = engine_kwargs(url)
+  if kwargs:
+    kwargs.update(pool_size=clients, max_overflow=0)
+  return kwargs
+
+
+def build_app(stack: str, database_url: str, clients: int) -> FastAPI:
+  app = FastAPI(lifespan=lifespan)
+  app.include_router(api_router, prefix=settings.api_prefix)
+  if stack == "sync":
+    engine = create_engine(database_url, **pool_kwargs(database_url, clients))
+    _sqlite_pragmas(engine)
+    sessions = sessionmaker(bind=engine, autoflush=False)
+
+    def override_db():
+      db = sessions()
+      try:
+        yield db
+      finally:
+        db.close()
+
+    app.include_router(sync_router, prefix=settings.api_prefix)
+    app.dependency_overrides[get_db] = override_db
+  else:
+    url = async_database_url(database_url)
+    engine = create_async_engine(url, **pool_kwargs(url, clients))
+    _sqlite_pragmas(engine.sync_engine)
+    sessions = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def override_async_db():
+      async with sessions() as db:
+        yield db
+
+    app.include_router(async_router, prefix=settings.api_prefix)
+    app.dependency_overrides[get_async_db] = override_async_db
+  return app
+
+
+def _sqlite_pragmas(engine) -> None:
+  if engine.dialect.name != "sqlite":
+    return
+
+  @event.listens_for(engine, "connect")
+  def _on_connect(dbapi_conn, _):
+    dbapi_conn.execute("PRAGMA journal_mode=WAL")
+    dbapi_conn.execute("PRAGMA busy_timeout=10000")
+
+
+def prepare_database(database_url: str, clients: int) -> list:
+  """建表并直接写入用户与关卡行，绕过 pbkdf2 登录；返回各用户的 Bearer token。"""
+  engine = create_engine(database_url)
+  Base.metadata.create_all(bind=engine)
+  hashed = get_password_hash("bench")
+  prefix = uuid.uuid4().hex[:8]
+  level = load_level("endless")
+  with engine.begin() as conn:
+    if conn.execute(text("SELECT 1 FROM levels WHERE id = :id"), {"id": level["id"]}).first() is None:
+      conn.execute(
+        Level.__table__.insert(),
+        {"id": level["id"], "config_json": level["config"], "version": level["version"], "hash": level["hash"]},
+      )
+    conn.execute(
+      User.__table__.insert(),
+      [{"name": f"bench-{prefix}-{i}", "hash_pwd": hashed} for i in range(clients)],
+    )
+    ids = conn.execute(
+      text("SELECT id FROM users WHERE name LIKE :p ORDER BY id"), {"p": f"bench-{prefix}-%"}
+    ).scalars()
+    tokens = [create_access_token({"sub": str(user_id)}) for user_id in ids]
+  engine.dispose()
+  return tokens
+
+
+def signed_payload(level: dict, score: int) -> dict:
+  body = {
+    "level_id": level["id"],
+    "level_version": level["version"],
+    "level_hash": level["hash"],
+    "score": score,
+    "wave": 5,
+    "time_ms": 60000,
+    "life_left": 3,
+    "timestamp": int(time.time()),
+    "nonce": uuid.uuid4().hex,
+  }
+  body["signature"] = compute_score_signature(settings.score_signature_key, ScoreSubmit(**body))
+  return body
+
+
+async def load(app: FastAPI, tokens: list, seconds: float) -> dict:
+  level = load_level("endless")
+  latencies, errors = [], 0
+  deadline = time.perf_counter() + seconds
+
+  async def client_loop(http: httpx.AsyncClient, token: str) -> None:
+    nonlocal errors
+    headers = {"Authorization": f"Bearer {token}"}
+    i = 0
+    while time.perf_counter() < deadline:
+      i += 1
+      for method, path, kwargs in (
+        ("POST", f"{settings.api_prefix}/score", {"json": signed_payload(level, i)}),
+        ("GET", f"{settings.api_prefix}/score/best", {"params": {"level": "endless"}}),
+      ):
+        start = time.perf_counter()
+        res = await http.request(method, path, headers=headers, **kwargs)
+        latencies.append(time.perf_counter() - start)
+        if res.status_code >= 400:
+          errors += 1
+
+  async with lifespan(app):
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+      start = time.perf_counter()
+      await asyncio.gather(*(client_loop(http, token) for token in tokens))
+      elapsed = time.perf_counter() - start
+  return {
+    "requests": len(latencies),
+    "rps": len(latencies) / elapsed,
+    "p50_ms": percentile(latencies, 50) * 1e3,
+    "p99_ms": percentile(latencies, 99) * 1e3,
+    "errors": errors,
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--database-url")
+  parser.add_argument("--clients", type=int, default=500)
+  parser.add_argument("--seconds", type=float, default=10)
+  parser.add_argument("--stacks", nargs="+", default=["sync", "async"])
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    database_url = args.database_url or f"sqlite:///{Path(tmp) / 'bench.db'}"
+    tokens = prepare_database(database_url, args.clients)
+    for stack in args.stacks:
+      result = asyncio.run(load(build_app(stack, database_url, args.clients), tokens, args.seconds))
+      print(
+        f"{stack:<6} clients={args.clients} requests={result['requests']:7d} rps={result['rps']:8.1f}"
+        f" p50={result['p50_ms']:8.1f}ms p99={result['p99_ms']:8.1f}ms errors={result['errors']}"
+      )
+
+
+if __name__ == "__main__":
+  main()
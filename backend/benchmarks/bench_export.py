@@ -0,0 +1,106 @@
+"""
+成绩导出吞吐：在临时 SQLite 文件库里合成 --rows 条成绩（--users 个用户），用 ScoreExporter 分别流式导出
+NDJSON 与 CSV（输出丢弃，只计字节），给出 rows/s 与 MiB/s；再单独量峰值内存，对比流式导出
+（与 --batch-size 相关）和先 fetchall 再整体编码（与总行数相关）。
+PostgreSQL 上 stream_results 走命名游标，行为与此一致；SQLite 的游标本身即逐行读取。
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.bench_export [--rows 500000] [--users 10000] [--batch-size 5000]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+
+from app.core.db import Base
+from app.models import Level, Score, User
+from app.services.export import EXPORT_FORMATS, ScoreExporter, csv_chunk, export_query, ndjson_chunk
+
+
+def populate(engine, rows: int, users: int) -> None:
+  rng = random.Random(1)
+  start = datetime(2026, 1, 1)
+  Base.metadata.create_all(engine)
+  with engine.begin() as conn:
+    conn.execute(insert(Level), [{"id": "endless", "config_json": {}, "version": "1", "hash": "h"}])
+    conn.execute(insert(User), [{"id": i, "name": f"player-{i}", "hash_pwd": "x"} for i in range(1, users + 1)])
+    for offset in range(0, rows, 50_000):
+      conn.execute(
+        insert(Score),
+        [
+          {
+            "user_id": rng.randint(1, users),
+            "level_id": "endless",
+            "score": rng.randint(0, 100_000),
+            "wave": rng.randint(1, 60),
+            "time_ms": rng.randint(10_000, 3_600_000),
+            "life_left": rng.randint(0, 20),
+            "created_at": start + timedelta(seconds=i * 7),
+            "replay_status": rng.choice((None, "verified")),
+          }
+          for i in range(offset, min(rows, offset + 50_000))
+        ],
+      )
+
+
+def stream(engine, fmt: str, batch_size: int) -> ScoreExporter:
+  exporter = ScoreExporter(engine, fmt, batch_size=batch_size)
+  for _ in exporter.chunks():
+    pass
+  return exporter
+
+
+def buffered(engine, fmt: str) -> int:
+  """旧做法：一次取回全部行再整体编码。"""
+  with engine.connect() as conn:
+    rows = conn.execute(export_query()).all()
+  return len((ndjson_chunk if fmt == "ndjson" else csv_chunk)(rows))
+
+
+def peak(fn) -> int:
+  """单独跑一次量峰值内存：tracemalloc 会把编码拖慢数倍，不与计时混在一起。"""
+  tracemalloc.start()
+  fn()
+  memory = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return memory
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--rows", type=int, default=500_000)
+  parser.add_argument("--users", type=int, default=10_000)
+  parser.add_argument("--batch-size", type=int, default=5000)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    engine = create_engine(f"sqlite:///{os.path.join(tmp, 'export.db')}")
+    begin = time.perf_counter()
+    populate(engine, args.rows, args.users)
+    print(f"{args.rows} scores / {args.users} users generated in {time.perf_counter() - begin:.1f}s")
+
+    for fmt in EXPORT_FORMATS:
+      stats = stream(engine, fmt, args.batch_size).stats
+      print(
+        f"{fmt:<6} stream: {stats.rows_per_second:>9.0f} rows/s | {stats.bytes / stats.elapsed / 2**20:6.1f} MiB/s"
+        f" | {stats.bytes / stats.rows:5.1f} B/row | {stats.elapsed:.2f}s"
+      )
+
+    for fmt in EXPORT_FORMATS:
+      streamed = peak(lambda fmt=fmt: stream(engine, fmt, args.batch_size))
+      whole = peak(lambda fmt=fmt: buffered(engine, fmt))
+      print(
+        f"{fmt:<6} peak memory: stream (batch {args.batch_size}) {streamed / 2**20:7.1f} MiB"
+        f" vs fetchall {whole / 2**20:7.1f} MiB"
+      )
+    engine.dispose()
+
+
+if __name__ == "__main__":
+  main()
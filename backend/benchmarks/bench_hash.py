@@ -0,0 +1,70 @@
+"""
+FNV-1a 基准：原逐字符实现 vs 字节快路径，配置大小 4 KB ~ 4 MB，并校验输出一致。
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.bench_hash [--repeat 3]
+"""
+
+import argparse
+import time
+
+from app.utils.hash import FNV_OFFSET, FNV_PRIME, fnv1a_hash, hash_level_config, stable_dumps
+
+SIZES = [4 << 10, 64 << 10, 512 << 10, 4 << 20]
+
+
+def reference_fnv1a(data: str) -> str:
+  hash_val = FNV_OFFSET
+  for ch in data:
+    hash_val ^= ord(ch)
+    hash_val = (hash_val * FNV_PRIME) % (1 << 32)
+  return f"fnv1a-{hash_val:08x}"
+
+
+def synthetic_config(target_bytes: int) -> dict:
+  """构造近似目标大小的关卡配置：大网格 + 大量 blocked 格子。"""
+  side = 64
+  blocked = []
+  config = {
+    "metadata": {"id": "bench", "version": "0.0.0", "hash": ""},
+    "grid": {"width": side, "height": side, "blocked": blocked},
+  }
+  while len(stable_dumps(config)) < target_bytes:
+    missing = target_bytes - len(stable_dumps(config))
+    for _ in range(max(1, missing // 20)):
+      i = len(blocked)
+      blocked.append({"x": i % 1000, "y": i // 1000})
+  return config
+
+
+def best_of(fn, repeat: int) -> float:
+  timings = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    fn()
+    timings.append(time.perf_counter() - start)
+  return min(timings)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--repeat", type=int, default=3)
+  args = parser.parse_args()
+
+  print(f"{'size':>10} {'dumps ms':>10} {'reference ms':>13} {'fast ms':>10} {'fast MB/s':>10} {'speedup':>8}")
+  for size in SIZES:
+    config = synthetic_config(size)
+    payload = stable_dumps(config)
+    assert reference_fnv1a(payload) == fnv1a_hash(payload) == hash_level_config(config)
+    dumps = best_of(lambda config=config: stable_dumps(config), args.repeat)
+    ref = best_of(lambda payload=payload: reference_fnv1a(payload), args.repeat)
+    fast = best_of(lambda payload=payload: fnv1a_hash(payload), args.repeat)
+    mb = len(payload) / (1 << 20)
+    print(
+      f"{len(payload):>10} {dumps * 1e3:>10.2f} {ref * 1e3:>13.2f} {fast * 1e3:>10.2f}"
+      f" {mb / fast:>10.1f} {ref / fast:>7.1f}x"
+    )
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,100 @@
+"""
+成绩写入基准：逐请求 commit（INSERT + upsert + commit）vs ScoreWriter 组提交。
+--clients 个线程并发提交，每个线程 --per-client 条成绩，统计吞吐与 commit 次数。
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.bench_ingest [--database-url postgresql+psycopg2://...] [--clients 64] [--per-client 50]
+未指定 --database-url 时使用临时 SQLite 文件（每次 commit 都会 fsync，最能体现组提交的收益）。
+"""
+
+import argparse
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import create_engine, delete, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.core.db import Base
+from app.models import Level, Score, User, UserLevelBest
+from app.services.best_scores import best_upsert
+from app.services.ingest import ScoreWriter
+
+
+def prepare(engine, users: int) -> None:
+  Base.metadata.create_all(bind=engine)
+  with engine.begin() as conn:
+    conn.execute(delete(UserLevelBest.__table__))
+    conn.execute(delete(Score.__table__))
+    conn.execute(delete(User.__table__))
+    conn.execute(delete(Level.__table__))
+    conn.execute(Level.__table__.insert(), {"id": "endless", "config_json": {}, "version": "1", "hash": "h"})
+    conn.execute(User.__table__.insert(), [{"id": i, "name": f"u{i}", "hash_pwd": ""} for i in range(1, users + 1)])
+
+
+def score_values(user_id: int, i: int) -> dict:
+  return {
+    "user_id": user_id,
+    "level_id": "endless",
+    "score": (user_id * 7919 + i * 104729) % 100_000,
+    "wave": 1,
+    "time_ms": 60_000 + i,
+    "life_left": 0,
+    "created_at": datetime.utcnow(),
+  }
+
+
+def run(label: str, engine, clients: int, per_client: int, submit) -> float:
+  start = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=clients) as pool:
+    list(pool.map(lambda user_id: [submit(score_values(user_id, i)) for i in range(per_client)], range(1, clients + 1)))
+  elapsed = time.perf_counter() - start
+  total = clients * per_client
+  with engine.connect() as conn:
+    assert conn.execute(select(func.count()).select_from(Score)).scalar_one() == total
+  print(f"{label:<22} {total / elapsed:10.0f} rows/s  ({elapsed:.2f}s)", end="")
+  return total / elapsed
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--database-url")
+  parser.add_argument("--clients", type=int, default=64)
+  parser.add_argument("--per-client", type=int, default=50)
+  parser.add_argument("--max-batch", type=int, default=500)
+  parser.add_argument("--max-latency-ms", type=int, default=20)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    url = args.database_url or f"sqlite:///{Path(tmp) / 'bench.db'}"
+    # SQLite 单写锁：并发逐请求 commit 时需等锁而非立刻报 database is locked
+    connect_args = {"timeout": 60} if url.startswith("sqlite") else {}
+    engine = create_engine(url, pool_size=args.clients, max_overflow=0, connect_args=connect_args)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False)
+    dialect = engine.dialect.name
+
+    prepare(engine, args.clients)
+
+    def per_request(values: dict) -> int:
+      with SessionLocal() as db:
+        score_id, _ = db.execute(insert(Score).values(**values).returning(Score.id, Score.created_at)).one()
+        db.execute(best_upsert(dialect, {**values, "score_id": score_id}))
+        db.commit()
+      return score_id
+
+    before = run("per-request commit", engine, args.clients, args.per_client, per_request)
+    print(f"  commits={args.clients * args.per_client}")
+
+    prepare(engine, args.clients)
+    writer = ScoreWriter(SessionLocal, args.max_batch, args.max_latency_ms / 1000).start()
+    after = run("write-behind batches", engine, args.clients, args.per_client, lambda v: writer.submit(v).result())
+    writer.stop()
+    print(f"  commits={writer.batches} (avg batch {writer.rows / writer.batches:.1f})")
+    print(f"speedup: {after / before:.1f}x")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+  main()
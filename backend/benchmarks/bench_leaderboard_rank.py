@@ -0,0 +1,134 @@
+"""
+大榜单名次查询基准（默认 10^6 成员）：Redis（ZREVRANK + 前后窗口、游标翻页）与内存回退对照，
+并与「分块拉取全榜线性查找名次」的旧做法比较；同时抽样核对两种后端的名次/窗口一致。
+fakeredis 替身只验证语义；绝对数字以真实 Redis（--redis-url）为准。
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.bench_leaderboard_rank [--redis-url redis://...] [--members 1000000] [--queries 2000]
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime
+
+import redis
+
+from app.core.config import get_settings
+from app.schemas import LeaderboardEntry
+from app.services.leaderboard import AROUND_SCRIPT, PAGE_SCRIPT, Leaderboard, rank_score
+
+from ._redis import percentile, redis_url
+
+settings = get_settings()
+LEVEL = "bench-rank"
+
+
+def make_entries(count: int, seed: int):
+  rng = random.Random(seed)
+  created = datetime(2024, 1, 1)
+  # time_ms 取 user_id，保证 ZSET 分值唯一，避免完全同分时的次序约定差异影响核对
+  return [
+    LeaderboardEntry.model_construct(
+      user_id=user_id,
+      name=f"u{user_id}",
+      score=rng.randrange(10**6),
+      wave=1,
+      time_ms=user_id,
+      life_left=1,
+      created_at=created,
+    )
+    for user_id in range(count)
+  ]
+
+
+def fill_redis(client: redis.Redis, leaderboard: Leaderboard, entries) -> None:
+  """直接 ZADD/HSET 批量灌数（等价于逐条 submit 后的状态），比逐条跑脚本快得多。"""
+  key = leaderboard._key(LEVEL)
+  client.delete(key, f"{key}:payloads")
+  for start in range(0, len(entries), 10_000):
+    batch = entries[start : start + 10_000]
+    pipe = client.pipeline(transaction=False)
+    pipe.zadd(key, {str(e.user_id): rank_score(e.score, e.time_ms) for e in batch})
+    pipe.hset(f"{key}:payloads", mapping={str(e.user_id): json.dumps(e.model_dump(mode="json")) for e in batch})
+    pipe.execute()
+
+
+def legacy_rank(client: redis.Redis, key: str, user_id: int, chunk: int = 10_000) -> int:
+  """旧做法：没有名次接口，只能从头分块拉取再线性查找。"""
+  member, start = str(user_id), 0
+  while True:
+    members = client.zrevrange(key, start, start + chunk - 1)
+    if member in members:
+      return start + members.index(member)
+    if len(members) < chunk:
+      return -1
+    start += chunk
+
+
+def timed(label: str, fn, args_list) -> None:
+  samples = []
+  for args in args_list:
+    start = time.perf_counter()
+    fn(*args)
+    samples.append(time.perf_counter() - start)
+  print(
+    f"{label:<34} {len(samples) / sum(samples):9.0f} ops/s"
+    f"  p50={percentile(samples, 50) * 1e6:8.1f}us  p99={percentile(samples, 99) * 1e6:8.1f}us"
+  )
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--redis-url")
+  parser.add_argument("--members", type=int, default=1_000_000)
+  parser.add_argument("--queries", type=int, default=200)
+  parser.add_argument("--legacy-queries", type=int, default=5)
+  args = parser.parse_args()
+  settings.leaderboard_memory_capacity = max(settings.leaderboard_memory_capacity, args.members)
+
+  entries = make_entries(args.members, seed=1)
+  rng = random.Random(2)
+  users = [(rng.randrange(args.members),) for _ in range(args.queries)]
+
+  memory = Leaderboard(None)
+  start = time.perf_counter()
+  for entry in entries:
+    memory.submit(LEVEL, entry)
+  print(f"memory fill {args.members}: {time.perf_counter() - start:.1f}s")
+
+  with redis_url(args.redis_url) as url:
+    client = redis.Redis.from_url(url, decode_responses=True)
+    leaderboard = Leaderboard(client)
+    # 预先 SCRIPT LOAD：fakeredis TCP 替身在返回 NOSCRIPT 后会断开连接
+    for script in (PAGE_SCRIPT, AROUND_SCRIPT):
+      client.script_load(script)
+    start = time.perf_counter()
+    fill_redis(client, leaderboard, entries)
+    print(f"redis fill {args.members}: {time.perf_counter() - start:.1f}s")
+
+    # 一致性抽样：名次、总数与 ±5 窗口
+    for (user_id,) in users[:200]:
+      r_rank, r_total, r_entries = leaderboard.around(LEVEL, user_id, radius=5)
+      m_rank, m_total, m_entries = memory.around(LEVEL, user_id, radius=5)
+      assert (r_rank, r_total) == (m_rank, m_total), (user_id, r_rank, m_rank)
+      assert [e.user_id for e in r_entries] == [e.user_id for e in m_entries]
+    cursors = [(leaderboard.page(LEVEL, limit=100)[1],)]
+    assert memory.page(LEVEL, limit=100)[1] == cursors[0][0]
+    print("parity: redis and memory agree on sampled ranks/windows")
+
+    key = leaderboard._key(LEVEL)
+    timed("redis ZREVRANK", lambda u: client.zrevrank(key, u), users)
+    timed("redis rank + around(5)", lambda u: leaderboard.around(LEVEL, u, radius=5), users)
+    timed("redis page(limit=100, cursor)", lambda c: leaderboard.page(LEVEL, limit=100, cursor=c), cursors * len(users))
+    timed("memory rank + around(5)", lambda u: memory.around(LEVEL, u, radius=5), users)
+    timed("memory page(limit=100, cursor)", lambda c: memory.page(LEVEL, limit=100, cursor=c), cursors * len(users))
+
+    timed("legacy chunked ZREVRANGE + scan", lambda u: legacy_rank(client, key, u), users[: args.legacy_queries])
+    client.delete(key, f"{key}:payloads")
+    client.close()
+
+
+if __name__ == "__main__":
+  main()
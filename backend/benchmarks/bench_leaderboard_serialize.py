@@ -0,0 +1,100 @@
+"""
+GET /leaderboard 序列化微基准（limit=100）：
+旧路径 = 逐条 json.loads + LeaderboardEntry 模型 → LeaderboardResponse → 按 response_model 再校验 → json.dumps；
+新路径 = 存储的 payload 字节原样拼接（Leaderboard.page_raw + leaderboard_body）。
+分别给出只算序列化（payload 已取回）与含 Redis 读取（进程内 fakeredis）的耗时。
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.bench_leaderboard_serialize [--limit 100] [--iterations 2000]
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime
+
+import fakeredis
+
+from app.api.routes import leaderboard_body
+from app.schemas import LeaderboardEntry, LeaderboardResponse
+from app.services.leaderboard import Leaderboard, _decode
+
+
+def legacy_body(level: str, scope: str, entries, next_cursor) -> bytes:
+  # FastAPI response_model 路径：返回值按 LeaderboardResponse 校验后转 JSON 兼容 dict，再由 JSONResponse dumps
+  response = LeaderboardResponse(level=level, scope=scope, entries=entries, next_cursor=next_cursor)
+  content = LeaderboardResponse.model_validate(response.model_dump()).model_dump(mode="json")
+  return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def bench(label: str, fn, iterations: int) -> float:
+  fn()
+  start = time.perf_counter()
+  for _ in range(iterations):
+    fn()
+  per_call_us = (time.perf_counter() - start) / iterations * 1e6
+  print(f"{label:<40} {per_call_us:9.1f} us/request")
+  return per_call_us
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--limit", type=int, default=100)
+  parser.add_argument("--members", type=int, default=1000)
+  parser.add_argument("--iterations", type=int, default=2000)
+  args = parser.parse_args()
+
+  client = fakeredis.FakeRedis(decode_responses=True)
+  leaderboard = Leaderboard(client)
+  for user_id in range(args.members):
+    leaderboard.submit(
+      "endless",
+      LeaderboardEntry(
+        user_id=user_id,
+        name=f"player-{user_id}",
+        score=100_000 - user_id,
+        wave=20,
+        time_ms=600_000 + user_id,
+        life_left=5,
+        created_at=datetime(2026, 1, 1, 12, 0, 0, 123456),
+      ),
+    )
+
+  key = leaderboard._key("endless")
+  payloads = leaderboard._page_payloads(key, args.limit, None)
+  raw = [payload.encode() for payload in payloads]
+  entries, cursor = leaderboard.page("endless", limit=args.limit)
+  _, raw_cursor = leaderboard.page_raw("endless", limit=args.limit)
+  assert json.loads(leaderboard_body("endless", "all", raw, raw_cursor)) == json.loads(
+    legacy_body("endless", "all", entries, cursor)
+  )
+
+  print(f"limit={args.limit}, serialization only:")
+  before = bench(
+    "  json.loads + models + revalidate",
+    lambda: legacy_body("endless", "all", _decode(payloads), cursor),
+    args.iterations,
+  )
+  after = bench(
+    "  raw payload splice",
+    lambda: leaderboard_body("endless", "all", [p.encode() for p in payloads], cursor),
+    args.iterations,
+  )
+  print(f"  speedup: {before / after:.1f}x")
+
+  print(f"limit={args.limit}, including Redis page script (in-process fakeredis):")
+  before = bench(
+    "  page + models + revalidate",
+    lambda: legacy_body("endless", "all", *leaderboard.page("endless", limit=args.limit)),
+    args.iterations // 4,
+  )
+  after = bench(
+    "  page_raw + splice",
+    lambda: leaderboard_body("endless", "all", *leaderboard.page_raw("endless", limit=args.limit)),
+    args.iterations // 4,
+  )
+  print(f"  speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,91 @@
+"""
+榜单提交吞吐：旧版 5 次往返（ZSCORE/ZADD/HSET/ZREMRANGEBYRANK/PUBLISH）vs 单次 Lua 脚本。
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.bench_leaderboard_submit [--redis-url ...] [--submits 5000] [--workers 8]
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import redis
+
+from app.core.config import get_settings
+from app.schemas import LeaderboardEntry
+from app.services.leaderboard import SUBMIT_SCRIPT, Leaderboard
+
+from ._redis import percentile, redis_url
+
+settings = get_settings()
+
+
+def legacy_submit(client: redis.Redis, key: str, entry: LeaderboardEntry) -> None:
+  """旧实现：多次往返，读-比较-写之间存在竞态，payload 哈希不随 ZSET 截断。"""
+  member = str(entry.user_id)
+  payload = entry.model_dump(mode="json")
+  prev_score = client.zscore(key, member)
+  if prev_score is None or entry.score > prev_score:
+    client.zadd(key, {member: entry.score})
+    client.hset(f"{key}:payloads", member, json.dumps(payload))
+  client.zremrangebyrank(key, 0, -(settings.leaderboard_size + 1))
+  client.publish(f"{key}:events", json.dumps({"type": "update"}))
+
+
+def make_entry(i: int) -> LeaderboardEntry:
+  return LeaderboardEntry(
+    user_id=i % 1000,
+    name=f"u{i % 1000}",
+    score=(i * 7919) % 100000,
+    wave=5,
+    time_ms=60000,
+    life_left=3,
+    created_at=datetime(2024, 1, 1),
+  )
+
+
+def run(label: str, submit, submits: int, workers: int) -> None:
+  latencies = []
+
+  def one(i: int) -> None:
+    start = time.perf_counter()
+    submit(make_entry(i))
+    latencies.append(time.perf_counter() - start)
+
+  start = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=workers) as pool:
+    list(pool.map(one, range(submits)))
+  elapsed = time.perf_counter() - start
+  print(
+    f"{label:<10} submits/s={submits / elapsed:8.0f}"
+    f" p50={percentile(latencies, 50) * 1e3:6.2f}ms p99={percentile(latencies, 99) * 1e3:6.2f}ms"
+  )
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--redis-url")
+  parser.add_argument("--submits", type=int, default=5000)
+  parser.add_argument("--workers", type=int, default=8)
+  args = parser.parse_args()
+
+  with redis_url(args.redis_url) as url:
+    client = redis.from_url(url, decode_responses=True)
+    leaderboard = Leaderboard(client)
+    legacy_key = "leaderboard:bench-legacy:all"
+    # 预先 SCRIPT LOAD：fakeredis TCP 替身在返回 NOSCRIPT 后会断开连接
+    client.script_load(SUBMIT_SCRIPT)
+
+    run("legacy", lambda e: legacy_submit(client, legacy_key, e), args.submits, args.workers)
+    run("lua", lambda e: leaderboard.submit("bench-lua", e), args.submits, args.workers)
+
+    lua_key = leaderboard._key("bench-lua")
+    print(f"payload hash size: legacy={client.hlen(f'{legacy_key}:payloads')} lua={client.hlen(f'{lua_key}:payloads')}")
+    client.delete(legacy_key, f"{legacy_key}:payloads", lua_key, f"{lua_key}:payloads")
+    client.close()
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,87 @@
+"""
+关卡编译：在 64² ~ 512² 的合成网格上测量一次编译（BFS 距离场 + 流场 + A* 基础路径）的耗时与下发体积，
+并对比编译后每个敌人取路径的成本：从入口跑一次 A*（前端每次建塔对每个敌人的做法）vs 沿流场查表。
+两种布局：random（20% 随机障碍，开阔）与 maze（蛇形走廊，路径最长约为格数的一半）。
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.bench_level_compile [--sizes 64,128,256,512] [--seed 1]
+"""
+
+import argparse
+import gzip
+import json
+import random
+import time
+from typing import Any, Dict
+
+from app.services.level_compiler import bfs_distance, compile_level, flow_field
+from app.services.simulation import find_path
+
+
+def random_grid(size: int, seed: int) -> Dict[str, Any]:
+  rng = random.Random(seed)
+  ends = {(0, 0), (size - 1, size - 1)}
+  blocked = [{"x": x, "y": y} for y in range(size) for x in range(size) if rng.random() < 0.2 and (x, y) not in ends]
+  return {
+    "width": size,
+    "height": size,
+    "entry": {"x": 0, "y": 0},
+    "exit": {"x": size - 1, "y": size - 1},
+    "blocked": blocked,
+  }
+
+
+def maze_grid(size: int) -> Dict[str, Any]:
+  """奇数行为墙，缺口左右交替：从左上走到最后一个偶数行的末端。"""
+  blocked = [
+    {"x": x, "y": y} for y in range(1, size, 2) for x in range(size) if x != (size - 1 if (y // 2) % 2 == 0 else 0)
+  ]
+  last = size - 1 if size % 2 else size - 2
+  exit_x = size - 1 if (last // 2) % 2 == 0 else 0
+  return {
+    "width": size,
+    "height": size,
+    "entry": {"x": 0, "y": 0},
+    "exit": {"x": exit_x, "y": last},
+    "blocked": blocked,
+  }
+
+
+def timed(fn):
+  start = time.perf_counter()
+  result = fn()
+  return result, time.perf_counter() - start
+
+
+def run(name: str, grid: Dict[str, Any]) -> None:
+  size = grid["width"]
+  blocked = frozenset((c["x"], c["y"]) for c in grid["blocked"])
+  entry, exit_ = (grid["entry"]["x"], grid["entry"]["y"]), (grid["exit"]["x"], grid["exit"]["y"])
+  compiled, total = timed(lambda: compile_level({"grid": grid}))
+  dist, bfs = timed(lambda: bfs_distance(size, size, blocked, exit_))
+  _, flow = timed(lambda: flow_field(dist))
+  _, astar = timed(lambda: find_path(size, size, entry, exit_, blocked))
+  path, lookup = timed(lambda: compiled.path_from(entry))
+  assert len(path) == len(compiled.base_path)
+  body = json.dumps(compiled.attachment()).encode()
+  print(
+    f"{name:<6} {size:>3}x{size:<3} compile {total * 1000:8.1f} ms"
+    f" (bfs {bfs * 1000:7.1f}, flow {flow * 1000:5.1f}, A* {astar * 1000:7.1f})"
+    f" | path {len(path):>6} cells: A* {astar * 1000:7.1f} ms vs flow lookup {lookup * 1000:6.2f} ms"
+    f" | attachment {len(body) / 1024:7.1f} KiB (gzip {len(gzip.compress(body)) / 1024:6.1f} KiB)"
+  )
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--sizes", default="64,128,256,512")
+  parser.add_argument("--seed", type=int, default=1)
+  args = parser.parse_args()
+
+  for size in (int(s) for s in args.sizes.split(",")):
+    run("random", random_grid(size, args.seed))
+    run("maze", maze_grid(size))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,61 @@
+"""
+关卡读取基准：对比旧版「每次请求读盘 + 解析 + 计算 hash」与注册表字典查找的单次开销。
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.bench_levels [--iterations 2000]
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from app.core.config import get_settings
+from app.services.levels import LevelRegistry
+from app.utils.hash import hash_level_config
+
+
+def legacy_load_level(level_dir: Path, level_id: str) -> dict:
+  """旧实现：每次调用都读文件、解析并重算 hash。"""
+  level_path = Path(level_dir) / f"{level_id}.json"
+  if not level_path.exists():
+    raise FileNotFoundError(f"Level {level_id} not found")
+  raw = json.loads(level_path.read_text(encoding="utf-8"))
+  metadata = raw.get("metadata", {})
+  computed_hash = hash_level_config({**raw, "metadata": {**metadata, "hash": ""}})
+  raw["metadata"] = {**metadata, "hash": computed_hash}
+  return {"id": level_id, "version": raw["metadata"]["version"], "hash": computed_hash, "config": raw}
+
+
+def bench(label: str, fn, iterations: int) -> float:
+  start = time.perf_counter()
+  for _ in range(iterations):
+    fn()
+  per_call_us = (time.perf_counter() - start) / iterations * 1e6
+  print(f"{label:<28} {per_call_us:10.2f} us/request")
+  return per_call_us
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--level", default="endless")
+  parser.add_argument("--iterations", type=int, default=2000)
+  args = parser.parse_args()
+
+  level_dir = get_settings().level_dir
+  registry = LevelRegistry(level_dir)
+  registry.load_all()
+  # interval=0：每次都 stat，作为最坏情况
+  registry_stat = LevelRegistry(level_dir, check_interval=0)
+  registry_stat.load_all()
+
+  assert legacy_load_level(level_dir, args.level)["hash"] == registry.get(args.level).hash
+
+  before = bench("legacy load_level", lambda: legacy_load_level(level_dir, args.level), args.iterations)
+  after = bench("registry (cached)", lambda: registry.get(args.level), args.iterations)
+  bench("registry (stat every call)", lambda: registry_stat.get(args.level), args.iterations)
+  print(f"speedup (cached): {before / after:.0f}x")
+
+
+if __name__ == "__main__":
+  main()
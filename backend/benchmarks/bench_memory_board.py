@@ -0,0 +1,85 @@
+"""
+内存榜单基准：旧版「线性查找 + 每次全量排序」vs MemoryBoard（索引 + 分块有序键），规模 10^5 ~ 10^6。
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.bench_memory_board [--sizes 100000 1000000] [--ops 20000]
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime
+
+from app.schemas import LeaderboardEntry
+from app.services.memory_board import MemoryBoard
+
+
+def legacy_submit(bucket: list, entry: LeaderboardEntry, size: int) -> None:
+  """旧内存实现（不截断到 10 条，以便同规模对比）。"""
+  existing_idx = next((i for i, e in enumerate(bucket) if e.user_id == entry.user_id), None)
+  if existing_idx is None:
+    bucket.append(entry)
+  else:
+    existing = bucket[existing_idx]
+    if entry.score > existing.score or (entry.score == existing.score and entry.time_ms < existing.time_ms):
+      bucket[existing_idx] = entry
+  bucket.sort(key=lambda e: (-e.score, e.time_ms))
+  if len(bucket) > size:
+    bucket[:] = bucket[:size]
+
+
+def make_entries(count: int, users: int, seed: int):
+  rng = random.Random(seed)
+  created = datetime(2024, 1, 1)
+  return [
+    LeaderboardEntry.model_construct(
+      user_id=rng.randrange(users),
+      name="u",
+      score=rng.randrange(10**7),
+      wave=1,
+      time_ms=rng.randrange(10**6),
+      life_left=1,
+      created_at=created,
+    )
+    for _ in range(count)
+  ]
+
+
+def timed(fn, count: int) -> float:
+  start = time.perf_counter()
+  fn()
+  return count / (time.perf_counter() - start)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+  parser.add_argument("--ops", type=int, default=20_000)
+  parser.add_argument("--legacy-ops", type=int, default=20)
+  args = parser.parse_args()
+
+  for size in args.sizes:
+    board = MemoryBoard(capacity=size)
+    fill = make_entries(size, size * 4, seed=1)
+    fill_rate = timed(lambda board=board, fill=fill: [board.submit(e) for e in fill], size)
+    ops = make_entries(args.ops, size * 4, seed=2)
+    submit_rate = timed(lambda board=board, ops=ops: [board.submit(e) for e in ops], args.ops)
+    users = [e.user_id for e in fill[: args.ops]]
+    rank_rate = timed(lambda board=board, users=users: [board.rank(u) for u in users], len(users))
+    top_rate = timed(lambda board=board: [board.top(100) for _ in range(1000)], 1000)
+
+    bucket = sorted(fill, key=lambda e: (-e.score, e.time_ms))
+    legacy_ops = make_entries(args.legacy_ops, size * 4, seed=3)
+    legacy_rate = timed(
+      lambda bucket=bucket, size=size, legacy_ops=legacy_ops: [legacy_submit(bucket, e, size) for e in legacy_ops],
+      args.legacy_ops,
+    )
+
+    print(
+      f"n={len(board):>8}  fill={fill_rate:9.0f}/s  submit={submit_rate:9.0f}/s  legacy submit={legacy_rate:7.1f}/s"
+      f"  rank={rank_rate:9.0f}/s  top100={top_rate:7.0f}/s"
+    )
+
+
+if __name__ == "__main__":
+  main()
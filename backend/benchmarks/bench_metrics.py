@@ -0,0 +1,169 @@
+"""
+/metrics 埋点开销：同一组请求（POST /score + GET /score/best + GET /leaderboard）在关闭/开启埋点
+（HTTP 中间件 + SQLAlchemy cursor 事件 + 按命令计时的 Redis 客户端）下交替跑若干轮，比较每轮平均请求耗时的中位数。
+另给出各埋点原语的单次开销，以及按“每请求观测次数 × 单次开销”估算的占比（单核机器上端到端 A/B 的噪声常大于埋点本身）。
+进程内 ASGI 调用（httpx.ASGITransport），Redis 为进程内 fakeredis，数据库为临时 SQLite 文件。
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.bench_metrics [--rounds 10] [--requests 300]
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import fakeredis
+import httpx
+import redis
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api.routes import router as api_router, sync_router
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.db import get_db
+from app.main import lifespan
+from app.services.leaderboard import Leaderboard
+from app.services.levels import load_level
+from app.utils.nonce import NonceStore
+
+from .bench_db_stacks import _sqlite_pragmas, prepare_database, signed_payload
+
+settings = get_settings()
+
+
+def build_app(database_url: str, server: fakeredis.FakeServer, instrumented: bool) -> FastAPI:
+  app = FastAPI(lifespan=lifespan)
+  if instrumented:
+    app.add_middleware(metrics.MetricsMiddleware)
+  app.include_router(api_router, prefix=settings.api_prefix)
+  app.include_router(sync_router, prefix=settings.api_prefix)
+  engine = create_engine(database_url)
+  _sqlite_pragmas(engine)
+  if instrumented:
+    metrics.instrument_engine(engine)
+  sessions = sessionmaker(bind=engine, autoflush=False)
+
+  def override_db():
+    db = sessions()
+    try:
+      yield db
+    finally:
+      db.close()
+
+  app.dependency_overrides[get_db] = override_db
+  pool = redis.ConnectionPool(connection_class=fakeredis.FakeRedisConnection, server=server, decode_responses=True)
+  app.state.redis_client = (metrics.InstrumentedRedis if instrumented else redis.Redis)(connection_pool=pool)
+  return app
+
+
+async def run_round(app: FastAPI, http: httpx.AsyncClient, token: str, requests: int, offset: int) -> float:
+  """顺序发送 requests 个请求（三种请求轮换），返回平均耗时（秒）。"""
+  level = load_level("endless")
+  headers = {"Authorization": f"Bearer {token}"}
+  start = time.perf_counter()
+  for i in range(requests):
+    kind = i % 3
+    if kind == 0:
+      res = await http.post(f"{settings.api_prefix}/score", json=signed_payload(level, offset + i), headers=headers)
+    elif kind == 1:
+      res = await http.get(f"{settings.api_prefix}/score/best", params={"level": "endless"}, headers=headers)
+    else:
+      res = await http.get(f"{settings.api_prefix}/leaderboard", params={"level": "endless"})
+    assert res.status_code == 200, res.text
+  return (time.perf_counter() - start) / requests
+
+
+async def compare(database_url: str, token: str, rounds: int, requests: int) -> dict:
+  server = fakeredis.FakeServer()
+  apps = {mode: build_app(database_url, server, mode == "on") for mode in ("off", "on")}
+  results = {"off": [], "on": []}
+  observations_before = observation_count()
+  async with lifespan(apps["off"]), lifespan(apps["on"]):
+    clients = {}
+    for mode, app in apps.items():
+      # lifespan 连不上本地 Redis 时各服务为内存回退；换成共享 fakeredis 上的客户端
+      client = app.state.redis_client
+      app.state.leaderboard = Leaderboard(client)
+      app.state.nonce_store = NonceStore(client)
+      clients[mode] = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+    try:
+      # 预热：建连接、加载脚本、填充缓存
+      for mode in apps:
+        await run_round(apps[mode], clients[mode], token, 30, 0)
+      for r in range(rounds):
+        # 交替先后顺序，抵消漂移
+        for mode in ("off", "on") if r % 2 == 0 else ("on", "off"):
+          results[mode].append(await run_round(apps[mode], clients[mode], token, requests, (r + 1) * 10 * requests))
+    finally:
+      for http in clients.values():
+        await http.aclose()
+  summary = {mode: statistics.median(values) for mode, values in results.items()}
+  # 预热轮也走了埋点
+  summary["observations_per_request"] = (observation_count() - observations_before) / (rounds * requests + 30)
+  return summary
+
+
+def observation_count() -> int:
+  """已记录的直方图观测 + 计数器累加次数（Redis 每条命令各一次）。"""
+  total = sum(
+    row_total(h) for h in (metrics.http_request_duration, metrics.db_query_duration, metrics.redis_command_duration)
+  )
+  return total + int(sum(metrics.redis_commands._values.values()))
+
+
+def row_total(histogram: metrics.Histogram) -> int:
+  return int(sum(sum(row[:-1]) for row in histogram._values.values()))
+
+
+def primitive_costs(iterations: int = 200_000) -> dict:
+  histogram = metrics.Histogram("td_bench_seconds", "bench", ("route",))
+  counter = metrics.Counter("td_bench_total", "bench", ("command",))
+  costs = {}
+  for label, fn in (
+    ("Histogram.observe", lambda: histogram.observe(("GET /api/leaderboard",), 0.0012)),
+    ("Counter.inc", lambda: counter.inc("EVALSHA")),
+    ("perf_counter pair", lambda: time.perf_counter() - time.perf_counter()),
+  ):
+    start = time.perf_counter()
+    for _ in range(iterations):
+      fn()
+    costs[label] = (time.perf_counter() - start) / iterations
+    print(f"  {label:<20} {costs[label] * 1e9:7.0f} ns")
+  return costs
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--rounds", type=int, default=10)
+  parser.add_argument("--requests", type=int, default=300)
+  args = parser.parse_args()
+
+  print("instrumentation primitives:")
+  costs = primitive_costs()
+  with tempfile.TemporaryDirectory() as tmp:
+    database_url = f"sqlite:///{Path(tmp) / 'bench.db'}"
+    token = prepare_database(database_url, 1)[0]
+    r = asyncio.run(compare(database_url, token, args.rounds, args.requests))
+  overhead = (r["on"] - r["off"]) / r["off"] * 100
+  # 每次观测 ≈ 一次 observe（或 inc）+ 一对 perf_counter
+  per_observation = costs["Histogram.observe"] + costs["perf_counter pair"]
+  estimated = r["observations_per_request"] * per_observation / r["off"] * 100
+  print(
+    f"mixed requests: off={r['off'] * 1e6:7.0f}us on={r['on'] * 1e6:7.0f}us per request"
+    f" | measured overhead {overhead:+.2f}%"
+  )
+  print(
+    f"observations/request={r['observations_per_request']:.1f}"
+    f" -> estimated overhead {r['observations_per_request'] * per_observation * 1e6:.1f}us ({estimated:.2f}%)"
+  )
+  if estimated > 2:
+    print("WARNING: instrumentation overhead above the 2% budget")
+
+
+if __name__ == "__main__":
+  main()
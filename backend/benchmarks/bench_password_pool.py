@@ -0,0 +1,117 @@
+"""
+登录洪峰下的榜单延迟：--logins 个客户端循环 POST /auth/login，同时 --readers 个客户端循环 GET /leaderboard。
+对比 pbkdf2 在请求线程内执行（旧行为，workers=0 且不限在途）与独立进程池（--workers，在途上限 --max-pending）。
+进程内 ASGI 调用（httpx.ASGITransport）；同步栈，榜单走内存回退，数据库为临时 SQLite 文件。
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.bench_password_pool [--logins 200] [--readers 20] [--seconds 10] [--workers 2]
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+
+from app.core.config import get_settings
+from app.main import lifespan
+from app.models import User
+from app.services.passwords import PasswordHasher
+from app.utils.security import get_password_hash
+
+from ._redis import percentile
+from .bench_db_stacks import build_app, prepare_database
+
+settings = get_settings()
+
+
+async def load(app: FastAPI, hasher: PasswordHasher, logins: int, readers: int, seconds: float) -> dict:
+  login_latencies, read_latencies = [], []
+  counts = {"ok": 0, "busy": 0}
+  deadline = time.perf_counter() + seconds
+
+  async def login_loop(http: httpx.AsyncClient, i: int) -> None:
+    body = {"name": f"login-{i}", "password": "bench"}
+    while time.perf_counter() < deadline:
+      start = time.perf_counter()
+      res = await http.post(f"{settings.api_prefix}/auth/login", json=body)
+      login_latencies.append(time.perf_counter() - start)
+      if res.status_code == 503:
+        counts["busy"] += 1
+        await asyncio.sleep(float(res.headers.get("Retry-After", "1")))
+      else:
+        assert res.status_code == 200, res.text
+        counts["ok"] += 1
+
+  async def read_loop(http: httpx.AsyncClient) -> None:
+    while time.perf_counter() < deadline:
+      start = time.perf_counter()
+      res = await http.get(f"{settings.api_prefix}/leaderboard", params={"level": "endless"})
+      read_latencies.append(time.perf_counter() - start)
+      assert res.status_code == 200, res.text
+
+  async with lifespan(app):
+    app.state.password_hasher.shutdown()
+    app.state.password_hasher = hasher
+    if hasher.workers:
+      # 预热：spawn 子进程并导入模块，不计入测量
+      await asyncio.gather(*(hasher.hash_async("warm") for _ in range(hasher.workers)))
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as http:
+      start = time.perf_counter()
+      await asyncio.gather(
+        *(login_loop(http, i) for i in range(logins)),
+        *(read_loop(http) for _ in range(readers)),
+      )
+      elapsed = time.perf_counter() - start
+    hasher.shutdown()
+  return {
+    "logins_per_s": counts["ok"] / elapsed,
+    "busy": counts["busy"],
+    "login_p50_ms": percentile(login_latencies, 50) * 1e3,
+    "read_rps": len(read_latencies) / elapsed,
+    "read_p50_ms": percentile(read_latencies, 50) * 1e3,
+    "read_p99_ms": percentile(read_latencies, 99) * 1e3,
+    "peak_in_flight": hasher.stats()["peak_in_flight"],
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--logins", type=int, default=200)
+  parser.add_argument("--readers", type=int, default=20)
+  parser.add_argument("--seconds", type=float, default=10)
+  parser.add_argument("--workers", type=int, default=2)
+  parser.add_argument("--max-pending", type=int, default=settings.password_hash_max_pending)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    database_url = f"sqlite:///{Path(tmp) / 'bench.db'}"
+    # prepare_database 建 bench-* 用户；登录用户单独以 login-{i} 命名
+    prepare_database(database_url, 1)
+    engine = create_engine(database_url)
+    hashed = get_password_hash("bench")
+    with engine.begin() as conn:
+      conn.execute(User.__table__.insert(), [{"name": f"login-{i}", "hash_pwd": hashed} for i in range(args.logins)])
+    engine.dispose()
+
+    modes = (
+      ("inline", PasswordHasher(settings.password_hash_rounds, workers=0, max_pending=1 << 30)),
+      ("process-pool", PasswordHasher(settings.password_hash_rounds, args.workers, args.max_pending)),
+    )
+    for label, hasher in modes:
+      app = build_app("sync", database_url, args.logins + args.readers)
+      r = asyncio.run(load(app, hasher, args.logins, args.readers, args.seconds))
+      print(
+        f"{label:<13} logins/s={r['logins_per_s']:7.1f} busy={r['busy']:6d} login_p50={r['login_p50_ms']:7.1f}ms"
+        f" | leaderboard rps={r['read_rps']:7.1f} p50={r['read_p50_ms']:6.1f}ms p99={r['read_p99_ms']:7.1f}ms"
+        f" | peak_in_flight={r['peak_in_flight']}"
+      )
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,115 @@
+"""
+榜单重建吞吐基准：合成 --scores 条成绩（默认 1000 万，每条对应不同的 (user, level)），
+流式重建总榜并报告 rows/s；--sink null 只测数据库流式读取 + payload 编码，--sink redis 连同 pipeline 写入。
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.bench_rebuild [--scores 10000000] [--sink null|redis] [--redis-url redis://...]
+                                     [--database-url postgresql+psycopg2://...]
+未指定 --database-url 时使用临时 SQLite 文件；fakeredis 替身写入较慢，--sink redis 建议配合真实 Redis。
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import redis
+from sqlalchemy import create_engine
+
+from app.core.db import Base
+from app.models import Level, Score, User
+from app.services.best_scores import backfill_upsert
+from app.services.rebuild import LeaderboardRebuilder, _payload
+
+from ._redis import redis_url
+
+LEVELS = 10
+
+
+class NullSinkRebuilder(LeaderboardRebuilder):
+  """只编码 payload、不写 Redis，用于单独衡量数据库侧吞吐。"""
+
+  def _write(self, keys, groups, expire_at):
+    for rows in groups.values():
+      for row in rows:
+        _payload(row)
+
+  def _finish_key(self, key, level_id, scope, expire_at):
+    pass
+
+
+def prepare(engine, scores: int) -> None:
+  Base.metadata.create_all(bind=engine)
+  users = scores // LEVELS
+  rng = random.Random(3)
+  created = datetime(2026, 1, 1)
+  start = time.perf_counter()
+  with engine.begin() as conn:
+    conn.execute(
+      Level.__table__.insert(),
+      [{"id": f"lvl{i}", "config_json": {}, "version": "1", "hash": "h"} for i in range(LEVELS)],
+    )
+    for base in range(0, users, 100_000):
+      conn.execute(
+        User.__table__.insert(),
+        [{"id": i + 1, "name": f"u{i}", "hash_pwd": ""} for i in range(base, min(users, base + 100_000))],
+      )
+    for base in range(0, scores, 100_000):
+      conn.execute(
+        Score.__table__.insert(),
+        [
+          {
+            "user_id": i // LEVELS + 1,
+            "level_id": f"lvl{i % LEVELS}",
+            "score": rng.randrange(10**6),
+            "wave": 1,
+            "time_ms": rng.randrange(10**6),
+            "life_left": 0,
+            "created_at": created,
+          }
+          for i in range(base, min(scores, base + 100_000))
+        ],
+      )
+  print(f"generated {scores} scores in {time.perf_counter() - start:.0f}s")
+  start = time.perf_counter()
+  for base in range(1, users + 1, 100_000):
+    with engine.begin() as conn:
+      conn.execute(backfill_upsert(engine.dialect.name, base, base + 100_000))
+  print(f"backfilled user_level_best in {time.perf_counter() - start:.0f}s")
+
+
+def progress(stats) -> None:
+  print(f"\r  {stats.rows:>10} rows  {stats.rows_per_second:>9.0f} rows/s", end="", file=sys.stderr, flush=True)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--scores", type=int, default=10_000_000)
+  parser.add_argument("--sink", choices=["null", "redis"], default="null")
+  parser.add_argument("--batch-size", type=int, default=5000)
+  parser.add_argument("--database-url")
+  parser.add_argument("--redis-url")
+  parser.add_argument(
+    "--generate", action="store_true", help="向 --database-url 写入合成数据（默认只在临时 SQLite 中生成）"
+  )
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    engine = create_engine(args.database_url or f"sqlite:///{Path(tmp) / 'bench.db'}")
+    if args.database_url is None or args.generate:
+      prepare(engine, args.scores)
+
+    with redis_url(args.redis_url if args.sink == "redis" else "redis://unused") as url:
+      client = redis.Redis.from_url(url, decode_responses=True)
+      cls = LeaderboardRebuilder if args.sink == "redis" else NullSinkRebuilder
+      stats = cls(engine, client, batch_size=args.batch_size, progress=progress).run(["all"])["all"]
+      print(file=sys.stderr)
+      print(f"sink={args.sink} rows={stats.rows} elapsed={stats.elapsed:.1f}s rows/s={stats.rows_per_second:.0f}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,105 @@
+"""
+Redis 连接复用基准：旧版「每请求 from_url 两次」vs 应用级共享连接池。
+模拟并发 POST /score 的 Redis 部分（nonce SET + Leaderboard.submit），统计新建连接数与延迟分位。
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.bench_redis_pool [--redis-url redis://localhost:6379/15] [--workers 32] [--submits 2000]
+"""
+
+import argparse
+import gc
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import redis
+
+from app.core.config import get_settings
+from app.core.deps import create_redis_pool
+from app.schemas import LeaderboardEntry
+from app.services.leaderboard import Leaderboard
+from app.utils.nonce import NonceStore
+
+from ._redis import percentile, redis_url
+
+
+class CountingConnection(redis.Connection):
+  """统计真实建连次数（TCP connect）。"""
+
+  created = 0
+  lock = threading.Lock()
+
+  def connect(self):
+    if self._sock is None:
+      with CountingConnection.lock:
+        CountingConnection.created += 1
+    super().connect()
+
+
+def simulate_submit(leaderboard: Leaderboard, nonce_store: NonceStore, user_id: int) -> None:
+  nonce_store.check_and_store(str(uuid.uuid4()), ttl_seconds=120)
+  entry = LeaderboardEntry(
+    user_id=user_id,
+    name=f"u{user_id}",
+    score=user_id * 7 % 5000,
+    wave=5,
+    time_ms=60000,
+    life_left=3,
+    created_at=datetime.utcnow(),
+  )
+  leaderboard.submit("bench", entry)
+
+
+def run(label: str, make_services, workers: int, submits: int) -> None:
+  latencies = []
+
+  def one(i: int) -> None:
+    start = time.perf_counter()
+    leaderboard, nonce_store = make_services()
+    simulate_submit(leaderboard, nonce_store, i % 500)
+    latencies.append(time.perf_counter() - start)
+
+  gc.collect()
+  before = CountingConnection.created
+  start = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=workers) as pool:
+    list(pool.map(one, range(submits)))
+  elapsed = time.perf_counter() - start
+  created = CountingConnection.created - before
+  print(
+    f"{label:<14} submits/s={submits / elapsed:8.0f} connections={created:6d}"
+    f" p50={percentile(latencies, 50) * 1e3:6.2f}ms p99={percentile(latencies, 99) * 1e3:6.2f}ms"
+  )
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--redis-url")
+  parser.add_argument("--workers", type=int, default=32)
+  parser.add_argument("--submits", type=int, default=2000)
+  args = parser.parse_args()
+
+  with redis_url(args.redis_url) as url:
+
+    def legacy_services():
+      # 旧 deps：每个依赖各自 from_url，新建客户端与连接池
+      lb_client = redis.from_url(url, decode_responses=True, connection_class=CountingConnection)
+      nonce_client = redis.from_url(url, decode_responses=True, connection_class=CountingConnection)
+      return Leaderboard(lb_client), NonceStore(nonce_client)
+
+    settings = get_settings().model_copy(update={"redis_url": url})
+    pool = create_redis_pool(settings)
+    pool.connection_class = CountingConnection
+    shared_client = redis.Redis(connection_pool=pool)
+    shared = (Leaderboard(shared_client), NonceStore(shared_client))
+
+    # 先测共享池：旧版大量短连接会拖慢替身服务器的 accept 队列
+    run("shared pool", lambda: shared, args.workers, args.submits)
+    pool.disconnect()
+    run("per-request", legacy_services, args.workers, args.submits)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,128 @@
+"""
+成绩重放校验吞吐：用脚本化策略（沿路径建塔、有钱就升级）按不同种子录制 --games 局 endless，
+再分别在当前进程内逐局 simulate、以及经 ReplayVerifier 进程池（--workers）校验，输出 replays/s、每局/每波/每帧耗时，
+并按每波耗时线性外推 50 波一局的校验时间（后期波次敌人更多，实际会更长）。结论写入临时 SQLite（与线上同样走完成回调 UPDATE）。
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.bench_replay [--games 8] [--workers 2]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core.db import Base
+from app.models import Level, Score, User
+from app.services.levels import load_level
+from app.services.replay import VERIFIED, ReplayVerifier
+from app.services.simulation import play, simulate
+
+MAX_TICKS = 60 * 60 * 60
+KINDS = ("CANNON", "LASER", "FREEZE", "HMG", "LMG")
+
+
+def policy(sim):
+  """每 20 帧操作一次：塔少于 8 座时沿路径建塔，之后优先做最便宜的升级。"""
+  if sim.tick % 20:
+    return []
+  upgrades = [
+    (spec.costs[level], cell)
+    for cell, level, spec in zip(sim.towers.cells, sim.towers.level, sim.towers.specs)
+    if level < len(spec.costs) and spec.costs[level] <= sim.gold
+  ]
+  if upgrades and len(sim.towers.cells) >= 8:
+    return [["upgrade", *min(upgrades)[1]]]
+  for x, y in sim.base_path[2:-2]:
+    for cell in ((x, y - 1), (x, y + 1), (x - 1, y), (x + 1, y)):
+      if sim._buildable(cell) and sim.gold >= 60:
+        return [["build", cell[0], cell[1], KINDS[len(sim.towers.cells) % len(KINDS)]]]
+  return []
+
+
+def record(config, games: int):
+  runs = []
+  for seed in range(1, games + 1):
+    replay, outcome = play(config, seed, policy, MAX_TICKS)
+    runs.append((replay, outcome))
+  return runs
+
+
+def serial(config, runs) -> float:
+  start = time.perf_counter()
+  for replay, outcome in runs:
+    assert simulate(config, replay, MAX_TICKS) == outcome
+  return time.perf_counter() - start
+
+
+def pooled(config, runs, workers: int, database_url: str) -> float:
+  engine = create_engine(database_url)
+  Base.metadata.create_all(engine)
+  sessions = sessionmaker(bind=engine)
+  with sessions() as db:
+    db.add(User(id=1, name="bench", hash_pwd=""))
+    db.add(Level(id="endless", config_json=config, version="bench", hash="bench"))
+    ids = [
+      db.execute(
+        insert(Score)
+        .values(
+          user_id=1,
+          level_id="endless",
+          score=o.score,
+          wave=o.wave,
+          time_ms=o.ticks * 17,
+          life_left=o.life_left,
+          replay_status="pending",
+        )
+        .returning(Score.id)
+      ).scalar_one()
+      for _, o in runs
+    ]
+    db.commit()
+  verifier = ReplayVerifier(sessions, workers=workers, max_pending=len(runs), max_ticks=MAX_TICKS)
+  try:
+    # 预热：子进程在首次提交时才 spawn 并导入 numpy
+    verifier.submit(ids[0], config, runs[0][0], claim(runs[0][1])).result()
+    start = time.perf_counter()
+    futures = [verifier.submit(score_id, config, replay, claim(o)) for score_id, (replay, o) in zip(ids, runs)]
+    results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+  finally:
+    verifier.shutdown()
+  assert results == [VERIFIED] * len(runs), results
+  return elapsed
+
+
+def claim(outcome):
+  return {"score": outcome.score, "wave": outcome.wave, "life_left": outcome.life_left, "time_ms": outcome.ticks * 17}
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--games", type=int, default=8)
+  parser.add_argument("--workers", type=int, default=2)
+  args = parser.parse_args()
+
+  config = load_level("endless")["config"]
+  runs = record(config, args.games)
+  ticks = sum(o.ticks for _, o in runs)
+  waves = sum(o.wave for _, o in runs)
+  print(f"recorded {len(runs)} games: {waves / len(runs):.1f} waves, {ticks / len(runs):.0f} ticks on average")
+
+  elapsed = serial(config, runs)
+  per_wave = elapsed / waves
+  print(
+    f"in-process : {len(runs) / elapsed:6.2f} replays/s | {elapsed / len(runs) * 1000:6.1f} ms/replay"
+    f" | {per_wave * 1000:5.1f} ms/wave | {elapsed / ticks * 1e6:5.1f} us/tick"
+    f" | 50-wave estimate {per_wave * 50 * 1000:.0f} ms"
+  )
+  with tempfile.TemporaryDirectory() as tmp:
+    elapsed = pooled(config, runs, args.workers, f"sqlite:///{Path(tmp) / 'bench.db'}")
+  print(f"pool x{args.workers}    : {len(runs) / elapsed:6.2f} replays/s (including the status UPDATE)")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,110 @@
+"""
+操作日志编码：合成一局 --waves 波、共约 --ops 条操作的长局（建塔/升级/出售/跳波混合，tick 递增），对比
+JSON（稳定序列化，即 ops_digest 的输入）与二进制 .tdr 的体积、编码/解码吞吐，
+以及上传路径上的校验成本：JSON 解析 + 重新序列化 + 摘要 vs ReplayParser 按 64 KiB 分段流式解析（含摘要）；
+最后对比按波次取一段（Range: waves=）与整份解码。
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.bench_replay_format [--ops 100000] [--waves 200] [--seed 1]
+"""
+
+import argparse
+import gzip
+import io
+import json
+import random
+import time
+
+from app.services.replay import replay_digest
+from app.services.replay_format import ReplayParser, ReplayReader, encode_replay
+from app.utils.hash import stable_dumps
+
+KINDS = ("CANNON", "LASER", "FREEZE", "HMG", "LMG")
+
+
+def synthesize(ops: int, waves: int, seed: int):
+  rng = random.Random(seed)
+  tick, log, labels = 0, [], []
+  for wave in range(1, waves + 1):
+    for _ in range(ops // waves):
+      tick += rng.choice((0, 0, 1, 5, 20, 60, 300))
+      x, y = rng.randrange(32), rng.randrange(18)
+      kind = rng.random()
+      if kind < 0.5:
+        log.append([tick, "build", x, y, rng.choice(KINDS)])
+      elif kind < 0.85:
+        log.append([tick, "upgrade", x, y])
+      elif kind < 0.98:
+        log.append([tick, "sell", x, y])
+      else:
+        log.append([tick, "skip"])
+      labels.append(wave)
+    tick += 600
+  return {"seed": seed, "ticks": tick + 1, "ops": log}, labels
+
+
+def timed(fn, repeat: int = 3):
+  best, result = float("inf"), None
+  for _ in range(repeat):
+    start = time.perf_counter()
+    result = fn()
+    best = min(best, time.perf_counter() - start)
+  return result, best
+
+
+def stream_parse(data: bytes, max_ops: int):
+  parser = ReplayParser(max_ops)
+  for i in range(0, len(data), 64 * 1024):
+    parser.feed(data[i : i + 64 * 1024])
+  return parser.finish()
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--ops", type=int, default=100_000)
+  parser.add_argument("--waves", type=int, default=200)
+  parser.add_argument("--seed", type=int, default=1)
+  args = parser.parse_args()
+
+  replay, waves = synthesize(args.ops, args.waves, args.seed)
+  n = len(replay["ops"])
+  text, json_encode = timed(lambda: stable_dumps(replay).encode("ascii"))
+  data, binary_encode = timed(lambda: encode_replay(replay, waves, KINDS))
+  gz = gzip.compress(text)
+  print(f"{n} ops over {args.waves} waves")
+  print(
+    f"size      : json {len(text) / 1024:8.1f} KiB | json+gzip {len(gz) / 1024:7.1f} KiB"
+    f" | tdr {len(data) / 1024:7.1f} KiB ({len(data) / n:.2f} B/op, {len(text) / len(data):.1f}x smaller than json)"
+  )
+
+  _, json_decode = timed(lambda: json.loads(text))
+  decoded, binary_decode = timed(lambda: ReplayReader(io.BytesIO(data)).read())
+  assert decoded == (replay, waves)
+  print(
+    f"encode    : json {n / json_encode / 1e6:6.2f} M ops/s | tdr {n / binary_encode / 1e6:6.2f} M ops/s\n"
+    f"decode    : json {n / json_decode / 1e6:6.2f} M ops/s | tdr {n / binary_decode / 1e6:6.2f} M ops/s"
+  )
+
+  digest, json_check = timed(lambda: replay_digest(json.loads(text)))
+  summary, binary_check = timed(lambda: stream_parse(data, n))
+  assert summary.digest == digest
+  print(
+    f"upload    : json parse+digest {json_check * 1000:7.1f} ms"
+    f" | tdr streaming parse+digest {binary_check * 1000:7.1f} ms ({len(data) / binary_check / 2**20:.1f} MiB/s)"
+  )
+
+  middle = args.waves // 2
+
+  def one_wave():
+    reader = ReplayReader(io.BytesIO(data))
+    return b"".join(reader.slice(reader.select(middle, middle)))
+
+  part, slice_time = timed(one_wave, repeat=20)
+  print(
+    f"range     : waves={middle}-{middle} {len(part) / 1024:.1f} KiB in {slice_time * 1e6:7.1f} us"
+    f" vs full decode {binary_decode * 1000:7.1f} ms"
+  )
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,145 @@
+"""
+波次表展开：按同一关卡 + 种子把第 1 ~ --waves 波整段展开，对比逐次调用 Mulberry32.random() 的标量管线
+与按块向量化取随机数的 WaveSchedule（两者逐位一致，先核对），给出每波耗时与常驻内存；
+再用已展开的表按 --page 波一页翻完全部波次，对比每页现场序列化与响应缓存命中的耗时。
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.bench_waves [--waves 10000] [--seed 42] [--page 100]
+"""
+
+import argparse
+import math
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.schemas import LevelWaves, WaveTable
+from app.services.levels import load_level
+from app.services.response_cache import ResponseCache
+from app.services.waves import ENEMY_ORDER, WaveSchedule, js_round
+
+
+class ScalarSchedule(WaveSchedule):
+  """旧写法：与前端一样每个随机数单独取一次。"""
+
+  def _auto_wave(self, index, rng):
+    count = min(self.max_per_wave, js_round(math.pow(index + 1.2, 1.1) * 6))
+    weights = dict(self.type_weights)
+    weights["BOSS"] = weights.get("BOSS", 0) + (0.2 * index if index >= 8 else 0)
+    weights["BRUISER"] = weights.get("BRUISER", 0) + index * 0.08
+    weights["TANK"] = weights.get("TANK", 0) + index * 0.06
+    weights["SHIELD"] = weights.get("SHIELD", 0) + index * 0.04
+    entries = list(weights.items())
+    total = 0
+    for _, weight in entries:
+      total += weight
+    counts = dict.fromkeys(ENEMY_ORDER, 0)
+    for _ in range(count):
+      r = rng.random() * total
+      acc = 0
+      picked = entries[-1][0]
+      for enemy_type, weight in entries:
+        acc += weight
+        if r <= acc:
+          picked = enemy_type
+          break
+      counts[picked] = counts.get(picked, 0) + 1
+    return tuple((enemy_type, c) for enemy_type, c in counts.items() if c > 0)
+
+  def _shuffle(self, spec, rng):
+    queue = [self._type_index[enemy_type] for enemy_type, count in spec for _ in range(count)]
+    for i in range(len(queue) - 1, 0, -1):
+      j = math.floor(rng.random() * (i + 1))
+      queue[i], queue[j] = queue[j], queue[i]
+    queue.reverse()
+    return queue
+
+  def _variance(self, n, rng):
+    return np.array([rng.random() * (1.2 - 0.8) + 0.8 for _ in range(n)])
+
+
+def expand(cls, config, seed: int, waves: int):
+  start = time.perf_counter()
+  schedule = cls.from_config(config, seed)
+  schedule.waves(0, waves)
+  return schedule, time.perf_counter() - start
+
+
+def resident(config, seed: int, waves: int) -> int:
+  """单独再展开一次量常驻内存：tracemalloc 会把展开本身拖慢数倍，不与计时混在一起。"""
+  tracemalloc.start()
+  schedule = WaveSchedule.from_config(config, seed)
+  schedule.waves(0, waves)
+  memory = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  return memory
+
+
+def page_body(level, schedule: WaveSchedule, start: int, count: int) -> bytes:
+  return (
+    LevelWaves(
+      level=level["id"],
+      hash=level["hash"],
+      seed=schedule.seed,
+      enemy_types=list(schedule.enemy_types),
+      waves=[
+        WaveTable(
+          wave=w.index + 1,
+          auto=w.auto,
+          difficulty_bonus=w.difficulty_bonus,
+          spawns=list(w.spawns),
+          variance=w.variance.tolist(),
+        )
+        for w in schedule.waves(start, count)
+      ],
+    )
+    .model_dump_json()
+    .encode()
+  )
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--waves", type=int, default=10_000)
+  parser.add_argument("--seed", type=int, default=42)
+  parser.add_argument("--page", type=int, default=100)
+  args = parser.parse_args()
+
+  level = load_level("endless")
+  config = level["config"]
+  results = {}
+  for name, cls in (("scalar", ScalarSchedule), ("vectorized", WaveSchedule)):
+    schedule, elapsed = expand(cls, config, args.seed, args.waves)
+    results[name] = schedule
+    spawns = sum(len(w.spawns) for w in schedule.waves(0, args.waves))
+    print(
+      f"{name:<10} waves 1..{args.waves}: {elapsed * 1000:8.1f} ms | {elapsed / args.waves * 1e6:6.1f} us/wave"
+      f" | {spawns} spawns"
+    )
+  for old, new in zip(results["scalar"].waves(0, args.waves), results["vectorized"].waves(0, args.waves)):
+    assert old.spawns == new.spawns and old.variance.tolist() == new.variance.tolist(), old.index
+
+  print(f"resident expanded table: {resident(config, args.seed, args.waves) / 2**20:.1f} MiB")
+
+  schedule = results["vectorized"]
+  starts = range(0, args.waves - args.page + 1, args.page)
+  begin = time.perf_counter()
+  bodies = [page_body(level, schedule, start, args.page) for start in starts]
+  built = (time.perf_counter() - begin) / len(bodies)
+  cache = ResponseCache(len(bodies))
+  for start, body in zip(starts, bodies):
+    cache.get_or_build(("waves", start), f'"{start}"', lambda body=body: body)
+  begin = time.perf_counter()
+  for start in starts:
+    cache.get_or_build(("waves", start), f'"{start}"', lambda: b"")
+  hit = (time.perf_counter() - begin) / len(bodies)
+  size = sum(len(b) for b in bodies) / len(bodies)
+  print(
+    f"pages of {args.page}: serialize {built * 1e6:8.1f} us/page vs response cache hit {hit * 1e6:5.2f} us/page"
+    f" | {size / 1024:.1f} KiB/page"
+  )
+
+
+if __name__ == "__main__":
+  main()
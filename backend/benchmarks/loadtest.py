@@ -0,0 +1,363 @@
+"""
+端到端压测：对真实 uvicorn 进程依次跑以下场景，输出各场景 p50/p95/p99 延迟、吞吐与错误率（JSON），并可与基线比对。
+- auth_mix：注册/登录混合（--register-ratio 比例为注册新用户）
+- score_burst：并发签名 POST /score（compute_score_signature + 唯一 nonce）
+- leaderboard_poll：轮询 GET /leaderboard（带 If-None-Match，304 计为成功）
+- ws_subscribers：大量 /ws/leaderboard 订阅者，同时低频提交成绩触发推送；延迟为建连到首个快照
+
+Usage（在 backend/ 下）：
+  python -m benchmarks.loadtest [--seconds 10] [--out result.json]
+                               [--baseline benchmarks/loadtest_baseline.json] [--tolerance 0.25]
+                               [--write-baseline PATH] [--scenarios auth_mix score_burst ...]
+  python -m benchmarks.loadtest --base-url http://127.0.0.1:8000   # 压已启动的服务
+未指定 --base-url 时在本机起 uvicorn 子进程：--database-url 缺省为临时 SQLite 文件，
+--redis-url 缺省为进程内 fakeredis TCP 替身；指向本地 Postgres/Redis 即可得到接近线上的数据。
+与基线比对时任一指标退化超过容差则退出码为 1；基线与机器相关，换机器后应重新 --write-baseline。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+import redis
+import websockets
+from sqlalchemy import create_engine
+
+from app import models  # noqa: F401  注册模型到 Base.metadata
+from app.core.config import get_settings
+from app.core.db import Base
+from app.schemas import ScoreSubmit
+from app.services.leaderboard import AROUND_SCRIPT, PAGE_SCRIPT, SUBMIT_SCRIPT
+from app.utils.security import compute_score_signature
+
+from ._redis import percentile, redis_url
+
+settings = get_settings()
+API = settings.api_prefix
+SCENARIOS = ("auth_mix", "score_burst", "leaderboard_poll", "ws_subscribers")
+# 越低越好的延迟指标按比例容差比较；错误率按绝对值
+LATENCY_METRICS = ("p50_ms", "p95_ms", "p99_ms")
+ERROR_RATE_SLACK = 0.01
+
+
+@dataclass
+class Stats:
+  latencies: List[float] = field(default_factory=list)
+  errors: int = 0
+  # 吞吐单位：HTTP 场景为请求，ws 场景为收到的快照
+  completed: int = 0
+  # 错误率分母：HTTP 场景为请求数，ws 场景为订阅者数
+  attempts: int = 0
+  elapsed: float = 0.0
+
+  def record(self, latency: float, ok: bool) -> None:
+    self.latencies.append(latency)
+    self.completed += 1
+    if not ok:
+      self.errors += 1
+
+  def summary(self) -> Dict[str, float]:
+    attempts = max(self.attempts or self.completed, 1)
+    return {
+      "requests": self.completed,
+      "errors": self.errors,
+      "error_rate": round(self.errors / attempts, 4),
+      "throughput_rps": round(self.completed / self.elapsed, 1) if self.elapsed else 0.0,
+      "p50_ms": round(percentile(self.latencies, 50) * 1e3, 2),
+      "p95_ms": round(percentile(self.latencies, 95) * 1e3, 2),
+      "p99_ms": round(percentile(self.latencies, 99) * 1e3, 2),
+    }
+
+
+def _free_port() -> int:
+  with socket.socket() as sock:
+    sock.bind(("127.0.0.1", 0))
+    return sock.getsockname()[1]
+
+
+@contextmanager
+def local_server(database_url: str, redis: str, workers: int) -> Iterator[str]:
+  """建表后启动 uvicorn 子进程，等待就绪；退出时终止。"""
+  engine = create_engine(database_url)
+  Base.metadata.create_all(bind=engine)
+  engine.dispose()
+  port = _free_port()
+  env = {**os.environ, "TD_DATABASE_URL": database_url, "TD_REDIS_URL": redis}
+  proc = subprocess.Popen(
+    [
+      sys.executable,
+      "-m",
+      "uvicorn",
+      "app.main:app",
+      "--port",
+      str(port),
+      "--workers",
+      str(workers),
+      "--log-level",
+      "warning",
+    ],
+    env=env,
+  )
+  base_url = f"http://127.0.0.1:{port}"
+  try:
+    deadline = time.monotonic() + 30
+    while True:
+      try:
+        if httpx.get(f"{base_url}{API}/levels/endless", timeout=1).status_code == 200:
+          break
+      except httpx.HTTPError:
+        pass
+      if proc.poll() is not None or time.monotonic() > deadline:
+        raise RuntimeError("uvicorn did not become ready")
+      time.sleep(0.2)
+    yield base_url
+  finally:
+    proc.terminate()
+    proc.wait(timeout=30)
+
+
+def signed_score(level: Dict[str, Any], score: int) -> Dict[str, Any]:
+  body = {
+    "level_id": level["id"],
+    "level_version": level["version"],
+    "level_hash": level["hash"],
+    "score": score,
+    "wave": random.randint(1, 30),
+    "time_ms": random.randint(30_000, 900_000),
+    "life_left": random.randint(0, 20),
+    "timestamp": int(time.time()),
+    "nonce": uuid.uuid4().hex,
+  }
+  body["signature"] = compute_score_signature(settings.score_signature_key, ScoreSubmit(**body))
+  return body
+
+
+async def timed(stats: Stats, request) -> Optional[httpx.Response]:
+  start = time.perf_counter()
+  try:
+    res = await request
+  except httpx.HTTPError:
+    stats.record(time.perf_counter() - start, ok=False)
+    return None
+  stats.record(time.perf_counter() - start, ok=res.status_code < 400)
+  return res
+
+
+async def seed_users(http: httpx.AsyncClient, count: int, prefix: str) -> List[Dict[str, str]]:
+  """预先注册并登录一批用户（不计入测量）。"""
+
+  async def one(i: int) -> Dict[str, str]:
+    name = f"{prefix}-{i}"
+    await http.post(f"{API}/auth/register", json={"name": name, "password": "load"})
+    res = await http.post(f"{API}/auth/login", json={"name": name, "password": "load"})
+    res.raise_for_status()
+    return {"name": name, "token": res.json()["access_token"]}
+
+  users = []
+  for start in range(0, count, 16):
+    users += await asyncio.gather(*(one(i) for i in range(start, min(start + 16, count))))
+  return users
+
+
+async def run_all(workers: List) -> float:
+  start = time.perf_counter()
+  await asyncio.gather(*workers)
+  return time.perf_counter() - start
+
+
+async def auth_mix(http: httpx.AsyncClient, args, users, level) -> Stats:
+  stats = Stats()
+  deadline = time.perf_counter() + args.seconds
+
+  async def worker() -> None:
+    while time.perf_counter() < deadline:
+      if random.random() < args.register_ratio:
+        body = {"name": f"lt-{uuid.uuid4().hex[:12]}", "password": "load"}
+        await timed(stats, http.post(f"{API}/auth/register", json=body))
+      else:
+        user = random.choice(users)
+        await timed(stats, http.post(f"{API}/auth/login", json={"name": user["name"], "password": "load"}))
+
+  stats.elapsed = await run_all([worker() for _ in range(args.concurrency)])
+  return stats
+
+
+async def score_burst(http: httpx.AsyncClient, args, users, level) -> Stats:
+  stats = Stats()
+  deadline = time.perf_counter() + args.seconds
+
+  async def worker(user: Dict[str, str]) -> None:
+    headers = {"Authorization": f"Bearer {user['token']}"}
+    while time.perf_counter() < deadline:
+      await timed(
+        stats, http.post(f"{API}/score", json=signed_score(level, random.randint(0, 100_000)), headers=headers)
+      )
+
+  stats.elapsed = await run_all([worker(users[i % len(users)]) for i in range(args.concurrency)])
+  return stats
+
+
+async def leaderboard_poll(http: httpx.AsyncClient, args, users, level) -> Stats:
+  stats = Stats()
+  deadline = time.perf_counter() + args.seconds
+
+  async def worker() -> None:
+    etags: Dict[str, str] = {}
+    while time.perf_counter() < deadline:
+      scope = random.choice(("all", "daily", "weekly"))
+      headers = {"If-None-Match": etags[scope]} if scope in etags else {}
+      res = await timed(
+        stats, http.get(f"{API}/leaderboard", params={"level": level["id"], "scope": scope}, headers=headers)
+      )
+      if res is not None and res.status_code == 200:
+        etags[scope] = res.headers["etag"]
+
+  stats.elapsed = await run_all([worker() for _ in range(args.concurrency)])
+  return stats
+
+
+async def ws_subscribers(http: httpx.AsyncClient, args, users, level) -> Stats:
+  """延迟 = 建连到首个快照；吞吐 = 全部订阅者每秒收到的快照数。"""
+  stats = Stats()
+  ws_url = str(http.base_url).replace("http", "ws", 1).rstrip("/") + f"/ws/leaderboard?level={level['id']}&scope=all"
+  deadline = time.perf_counter() + args.seconds
+  received = 0
+
+  async def subscriber() -> None:
+    nonlocal received
+    start = time.perf_counter()
+    try:
+      async with websockets.connect(ws_url, open_timeout=30, max_queue=None) as ws:
+        await ws.recv()
+        stats.latencies.append(time.perf_counter() - start)
+        received += 1
+        while (remaining := deadline - time.perf_counter()) > 0:
+          try:
+            await asyncio.wait_for(ws.recv(), timeout=remaining)
+          except asyncio.TimeoutError:
+            break
+          received += 1
+    except (OSError, asyncio.TimeoutError, websockets.WebSocketException):
+      stats.errors += 1
+
+  async def submitter() -> None:
+    # 低频提交高分，确保前 N 名变化从而触发推送
+    user = users[0]
+    headers = {"Authorization": f"Bearer {user['token']}"}
+    score = 1_000_000
+    while time.perf_counter() < deadline:
+      score += 1
+      await http.post(f"{API}/score", json=signed_score(level, score), headers=headers)
+      await asyncio.sleep(args.ws_submit_interval)
+
+  stats.elapsed = await run_all([*(subscriber() for _ in range(args.subscribers)), submitter()])
+  stats.completed = received
+  stats.attempts = args.subscribers
+  return stats
+
+
+async def run_scenarios(base_url: str, args) -> Dict[str, Dict[str, float]]:
+  limits = httpx.Limits(max_connections=args.concurrency * 2 + 16, max_keepalive_connections=args.concurrency * 2 + 16)
+  async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as http:
+    level = (await http.get(f"{API}/levels/endless")).json()
+    users = await seed_users(http, args.users, f"lt{uuid.uuid4().hex[:6]}")
+    results = {}
+    for name in args.scenarios:
+      stats = await globals()[name](http, args, users, level)
+      results[name] = stats.summary()
+      print(f"[loadtest] {name}: {json.dumps(results[name])}", file=sys.stderr)
+  return results
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+  """返回退化项：延迟高于基线 (1 + tolerance) 倍、吞吐低于 (1 - tolerance) 倍、错误率高出 1 个百分点以上。"""
+  regressions = []
+  for name, base in baseline.get("scenarios", {}).items():
+    current = result["scenarios"].get(name)
+    if current is None:
+      continue
+    for metric in LATENCY_METRICS:
+      if base[metric] and current[metric] > base[metric] * (1 + tolerance):
+        regressions.append(f"{name}.{metric}: {current[metric]} > baseline {base[metric]}")
+    if current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+      regressions.append(f"{name}.throughput_rps: {current['throughput_rps']} < baseline {base['throughput_rps']}")
+    if current["error_rate"] > base["error_rate"] + ERROR_RATE_SLACK:
+      regressions.append(f"{name}.error_rate: {current['error_rate']} > baseline {base['error_rate']}")
+  return regressions
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--base-url")
+  parser.add_argument("--database-url")
+  parser.add_argument("--redis-url")
+  parser.add_argument("--server-workers", type=int, default=1)
+  parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+  parser.add_argument("--seconds", type=float, default=10)
+  parser.add_argument("--concurrency", type=int, default=32)
+  parser.add_argument("--users", type=int, default=64)
+  parser.add_argument("--register-ratio", type=float, default=0.2)
+  parser.add_argument("--subscribers", type=int, default=500)
+  parser.add_argument("--ws-submit-interval", type=float, default=0.1)
+  parser.add_argument("--seed", type=int, default=1)
+  parser.add_argument("--out")
+  parser.add_argument("--baseline")
+  parser.add_argument("--tolerance", type=float, default=0.25)
+  parser.add_argument("--write-baseline")
+  args = parser.parse_args()
+  random.seed(args.seed)
+
+  meta = {
+    "seconds": args.seconds,
+    "concurrency": args.concurrency,
+    "users": args.users,
+    "subscribers": args.subscribers,
+    "python": platform.python_version(),
+    "cpus": os.cpu_count(),
+  }
+  if args.base_url:
+    scenarios = asyncio.run(run_scenarios(args.base_url, args))
+    meta["target"] = args.base_url
+  else:
+    with tempfile.TemporaryDirectory() as tmp, redis_url(args.redis_url) as url:
+      if not args.redis_url:
+        # fakeredis 替身在 NOSCRIPT 后会断开连接，预先加载脚本避免首个 EVALSHA 失败
+        client = redis.Redis.from_url(url)
+        for script in (SUBMIT_SCRIPT, PAGE_SCRIPT, AROUND_SCRIPT):
+          client.script_load(script)
+        client.close()
+      database_url = args.database_url or f"sqlite:///{Path(tmp) / 'loadtest.db'}"
+      with local_server(database_url, url, args.server_workers) as base_url:
+        scenarios = asyncio.run(run_scenarios(base_url, args))
+      meta["target"] = f"local uvicorn ({database_url.split(':')[0]}, {'redis' if args.redis_url else 'fakeredis'})"
+
+  result = {"meta": meta, "scenarios": scenarios}
+  output = json.dumps(result, indent=2)
+  print(output)
+  if args.out:
+    Path(args.out).write_text(output + "\n", encoding="utf-8")
+  if args.write_baseline:
+    Path(args.write_baseline).write_text(output + "\n", encoding="utf-8")
+  if args.baseline:
+    regressions = compare(result, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.tolerance)
+    for line in regressions:
+      print(f"[loadtest] REGRESSION {line}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+  main()
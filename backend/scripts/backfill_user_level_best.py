@@ -0,0 +1,50 @@
+"""
+Backfill user_level_best from the scores table (run after `alembic upgrade head`).
+
+Usage:
+  python scripts/backfill_user_level_best.py [--batch-users 1000] [--database-url ...]
+
+按 user_id 区间分批执行 INSERT ... SELECT ... ON CONFLICT DO UPDATE，每批一个事务；
+只在更好时覆盖，可重复执行，也可与线上写入并行。
+"""
+
+import argparse
+import os
+import sys
+
+from sqlalchemy import create_engine, func, select
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.config import get_settings  # noqa: E402
+from app.models import Score  # noqa: E402
+from app.services.best_scores import backfill_upsert  # noqa: E402
+
+
+def backfill(engine, batch_users: int = 1000) -> int:
+  """返回处理的批次数。"""
+  with engine.connect() as conn:
+    low, high = conn.execute(select(func.min(Score.user_id), func.max(Score.user_id))).one()
+  if low is None:
+    return 0
+  batches = 0
+  for start in range(low, high + 1, batch_users):
+    with engine.begin() as conn:
+      conn.execute(backfill_upsert(engine.dialect.name, start, start + batch_users))
+    batches += 1
+    print(f"[backfill] users {start}..{min(start + batch_users, high + 1) - 1} done")
+  return batches
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Backfill user_level_best from scores")
+  parser.add_argument("--database-url", default=get_settings().database_url)
+  parser.add_argument("--batch-users", type=int, default=1000)
+  args = parser.parse_args()
+  engine = create_engine(args.database_url)
+  batches = backfill(engine, args.batch_users)
+  print(f"[backfill] finished in {batches} batch(es)")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,87 @@
+"""
+Export scores (joined with users) from the database as NDJSON or CSV.
+
+Usage:
+  python scripts/export_scores.py [--format ndjson|csv] [--level endless] [--since 2026-01-01] [--until 2026-02-01]
+                                  [--after-id 0] [--limit N] [--batch-size 5000] [--out scores.ndjson] [--resume]
+
+- 服务端游标流式读取，逐批编码写出；内存占用与批大小相关，与总行数无关。
+- 按 scores.id 升序输出，id 即续传游标：--after-id 从指定 id 之后开始。
+- --resume（需 --out）：截掉输出文件末尾的残行，从最后一条完整行之后继续追加；文件不存在时等同全新导出。
+  同时给出 --limit 时只补齐剩余的行数（重跑同一条命令即可）。
+- 未指定 --out 时写到 stdout，进度写到 stderr。
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.config import get_settings  # noqa: E402
+from app.services.export import EXPORT_FORMATS, ExportStats, ScoreExporter, exported_rows, resume_point  # noqa: E402
+
+
+def print_progress(stats: ExportStats) -> None:
+  print(
+    f"\r[export] {stats.rows:>10} rows  id<={stats.last_id}  {stats.bytes / 2**20:>9.1f} MiB  {stats.rows_per_second:>9.0f} rows/s",
+    end="",
+    file=sys.stderr,
+    flush=True,
+  )
+
+
+def main():
+  settings = get_settings()
+  parser = argparse.ArgumentParser(description="Export scores as NDJSON or CSV")
+  parser.add_argument("--database-url", default=settings.database_url)
+  parser.add_argument("--format", default="ndjson", choices=EXPORT_FORMATS)
+  parser.add_argument("--level")
+  parser.add_argument("--since", type=datetime.fromisoformat)
+  parser.add_argument("--until", type=datetime.fromisoformat)
+  parser.add_argument("--after-id", type=int)
+  parser.add_argument("--limit", type=int)
+  parser.add_argument("--batch-size", type=int, default=settings.export_batch_size)
+  parser.add_argument("--out", type=Path)
+  parser.add_argument("--resume", action="store_true")
+  args = parser.parse_args()
+  if args.resume and not args.out:
+    parser.error("--resume requires --out")
+
+  after_id, limit, header, mode = args.after_id, args.limit, True, "wb"
+  if args.resume and args.out.exists():
+    point = resume_point(args.out, args.format)
+    if point is not None:
+      after_id = point
+    header, mode = args.out.stat().st_size == 0, "ab"
+    if limit is not None:
+      # --limit 是整个导出的行数：扣掉文件里已有的行
+      limit = max(0, limit - exported_rows(args.out, args.format))
+    print(f"[export] resuming {args.out} after id {after_id}", file=sys.stderr)
+
+  engine = create_engine(args.database_url)
+  exporter = ScoreExporter(engine, args.format, batch_size=args.batch_size, progress=print_progress)
+  out = open(args.out, mode) if args.out else sys.stdout.buffer
+  try:
+    for chunk in exporter.chunks(args.level, args.since, args.until, after_id, limit, header=header):
+      out.write(chunk)
+  finally:
+    if args.out:
+      out.close()
+    else:
+      out.flush()
+  stats = exporter.stats
+  print(file=sys.stderr)
+  print(
+    f"[export] {stats.rows} rows, {stats.bytes / 2**20:.1f} MiB, last id {stats.last_id},"
+    f" {stats.elapsed:.1f}s, {stats.rows_per_second:.0f} rows/s",
+    file=sys.stderr,
+  )
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,71 @@
+"""
+Rebuild Redis leaderboards from the database (e.g. after Redis was flushed or restarted).
+
+Usage:
+  python scripts/rebuild_leaderboards.py [--scopes all daily weekly] [--batch-size 5000]
+                                         [--checkpoint rebuild.json] [--dry-run]
+
+- 总榜读 user_level_best（需已执行 0002 迁移与回填），日/周榜从 scores 中当前周期的记录计算。
+- 服务端游标流式读取，每批一个 pipeline 写入 ZADD/HSET；内存占用与批大小相关。
+- --checkpoint：每批后记录进度，中断后以同一参数重跑即从断点继续；全部完成后可删除该文件。
+- --dry-run：不写 Redis，只与现有榜单比对，输出缺失/不一致数量及样例。
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import redis
+from sqlalchemy import create_engine
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.config import get_settings  # noqa: E402
+from app.services.leaderboard import SCOPES  # noqa: E402
+from app.services.rebuild import LeaderboardRebuilder, RebuildStats  # noqa: E402
+
+
+def print_progress(stats: RebuildStats) -> None:
+  print(
+    f"\r[rebuild] {stats.scope}: {stats.rows:>10} rows  {stats.keys} keys  {stats.rows_per_second:>9.0f} rows/s",
+    end="",
+    file=sys.stderr,
+    flush=True,
+  )
+
+
+def main():
+  settings = get_settings()
+  parser = argparse.ArgumentParser(description="Rebuild Redis leaderboards from the database")
+  parser.add_argument("--database-url", default=settings.database_url)
+  parser.add_argument("--redis-url", default=settings.redis_url)
+  parser.add_argument("--scopes", nargs="+", default=list(SCOPES), choices=SCOPES)
+  parser.add_argument("--batch-size", type=int, default=5000)
+  parser.add_argument("--checkpoint", type=Path)
+  parser.add_argument("--dry-run", action="store_true")
+  args = parser.parse_args()
+
+  engine = create_engine(args.database_url)
+  client = redis.Redis.from_url(args.redis_url, decode_responses=True)
+  rebuilder = LeaderboardRebuilder(
+    engine,
+    client,
+    batch_size=args.batch_size,
+    checkpoint=args.checkpoint,
+    dry_run=args.dry_run,
+    progress=print_progress,
+  )
+  results = rebuilder.run(args.scopes)
+  print(file=sys.stderr)
+  for stats in results.values():
+    line = f"[rebuild] {stats.scope}: {stats.rows} rows, {stats.keys} keys, {stats.elapsed:.1f}s, {stats.rows_per_second:.0f} rows/s"
+    if args.dry_run:
+      line += f"; missing={stats.missing} changed={stats.changed} unchanged={stats.unchanged}"
+    print(line)
+    for sample in stats.samples:
+      print(f"  {sample}")
+
+
+if __name__ == "__main__":
+  main()
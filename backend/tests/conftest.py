@@ -1,14 +1,16 @@
-from typing import Generator
+from typing import Generator, List
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
-from app.core.db import Base, get_db
+from app.api.routes import synced_levels
+from app.core.db import Base, get_db, get_engine
 from app.core.deps import get_leaderboard
 from app.main import app
+from app.services.auth_cache import get_auth_cache
 from app.services.leaderboard import Leaderboard
 
 # SQLite 内存数据库，用 StaticPool 保持同一实例。
@@ -29,6 +31,9 @@ def _reset_db() -> Generator[None, None, None]:
   Base.metadata.drop_all(bind=engine)
   Base.metadata.create_all(bind=engine)
   test_leaderboard.fallback.clear()
+  # 每个测试重建表，已同步关卡版本的进程级记录也需清空
+  synced_levels.clear()
+  get_auth_cache().clear()
   yield
   Base.metadata.drop_all(bind=engine)
 
@@ -45,9 +50,23 @@ def client() -> Generator[TestClient, None, None]:
 
   # 使用共享的内存版 Leaderboard，避免 Redis 依赖。
   app.dependency_overrides[get_db] = override_db
+  app.dependency_overrides[get_engine] = lambda: engine
   app.dependency_overrides[get_leaderboard] = lambda: test_leaderboard
 
   with TestClient(app) as test_client:
     yield test_client
 
   app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def sql_statements() -> Generator[List[str], None, None]:
+  """记录测试引擎执行的 SQL（含事务控制之外的全部语句），用于断言每请求查询数。"""
+  statements: List[str] = []
+
+  def record(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+  event.listen(engine, "before_cursor_execute", record)
+  yield statements
+  event.remove(engine, "before_cursor_execute", record)
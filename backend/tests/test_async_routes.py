@@ -0,0 +1,91 @@
+from typing import Generator
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.api.routes import router as api_router
+from app.api.routes_async import router as async_router
+from app.core.config import get_settings
+from app.core.db import Base, get_async_db
+from app.main import lifespan
+from app.services.levels import load_level
+from app.services.replay import replay_digest
+from app.services.replay_format import encode_replay
+from app.services.replay_store import ReplayStore
+
+from test_score import signed_score_payload
+
+settings = get_settings()
+
+
+@pytest.fixture
+def async_client(tmp_path) -> Generator[TestClient, None, None]:
+  # 文件型 SQLite：同步引擎建表，aiosqlite 驱动的异步引擎读写
+  db_path = tmp_path / "async.db"
+  sync_engine = create_engine(f"sqlite:///{db_path}")
+  Base.metadata.create_all(bind=sync_engine)
+  async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+  sessions = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+  async def override_db():
+    async with sessions() as db:
+      yield db
+
+  app = FastAPI(lifespan=lifespan)
+  app.include_router(api_router, prefix=settings.api_prefix)
+  app.include_router(async_router, prefix=settings.api_prefix)
+  app.dependency_overrides[get_async_db] = override_db
+  with TestClient(app) as client:
+    yield client
+  sync_engine.dispose()
+
+
+def test_async_stack_register_login_submit_best(async_client):
+  client = async_client
+  register = client.post(client.app.url_path_for("auth_register"), json={"name": "alice", "password": "p@ss"})
+  assert register.status_code == 201
+  duplicate = client.post(client.app.url_path_for("auth_register"), json={"name": "alice", "password": "p@ss"})
+  assert duplicate.status_code == 400
+  bad = client.post(client.app.url_path_for("auth_login"), json={"name": "alice", "password": "nope"})
+  assert bad.status_code == 401
+
+  login = client.post(client.app.url_path_for("auth_login"), json={"name": "alice", "password": "p@ss"})
+  headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+  level = load_level("endless")
+  payload = signed_score_payload(level, {"score": 1300, "wave": 9, "time_ms": 91000, "life_left": 4})
+  submit = client.post(client.app.url_path_for("submit_score"), json=payload, headers=headers)
+  assert submit.status_code == 200
+  assert submit.json()["score"] == 1300
+
+  best = client.get(client.app.url_path_for("best_score"), params={"level": "endless"}, headers=headers)
+  assert best.json()["best_score"] == 1300
+
+  board = client.get(client.app.url_path_for("read_leaderboard"), params={"level": "endless"})
+  assert [e["name"] for e in board.json()["entries"]] == ["alice"]
+
+
+def test_async_stack_streams_replay_upload(async_client, tmp_path):
+  client = async_client
+  client.post(client.app.url_path_for("auth_register"), json={"name": "alice", "password": "p@ss"})
+  login = client.post(client.app.url_path_for("auth_login"), json={"name": "alice", "password": "p@ss"})
+  headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+  replay = {"seed": 1, "ticks": 600, "ops": [[30, "build", 3, 4, "LMG"], [400, "skip"]]}
+  data = encode_replay(replay, [1, 1])
+
+  level = load_level("endless")
+  payload = signed_score_payload(level, {"score": 10, "ops_digest": replay_digest(replay)})
+  score_id = client.post(client.app.url_path_for("submit_score"), json=payload, headers=headers).json()["id"]
+  client.app.state.replay_verifier = None
+  client.app.state.replay_store = ReplayStore(tmp_path / "replays", max_ops=100)
+  upload = client.put(
+    client.app.url_path_for("upload_replay", score_id=score_id),
+    content=(data[i : i + 16] for i in range(0, len(data), 16)),
+    headers=headers,
+  )
+  assert upload.status_code == 201
+  assert (upload.json()["ops"], upload.json()["replay_status"]) == (2, "pending")
+  assert client.get(client.app.url_path_for("download_replay", score_id=score_id)).content == data
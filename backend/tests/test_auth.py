@@ -1,3 +1,20 @@
+import time
+
+import fakeredis
+import pytest
+
+from app.core.config import get_settings
+from app.core.deps import get_password_hasher
+from app.models import User
+from app.services.auth_cache import AuthCache, get_auth_cache
+from app.services.passwords import PasswordHasher
+from app.utils.security import get_password_hash
+
+from conftest import TestingSessionLocal
+
+settings = get_settings()
+
+
 def test_guest_login_without_password(client):
   login_path = client.app.url_path_for("auth_login")
   res = client.post(login_path, json={})
@@ -25,3 +42,130 @@ def test_register_then_login_success(client):
   best_path = client.app.url_path_for("best_score")
   resp = client.get(best_path, params={"level": "endless"}, headers=headers)
   assert resp.status_code == 200
+
+
+def test_login_upgrades_hash_when_rounds_change(client):
+  login_path = client.app.url_path_for("auth_login")
+  with TestingSessionLocal() as db:
+    db.add(User(name="alice", hash_pwd=get_password_hash("p@ss", rounds=1000)))
+    db.commit()
+
+  assert client.post(login_path, json={"name": "alice", "password": "p@ss"}).status_code == 200
+  with TestingSessionLocal() as db:
+    upgraded = db.query(User).filter(User.name == "alice").one().hash_pwd
+  assert upgraded.startswith(f"$pbkdf2-sha256${settings.password_hash_rounds}$")
+
+  # 升级后的哈希照常可登录，且不再重写
+  assert client.post(login_path, json={"name": "alice", "password": "p@ss"}).status_code == 200
+  with TestingSessionLocal() as db:
+    assert db.query(User).filter(User.name == "alice").one().hash_pwd == upgraded
+
+
+def test_password_work_is_bounded(client):
+  register_path = client.app.url_path_for("auth_register")
+  hasher = client.app.state.password_hasher
+  assert client.post(register_path, json={"name": "alice", "password": "p@ss"}).status_code == 201
+  assert hasher.stats()["completed"] >= 1 and hasher.stats()["in_flight"] == 0
+
+  busy = PasswordHasher(settings.password_hash_rounds, workers=0, max_pending=0)
+  client.app.dependency_overrides[get_password_hasher] = lambda: busy
+  res = client.post(register_path, json={"name": "bob", "password": "p@ss"})
+  assert res.status_code == 503
+  assert res.headers["Retry-After"] == "1"
+  assert busy.stats()["rejected"] == 1
+
+
+def login_headers(client, name: str) -> dict:
+  client.post(client.app.url_path_for("auth_register"), json={"name": name, "password": "p@ss"})
+  token = client.post(client.app.url_path_for("auth_login"), json={"name": name, "password": "p@ss"}).json()[
+    "access_token"
+  ]
+  return {"Authorization": f"Bearer {token}"}
+
+
+def test_auth_cache_skips_user_lookup(client, sql_statements):
+  best_path = client.app.url_path_for("best_score")
+  headers = login_headers(client, "alice")
+  cache = get_auth_cache()
+
+  hits = cache.stats()["hits"]
+  sql_statements.clear()
+  for _ in range(3):
+    assert client.get(best_path, params={"level": "endless"}, headers=headers).status_code == 200
+  assert sum(stmt.startswith("SELECT users.") for stmt in sql_statements) == 1
+  assert cache.stats()["hits"] - hits == 2
+
+
+@pytest.mark.parametrize("trust_claims", [False, True])
+def test_deleted_user_rejected_within_ttl(client, sql_statements, monkeypatch, trust_claims):
+  monkeypatch.setattr(settings, "auth_trust_token_claims", trust_claims)
+  best_path = client.app.url_path_for("best_score")
+  headers = login_headers(client, "alice")
+
+  sql_statements.clear()
+  assert client.get(best_path, params={"level": "endless"}, headers=headers).status_code == 200
+  assert any(stmt.startswith("SELECT users.") for stmt in sql_statements) != trust_claims
+
+  # 改名：缓存按 user_id 失效，下一次请求拿到新名字
+  with TestingSessionLocal() as db:
+    db.query(User).filter(User.name == "alice").one().name = "alicia"
+    db.commit()
+  assert get_auth_cache().stats()["entries"] == 0
+
+  with TestingSessionLocal() as db:
+    db.delete(db.query(User).filter(User.name == "alicia").one())
+    db.commit()
+  # 仍在缓存 TTL 与 token 有效期内，但删除已撤销身份
+  res = client.get(best_path, params={"level": "endless"}, headers=headers)
+  assert res.status_code == 401
+
+
+def test_auth_cache_lru_and_ttl():
+  now = [1000.0]
+  cache = AuthCache(max_entries=2, ttl=10, clock=lambda: now[0])
+  cache.put("a", 1, "amy")
+  cache.put("b", 2, "ben", token_exp=1005)
+  assert cache.get("a").name == "amy"
+  cache.put("c", 3, "cat")
+  # b 最久未用，被淘汰
+  assert cache.get("b") is None and cache.stats()["evictions"] == 1
+
+  cache.put("b", 2, "ben", token_exp=1005)
+  now[0] = 1006
+  # TTL 不超过 token 自身的 exp
+  assert cache.get("b") is None
+  assert cache.get("c").user_id == 3
+  now[0] = 1011
+  assert cache.get("c") is None
+  assert cache.stats()["hit_rate"] == pytest.approx(2 / 5)
+
+
+def test_revocation_shared_across_processes():
+  server = fakeredis.FakeServer()
+  first, second = AuthCache(max_entries=10, ttl=60), AuthCache(max_entries=10, ttl=60)
+  second.put("old", 1, "amy")
+  first.start(fakeredis.FakeRedis(server=server, decode_responses=True))
+  second.start(fakeredis.FakeRedis(server=server, decode_responses=True))
+  try:
+    second.put("t1", 1, "amy")
+    second.put("t2", 2, "ben")
+    # 订阅时清空本地缓存，断线期间错过的失效不会残留
+    assert second.get("old") is None
+
+    # 另一个进程里改名 / 删除：本进程的缓存随之失效，删除的用户被拒
+    first.invalidate_user(2)
+    first.revoke_user(1)
+    deadline = time.monotonic() + 5
+    while (second.get("t2") is not None or not second.is_revoked(1)) and time.monotonic() < deadline:
+      time.sleep(0.01)
+    assert second.get("t1") is None and second.get("t2") is None
+    assert second.is_revoked(1) and not second.is_revoked(2)
+
+    # 之后启动的进程从共享撤销表加载
+    third = AuthCache(max_entries=10, ttl=60)
+    third.start(fakeredis.FakeRedis(server=server, decode_responses=True))
+    third.stop()
+    assert third.is_revoked(1)
+  finally:
+    first.stop()
+    second.stop()
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime
+
+from app.core.deps import get_leaderboard
+from app.schemas import LeaderboardEntry
+from app.services.broadcast import LeaderboardBroadcaster, Subscriber
+from app.services.leaderboard import DAY_SECONDS, Leaderboard, parse_events_channel
+from app.services.levels import load_level
+
+from test_leaderboard import SATURDAY_NOON
+from test_score import auth_headers, signed_score_payload
+
+
+def make_entry(user_id: int, score: int) -> LeaderboardEntry:
+  return LeaderboardEntry(
+    user_id=user_id,
+    name=f"user{user_id}",
+    score=score,
+    wave=5,
+    time_ms=60000,
+    life_left=3,
+    created_at=datetime(2024, 1, 1),
+  )
+
+
+def test_parse_events_channel():
+  assert parse_events_channel("leaderboard:endless:all:events") == ("endless", "all")
+  assert parse_events_channel("nonce:abc") is None
+
+
+def test_slow_subscriber_keeps_latest_snapshots():
+  async def scenario():
+    subscriber = Subscriber(("endless", "all"), maxsize=2)
+    for i in range(5):
+      subscriber.offer(str(i))
+    return [subscriber.queue.get_nowait() for _ in range(2)], subscriber.dropped
+
+  assert asyncio.run(scenario()) == (["3", "4"], 3)
+
+
+def test_change_is_serialized_once_and_fanned_out():
+  async def scenario():
+    leaderboard = Leaderboard(None)
+    broadcaster = LeaderboardBroadcaster(leaderboard)
+    await broadcaster.start()
+    first = await broadcaster.subscribe("endless", "all")
+    second = await broadcaster.subscribe("endless", "all")
+    assert first.queue.get_nowait() == '{"entries": []}'
+    second.queue.get_nowait()
+
+    leaderboard.submit("endless", make_entry(1, 100))
+    leaderboard.submit("endless", make_entry(2, 200))
+    a = await asyncio.wait_for(first.queue.get(), timeout=1)
+    b = await asyncio.wait_for(second.queue.get(), timeout=1)
+    await broadcaster.stop()
+    return a, b
+
+  a, b = asyncio.run(scenario())
+  # 两个连接拿到的是同一个已序列化对象
+  assert a is b
+  assert '"score": 100' in a
+
+
+def test_websocket_pushes_on_submit(client):
+  client.app.dependency_overrides[get_leaderboard] = lambda: client.app.state.leaderboard
+  level = load_level("endless")
+  headers = auth_headers(client, "alice")
+
+  with client.websocket_connect("/ws/leaderboard?level=endless&scope=all") as ws:
+    assert ws.receive_json() == {"entries": []}
+    payload = signed_score_payload(level, {"score": 900, "wave": 4, "time_ms": 70000, "life_left": 5})
+    res = client.post(client.app.url_path_for("submit_score"), json=payload, headers=headers)
+    assert res.status_code == 200
+    entries = ws.receive_json()["entries"]
+    assert [(e["name"], e["score"]) for e in entries] == [("alice", 900)]
+
+
+def test_snapshot_is_not_reused_across_bucket_rollover():
+  now = [SATURDAY_NOON]
+
+  async def scenario():
+    leaderboard = Leaderboard(None, clock=lambda: now[0])
+    broadcaster = LeaderboardBroadcaster(leaderboard)
+    await broadcaster.start()
+    leaderboard.submit("endless", make_entry(1, 100), scope="daily")
+    first = await broadcaster.subscribe("endless", "daily")
+    before = first.queue.get_nowait()
+
+    # 过了零点且无新提交：新连接拿到新一天的（空）榜单，而不是缓存的昨日快照
+    now[0] += DAY_SECONDS
+    second = await broadcaster.subscribe("endless", "daily")
+    after = second.queue.get_nowait()
+    await broadcaster.stop()
+    return before, after
+
+  before, after = asyncio.run(scenario())
+  assert '"score": 100' in before
+  assert after == '{"entries": []}'
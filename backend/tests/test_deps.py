@@ -0,0 +1,88 @@
+import fakeredis
+import pytest
+import redis
+from fastapi.testclient import TestClient
+
+from app import main
+from app.core import metrics
+from app.core.config import Settings
+from app.core.deps import connect_redis, create_redis_pool
+from app.services.auth_cache import get_auth_cache
+
+
+def fake_pool() -> redis.ConnectionPool:
+  return redis.ConnectionPool(
+    connection_class=fakeredis.FakeRedisConnection, server=fakeredis.FakeServer(), decode_responses=True
+  )
+
+
+def unreachable_pool() -> redis.ConnectionPool:
+  # 端口 1 上没有 Redis：连接立即被拒绝
+  return create_redis_pool(Settings(redis_url="redis://127.0.0.1:1/0", redis_socket_connect_timeout=0.2))
+
+
+@pytest.fixture
+def tracked_pool(monkeypatch):
+  """让 lifespan 使用给定的连接池，并记录 disconnect 调用次数。"""
+  disconnects = []
+
+  def use(pool: redis.ConnectionPool) -> list:
+    original = pool.disconnect
+
+    def disconnect(*args, **kwargs):
+      disconnects.append(pool)
+      return original(*args, **kwargs)
+
+    monkeypatch.setattr(pool, "disconnect", disconnect)
+    monkeypatch.setattr(main, "create_redis_pool", lambda settings: pool)
+    return disconnects
+
+  return use
+
+
+def test_create_redis_pool_applies_settings():
+  settings = Settings(redis_url="redis://cache:6380/2", redis_max_connections=7, redis_socket_timeout=0.5)
+  pool = create_redis_pool(settings)
+  assert pool.max_connections == 7
+  assert pool.connection_kwargs["host"] == "cache" and pool.connection_kwargs["port"] == 6380
+  assert pool.connection_kwargs["db"] == 2
+  assert pool.connection_kwargs["socket_timeout"] == 0.5
+  assert pool.connection_kwargs["decode_responses"] is True
+
+
+def test_connect_redis_pings_and_falls_back():
+  pool = fake_pool()
+  client = connect_redis(pool)
+  assert client is not None and client.connection_pool is pool
+  assert isinstance(connect_redis(pool, instrumented=True), metrics.InstrumentedRedis)
+  # 探活失败：返回 None，由各服务回退内存实现
+  assert connect_redis(unreachable_pool()) is None
+
+
+def test_lifespan_shares_one_pool_and_closes_it(tracked_pool):
+  pool = fake_pool()
+  disconnects = tracked_pool(pool)
+  with TestClient(main.app) as client:
+    state = client.app.state
+    assert state.redis_pool is pool and state.redis.connection_pool is pool
+    # 各单例共用同一个客户端（同一连接池）
+    assert state.leaderboard.client is state.redis
+    assert state.nonce_store.client is state.redis
+    assert get_auth_cache().client is state.redis
+    assert metrics.fallback_active.value("leaderboard") == 0
+    assert disconnects == []
+  assert disconnects == [pool]
+  assert get_auth_cache().client is None
+
+
+def test_lifespan_falls_back_to_memory_when_ping_fails(tracked_pool):
+  pool = unreachable_pool()
+  disconnects = tracked_pool(pool)
+  with TestClient(main.app) as client:
+    state = client.app.state
+    assert state.redis is None
+    assert state.leaderboard.client is None and state.nonce_store.client is None
+    assert state.broadcaster.redis_url is None
+    assert metrics.fallback_active.value("leaderboard") == 1
+    assert metrics.fallback_active.value("nonce_store") == 1
+  assert disconnects == [pool]
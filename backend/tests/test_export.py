@@ -0,0 +1,157 @@
+import csv
+import io
+import runpy
+import sys
+from datetime import datetime
+
+import orjson
+import pytest
+import sqlalchemy
+
+from app.api import routes
+from app.models import Level, Score, User
+from app.services.export import EXPORT_COLUMNS, ScoreExporter, exported_rows, resume_point
+from app.services.levels import load_level
+from conftest import TestingSessionLocal, engine
+
+ADMIN = {"Authorization": "Bearer admin-secret"}
+
+
+@pytest.fixture
+def admin_token(monkeypatch):
+  monkeypatch.setattr(routes.settings, "admin_token", "admin-secret")
+  monkeypatch.setattr(routes.settings, "export_batch_size", 2)
+
+
+def seed_scores():
+  level = load_level("endless")
+  with TestingSessionLocal() as db:
+    db.add(Level(id="endless", config_json=level["config"], version=level["version"], hash=level["hash"]))
+    db.add(Level(id="other", config_json=level["config"], version=level["version"], hash=level["hash"]))
+    db.add_all([User(id=1, name="alice", hash_pwd="x"), User(id=2, name='bob, "the" builder', hash_pwd="x")])
+    for i in range(1, 8):
+      db.add(
+        Score(
+          id=i,
+          user_id=1 + i % 2,
+          level_id="other" if i == 4 else "endless",
+          score=i * 100,
+          wave=i,
+          time_ms=i * 1000,
+          life_left=20 - i,
+          created_at=datetime(2026, 1, i),
+        )
+      )
+    db.commit()
+
+
+def test_export_requires_admin_token(client, monkeypatch):
+  path = client.app.url_path_for("export_scores")
+  assert client.get(path).status_code == 404
+  monkeypatch.setattr(routes.settings, "admin_token", "admin-secret")
+  assert client.get(path).status_code == 401
+  assert client.get(path, headers={"Authorization": "Bearer nope"}).status_code == 401
+  assert client.get(path, headers=ADMIN, params={"format": "xml"}).status_code == 422
+
+
+def test_export_streams_ndjson_and_csv_with_filters(client, admin_token):
+  seed_scores()
+  path = client.app.url_path_for("export_scores")
+
+  res = client.get(
+    path, headers=ADMIN, params={"level": "endless", "since": "2026-01-02T00:00:00Z", "until": "2026-01-07"}
+  )
+  assert res.status_code == 200
+  assert res.headers["content-type"] == "application/x-ndjson"
+  rows = [orjson.loads(line) for line in res.content.splitlines()]
+  assert [r["id"] for r in rows] == [2, 3, 5, 6]
+  assert rows[1] == {
+    "id": 3,
+    "user_id": 2,
+    "name": 'bob, "the" builder',
+    "level_id": "endless",
+    "score": 300,
+    "wave": 3,
+    "time_ms": 3000,
+    "life_left": 17,
+    "created_at": "2026-01-03T00:00:00",
+    "replay_status": None,
+  }
+
+  # 按 id 续传：after_id 之后、limit 条
+  res = client.get(path, headers=ADMIN, params={"format": "csv", "after_id": 3, "limit": 3})
+  assert res.headers["content-type"] == "text/csv; charset=utf-8"
+  table = list(csv.reader(io.StringIO(res.text)))
+  assert table[0] == list(EXPORT_COLUMNS)
+  assert [int(r[0]) for r in table[1:]] == [4, 5, 6]
+  assert table[2][2] == 'bob, "the" builder' and table[2][8] == "2026-01-05T00:00:00"
+
+
+def test_exporter_resumes_truncated_file(tmp_path):
+  seed_scores()
+  out = tmp_path / "scores.csv"
+  exporter = ScoreExporter(engine, "csv", batch_size=3)
+  data = b"".join(exporter.chunks(limit=4))
+  assert (exporter.stats.rows, exporter.stats.last_id, exporter.stats.bytes) == (4, 4, len(data))
+
+  # 写到一半中断：续传截掉残行，从最后一条完整行之后接着导
+  out.write_bytes(data + b"5,1,ali")
+  after = resume_point(out, "csv")
+  assert after == 4 and out.read_bytes() == data
+  with open(out, "ab") as f:
+    f.writelines(ScoreExporter(engine, "csv").chunks(after_id=after, header=False))
+  table = list(csv.reader(io.StringIO(out.read_text())))
+  assert [int(r[0]) for r in table[1:]] == list(range(1, 8))
+
+  header_only = tmp_path / "empty.csv"
+  header_only.write_bytes(b"".join(ScoreExporter(engine, "csv").chunks(after_id=7)))
+  assert resume_point(header_only, "csv") is None
+
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson"])
+def test_resume_point_scans_back_past_long_rows_and_quoted_newlines(tmp_path, fmt):
+  seed_scores()
+  with TestingSessionLocal() as db:
+    # 引号内的换行，以及像数据行开头的名字
+    db.get(User, 1).name = "ali\r\nce\n9,1,x"
+    db.get(User, 2).name = "b" * 500
+    db.commit()
+  out = tmp_path / f"scores.{fmt}"
+  data = b"".join(ScoreExporter(engine, fmt).chunks(limit=5))
+  rows = data.splitlines(keepends=True)
+  partial = b"".join(ScoreExporter(engine, fmt).chunks(after_id=5, limit=1, header=False))
+  for cut in (0, 3, len(partial) // 2, len(partial) - 1):
+    out.write_bytes(data + partial[:cut])
+    # tail 远小于一行：须逐步往前读到完整的一行
+    assert resume_point(out, fmt, tail=16) == 5
+    assert out.read_bytes() == data
+    assert exported_rows(out, fmt) == 5
+  out.write_bytes(rows[0] + b"1,2,bo")
+  assert resume_point(out, fmt, tail=4) == (None if fmt == "csv" else 1)
+
+
+def run_export(monkeypatch, *args):
+  monkeypatch.setattr(sqlalchemy, "create_engine", lambda url: engine)
+  monkeypatch.setattr(sys, "argv", ["export_scores.py", *map(str, args)])
+  runpy.run_path("scripts/export_scores.py", run_name="__main__")
+
+
+def test_export_script_resumes_after_id_zero_and_limits_the_rest(tmp_path, monkeypatch):
+  seed_scores()
+  with TestingSessionLocal() as db:
+    db.add(Score(id=0, user_id=1, level_id="endless", score=1, wave=1, time_ms=1, life_left=1))
+    db.commit()
+  out = tmp_path / "scores.csv"
+  run_export(monkeypatch, "--format", "csv", "--out", out, "--limit", 1)
+  assert [r[0] for r in csv.reader(io.StringIO(out.read_text()))][1:] == ["0"]
+
+  # 续传点为 id 0：从其后继续，而不是从头重导
+  run_export(monkeypatch, "--format", "csv", "--out", out, "--limit", 3, "--resume")
+  ids = [int(r[0]) for r in list(csv.reader(io.StringIO(out.read_text())))[1:]]
+  assert ids == [0, 1, 2]
+
+  # 中断后重跑同一命令：只补齐 --limit 剩余的行
+  out.write_bytes(out.read_bytes() + b"3,2,bo")
+  run_export(monkeypatch, "--format", "csv", "--out", out, "--limit", 5, "--resume")
+  ids = [int(r[0]) for r in list(csv.reader(io.StringIO(out.read_text())))[1:]]
+  assert ids == [0, 1, 2, 3, 4]
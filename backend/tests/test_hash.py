@@ -0,0 +1,54 @@
+import pytest
+
+from app.services.levels import load_level
+from app.utils.hash import FNV_OFFSET, FNV_PRIME, fnv1a_hash, fnv1a_hash_bytes, hash_level_config, stable_dumps
+
+# 由 frontend/src/utils/hash.ts（hashStringFNV1a / stableStringify）在 Node 下生成的金标准向量
+GOLDEN_VECTORS = [
+  ("", "fnv1a-811c9dc5"),
+  ("a", "fnv1a-e40c292c"),
+  ("foobar", "fnv1a-bf9cf968"),
+  ("hello world", "fnv1a-d58b3fa7"),
+  ("0123456", "fnv1a-57879f38"),
+  ("01234567", "fnv1a-d97f649d"),
+  ("012345678", "fnv1a-088b6fbf"),
+  ("fnv1a-tower-defense", "fnv1a-7787f63a"),
+  ('{"a":"x","b":[1,2.5,{"c":null}],"z":true}', "fnv1a-0d7c95c2"),
+  ("x" * 4096, "fnv1a-e01bddc5"),
+  ("ab" * 100003, "fnv1a-007e810e"),
+]
+
+
+def reference_fnv1a(data: str) -> str:
+  """原始逐字符实现，作为快路径的对照。"""
+  hash_val = FNV_OFFSET
+  for ch in data:
+    hash_val ^= ord(ch)
+    hash_val = (hash_val * FNV_PRIME) % (1 << 32)
+  return f"fnv1a-{hash_val:08x}"
+
+
+@pytest.mark.parametrize("data,expected", GOLDEN_VECTORS)
+def test_golden_vectors(data, expected):
+  assert fnv1a_hash(data) == expected
+  assert fnv1a_hash_bytes(data.encode("ascii")) == expected
+  assert reference_fnv1a(data) == expected
+
+
+@pytest.mark.parametrize("length", range(0, 25))
+def test_unrolled_tail_lengths(length):
+  data = "".join(chr(33 + (i * 7) % 90) for i in range(length))
+  assert fnv1a_hash(data) == reference_fnv1a(data)
+
+
+def test_non_ascii_falls_back_to_reference():
+  data = "塔防-endless"
+  assert fnv1a_hash(data) == reference_fnv1a(data)
+
+
+def test_level_hash_matches_frontend():
+  # 前端 hashLevelConfig(endless.json) 的输出
+  assert load_level("endless")["hash"] == "fnv1a-f8ab2ee9"
+  config = {**load_level("endless")["config"]}
+  config["metadata"] = {**config["metadata"], "hash": ""}
+  assert hash_level_config(config) == reference_fnv1a(stable_dumps(config))
@@ -0,0 +1,168 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from anyio import to_thread
+from sqlalchemy import func, select
+
+from app.api import routes
+from app.models import Score, User, UserLevelBest
+from app.services.ingest import ScoreQueueFull, ScoreWriter
+from app.services.levels import load_level
+
+from conftest import TestingSessionLocal
+from test_score import auth_headers, signed_score_payload
+
+
+def score_row(user_id: int, score: int, time_ms: int = 60000) -> dict:
+  return {
+    "user_id": user_id,
+    "level_id": "endless",
+    "score": score,
+    "wave": 3,
+    "time_ms": time_ms,
+    "life_left": 5,
+    "created_at": datetime.utcnow(),
+  }
+
+
+def seed_users(*names: str) -> list:
+  with TestingSessionLocal() as db:
+    users = [User(name=name, hash_pwd="x") for name in names]
+    db.add_all(users)
+    db.commit()
+    return [user.id for user in users]
+
+
+def test_writer_group_commits_and_keeps_best_per_user():
+  amy, ben = seed_users("amy", "ben")
+  writer = ScoreWriter(TestingSessionLocal, max_batch=50, max_latency=0.05).start()
+  scores = [(amy, 100, 9000), (ben, 300, 9000), (amy, 500, 9000), (amy, 500, 7000), (ben, 200, 1000)]
+  with ThreadPoolExecutor(max_workers=len(scores)) as pool:
+    futures = list(pool.map(lambda s: writer.submit(score_row(*s)), scores))
+  ids = [future.result(timeout=5) for future in futures]
+  writer.stop()
+
+  assert len(set(ids)) == len(scores)
+  assert writer.rows == len(scores)
+  assert writer.batches < len(scores)
+  with TestingSessionLocal() as db:
+    assert db.scalar(select(func.count()).select_from(Score)) == len(scores)
+    best = {row.user_id: (row.score, row.time_ms) for row in db.scalars(select(UserLevelBest))}
+    assert db.get(Score, ids[3]).time_ms == 7000
+  assert best == {amy: (500, 7000), ben: (300, 9000)}
+
+
+def test_writer_stop_drains_queue_and_rejects_when_full():
+  (amy,) = seed_users("amy")
+  writer = ScoreWriter(TestingSessionLocal, max_queue=2)
+  first = writer.submit(score_row(amy, 10))
+  writer.submit(score_row(amy, 20))
+  with pytest.raises(ScoreQueueFull):
+    writer.submit(score_row(amy, 30))
+
+  # 启动后立即停止：已入队的成绩仍全部落库
+  writer.start().stop()
+  assert first.result(timeout=0) > 0
+  assert writer.rows == 2
+
+
+def test_submit_route_uses_score_writer(client):
+  level = load_level("endless")
+  submit_path = client.app.url_path_for("submit_score")
+  best_path = client.app.url_path_for("best_score")
+  headers = auth_headers(client, "alice")
+
+  client.app.state.score_writer = ScoreWriter(TestingSessionLocal, max_latency=0.001).start()
+  try:
+    res = client.post(submit_path, json=signed_score_payload(level, {"score": 700}), headers=headers)
+  finally:
+    client.app.state.score_writer.stop()
+    client.app.state.score_writer = None
+  assert res.status_code == 200
+  assert res.json()["id"] > 0
+  assert client.get(best_path, params={"level": level["id"]}, headers=headers).json()["best_score"] == 700
+
+  # 队列已满（写线程未启动）：503 + Retry-After，成绩不会落库
+  full = ScoreWriter(TestingSessionLocal, max_queue=1)
+  full.submit(score_row(1, 1))
+  client.app.state.score_writer = full
+  try:
+    busy = client.post(submit_path, json=signed_score_payload(level, {"score": 900}), headers=headers)
+  finally:
+    client.app.state.score_writer = None
+  assert busy.status_code == 503
+  assert busy.headers["Retry-After"] == "1"
+
+
+def test_submit_route_leaves_no_trace_when_score_is_not_committed(client, monkeypatch):
+  level = load_level("endless")
+  submit_path = client.app.url_path_for("submit_score")
+  leaderboard_path = client.app.url_path_for("read_leaderboard")
+  headers = auth_headers(client, "alice")
+  monkeypatch.setattr(routes.settings, "score_commit_timeout_seconds", 0.05)
+  payload = signed_score_payload(level, {"score": 700})
+
+  # 写线程未启动：等待超时时成绩仍在队列中，被撤回后 503；榜单不留条目，nonce 释放可原样重试
+  stalled = ScoreWriter(TestingSessionLocal)
+  client.app.state.score_writer = stalled
+  try:
+    timed_out = client.post(submit_path, json=payload, headers=headers)
+  finally:
+    client.app.state.score_writer = None
+  assert timed_out.status_code == 503
+  assert client.get(leaderboard_path, params={"level": level["id"]}).json()["entries"] == []
+  stalled.start().stop()
+  assert stalled.rows == 0
+
+  # commit 失败同样不更新榜单
+  def broken_session():
+    raise RuntimeError("database down")
+
+  failing = ScoreWriter(broken_session, max_latency=0.001).start()
+  client.app.state.score_writer = failing
+  try:
+    failed = client.post(submit_path, json=payload, headers=headers)
+  finally:
+    failing.stop()
+    client.app.state.score_writer = None
+  assert failed.status_code == 503
+  assert client.get(leaderboard_path, params={"level": level["id"]}).json()["entries"] == []
+
+  retry = client.post(submit_path, json=payload, headers=headers)
+  assert retry.status_code == 200
+  assert [e["score"] for e in client.get(leaderboard_path, params={"level": level["id"]}).json()["entries"]] == [700]
+  with TestingSessionLocal() as db:
+    assert db.scalar(select(func.count()).select_from(Score)) == 1
+
+
+def test_write_behind_batch_is_not_capped_by_the_threadpool(client):
+  level = load_level("endless")
+  submit_path = client.app.url_path_for("submit_score")
+  headers = auth_headers(client, "alice")
+  limiter = client.portal.call(to_thread.current_default_thread_limiter)
+  tokens = limiter.total_tokens
+  client.portal.call(setattr, limiter, "total_tokens", 4)
+  writer = ScoreWriter(TestingSessionLocal, max_batch=100, max_latency=0.001)
+  client.app.state.score_writer = writer
+  count = 12
+  try:
+    with ThreadPoolExecutor(max_workers=count) as pool:
+      responses = [
+        pool.submit(client.post, submit_path, json=signed_score_payload(level, {"score": i}), headers=headers)
+        for i in range(count)
+      ]
+      # 写线程未启动：等待 commit 的请求不占线程池，比线程池（4）多的成绩都能入队
+      deadline = time.monotonic() + 5
+      while writer._queue.qsize() < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+      assert writer._queue.qsize() == count
+      writer.start()
+      results = [response.result(timeout=10) for response in responses]
+  finally:
+    writer.stop()
+    client.app.state.score_writer = None
+    client.portal.call(setattr, limiter, "total_tokens", tokens)
+  assert [res.status_code for res in results] == [200] * count
+  assert (writer.batches, writer.rows) == (1, count)
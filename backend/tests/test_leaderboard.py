@@ -0,0 +1,326 @@
+import bisect
+import random
+import threading
+from datetime import datetime, timezone
+
+import fakeredis
+import orjson
+import pytest
+
+from app.core.config import get_settings
+from app.api.routes import leaderboard_body
+from app.schemas import LeaderboardEntry, LeaderboardResponse
+from app.services.leaderboard import (
+  BUCKET_GRACE_SECONDS,
+  DAY_SECONDS,
+  Leaderboard,
+  period_bucket,
+  rank_score,
+  split_rank_score,
+)
+from app.services.memory_board import MemoryBoard, SortedKeys, sort_key
+
+settings = get_settings()
+
+
+def make_entry(user_id: int, score: int, time_ms: int = 60000) -> LeaderboardEntry:
+  return LeaderboardEntry(
+    user_id=user_id,
+    name=f"user{user_id}",
+    score=score,
+    wave=5,
+    time_ms=time_ms,
+    life_left=3,
+    created_at=datetime(2024, 1, 1),
+  )
+
+
+@pytest.fixture
+def redis_client():
+  # fakeredis[lua] 作为本地 Redis 替身，支持 EVALSHA/SCRIPT
+  client = fakeredis.FakeRedis(decode_responses=True)
+  yield client
+  client.flushall()
+
+
+def test_submit_keeps_best_score(redis_client):
+  leaderboard = Leaderboard(redis_client)
+  assert leaderboard.submit("endless", make_entry(1, 100))
+  assert not leaderboard.submit("endless", make_entry(1, 80))
+  assert leaderboard.submit("endless", make_entry(1, 150))
+
+  entries = leaderboard.top("endless")
+  assert [(e.user_id, e.score) for e in entries] == [(1, 150)]
+
+
+def test_submit_trims_zset_and_payloads_together(redis_client, monkeypatch):
+  size = 10
+  monkeypatch.setattr(settings, "leaderboard_capacity", size)
+  leaderboard = Leaderboard(redis_client)
+  for user_id in range(size + 5):
+    leaderboard.submit("endless", make_entry(user_id, 100 + user_id))
+
+  key = leaderboard._key("endless")
+  assert redis_client.zcard(key) == size
+  assert redis_client.hlen(f"{key}:payloads") == size
+  assert set(redis_client.hkeys(f"{key}:payloads")) == set(redis_client.zrange(key, 0, -1))
+  # 分数过低的新成员被立即淘汰，不留 payload，也不视为变化
+  assert not leaderboard.submit("endless", make_entry(999, 1))
+  assert redis_client.hget(f"{key}:payloads", "999") is None
+
+
+def test_submit_publishes_only_on_change(redis_client):
+  leaderboard = Leaderboard(redis_client)
+  pubsub = redis_client.pubsub()
+  pubsub.subscribe(f"{leaderboard._key('endless')}:events")
+  pubsub.get_message(timeout=1)
+
+  leaderboard.submit("endless", make_entry(1, 100))
+  assert pubsub.get_message(timeout=1)["type"] == "message"
+  leaderboard.submit("endless", make_entry(1, 50))
+  assert pubsub.get_message(timeout=0.1) is None
+
+
+def test_submit_reloads_script_after_flush(redis_client):
+  leaderboard = Leaderboard(redis_client)
+  leaderboard.submit("endless", make_entry(1, 100))
+  redis_client.script_flush()
+  # EVALSHA 报 NOSCRIPT 后自动重新加载
+  assert leaderboard.submit("endless", make_entry(2, 200))
+  assert [e.user_id for e in leaderboard.top("endless")] == [2, 1]
+
+
+# 2026-10-17（周六）12:00 UTC
+SATURDAY_NOON = datetime(2026, 10, 17, 12, tzinfo=timezone.utc).timestamp()
+
+
+def test_period_bucket_uses_utc_day_and_iso_week():
+  assert period_bucket("all", SATURDAY_NOON) is None
+  label, expire_at = period_bucket("daily", SATURDAY_NOON)
+  assert label == "20261017"
+  assert expire_at == SATURDAY_NOON + 12 * 3600 + BUCKET_GRACE_SECONDS
+  # 周桶以周一开始，周日仍在同一桶
+  assert period_bucket("weekly", SATURDAY_NOON)[0] == "20261012"
+  assert period_bucket("weekly", SATURDAY_NOON + DAY_SECONDS)[0] == "20261012"
+  assert period_bucket("weekly", SATURDAY_NOON + 2 * DAY_SECONDS)[0] == "20261019"
+
+
+def test_submit_scopes_buckets_and_expires_periodic_boards(redis_client):
+  now = [SATURDAY_NOON]
+  leaderboard = Leaderboard(redis_client, clock=lambda: now[0])
+  assert leaderboard.submit_scopes("endless", make_entry(1, 100)) == [True, True, True]
+
+  daily_key = leaderboard._key("endless", "daily")
+  assert daily_key == "leaderboard:endless:daily:20261017"
+  assert redis_client.expiretime(daily_key) == period_bucket("daily", now[0])[1]
+  assert redis_client.expiretime(f"{daily_key}:payloads") == period_bucket("daily", now[0])[1]
+  assert redis_client.ttl(leaderboard._key("endless", "all")) == -1
+
+  # 第二天：日榜换桶，周榜/总榜沿用
+  now[0] += DAY_SECONDS
+  assert leaderboard.top("endless", scope="daily") == []
+  assert leaderboard.submit_scopes("endless", make_entry(2, 50)) == [True, True, True]
+  assert [e.user_id for e in leaderboard.top("endless", scope="daily")] == [2]
+  assert [e.user_id for e in leaderboard.top("endless", scope="weekly")] == [1, 2]
+  assert [e.user_id for e in leaderboard.top("endless", scope="all")] == [1, 2]
+
+
+def test_memory_periodic_boards_roll_over_and_purge():
+  now = [SATURDAY_NOON]
+  leaderboard = Leaderboard(None, clock=lambda: now[0])
+  changes = []
+  leaderboard.on_change = lambda level, scope: changes.append(scope)
+  leaderboard.submit_scopes("endless", make_entry(1, 100))
+  assert changes == ["all", "daily", "weekly"]
+  old_daily = leaderboard._key("endless", "daily")
+
+  now[0] += DAY_SECONDS
+  leaderboard.submit_scopes("endless", make_entry(2, 50))
+  assert [e.user_id for e in leaderboard.top("endless", scope="daily")] == [2]
+  assert [e.user_id for e in leaderboard.top("endless", scope="weekly")] == [1, 2]
+  # 旧日桶已过期，在新桶创建时被清理
+  assert old_daily not in leaderboard.fallback
+
+
+def test_same_score_faster_time_ranks_first_and_replaces(redis_client):
+  leaderboard = Leaderboard(redis_client)
+  leaderboard.submit("endless", make_entry(1, 100, time_ms=70000))
+  leaderboard.submit("endless", make_entry(2, 100, time_ms=60000))
+  assert [e.user_id for e in leaderboard.top("endless")] == [2, 1]
+  # 同分更快：覆盖自己的记录并前移
+  assert leaderboard.submit("endless", make_entry(1, 100, time_ms=50000))
+  assert [(e.user_id, e.time_ms) for e in leaderboard.top("endless")] == [(1, 50000), (2, 60000)]
+
+
+def test_large_rank_scores_keep_full_precision(redis_client):
+  leaderboard = Leaderboard(redis_client)
+  leaderboard.submit("endless", make_entry(1, 60_000_000, time_ms=12345))
+  value = redis_client.zscore(leaderboard._key("endless"), "1")
+  assert int(value) == rank_score(60_000_000, 12345)
+  assert split_rank_score(int(value)) == (60_000_000, 12345)
+
+
+def test_rank_around_and_cursor_pages_match_memory(redis_client):
+  rng = random.Random(11)
+  redis_board = Leaderboard(redis_client)
+  memory_board = Leaderboard(None)
+  for _ in range(400):
+    user_id = rng.randrange(120)
+    # 分数/耗时组合各不相同，避免完全同分时两种后端的次序约定差异
+    entry = make_entry(user_id, rng.randrange(50) * 1000 + user_id, time_ms=rng.randrange(1000, 90000))
+    redis_board.submit("endless", entry)
+    memory_board.submit("endless", entry)
+
+  def walk(board):
+    pages, cursor = [], None
+    while True:
+      entries, cursor = board.page("endless", limit=7, cursor=cursor)
+      pages.append([e.user_id for e in entries])
+      if cursor is None:
+        return pages
+
+  assert walk(redis_board) == walk(memory_board)
+  ordered = [e.user_id for e in memory_board.top("endless", limit=1000)]
+  for user_id in (ordered[0], ordered[5], ordered[-1], 10_000):
+    redis_rank, redis_total, redis_entries = redis_board.around("endless", user_id, radius=3)
+    memory_rank, memory_total, memory_entries = memory_board.around("endless", user_id, radius=3)
+    assert (redis_rank, redis_total) == (memory_rank, memory_total)
+    assert [e.user_id for e in redis_entries] == [e.user_id for e in memory_entries]
+    if user_id in ordered:
+      rank = ordered.index(user_id)
+      assert redis_rank == rank
+      assert [e.user_id for e in redis_entries] == ordered[max(0, rank - 3) : rank + 4]
+
+  # 游标成员在翻页间隙名次变化：两种后端都从“严格优于游标分值”的位置继续
+  first, cursor = redis_board.page("endless", limit=5)
+  assert memory_board.page("endless", limit=5)[1] == cursor
+  moved = make_entry(first[-1].user_id, 10**6)
+  redis_board.submit("endless", moved)
+  memory_board.submit("endless", moved)
+  assert [e.user_id for e in redis_board.page("endless", limit=5, cursor=cursor)[0]] == [
+    e.user_id for e in memory_board.page("endless", limit=5, cursor=cursor)[0]
+  ]
+
+
+def test_sorted_keys_matches_sorted_list():
+  rng = random.Random(7)
+  keys = SortedKeys(load=4)
+  reference = []
+  for _ in range(2000):
+    key = (rng.randint(-50, 0), rng.randint(0, 50), rng.randint(0, 10**6))
+    if reference and rng.random() < 0.3:
+      victim = reference.pop(rng.randrange(len(reference)))
+      keys.remove(victim)
+    elif key not in reference:
+      keys.add(key)
+      reference.append(key)
+    reference.sort()
+    # 增删之间查询：块长度树状数组的增量更新与失效重建都要覆盖
+    if reference and rng.random() < 0.2:
+      probe = reference[rng.randrange(len(reference))]
+      assert keys.index(probe) == reference.index(probe)
+      assert keys.count_le(key) == bisect.bisect_right(reference, key)
+      start = rng.randrange(len(reference))
+      assert list(keys.islice(start, start + 3)) == reference[start : start + 3]
+  assert list(keys.islice()) == reference
+  assert [keys.index(k) for k in reference] == list(range(len(reference)))
+  assert list(keys.islice(5, 9)) == reference[5:9]
+
+
+def test_memory_board_keeps_best_and_ranks():
+  board = MemoryBoard(capacity=100)
+  assert board.submit(make_entry(1, 100)) == 0
+  assert board.submit(make_entry(2, 200)) == 0
+  assert board.rank(1) == 1
+  # 更低分或同分更慢不覆盖；同分更快覆盖
+  assert board.submit(make_entry(1, 90)) is None
+  assert board.submit(make_entry(1, 100, time_ms=70000)) is None
+  assert board.submit(make_entry(1, 100, time_ms=50000)) == 1
+  assert [(e.user_id, e.time_ms) for e in board.top(10)] == [(2, 60000), (1, 50000)]
+
+
+def test_memory_board_evicts_worst_beyond_capacity():
+  board = MemoryBoard(capacity=3)
+  for user_id, score in enumerate([50, 40, 30]):
+    board.submit(make_entry(user_id, score))
+  assert board.submit(make_entry(9, 10)) is None
+  assert board.submit(make_entry(9, 45)) == 1
+  assert len(board) == 3
+  assert board.rank(2) is None
+
+
+def test_memory_board_concurrent_submits():
+  board = MemoryBoard(capacity=10_000)
+
+  def worker(offset: int) -> None:
+    for i in range(500):
+      board.submit(make_entry(i, offset * 1000 + i))
+
+  threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  entries = board.top(1000)
+  assert len(entries) == 500
+  assert all(e.score >= 3000 for e in entries)
+  assert [sort_key(e) for e in entries] == sorted(sort_key(e) for e in entries)
+
+
+@pytest.mark.parametrize("use_redis", [True, False])
+def test_version_changes_only_when_board_changes(redis_client, use_redis):
+  leaderboard = Leaderboard(redis_client if use_redis else None, clock=lambda: SATURDAY_NOON)
+  empty = leaderboard.version("endless", "daily")
+  assert empty.startswith("20261017.")
+
+  leaderboard.submit_scopes("endless", make_entry(1, 100))
+  first = leaderboard.version("endless", "daily")
+  assert first != empty
+  # 未刷新最好成绩：榜单内容不变，版本不变
+  leaderboard.submit_scopes("endless", make_entry(1, 90))
+  assert leaderboard.version("endless", "daily") == first
+  leaderboard.submit_scopes("endless", make_entry(2, 50))
+  assert leaderboard.version("endless", "daily") != first
+  assert leaderboard.version("endless", "all").startswith("all.")
+  if use_redis:
+    key = leaderboard._key("endless", "daily")
+    assert redis_client.expiretime(f"{key}:version") == redis_client.expiretime(key)
+
+
+@pytest.mark.parametrize("use_redis", [True, False])
+def test_withdraw_replaces_only_the_withdrawn_score(redis_client, use_redis):
+  leaderboard = Leaderboard(redis_client if use_redis else None, clock=lambda: SATURDAY_NOON)
+  leaderboard.submit_scopes("endless", make_entry(1, 900))
+  leaderboard.submit_scopes("endless", make_entry(2, 500))
+  version = leaderboard.version("endless")
+
+  # 榜上已是别的成绩：不动
+  assert leaderboard.withdraw("endless", 1, 800, 60000, {"all": None}) == [False]
+  assert leaderboard.version("endless") == version
+
+  replacement = make_entry(1, 300)
+  assert leaderboard.withdraw("endless", 1, 900, 60000, {"all": replacement, "daily": None}) == [True, True]
+  assert [(e.user_id, e.score) for e in leaderboard.top("endless")] == [(2, 500), (1, 300)]
+  assert [e.user_id for e in leaderboard.top("endless", scope="daily")] == [2]
+  assert [e.user_id for e in leaderboard.top("endless", scope="weekly")] == [1, 2]
+  assert leaderboard.version("endless") != version
+  assert leaderboard.around("endless", 1)[0] == 1
+
+
+@pytest.mark.parametrize("use_redis", [True, False])
+def test_page_raw_matches_model_page(redis_client, use_redis):
+  leaderboard = Leaderboard(redis_client if use_redis else None)
+  for user_id in range(25):
+    leaderboard.submit("endless", make_entry(user_id, 1000 - user_id * 10, time_ms=50000 + user_id))
+
+  cursor = raw_cursor = None
+  for _ in range(3):
+    entries, cursor = leaderboard.page("endless", limit=10, cursor=cursor)
+    payloads, raw_cursor = leaderboard.page_raw("endless", limit=10, cursor=raw_cursor)
+    assert raw_cursor == cursor
+    body = leaderboard_body("endless", "all", payloads, raw_cursor)
+    expected = LeaderboardResponse(level="endless", scope="all", entries=entries, next_cursor=cursor)
+    # 拼接出的响应体与模型序列化逐字段一致，且能通过响应模型校验
+    assert orjson.loads(body) == orjson.loads(expected.model_dump_json())
+    assert LeaderboardResponse.model_validate_json(body) == expected
+  assert cursor is None
@@ -0,0 +1,182 @@
+import base64
+import json
+import pickle
+import os
+import shutil
+import threading
+
+import numpy as np
+import pytest
+
+from app.core.config import get_settings
+from app.services.level_compiler import NO_FLOW, LevelInvalid, compile_level
+from app.services import levels
+from app.services.levels import LevelRegistry, load_level
+
+settings = get_settings()
+
+
+@pytest.fixture
+def level_dir(tmp_path):
+  shutil.copy(settings.level_dir / "endless.json", tmp_path / "endless.json")
+  return tmp_path
+
+
+def test_registry_matches_load_level(level_dir):
+  registry = LevelRegistry(level_dir)
+  registry.load_all()
+  record = registry.get("endless")
+  level = load_level("endless")
+  assert record.hash == level["hash"]
+  assert record.version == level["version"]
+  # 未变化时返回同一对象，不重复解析
+  assert registry.get("endless") is record
+
+
+def test_registry_reloads_only_on_content_change(level_dir):
+  registry = LevelRegistry(level_dir, check_interval=0)
+  registry.load_all()
+  path = level_dir / "endless.json"
+  first = registry.get("endless")
+
+  # 仅 touch：内容相同，沿用旧 hash 与 config
+  stat = path.stat()
+  os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+  touched = registry.get("endless")
+  assert touched.config is first.config
+  assert touched.hash == first.hash
+
+  raw = json.loads(path.read_text(encoding="utf-8"))
+  raw["metadata"]["version"] = "9.9.9"
+  path.write_text(json.dumps(raw), encoding="utf-8")
+  changed = registry.get("endless")
+  assert changed.version == "9.9.9"
+  assert changed.hash != first.hash
+
+  # 只改格式：hash 不变，直接复用已编译的寻路数据
+  path.write_text(json.dumps(raw, indent=2), encoding="utf-8")
+  assert registry.get("endless").compiled is changed.compiled
+
+
+def test_registry_compiles_outside_the_lock(level_dir, monkeypatch):
+  registry = LevelRegistry(level_dir, check_interval=0)
+  registry.load_all()
+  raw = json.loads((level_dir / "endless.json").read_text(encoding="utf-8"))
+  raw["metadata"]["version"] = "2.0.0"
+  (level_dir / "slow.json").write_text(json.dumps(raw), encoding="utf-8")
+
+  started, release = threading.Event(), threading.Event()
+
+  def slow_compile(config):
+    started.set()
+    release.wait(5)
+    return compile_level(config)
+
+  monkeypatch.setattr(levels, "compile_level", slow_compile)
+  loaders = [threading.Thread(target=registry.get, args=("slow",)) for _ in range(2)]
+  for loader in loaders:
+    loader.start()
+  assert started.wait(5)
+
+  # 一个关卡编译中，其他关卡的 get() 不被阻塞
+  served = threading.Event()
+  threading.Thread(target=lambda: registry.get("endless") and served.set()).start()
+  assert served.wait(2)
+  release.set()
+  for loader in loaders:
+    loader.join()
+  slow = registry.get("slow")
+  assert slow.version == "2.0.0" and registry.get("slow") is slow
+
+
+def test_registry_skips_bad_levels_and_freezes_config(level_dir):
+  raw = json.loads((level_dir / "endless.json").read_text(encoding="utf-8"))
+  raw["grid"]["blocked"].extend({"x": 10, "y": y} for y in range(raw["grid"]["height"]))
+  (level_dir / "walled.json").write_text(json.dumps(raw), encoding="utf-8")
+  (level_dir / "truncated.json").write_text('{"grid": ', encoding="utf-8")
+
+  # 不可解/格式错误的关卡跳过，其余照常加载
+  registry = LevelRegistry(level_dir)
+  registry.load_all()
+  config = registry.get("endless").config
+  with pytest.raises(LevelInvalid):
+    registry.get("walled")
+
+  # 共享的 config 深度只读，但序列化、比较与跨进程传递照常
+  with pytest.raises(TypeError):
+    config["grid"]["blocked"].append({"x": 0, "y": 0})
+  with pytest.raises(TypeError):
+    config["metadata"]["version"] = "9.9.9"
+  assert json.loads(json.dumps(config)) == config == pickle.loads(pickle.dumps(config))
+
+
+def test_registry_missing_level(level_dir):
+  registry = LevelRegistry(level_dir, check_interval=0)
+  registry.load_all()
+  (level_dir / "endless.json").unlink()
+  with pytest.raises(FileNotFoundError):
+    registry.get("endless")
+
+
+def test_get_level_etag_and_precompressed_body(client):
+  path = client.app.url_path_for("get_level", level_id="endless")
+  level = load_level("endless")
+
+  res = client.get(path, headers={"Accept-Encoding": "gzip"})
+  assert res.status_code == 200
+  # 每种内容编码各有自己的强 ETag
+  assert res.headers["etag"] == f'"{level["hash"]}-gzip"'
+  assert res.headers["content-encoding"] == "gzip"
+  assert res.json()["config"] == level["config"]
+
+  plain = client.get(path, headers={"Accept-Encoding": "identity"})
+  assert "content-encoding" not in plain.headers
+  assert plain.headers["etag"] == f'"{level["hash"]}"'
+  assert plain.json() == res.json()
+
+  for etag in (res.headers["etag"], plain.headers["etag"], f'"stale", W/{res.headers["etag"]}'):
+    cached = client.get(path, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag.split(", W/")[-1]
+  assert client.get(path, headers={"If-None-Match": f'"{level["hash"]}-deflate"'}).status_code == 200
+
+
+def test_compile_level_flow_field_and_validation():
+  config = load_level("endless")["config"]
+  compiled = compile_level(config)
+  entry = (config["grid"]["entry"]["x"], config["grid"]["entry"]["y"])
+  exit_ = (config["grid"]["exit"]["x"], config["grid"]["exit"]["y"])
+  assert compiled.base_path[0] == entry and compiled.base_path[-1] == exit_
+  # 流场走出的是最短路：与 A* 基础路径等长
+  assert compiled.distance[entry[1], entry[0]] == len(compiled.base_path) - 1
+  assert len(compiled.path_from(entry)) == len(compiled.base_path)
+  blocked = config["grid"]["blocked"][0]
+  assert compiled.flow[blocked["y"], blocked["x"]] == NO_FLOW
+  assert compiled.path_from((blocked["x"], blocked["y"])) == []
+
+  def broken(mutate):
+    # 注册表的 config 只读，改一份可变副本
+    bad = json.loads(json.dumps(config))
+    mutate(bad["grid"])
+    with pytest.raises(LevelInvalid):
+      compile_level(bad)
+
+  broken(lambda grid: grid.update(exit={"x": grid["width"], "y": 0}))
+  broken(lambda grid: grid["blocked"].append(dict(grid["exit"])))
+  # 用一整列障碍把 entry 与 exit 隔开
+  broken(lambda grid: grid["blocked"].extend({"x": 10, "y": y} for y in range(grid["height"])))
+
+
+def test_get_level_serves_compiled_paths(client):
+  body = client.get(client.app.url_path_for("get_level", level_id="endless")).json()
+  paths = body["paths"]
+  width, height = paths["width"], paths["height"]
+  distance = np.frombuffer(
+    base64.b64decode(paths["distance"]), dtype=np.dtype(paths["distance_dtype"]).newbyteorder("<")
+  )
+  flow = np.frombuffer(base64.b64decode(paths["flow"]), dtype=np.uint8)
+  assert distance.shape == flow.shape == (width * height,)
+  entry = body["config"]["grid"]["entry"]
+  assert paths["base_path"][:2] == [entry["x"], entry["y"]]
+  assert distance[entry["y"] * width + entry["x"]] == len(paths["base_path"]) // 2 - 1
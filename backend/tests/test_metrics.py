@@ -0,0 +1,85 @@
+import fakeredis
+import redis
+from sqlalchemy import create_engine, text
+
+from app.core import metrics
+from app.core.config import get_settings
+from app.services.leaderboard import Leaderboard
+
+settings = get_settings()
+
+
+def sample(body: str, name: str) -> float:
+  for line in body.splitlines():
+    if line.startswith(name + " "):
+      return float(line.rsplit(" ", 1)[1])
+  raise AssertionError(f"{name} not in /metrics")
+
+
+def test_metrics_endpoint_exposes_route_templates(client):
+  route = f"{settings.api_prefix}/levels/{{level_id}}"
+  before = metrics.http_request_duration.count("GET", route, "200")
+  assert client.get(f"{settings.api_prefix}/levels/endless").status_code == 200
+  assert client.get(f"{settings.api_prefix}/no-such-path").status_code == 404
+  assert metrics.http_request_duration.count("GET", route, "200") == before + 1
+
+  res = client.get("/metrics")
+  assert res.status_code == 200
+  assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
+  body = res.text
+  # 按模板而非具体路径打标签；未匹配路径不带原始 URL
+  assert f'route="{route}",status="200",le="+Inf"' in body
+  assert 'route="unmatched",status="404"' in body
+  assert "no-such-path" not in body
+  # 测试环境无 Redis：两处回退都处于激活状态，内存 nonce 条目数可见
+  assert sample(body, 'td_redis_fallback_active{component="leaderboard"}') == 1
+  assert sample(body, 'td_redis_fallback_active{component="nonce_store"}') == 1
+  assert sample(body, "td_nonce_fallback_entries") >= 0
+  assert sample(body, 'td_password_hash_tasks{state="in_flight"}') == 0
+  assert "/metrics" not in client.get("/openapi.json").text
+
+
+def test_histogram_buckets_are_cumulative():
+  histogram = metrics.Histogram("td_test_seconds", "test", ("op",), buckets=(0.1, 1.0))
+  for value in (0.05, 0.5, 0.5, 3.0):
+    histogram.observe(("a",), value)
+  lines = histogram.samples()
+  assert lines == [
+    'td_test_seconds_bucket{op="a",le="0.1"} 1',
+    'td_test_seconds_bucket{op="a",le="1"} 3',
+    'td_test_seconds_bucket{op="a",le="+Inf"} 4',
+    'td_test_seconds_sum{op="a"} 4.05',
+    'td_test_seconds_count{op="a"} 4',
+  ]
+
+
+def test_engine_and_redis_instrumentation():
+  engine = create_engine("sqlite+pysqlite:///:memory:")
+  metrics.instrument_engine(engine)
+  before = metrics.db_query_duration.count("SELECT")
+  with engine.connect() as conn:
+    conn.execute(text("select 1"))
+  assert metrics.db_query_duration.count("SELECT") == before + 1
+
+  pool = redis.ConnectionPool(
+    connection_class=fakeredis.FakeRedisConnection, server=fakeredis.FakeServer(), decode_responses=True
+  )
+  client = metrics.InstrumentedRedis(connection_pool=pool)
+  zadds, pipelines = metrics.redis_commands.value("ZADD"), metrics.redis_command_duration.count("PIPELINE")
+  client.set("k", "v")
+  assert metrics.redis_command_duration.count("SET") >= 1
+  # 榜单提交走管道内的 EVALSHA：命令逐条计数，耗时按整个管道记一次
+  Leaderboard(client).submit_scopes("endless", _entry())
+  assert metrics.redis_command_duration.count("PIPELINE") == pipelines + 1
+  assert metrics.redis_commands.value("EVALSHA") >= 1
+  assert metrics.redis_commands.value("ZADD") == zadds
+
+
+def _entry():
+  from datetime import datetime
+
+  from app.schemas import LeaderboardEntry
+
+  return LeaderboardEntry(
+    user_id=1, name="p", score=10, wave=1, time_ms=1000, life_left=1, created_at=datetime(2026, 1, 1)
+  )
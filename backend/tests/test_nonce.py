@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from app.utils.nonce import NonceStore, NonceStoreFull
+
+
+class FakeClock:
+  def __init__(self, now: float = 1_000.0):
+    self.now = now
+
+  def __call__(self) -> float:
+    return self.now
+
+
+def test_rejects_replay_until_expiry():
+  clock = FakeClock()
+  store = NonceStore(None, clock=clock)
+  assert store.check_and_store("a", ttl_seconds=10)
+  assert not store.check_and_store("a", ttl_seconds=10)
+  clock.now += 10.5
+  assert store.check_and_store("a", ttl_seconds=10)
+
+
+def test_expired_entries_are_evicted_in_batches():
+  clock = FakeClock()
+  store = NonceStore(None, evict_batch=8, clock=clock)
+  for i in range(100):
+    store.check_and_store(f"n{i}", ttl_seconds=5)
+  clock.now += 10
+  store.check_and_store("fresh", ttl_seconds=5)
+  # 每次调用最多清理一批
+  assert len(store.fallback) == 100 - 8 + 1
+  for i in range(20):
+    store.check_and_store(f"m{i}", ttl_seconds=5)
+  assert set(store.fallback) == {"fresh", *(f"m{i}" for i in range(20))}
+
+
+def test_full_store_rejects_new_nonces():
+  clock = FakeClock()
+  store = NonceStore(None, max_entries=3, clock=clock)
+  for i in range(3):
+    assert store.check_and_store(f"n{i}", ttl_seconds=60)
+  with pytest.raises(NonceStoreFull):
+    store.check_and_store("overflow", ttl_seconds=60)
+  # 已有条目过期后可腾出空间
+  clock.now += 61
+  assert store.check_and_store("overflow", ttl_seconds=60)
+  assert len(store.fallback) == 1
+
+
+def test_concurrent_duplicates_accept_exactly_once():
+  store = NonceStore(None)
+  results = []
+
+  def worker():
+    results.append(store.check_and_store("same", ttl_seconds=60))
+
+  threads = [threading.Thread(target=worker) for _ in range(16)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert results.count(True) == 1
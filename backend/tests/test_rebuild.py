@@ -0,0 +1,142 @@
+import threading
+from datetime import datetime, timezone
+
+import fakeredis
+import pytest
+from sqlalchemy import create_engine
+
+from app.core.db import Base
+from app.models import Level, Score, User
+from app.schemas import LeaderboardEntry
+from app.services.best_scores import backfill_upsert
+from app.services.leaderboard import Leaderboard
+from app.services.rebuild import LeaderboardRebuilder, leaderboards_missing, warm_up
+
+NOW = datetime(2026, 10, 17, 12, tzinfo=timezone.utc).timestamp()
+TODAY = datetime(2026, 10, 17, 8)
+LAST_MONTH = datetime(2026, 9, 1)
+
+
+def _entry(user_id: int, score: int) -> LeaderboardEntry:
+  return LeaderboardEntry(
+    user_id=user_id, name=f"u{user_id}", score=score, wave=1, time_ms=60000, life_left=0, created_at=LAST_MONTH
+  )
+
+
+@pytest.fixture
+def engine(tmp_path):
+  engine = create_engine(f"sqlite:///{tmp_path / 'rebuild.db'}")
+  Base.metadata.create_all(bind=engine)
+  scores = []
+  for user_id in range(1, 31):
+    # 上月的高分只进总榜；今天的成绩同时进入日/周榜
+    scores.append({"user_id": user_id, "level_id": "endless", "score": 1000 + user_id, "created_at": LAST_MONTH})
+    scores.append({"user_id": user_id, "level_id": "endless", "score": user_id, "created_at": TODAY})
+    if user_id % 3 == 0:
+      scores.append({"user_id": user_id, "level_id": "other", "score": 50 * user_id, "created_at": TODAY})
+  with engine.begin() as conn:
+    conn.execute(User.__table__.insert(), [{"id": i, "name": f"u{i}", "hash_pwd": ""} for i in range(1, 31)])
+    conn.execute(
+      Level.__table__.insert(),
+      [{"id": lid, "config_json": {}, "version": "1", "hash": "h"} for lid in ("endless", "other")],
+    )
+    conn.execute(Score.__table__.insert(), [{"wave": 1, "time_ms": 60000, "life_left": 0, **row} for row in scores])
+    conn.execute(backfill_upsert("sqlite", 0, 100))
+  yield engine
+  engine.dispose()
+
+
+@pytest.fixture
+def redis_client():
+  client = fakeredis.FakeRedis(decode_responses=True)
+  yield client
+  client.flushall()
+
+
+def test_rebuild_restores_all_and_periodic_boards(engine, redis_client):
+  assert leaderboards_missing(redis_client)
+  results = LeaderboardRebuilder(engine, redis_client, batch_size=7, clock=lambda: NOW).run()
+  assert {scope: stats.rows for scope, stats in results.items()} == {"all": 40, "daily": 40, "weekly": 40}
+  assert not leaderboards_missing(redis_client)
+
+  leaderboard = Leaderboard(redis_client, clock=lambda: NOW)
+  top = leaderboard.top("endless", limit=3)
+  assert [(e.user_id, e.score, e.created_at) for e in top] == [
+    (30, 1030, LAST_MONTH),
+    (29, 1029, LAST_MONTH),
+    (28, 1028, LAST_MONTH),
+  ]
+  assert [e.score for e in leaderboard.top("endless", scope="daily", limit=2)] == [30, 29]
+  assert [e.user_id for e in leaderboard.top("other", scope="weekly", limit=2)] == [30, 27]
+  assert redis_client.ttl(leaderboard._key("endless", "daily")) > 0
+
+
+def test_dry_run_diffs_without_writing(engine, redis_client):
+  leaderboard = Leaderboard(redis_client, clock=lambda: NOW)
+  leaderboard.submit("endless", _entry(5, 1005))
+  stats = LeaderboardRebuilder(engine, redis_client, dry_run=True, clock=lambda: NOW).run(["all"])["all"]
+  assert (stats.missing, stats.changed, stats.unchanged) == (39, 0, 1)
+  assert stats.samples and "missing" in stats.samples[0]
+  assert redis_client.zcard(leaderboard._key("endless")) == 1
+
+  leaderboard.submit("endless", _entry(6, 999_999))
+  stats = LeaderboardRebuilder(engine, redis_client, dry_run=True, clock=lambda: NOW).run(["all"])["all"]
+  assert stats.changed == 1
+
+
+def test_rebuild_keeps_better_live_scores(engine, redis_client):
+  # 预热期间线上提交的更好成绩不被库里的旧行覆盖；更差的仍被库里的最好成绩替换
+  leaderboard = Leaderboard(redis_client, clock=lambda: NOW)
+  leaderboard.submit("endless", _entry(5, 999_999))
+  leaderboard.submit("endless", _entry(6, 1))
+  LeaderboardRebuilder(engine, redis_client, clock=lambda: NOW).run(["all"])
+  scores = {e.user_id: e.score for e in leaderboard.top("endless", limit=30)}
+  assert (scores[5], scores[6], scores[7]) == (999_999, 1006, 1007)
+
+
+def test_rebuild_resumes_from_checkpoint(engine, redis_client, tmp_path):
+  checkpoint = tmp_path / "rebuild.json"
+  # 只出现在第一批里的关卡：续跑后也要截断、递增版本
+  with engine.begin() as conn:
+    conn.execute(Level.__table__.insert(), [{"id": "early", "config_json": {}, "version": "1", "hash": "h"}])
+    conn.execute(
+      Score.__table__.insert(),
+      [{"user_id": 1, "level_id": "early", "score": 7, "wave": 1, "time_ms": 1, "life_left": 0, "created_at": TODAY}],
+    )
+    conn.execute(backfill_upsert("sqlite", 0, 100))
+  stop = threading.Event()
+
+  def stop_after_first_batch(stats):
+    stop.set()
+
+  first = LeaderboardRebuilder(
+    engine,
+    redis_client,
+    batch_size=10,
+    checkpoint=checkpoint,
+    progress=stop_after_first_batch,
+    stop=stop,
+    clock=lambda: NOW,
+  ).run(["all"])
+  assert first["all"].rows == 10
+
+  second = LeaderboardRebuilder(engine, redis_client, batch_size=10, checkpoint=checkpoint, clock=lambda: NOW).run(
+    ["all"]
+  )
+  assert second["all"].rows == 31
+  assert second["all"].keys == 3
+  leaderboard = Leaderboard(redis_client, clock=lambda: NOW)
+  assert redis_client.zcard(leaderboard._key("endless")) == 30
+  assert redis_client.zcard(leaderboard._key("other")) == 10
+  assert redis_client.exists(f"{leaderboard._key('early')}:version")
+  # 已完成的 scope 再跑直接跳过
+  assert LeaderboardRebuilder(engine, redis_client, checkpoint=checkpoint).run(["all"]) == {}
+
+
+def test_warm_up_only_when_boards_missing(engine, redis_client):
+  redis_client.set("leaderboard:endless:all:marker", "1")
+  warm_up(engine, redis_client)
+  assert redis_client.keys("leaderboard:*") == ["leaderboard:endless:all:marker"]
+  redis_client.flushall()
+  warm_up(engine, redis_client)
+  assert redis_client.zcard("leaderboard:endless:all") == 30
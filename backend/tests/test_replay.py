@@ -0,0 +1,200 @@
+import io
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import get_settings
+from app.models import Score
+from app.services.levels import load_level
+from app.services.replay import INVALID, MISMATCH, SKIPPED, VERIFIED, ReplayVerifier, replay_digest, verify_replay
+from app.services.replay_format import ReplayFormatError, ReplayParser, ReplayReader, encode_replay
+from app.services.replay_store import ReplayStore
+from app.services.simulation import simulate, play
+from app.services.waves import Mulberry32
+
+from conftest import TestingSessionLocal, test_leaderboard
+from test_score import auth_headers, signed_score_payload
+
+MAX_TICKS = 60 * 60 * 30
+settings = get_settings()
+
+
+def builder(sim):
+  """沿基础路径两侧轮流建五种塔，建满后逐个升级；每 30 帧操作一次。"""
+  if sim.tick % 30:
+    return []
+  kinds = ("LMG", "CANNON", "FREEZE", "LASER", "HMG")
+  for x, y in sim.base_path[1:-1]:
+    for cell in ((x, y - 1), (x, y + 1)):
+      if sim._buildable(cell) and sim.gold >= 20:
+        return [["build", cell[0], cell[1], kinds[len(sim.towers.cells) % len(kinds)]]]
+  for cell, level in zip(sim.towers.cells, sim.towers.level):
+    if level < 5:
+      return [["upgrade", cell[0], cell[1]]]
+  return []
+
+
+@pytest.fixture(scope="module")
+def recorded():
+  config = load_level("endless")["config"]
+  replay, outcome = play(config, 42, builder, MAX_TICKS)
+  assert outcome.game_over and outcome.wave > 1 and replay["ops"]
+  return config, replay, outcome
+
+
+def claim_of(outcome, **overrides):
+  claim = {"score": outcome.score, "wave": outcome.wave, "life_left": outcome.life_left, "time_ms": outcome.ticks * 17}
+  return {**claim, **overrides}
+
+
+def test_mulberry32_matches_js_reference():
+  # 参考值来自 JS 版 mulberry32（Math.imul 实现）
+  rng = Mulberry32(42)
+  assert [rng.random() for _ in range(3)] == [0.6011037519201636, 0.44829055899754167, 0.8524657934904099]
+
+
+def test_replay_reproduces_recorded_game(recorded):
+  config, replay, outcome = recorded
+  assert simulate(config, replay, MAX_TICKS) == outcome
+  assert verify_replay(config, replay, claim_of(outcome), MAX_TICKS) == VERIFIED
+  assert verify_replay(config, replay, claim_of(outcome, score=outcome.score + 1), MAX_TICKS) == MISMATCH
+  # 时长短于帧数、或声明的终局不是日志末帧，都不认
+  assert verify_replay(config, replay, claim_of(outcome, time_ms=1000), MAX_TICKS) == MISMATCH
+  assert verify_replay(config, {**replay, "ticks": replay["ticks"] - 60}, claim_of(outcome), MAX_TICKS) == MISMATCH
+  assert (
+    verify_replay(config, {**replay, "ops": list(reversed(replay["ops"]))}, claim_of(outcome), MAX_TICKS) == INVALID
+  )
+  assert verify_replay(config, replay, claim_of(outcome), replay["ticks"] - 1) == INVALID
+
+
+@pytest.mark.parametrize("mode", ["record", "enforce"])
+def test_submitted_replay_is_verified_off_the_request(client, recorded, monkeypatch, mode):
+  monkeypatch.setattr(settings, "replay_mode", mode)
+  enforce = mode == "enforce"
+  _, replay, outcome = recorded
+  level = load_level("endless")
+  submit_path = client.app.url_path_for("submit_score")
+  headers = auth_headers(client, "alice")
+  original = client.app.state.replay_verifier
+
+  def submit(claim, digest=replay_digest(replay)):
+    payload = signed_score_payload(level, {**claim, "ops_digest": digest})
+    return client.post(submit_path, json={**payload, "replay": replay}, headers=headers)
+
+  # workers=0：在请求线程内校验，响应返回前结论已落库；与 lifespan 一致，只有 enforce 模式按结论撤榜
+  client.app.state.replay_verifier = ReplayVerifier(
+    TestingSessionLocal, workers=0, max_ticks=MAX_TICKS, leaderboard=test_leaderboard if enforce else None
+  )
+  try:
+    honest = submit(claim_of(outcome))
+    inflated = submit(claim_of(outcome, score=outcome.score * 2))
+    # 日志被替换（摘要与签名不符）：直接拒绝
+    tampered = submit(claim_of(outcome), digest="fnv1a-00000000")
+    client.app.state.replay_verifier = ReplayVerifier(TestingSessionLocal, workers=0, max_pending=0)
+    skipped = submit(claim_of(outcome))
+    # 不带日志：enforce 模式直接拒绝
+    bare = client.post(submit_path, json=signed_score_payload(level, claim_of(outcome, score=1)), headers=headers)
+  finally:
+    client.app.state.replay_verifier = original
+  assert honest.status_code == inflated.status_code == skipped.status_code == 200
+  assert honest.json()["replay_status"] == "pending"
+  assert tampered.status_code == 400
+  with TestingSessionLocal() as db:
+    statuses = dict(db.execute(select(Score.id, Score.replay_status)).all())
+  assert statuses[honest.json()["id"]] == VERIFIED
+  assert statuses[inflated.json()["id"]] == MISMATCH
+  assert statuses[skipped.json()["id"]] == SKIPPED
+  assert bare.status_code == (400 if enforce else 200)
+
+  # enforce：被判定不一致的虚高成绩从各榜单撤下，换回该用户下一条有效的最好成绩；record 只记录结论
+  expected = outcome.score if enforce else outcome.score * 2
+  for scope in ("all", "daily", "weekly"):
+    board = client.get(client.app.url_path_for("read_leaderboard"), params={"level": level["id"], "scope": scope})
+    assert [(e["name"], e["score"]) for e in board.json()["entries"]] == [("alice", expected)]
+  best = client.get(client.app.url_path_for("best_score"), params={"level": level["id"]}, headers=headers).json()
+  assert best["best_score"] == expected
+
+
+def test_binary_replay_round_trip_and_streaming_parser(recorded):
+  config, replay, outcome = recorded
+  waves = []
+  assert simulate(config, replay, MAX_TICKS, op_waves=waves) == outcome
+  data = encode_replay(replay, waves)
+
+  decoded, decoded_waves = ReplayReader(io.BytesIO(data)).read()
+  assert (decoded, decoded_waves) == (replay, waves)
+  # 任意切分喂给解析器：摘要与 JSON 日志一致
+  parser = ReplayParser(max_ops=len(replay["ops"]))
+  for i in range(0, len(data), 5):
+    parser.feed(data[i : i + 5])
+  summary = parser.finish()
+  assert summary.digest == replay_digest(replay)
+  assert (summary.ops, summary.first_wave, summary.last_wave) == (len(replay["ops"]), waves[0], waves[-1])
+
+  def parse(blob, max_ops=1000):
+    parser = ReplayParser(max_ops)
+    parser.feed(blob)
+    return parser.finish()
+
+  with pytest.raises(ReplayFormatError):
+    parse(data[:-1])
+  with pytest.raises(ReplayFormatError):
+    parse(data, max_ops=1)
+  corrupt = bytearray(data)
+  corrupt[-30] ^= 0xFF
+  with pytest.raises(ReplayFormatError):
+    parse(bytes(corrupt))
+  with pytest.raises(ReplayFormatError):
+    encode_replay({**replay, "ops": [[1, "build", 1.5, 2, "LMG"]]}, [1])
+
+
+def test_upload_and_download_binary_replay(client, recorded, tmp_path):
+  config, replay, outcome = recorded
+  waves = []
+  simulate(config, replay, MAX_TICKS, op_waves=waves)
+  data = encode_replay(replay, waves)
+  level = load_level("endless")
+  headers = auth_headers(client, "alice")
+
+  def submit(claim):
+    payload = signed_score_payload(level, {**claim, "ops_digest": replay_digest(replay)})
+    return client.post(client.app.url_path_for("submit_score"), json=payload, headers=headers).json()["id"]
+
+  def upload(score_id, blob, as_user=headers):
+    path = client.app.url_path_for("upload_replay", score_id=score_id)
+    # 分块发送：服务端边收边校验
+    return client.put(path, content=(blob[i : i + 64] for i in range(0, len(blob), 64)), headers=as_user)
+
+  original = client.app.state.replay_verifier, client.app.state.replay_store
+  client.app.state.replay_verifier = ReplayVerifier(TestingSessionLocal, workers=0, max_ticks=MAX_TICKS)
+  client.app.state.replay_store = ReplayStore(tmp_path, max_ops=1000)
+  try:
+    honest, inflated = submit(claim_of(outcome)), submit(claim_of(outcome, score=outcome.score * 2))
+    stored = upload(honest, data)
+    assert stored.status_code == 201
+    assert stored.json()["replay_status"] == VERIFIED
+    assert (stored.json()["size"], stored.json()["last_wave"]) == (len(data), waves[-1])
+    assert upload(honest, data).status_code == 409
+    assert upload(inflated, data, as_user=auth_headers(client, "bob")).status_code == 404
+    assert upload(inflated, data[:-4]).status_code == 400
+    assert upload(inflated, encode_replay({**replay, "seed": 7}, waves)).status_code == 400
+    assert upload(inflated, data).json()["replay_status"] == MISMATCH
+
+    download = client.app.url_path_for("download_replay", score_id=honest)
+    assert client.get(download).content == data
+    first, last = waves[-1] - 1, waves[-1]
+    part = client.get(download, headers={"Range": f"waves={first}-{last}"})
+    assert part.status_code == 206
+    assert part.headers["content-range"] == f"waves {first}-{last}/{waves[-1]}"
+    sliced, sliced_waves = ReplayReader(io.BytesIO(part.content)).read()
+    assert sliced_waves == [w for w in waves if w >= first]
+    assert sliced["ops"] == [op for op, w in zip(replay["ops"], waves) if w >= first]
+    assert client.get(download, headers={"Range": "waves=-1"}).headers["content-range"] == f"waves {last}-{last}/{last}"
+    assert client.get(download, headers={"Range": "waves=900-"}).status_code == 416
+    assert client.get(download, headers={"Range": "bytes=0-3"}).content == data[:4]
+    assert client.get(client.app.url_path_for("download_replay", score_id=inflated + 1)).status_code == 404
+  finally:
+    client.app.state.replay_verifier, client.app.state.replay_store = original
+  with TestingSessionLocal() as db:
+    statuses = dict(db.execute(select(Score.id, Score.replay_status)).all())
+  assert statuses == {honest: VERIFIED, inflated: MISMATCH}
@@ -1,8 +1,17 @@
 import time
 import uuid
+from datetime import datetime
 
+from sqlalchemy import create_engine, select
+
+from app.core.db import Base
+from app.models import Level, Score, User, UserLevelBest
+from app.services.best_scores import backfill_upsert
+from app.services.leaderboard import SCORE_LIMIT
 from app.services.levels import load_level
-from app.schemas import ScoreSubmit
+from app.core.deps import get_leaderboard
+from app.schemas import LeaderboardEntry, ScoreSubmit
+from app.services.response_cache import get_response_cache
 from app.core.config import get_settings
 from app.utils.security import compute_score_signature
 
@@ -85,6 +94,47 @@ def test_leaderboard_orders_and_deduplicates(client):
   assert entries[1]["score"] == 1500
 
 
+def test_submit_score_query_count(client, sql_statements):
+  # 旧实现每次提交：查用户、查关卡（并覆盖写配置）、INSERT、refresh 查成绩、commit 后重载用户，共 5 条
+  headers = auth_headers(client, "alice")
+  submit_path = client.app.url_path_for("submit_score")
+  level = load_level("endless")
+
+  first = client.post(submit_path, json=signed_score_payload(level, {"score": 100}), headers=headers)
+  assert first.status_code == 200
+  assert any(stmt.startswith("INSERT INTO levels") for stmt in sql_statements)
+
+  sql_statements.clear()
+  second = client.post(submit_path, json=signed_score_payload(level, {"score": 200}), headers=headers)
+  assert second.status_code == 200
+  assert second.json()["id"] > first.json()["id"]
+  assert second.json()["created_at"]
+  # 关卡已同步、用户命中认证缓存：只剩 INSERT ... RETURNING + 最好成绩 upsert
+  assert len(sql_statements) == 2
+  assert sql_statements[0].startswith("INSERT INTO scores") and "RETURNING" in sql_statements[0]
+  assert sql_statements[1].startswith("INSERT INTO user_level_best") and "ON CONFLICT" in sql_statements[1]
+
+
+def test_best_score_keeps_best_and_prefers_faster_tie(client, sql_statements):
+  headers = auth_headers(client, "alice")
+  submit_path = client.app.url_path_for("submit_score")
+  best_path = client.app.url_path_for("best_score")
+  level = load_level("endless")
+
+  for score, time_ms in ((1000, 80000), (900, 50000), (1000, 70000), (1000, 75000)):
+    res = client.post(
+      submit_path, json=signed_score_payload(level, {"score": score, "time_ms": time_ms}), headers=headers
+    )
+    assert res.status_code == 200
+
+  sql_statements.clear()
+  best = client.get(best_path, params={"level": level["id"]}, headers=headers).json()
+  assert (best["best_score"], best["time_ms"]) == (1000, 70000)
+  # 用户命中认证缓存，只剩主键查 user_level_best，不再扫描 scores
+  assert len(sql_statements) == 1
+  assert "FROM user_level_best" in sql_statements[0] and "ORDER BY" not in sql_statements[0]
+
+
 def signed_score_payload(level: dict, overrides: dict) -> dict:
   """构建带签名的成绩请求体。"""
   base = {
@@ -103,3 +153,130 @@ def signed_score_payload(level: dict, overrides: dict) -> dict:
   model = ScoreSubmit(**base)
   base["signature"] = compute_score_signature(settings.score_signature_key, model)
   return base
+
+
+def test_leaderboard_rank_window_and_cursor(client):
+  level = load_level("endless")
+  submit_path = client.app.url_path_for("submit_score")
+  leaderboard_path = client.app.url_path_for("read_leaderboard")
+  rank_path = client.app.url_path_for("read_leaderboard_rank")
+  headers = {}
+  for i, name in enumerate(("amy", "ben", "cat", "dan")):
+    headers[name] = auth_headers(client, name)
+    client.post(submit_path, json=signed_score_payload(level, {"score": 1000 - i * 100}), headers=headers[name])
+
+  rank = client.get(rank_path, params={"level": level["id"], "around": 1}, headers=headers["cat"]).json()
+  assert (rank["rank"], rank["total"]) == (3, 4)
+  assert [(e["name"], e["rank"]) for e in rank["entries"]] == [("ben", 2), ("cat", 3), ("dan", 4)]
+  assert client.get(rank_path, headers=auth_headers(client, "eve")).json()["rank"] is None
+
+  first = client.get(leaderboard_path, params={"level": level["id"], "limit": 3}).json()
+  assert [e["name"] for e in first["entries"]] == ["amy", "ben", "cat"]
+  second = client.get(
+    leaderboard_path, params={"level": level["id"], "limit": 3, "cursor": first["next_cursor"]}
+  ).json()
+  assert [e["name"] for e in second["entries"]] == ["dan"]
+  assert second["next_cursor"] is None
+  assert client.get(leaderboard_path, params={"cursor": "bogus"}).status_code == 400
+
+
+def test_submit_score_rejects_scores_outside_rank_range(client):
+  level = load_level("endless")
+  submit_path = client.app.url_path_for("submit_score")
+  headers = auth_headers(client, "amy")
+  # 超过 2^(53 - TIME_BITS) 的分数在 ZSET double 中会舍入
+  res = client.post(submit_path, json=signed_score_payload(level, {"score": SCORE_LIMIT}), headers=headers)
+  assert (res.status_code, res.json()["detail"]) == (400, "Score out of range")
+  payload = {**signed_score_payload(level, {"score": 5}), "score": -1}
+  assert client.post(submit_path, json=payload, headers=headers).status_code == 422
+  ok = client.post(submit_path, json=signed_score_payload(level, {"score": SCORE_LIMIT - 1}), headers=headers)
+  assert ok.status_code == 200
+
+
+def test_backfill_user_level_best_is_idempotent():
+  engine = create_engine("sqlite+pysqlite:///:memory:")
+  Base.metadata.create_all(bind=engine)
+  rows = [(1, 500, 60000), (1, 800, 90000), (1, 800, 70000), (2, 300, 10000)]
+  with engine.begin() as conn:
+    conn.execute(
+      User.__table__.insert(), [{"id": 1, "name": "a", "hash_pwd": ""}, {"id": 2, "name": "b", "hash_pwd": ""}]
+    )
+    conn.execute(Level.__table__.insert(), {"id": "endless", "config_json": {}, "version": "1", "hash": "h"})
+    conn.execute(
+      Score.__table__.insert(),
+      [
+        {"user_id": user_id, "level_id": "endless", "score": score, "wave": 1, "time_ms": time_ms, "life_left": 0}
+        for user_id, score, time_ms in rows
+      ],
+    )
+
+  for _ in range(2):
+    for start in (0, 2):
+      with engine.begin() as conn:
+        conn.execute(backfill_upsert("sqlite", start, start + 2))
+
+  with engine.connect() as conn:
+    best = conn.execute(
+      select(UserLevelBest.user_id, UserLevelBest.score, UserLevelBest.time_ms, UserLevelBest.score_id).order_by(
+        UserLevelBest.user_id
+      )
+    ).all()
+  assert [tuple(row) for row in best] == [(1, 800, 70000, 3), (2, 300, 10000, 4)]
+
+
+def test_leaderboard_etag_changes_on_submit(client):
+  level = load_level("endless")
+  submit_path = client.app.url_path_for("submit_score")
+  leaderboard_path = client.app.url_path_for("read_leaderboard")
+  headers = auth_headers(client, "alice")
+  params = {"level": level["id"], "scope": "all"}
+
+  client.post(submit_path, json=signed_score_payload(level, {"score": 100}), headers=headers)
+  first = client.get(leaderboard_path, params=params)
+  etag = first.headers["etag"]
+  assert client.get(leaderboard_path, params=params, headers={"If-None-Match": etag}).status_code == 304
+
+  client.post(submit_path, json=signed_score_payload(level, {"score": 200}), headers=headers)
+  changed = client.get(leaderboard_path, params=params, headers={"If-None-Match": etag})
+  assert changed.status_code == 200
+  assert changed.headers["etag"] != etag
+  assert changed.json()["entries"][0]["score"] == 200
+  # 游标格式错误仍先返回 400，而不是 304
+  bad = client.get(leaderboard_path, params={**params, "cursor": "x"}, headers={"If-None-Match": "*"})
+  assert bad.status_code == 400
+
+
+def test_leaderboard_not_cached_when_board_changes_while_building(client, monkeypatch):
+  level = load_level("endless")
+  leaderboard_path = client.app.url_path_for("read_leaderboard")
+  params = {"level": level["id"], "scope": "all"}
+  leaderboard = client.app.dependency_overrides[get_leaderboard]()
+  # 空榜版本恒为 all.0：清掉其他测试留下的同键缓存，确保本次走构建
+  get_response_cache().clear()
+  version = leaderboard.version(level["id"])
+  page_raw = leaderboard.page_raw
+
+  def racing_page_raw(*args, **kwargs):
+    # 读版本之后、读页之前有一次提交
+    monkeypatch.setattr(leaderboard, "page_raw", page_raw)
+    entry = LeaderboardEntry(
+      user_id=1, name="amy", score=10, wave=1, time_ms=1, life_left=0, created_at=datetime(2026, 1, 1)
+    )
+    leaderboard.submit(level["id"], entry)
+    return page_raw(*args, **kwargs)
+
+  monkeypatch.setattr(leaderboard, "page_raw", racing_page_raw)
+  res = client.get(leaderboard_path, params=params)
+  assert res.headers["etag"] == f'"{version}"'
+  assert [e["name"] for e in res.json()["entries"]] == ["amy"]
+  assert not [key for key in get_response_cache()._entries if key[0] == "leaderboard" and key[-1] == version]
+
+  again = client.get(leaderboard_path, params=params)
+  assert again.headers["etag"] == f'"{leaderboard.version(level["id"])}"' != res.headers["etag"]
+
+
+def test_leaderboard_openapi_schema_unchanged(client):
+  schema = client.get("/openapi.json").json()
+  path = client.app.url_path_for("read_leaderboard")
+  response = schema["paths"][path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+  assert response == {"$ref": "#/components/schemas/LeaderboardResponse"}
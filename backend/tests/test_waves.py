@@ -0,0 +1,78 @@
+from app.services.levels import load_level
+from app.services.waves import Mulberry32, WaveSchedule, WaveScheduleCache, get_wave_schedules
+
+LEVEL = load_level("endless")
+
+
+def test_mulberry32_block_matches_scalar_draws():
+  scalar, vector = Mulberry32(2024), Mulberry32(2024)
+  draws = [scalar.random() for _ in range(100)]
+  assert vector.block(60).tolist() + vector.block(40).tolist() == draws
+  assert vector.state == scalar.state
+
+
+def test_schedule_is_deterministic_and_lazy():
+  config = LEVEL["config"]
+  schedule = WaveSchedule.from_config(config, 7)
+  tail = schedule.wave(29)
+  assert schedule.expanded == 1
+
+  # 同一配置 + 种子展开结果一致，不同种子不同
+  again = WaveSchedule.from_config(config, 7)
+  assert again.wave(29).spawns == tail.spawns
+  assert again.wave(29).variance.tolist() == tail.variance.tolist()
+  assert [w.spawns for w in again.waves(0, 30)] == [w.spawns for w in schedule.waves(0, 30)]
+  assert WaveSchedule.from_config(config, 8).wave(29).spawns != tail.spawns
+
+  # 固定波按配置的数量刷出，只打乱顺序
+  for wave, spec in zip(schedule.waves(0, len(config["waves"]["fixed"])), config["waves"]["fixed"]):
+    assert not wave.auto and wave.difficulty_bonus == 0
+    names = schedule.names(wave)
+    assert {e["type"]: e["count"] for e in spec["enemies"]} == {t: names.count(t) for t in set(names)}
+    assert len(wave.variance) == len(names)
+    assert all(0.8 <= v < 1.2 for v in wave.variance)
+  assert tail.auto and len(tail.spawns) <= config["waves"]["generator"]["maxPerWave"]
+
+  cache = WaveScheduleCache(max_entries=1)
+  first = cache.get(LEVEL["hash"], config, 7)
+  assert cache.get(LEVEL["hash"], config, 7) is first
+  cache.get(LEVEL["hash"], config, 8)
+  assert cache.get(LEVEL["hash"], config, 7) is not first
+  assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_get_level_waves_pages_and_etag(client):
+  path = client.app.url_path_for("get_level_waves", level_id="endless")
+  res = client.get(path, params={"seed": 7, "from": 3, "count": 4}, headers={"Accept-Encoding": "identity"})
+  assert res.status_code == 200
+  body = res.json()
+  assert res.headers["etag"] == f'"{LEVEL["hash"]}-7-3-4"'
+  assert (body["hash"], body["seed"]) == (LEVEL["hash"], 7)
+  assert [w["wave"] for w in body["waves"]] == [3, 4, 5, 6]
+
+  schedule = WaveSchedule.from_config(LEVEL["config"], 7)
+  expected = schedule.wave(4)
+  assert body["waves"][2]["spawns"] == list(expected.spawns)
+  assert body["waves"][2]["variance"] == expected.variance.tolist()
+  assert [body["enemy_types"][i] for i in body["waves"][2]["spawns"]] == schedule.names(expected)
+
+  cached = client.get(path, params={"seed": 7, "from": 3, "count": 4}, headers={"If-None-Match": res.headers["etag"]})
+  assert cached.status_code == 304
+
+  assert client.get(path, params={"seed": 7, "from": 10_000, "count": 2}).status_code == 400
+  assert client.get(path, params={"seed": 7, "from": 10_000, "count": 1}).status_code == 200
+  assert client.get(path, params={"seed": 7, "from": 0}).status_code == 422
+  assert client.get(path, params={"from": 1}).status_code == 422
+
+
+def test_high_waves_do_not_expand_earlier_waves(client):
+  path = client.app.url_path_for("get_level_waves", level_id="endless")
+  res = client.get(path, params={"seed": 123457, "from": 9991, "count": 10})
+  assert [w["wave"] for w in res.json()["waves"]] == list(range(9991, 10_001))
+
+  # 只展开被请求的 10 波；与另起一份波次表展开的同一波一致
+  schedule = get_wave_schedules().get(LEVEL["hash"], LEVEL["config"], 123457)
+  assert schedule.expanded == 10
+  sequential = WaveSchedule.from_config(LEVEL["config"], 123457).waves(9980, 20)[10]
+  assert res.json()["waves"][0]["spawns"] == list(sequential.spawns)
+  assert res.json()["waves"][0]["variance"] == sequential.variance.tolist()
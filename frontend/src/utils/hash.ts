@@ -24,7 +24,8 @@ export function hashStringFNV1a(input: string): string {
 
   for (let i = 0; i < input.length; i += 1) {
     hash ^= input.charCodeAt(i)
-    hash = (hash * 0x01000193) >>> 0
+    // Math.imul 做精确的 32 位乘法；直接相乘会超出 2^53 丢失低位，与后端不一致
+    hash = Math.imul(hash, 0x01000193) >>> 0
   }
 
   return `fnv1a-${hash.toString(16).padStart(8, '0')}`